@@ -0,0 +1,157 @@
+"""add standing budget balance ledger and snapshots
+
+Revision ID: 3c5a1f0e9b27
+Revises: d01774fa3ae3
+Create Date: 2026-10-18 10:12:31.502811
+
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy_utc.sqltypes import UtcDateTime
+from biweeklybudget.utils import dtnow
+
+# revision identifiers, used by Alembic.
+revision = '3c5a1f0e9b27'
+down_revision = 'd01774fa3ae3'
+branch_labels = None
+depends_on = None
+
+budgets = sa.table(
+    'budgets',
+    sa.column('id', sa.Integer),
+    sa.column('is_periodic', sa.Boolean),
+    sa.column('current_balance', sa.Numeric(precision=10, scale=4))
+)
+
+budget_transactions = sa.table(
+    'budget_transactions',
+    sa.column('amount', sa.Numeric(precision=10, scale=4)),
+    sa.column('trans_id', sa.Integer),
+    sa.column('budget_id', sa.Integer)
+)
+
+transactions = sa.table(
+    'transactions',
+    sa.column('id', sa.Integer),
+    sa.column('date', sa.Date)
+)
+
+
+def upgrade():
+    entries_table = op.create_table(
+        'budget_balance_entries',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('budget_id', sa.Integer(), nullable=False),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('amount', sa.Numeric(precision=10, scale=4), nullable=False),
+        sa.Column('trans_id', sa.Integer(), nullable=True),
+        sa.Column('note', sa.String(length=254), nullable=True),
+        sa.Column('created', UtcDateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(
+            ['budget_id'], ['budgets.id'],
+            name=op.f('fk_budget_balance_entries_budget_id_budgets')
+        ),
+        sa.ForeignKeyConstraint(
+            ['trans_id'], ['transactions.id'],
+            name=op.f('fk_budget_balance_entries_trans_id_transactions')
+        ),
+        sa.PrimaryKeyConstraint('id', name=op.f('pk_budget_balance_entries')),
+        mysql_engine='InnoDB'
+    )
+    op.create_index(
+        'ix_budget_balance_entries_budget_id_date',
+        'budget_balance_entries', ['budget_id', 'date'], unique=False
+    )
+    snapshots_table = op.create_table(
+        'budget_balance_snapshots',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('budget_id', sa.Integer(), nullable=False),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column(
+            'balance', sa.Numeric(precision=10, scale=4), nullable=False
+        ),
+        sa.ForeignKeyConstraint(
+            ['budget_id'], ['budgets.id'],
+            name=op.f('fk_budget_balance_snapshots_budget_id_budgets')
+        ),
+        sa.PrimaryKeyConstraint(
+            'id', name=op.f('pk_budget_balance_snapshots')
+        ),
+        sa.UniqueConstraint(
+            'budget_id', 'date',
+            name=op.f('uq_budget_balance_snapshots_budget_id')
+        ),
+        mysql_engine='InnoDB'
+    )
+    # Backfill the ledger for existing standing budgets from their
+    # BudgetTransactions, with an opening balance entry to account for
+    # any difference from their current balance.
+    bind = op.get_bind()
+    today = dtnow().date()
+    now = dtnow()
+    entries = []
+    snapshots = []
+    for budget_id, current_balance in bind.execute(
+        sa.select([budgets.c.id, budgets.c.current_balance]).where(
+            budgets.c.is_periodic == sa.false()
+        )
+    ).fetchall():
+        budg_entries = []
+        for amount, trans_id, dt in bind.execute(
+            sa.select([
+                budget_transactions.c.amount,
+                budget_transactions.c.trans_id,
+                transactions.c.date
+            ]).select_from(
+                budget_transactions.join(
+                    transactions,
+                    budget_transactions.c.trans_id == transactions.c.id
+                )
+            ).where(
+                budget_transactions.c.budget_id == budget_id
+            ).order_by(transactions.c.date, transactions.c.id)
+        ).fetchall():
+            budg_entries.append({
+                'budget_id': budget_id,
+                'date': dt if dt is not None else today,
+                'amount': amount * -1,
+                'trans_id': trans_id,
+                'note': 'BudgetTransaction',
+                'created': now
+            })
+        opening = (current_balance or Decimal('0')) - sum(
+            e['amount'] for e in budg_entries
+        )
+        if opening != 0:
+            budg_entries.insert(0, {
+                'budget_id': budget_id,
+                'date': min(
+                    [e['date'] for e in budg_entries] + [today]
+                ),
+                'amount': opening,
+                'trans_id': None,
+                'note': 'Opening balance',
+                'created': now
+            })
+        monthly = defaultdict(Decimal)
+        for e in budg_entries:
+            monthly[date(e['date'].year, e['date'].month, 1)] += e['amount']
+        balance = Decimal('0')
+        for month in sorted(monthly.keys()):
+            snapshots.append({
+                'budget_id': budget_id, 'date': month, 'balance': balance
+            })
+            balance += monthly[month]
+        entries.extend(budg_entries)
+    if entries:
+        op.bulk_insert(entries_table, entries)
+    if snapshots:
+        op.bulk_insert(snapshots_table, snapshots)
+
+
+def downgrade():
+    op.drop_table('budget_balance_snapshots')
+    op.drop_table('budget_balance_entries')
@@ -0,0 +1,27 @@
+"""PlaidItem add sync_cursor
+
+Revision ID: 9e4b7d2c1a63
+Revises: 3c5a1f0e9b27
+Create Date: 2026-10-18 14:02:17.318420
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e4b7d2c1a63'
+down_revision = '3c5a1f0e9b27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        'plaid_items',
+        sa.Column('sync_cursor', sa.Text(), nullable=True)
+    )
+
+
+def downgrade():
+    op.drop_column('plaid_items', 'sync_cursor')
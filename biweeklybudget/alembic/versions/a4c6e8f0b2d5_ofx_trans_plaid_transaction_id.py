@@ -0,0 +1,34 @@
+"""OFXTransaction add plaid_transaction_id
+
+Revision ID: a4c6e8f0b2d5
+Revises: e7b2c9d4f6a8
+Create Date: 2026-10-19 09:41:05.218734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4c6e8f0b2d5'
+down_revision = 'e7b2c9d4f6a8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        'ofx_trans',
+        sa.Column('plaid_transaction_id', sa.String(length=255), nullable=True)
+    )
+    op.create_index(
+        op.f('ix_ofx_trans_plaid_transaction_id'), 'ofx_trans',
+        ['plaid_transaction_id'], unique=False
+    )
+
+
+def downgrade():
+    op.drop_index(
+        op.f('ix_ofx_trans_plaid_transaction_id'), table_name='ofx_trans'
+    )
+    op.drop_column('ofx_trans', 'plaid_transaction_id')
@@ -0,0 +1,133 @@
+"""add full-text search indexes
+
+Revision ID: b5d7e3f1a2c4
+Revises: 9e4b7d2c1a63
+Create Date: 2026-10-18 19:41:08.224913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from biweeklybudget.fulltext import tokenize, is_native
+
+# revision identifiers, used by Alembic.
+revision = 'b5d7e3f1a2c4'
+down_revision = '9e4b7d2c1a63'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+transactions = sa.table(
+    'transactions',
+    sa.column('id', sa.Integer),
+    sa.column('description', sa.String(254))
+)
+
+ofx_trans = sa.table(
+    'ofx_trans',
+    sa.column('account_id', sa.Integer),
+    sa.column('fitid', sa.String(255)),
+    sa.column('name', sa.String(255)),
+    sa.column('memo', sa.String(255)),
+    sa.column('description', sa.String(254)),
+    sa.column('notes', sa.Text)
+)
+
+
+def _backfill(bind, token_table, query, key_names):
+    """
+    Insert the local index tokens for every row returned by ``query``, whose
+    first columns are the key columns named in ``key_names`` and the rest are
+    the text columns to tokenize.
+    """
+    rows = []
+    for r in bind.execute(query):
+        key = dict(zip(key_names, r[:len(key_names)]))
+        for token in sorted(tokenize(*r[len(key_names):])):
+            row = dict(key)
+            row['token'] = token
+            rows.append(row)
+        if len(rows) >= BATCH_SIZE:
+            op.bulk_insert(token_table, rows)
+            rows = []
+    if rows:
+        op.bulk_insert(token_table, rows)
+
+
+def upgrade():
+    trans_tokens = op.create_table(
+        'transaction_search_tokens',
+        sa.Column('token', sa.String(length=64), nullable=False),
+        sa.Column('transaction_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ['transaction_id'], ['transactions.id'],
+            name=op.f(
+                'fk_transaction_search_tokens_transaction_id_transactions'
+            ),
+            ondelete='CASCADE'
+        ),
+        sa.PrimaryKeyConstraint(
+            'token', 'transaction_id',
+            name=op.f('pk_transaction_search_tokens')
+        ),
+        mysql_engine='InnoDB'
+    )
+    op.create_index(
+        'ix_transaction_search_tokens_transaction_id',
+        'transaction_search_tokens', ['transaction_id'], unique=False
+    )
+    ofx_tokens = op.create_table(
+        'ofx_trans_search_tokens',
+        sa.Column('token', sa.String(length=64), nullable=False),
+        sa.Column('account_id', sa.Integer(), nullable=False),
+        sa.Column('fitid', sa.String(length=255), nullable=False),
+        sa.ForeignKeyConstraint(
+            ['account_id', 'fitid'],
+            ['ofx_trans.account_id', 'ofx_trans.fitid'],
+            name=op.f('fk_ofx_trans_search_tokens_account_id_ofx_trans'),
+            ondelete='CASCADE'
+        ),
+        sa.PrimaryKeyConstraint(
+            'token', 'account_id', 'fitid',
+            name=op.f('pk_ofx_trans_search_tokens')
+        ),
+        mysql_engine='InnoDB'
+    )
+    op.create_index(
+        'ix_ofx_trans_search_tokens_account_id_fitid',
+        'ofx_trans_search_tokens', ['account_id', 'fitid'], unique=False
+    )
+    bind = op.get_bind()
+    if is_native(bind):
+        op.create_index(
+            'ix_transactions_fulltext', 'transactions', ['description'],
+            unique=False, mysql_prefix='FULLTEXT'
+        )
+        op.create_index(
+            'ix_ofx_trans_fulltext', 'ofx_trans',
+            ['name', 'memo', 'description', 'notes'],
+            unique=False, mysql_prefix='FULLTEXT'
+        )
+        return
+    # other databases use the local token tables; index the existing rows
+    _backfill(
+        bind, trans_tokens,
+        sa.select([transactions.c.id, transactions.c.description]),
+        ['transaction_id']
+    )
+    _backfill(
+        bind, ofx_tokens,
+        sa.select([
+            ofx_trans.c.account_id, ofx_trans.c.fitid, ofx_trans.c.name,
+            ofx_trans.c.memo, ofx_trans.c.description, ofx_trans.c.notes
+        ]),
+        ['account_id', 'fitid']
+    )
+
+
+def downgrade():
+    if is_native(op.get_bind()):
+        op.drop_index('ix_ofx_trans_fulltext', table_name='ofx_trans')
+        op.drop_index('ix_transactions_fulltext', table_name='transactions')
+    op.drop_table('ofx_trans_search_tokens')
+    op.drop_table('transaction_search_tokens')
@@ -0,0 +1,63 @@
+"""store Transaction actual_amount
+
+Revision ID: c3a9f4e2d8b1
+Revises: b5d7e3f1a2c4
+Create Date: 2026-10-18 21:06:52.118047
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c3a9f4e2d8b1'
+down_revision = 'b5d7e3f1a2c4'
+branch_labels = None
+depends_on = None
+
+transactions = sa.table(
+    'transactions',
+    sa.column('id', sa.Integer),
+    sa.column('actual_amount', sa.Numeric(precision=10, scale=4))
+)
+
+budget_transactions = sa.table(
+    'budget_transactions',
+    sa.column('amount', sa.Numeric(precision=10, scale=4)),
+    sa.column('trans_id', sa.Integer)
+)
+
+
+def upgrade():
+    op.add_column(
+        'transactions',
+        sa.Column(
+            'actual_amount', sa.Numeric(precision=10, scale=4),
+            nullable=False, server_default='0'
+        )
+    )
+    # backfill from the sum of each Transaction's BudgetTransactions
+    op.execute(
+        transactions.update().values(
+            actual_amount=sa.select([
+                sa.func.coalesce(sa.func.sum(budget_transactions.c.amount), 0)
+            ]).where(
+                budget_transactions.c.trans_id == transactions.c.id
+            ).as_scalar()
+        )
+    )
+    with op.batch_alter_table('transactions') as batch_op:
+        batch_op.alter_column(
+            'actual_amount', existing_type=sa.Numeric(precision=10, scale=4),
+            existing_nullable=False, server_default=None
+        )
+    op.create_index(
+        op.f('ix_transactions_actual_amount'), 'transactions',
+        ['actual_amount'], unique=False
+    )
+
+
+def downgrade():
+    op.drop_index(
+        op.f('ix_transactions_actual_amount'), table_name='transactions'
+    )
+    op.drop_column('transactions', 'actual_amount')
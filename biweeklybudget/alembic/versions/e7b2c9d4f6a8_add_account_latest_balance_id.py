@@ -0,0 +1,58 @@
+"""add Account latest_balance_id
+
+Revision ID: e7b2c9d4f6a8
+Revises: c3a9f4e2d8b1
+Create Date: 2026-10-18 23:12:40.503127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'e7b2c9d4f6a8'
+down_revision = 'c3a9f4e2d8b1'
+branch_labels = None
+depends_on = None
+
+accounts = sa.table(
+    'accounts',
+    sa.column('id', sa.Integer),
+    sa.column('latest_balance_id', sa.Integer)
+)
+
+account_balances = sa.table(
+    'account_balances',
+    sa.column('id', sa.Integer),
+    sa.column('account_id', sa.Integer)
+)
+
+
+def upgrade():
+    with op.batch_alter_table('accounts') as batch_op:
+        batch_op.add_column(
+            sa.Column('latest_balance_id', sa.Integer(), nullable=True)
+        )
+        batch_op.create_foreign_key(
+            op.f('fk_accounts_latest_balance_id_account_balances'),
+            'account_balances', ['latest_balance_id'], ['id'],
+            ondelete='SET NULL'
+        )
+    # backfill with the highest AccountBalance ID of each Account
+    op.execute(
+        accounts.update().values(
+            latest_balance_id=sa.select([
+                sa.func.max(account_balances.c.id)
+            ]).where(
+                account_balances.c.account_id == accounts.c.id
+            ).as_scalar()
+        )
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('accounts') as batch_op:
+        batch_op.drop_constraint(
+            op.f('fk_accounts_latest_balance_id_account_balances'),
+            type_='foreignkey'
+        )
+        batch_op.drop_column('latest_balance_id')
@@ -39,25 +39,51 @@ from datetime import datetime
 import os
 import argparse
 import logging
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from io import BytesIO
+from timeit import default_timer
 from pytz import UTC
 
 from ofxparse import OfxParser
 from sqlalchemy.exc import InvalidRequestError, IntegrityError
 
 from biweeklybudget.cliutils import set_log_debug, set_log_info
+from biweeklybudget.import_manifest import ImportManifest
+from biweeklybudget.ingest_metrics import IngestSummary
 from biweeklybudget.ofxapi import apiclient
 from biweeklybudget.ofxapi.exceptions import DuplicateFileException
+from biweeklybudget.ofxstream import OfxStreamReader
 
 logger = logging.getLogger(__name__)
 
 
+def _parse_ofx_file(path):
+    """
+    Read and parse one OFX file. This is module-level so that it can be run
+    in a :py:class:`concurrent.futures.ProcessPoolExecutor` worker by
+    :py:meth:`~.OfxBackfiller._run_pipelined`.
+
+    :param path: absolute path to OFX/QFX file
+    :type path: str
+    :return: 2-tuple of parsed Ofx instance and file modification time
+    :rtype: tuple
+    """
+    with open(path, 'rb') as fh:
+        ofx_str = fh.read()
+    ofx = OfxParser.parse(BytesIO(ofx_str))
+    mtime = datetime.fromtimestamp(os.path.getmtime(path), tz=UTC)
+    return ofx, mtime
+
+
 class OfxBackfiller(object):
     """
     Class to backfill OFX in database from files on disk.
     """
 
-    def __init__(self, client, savedir):
+    def __init__(self, client, savedir, jobs=0, queue_size=None,
+                 stream=False, manifest=None, verify=False, batch_size=0):
         """
         Initialize the OFX Backfiller.
 
@@ -66,17 +92,55 @@ class OfxBackfiller(object):
           :py:class:`~.OfxApiRemote`
         :param savedir: directory/path to save statements in
         :type savedir: str
+        :param jobs: if greater than zero, parse files in a pool of this many
+          processes (see :py:meth:`~._run_pipelined`); otherwise parse and
+          upsert each file in turn
+        :type jobs: int
+        :param queue_size: maximum number of files parsed or being parsed
+          ahead of the file currently being written to the database, when
+          ``jobs`` is greater than zero. Defaults to four times ``jobs``.
+        :type queue_size: int
+        :param stream: if True, read each file with
+          :py:class:`~biweeklybudget.ofxstream.OfxStreamReader` and update it
+          with :py:meth:`~.OfxApiLocal.update_statement_stream` instead of
+          parsing the whole file at once. Only supported with
+          :py:class:`~.OfxApiLocal`, and when ``jobs`` is zero.
+        :type stream: bool
+        :param manifest: import manifest for ``savedir``, to skip files that
+          are unchanged since they were imported and record newly-imported
+          files in; or None to import all files
+        :type manifest: biweeklybudget.import_manifest.ImportManifest
+        :param verify: if True, compare the hashes of files in the manifest
+          instead of their sizes and modification times
+        :type verify: bool
+        :param batch_size: if greater than zero, upload the files for each
+          account in batches of this many statements (see
+          :py:meth:`~._do_account_batches`); only when ``jobs`` is zero and
+          ``stream`` is False
+        :type batch_size: int
         """
         logger.info('Initializing OfxBackfiller with savedir=%s', savedir)
         self.savedir = savedir
         self._client = client
+        self._jobs = jobs
+        if queue_size is None:
+            queue_size = jobs * 4
+        self._queue_size = max(queue_size, 1)
+        self._stream = stream
+        self._manifest = manifest
+        self._verify = verify
+        self._batch_size = batch_size
+        #: aggregated ingestion metrics for all statements imported
+        self.summary = IngestSummary()
 
     def run(self):
         """
-        Main entry point - run the backfill.
+        Main entry point - run the backfill. When done, the aggregated
+        ingestion metrics in :py:attr:`~.summary` are logged.
         """
         logger.debug('Checking for Accounts with statement directories')
         accounts = self._client.get_accounts()
+        dirs = []
         for acctname in sorted(accounts.keys()):
             p = os.path.join(self.savedir, acctname)
             data = accounts[acctname]
@@ -85,18 +149,93 @@ class OfxBackfiller(object):
                             data['id'], p)
                 continue
             logger.debug('Found directory %s for Account %d', p, data['id'])
-            self._do_account_dir(data['id'], p)
+            dirs.append((data['id'], p))
+        self._prune_manifest()
+        try:
+            if self._jobs > 0:
+                self._run_pipelined(dirs)
+                return
+            for acct_id, p in dirs:
+                self._do_account_dir(acct_id, p)
+                self._save_manifest()
+        finally:
+            self._save_manifest()
+            logger.info('Ingestion metrics:\n%s', self.summary.report())
 
-    def _do_account_dir(self, acct_id, path):
+    def _add_metrics(self, result, stage=None, secs=0.0):
         """
-        Handle all OFX statements in a per-account directory.
+        Add the time spent reading and parsing a file to the metrics of its
+        import result (unless ``stage`` is None), and add them to
+        :py:attr:`~.summary`.
+
+        :param result: return value of the client's ``update_statement_*``
+          methods
+        :type result: biweeklybudget.ingest_metrics.IngestResult
+        :param stage: name of the stage to add ``secs`` to, or None
+        :type stage: str
+        :param secs: seconds spent reading and parsing the file
+        :type secs: float
+        """
+        metrics = getattr(result, 'metrics', None)
+        if metrics is None:
+            return
+        if stage is not None:
+            metrics.add_stage(stage, secs)
+        self.summary.add(metrics)
+
+    def _save_manifest(self):
+        """
+        Save the import manifest, if there is one.
+        """
+        if self._manifest is not None:
+            self._manifest.save()
+
+    def _prune_manifest(self):
+        """
+        If there is an import manifest, remove its entries for statements that
+        no longer exist in the database (checked with a single call to the
+        client's ``get_statement_ids`` method), so that those files are
+        imported again instead of being skipped as unchanged.
+        """
+        if self._manifest is None:
+            return
+        stmt_ids = self._manifest.statement_ids()
+        if not stmt_ids:
+            return
+        removed = self._manifest.prune(
+            self._client.get_statement_ids(stmt_ids)
+        )
+        if removed > 0:
+            logger.warning(
+                'Import manifest had %d entries for statements not in the '
+                'database; those files will be imported again', removed
+            )
+
+    def _record(self, path, stmt_id):
+        """
+        Record an imported file in the import manifest, if there is one.
+
+        :param path: absolute path to OFX/QFX file
+        :type path: str
+        :param stmt_id: ID of the OFXStatement for the file
+        :type stmt_id: int
+        """
+        if self._manifest is not None:
+            self._manifest.record(path, stmt_id)
+
+    def _account_files(self, acct_id, path):
+        """
+        Return the paths of all OFX/QFX files in a per-account directory, in
+        order of modification time, oldest first. Files that the import
+        manifest shows are unchanged since they were imported are omitted.
 
         :param acct_id: account database ID
         :type acct_id: int
         :param path: absolute path to per-account directory
         :type path: str
+        :return: list of absolute file paths
+        :rtype: list
         """
-        logger.debug('Doing account %d directory (%s)', acct_id, path)
         files = {}
         for f in os.listdir(path):
             p = os.path.join(path, f)
@@ -107,14 +246,125 @@ class OfxBackfiller(object):
                 continue
             files[p] = os.path.getmtime(p)
         logger.debug('Found %d files for account %d', len(files), acct_id)
+        if self._manifest is not None:
+            unchanged = [
+                p for p in files
+                if self._manifest.is_unchanged(p, verify=self._verify)
+            ]
+            for p in unchanged:
+                del files[p]
+            logger.info('Skipping %d files for account %d that are unchanged '
+                        'since import', len(unchanged), acct_id)
+        return sorted(files, key=files.get)
+
+    def _run_pipelined(self, dirs):
+        """
+        Backfill all per-account directories with a two-stage pipeline. Files
+        are read and parsed in a pool of ``jobs`` processes, and the parsed
+        results are written to the database one at a time, in this process,
+        in the same order as :py:meth:`~._do_account_dir` would (accounts in
+        name order, each account's files oldest to newest). At most
+        ``queue_size`` files are submitted for parsing ahead of the one being
+        written, so memory use does not grow with the number of files.
+
+        :param dirs: list of (account ID, per-account directory path) 2-tuples
+        :type dirs: list
+        :return: 3-tuple of int count of files successfully inserted, int count
+          of files already in the DB, and float files per second throughput
+        :rtype: tuple
+        """
+        todo = deque()
+        counts = {}
+        for acct_id, path in dirs:
+            logger.debug('Doing account %d directory (%s)', acct_id, path)
+            files = self._account_files(acct_id, path)
+            counts[acct_id] = [0, 0, len(files)]
+            todo.extend((acct_id, p) for p in files)
+        total = len(todo)
+        logger.info('Parsing %d files with %d processes', total, self._jobs)
+        start = time.time()
+        done = 0
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=self._jobs) as executor:
+            while todo or pending:
+                while todo and len(pending) < self._queue_size:
+                    acct_id, p = todo.popleft()
+                    pending.append(
+                        (acct_id, p, executor.submit(_parse_ofx_file, p))
+                    )
+                acct_id, p, future = pending.popleft()
+                try:
+                    # parsing is in other processes, so only the time spent
+                    # waiting on it is a stage of this file's import
+                    parse_start = default_timer()
+                    ofx, mtime = future.result()
+                    parse_secs = default_timer() - parse_start
+                    logger.debug('Parsed OFX from %s', p)
+                    self._record(p, self._update_one_file(
+                        acct_id, p, ofx, mtime, parse_secs=parse_secs,
+                        parse_stage='parse_wait'
+                    ))
+                    counts[acct_id][0] += 1
+                except DuplicateFileException as ex:
+                    self._record(p, ex.stmt_id)
+                    counts[acct_id][1] += 1
+                    logger.warning(
+                        'OFX is already parsed for account; skipping'
+                    )
+                except (InvalidRequestError, IntegrityError, TypeError):
+                    for _, _, f in pending:
+                        f.cancel()
+                    raise
+                except Exception:
+                    logger.error('Exception parsing and inserting file %s',
+                                 p, exc_info=True)
+                done += 1
+                if done % 100 == 0:
+                    self._save_manifest()
+                    logger.info(
+                        'Processed %d of %d files (%.1f files/sec)', done,
+                        total, done / (time.time() - start)
+                    )
+        elapsed = time.time() - start
+        rate = total / elapsed if elapsed > 0 else 0.0
+        for acct_id, (success, already, count) in counts.items():
+            logger.info('Successfully parsed and inserted %d of %d files for '
+                        'account %d; %d files already in DB', success, count,
+                        acct_id, already)
+        success = sum(x[0] for x in counts.values())
+        already = sum(x[1] for x in counts.values())
+        logger.warning(
+            'Processed %d files in %.2f seconds (%.1f files/sec); %d inserted,'
+            ' %d already in DB', total, elapsed, rate, success, already
+        )
+        return success, already, rate
+
+    def _do_account_dir(self, acct_id, path):
+        """
+        Handle all OFX statements in a per-account directory.
+
+        :param acct_id: account database ID
+        :type acct_id: int
+        :param path: absolute path to per-account directory
+        :type path: str
+        """
+        logger.debug('Doing account %d directory (%s)', acct_id, path)
+        files = self._account_files(acct_id, path)
+        if self._batch_size > 0:
+            success, already = self._do_account_batches(acct_id, files)
+            logger.info('Successfully parsed and inserted %d of %d files for '
+                        'account %d; %d files already in DB', success,
+                        len(files), acct_id, already)
+            return
         # run through the files, oldest to newest
         success = 0
         already = 0
-        for p in sorted(files, key=files.get):
+        for p in files:
             try:
-                self._do_one_file(acct_id, p)
+                self._record(p, self._do_one_file(acct_id, p))
                 success += 1
-            except DuplicateFileException:
+            except DuplicateFileException as ex:
+                self._record(p, ex.stmt_id)
                 already += 1
                 logger.warning('OFX is already parsed for account; skipping')
             except (InvalidRequestError, IntegrityError, TypeError):
@@ -126,6 +376,56 @@ class OfxBackfiller(object):
                     'account %d; %d files already in DB', success, len(files),
                     acct_id, already)
 
+    def _do_account_batches(self, acct_id, files):
+        """
+        Parse an account's files and upload them with the client's
+        ``update_statements`` method, ``batch_size`` statements at a time, in
+        the same order as :py:meth:`~._do_account_dir`.
+
+        :param acct_id: account database ID
+        :type acct_id: int
+        :param files: absolute paths of the files to upload, oldest first
+        :type files: list
+        :return: 2-tuple of int count of files successfully inserted and int
+          count of files already in the DB
+        :rtype: tuple
+        """
+        success = 0
+        already = 0
+        for i in range(0, len(files), self._batch_size):
+            paths = []
+            statements = []
+            parse_secs = []
+            for p in files[i:i + self._batch_size]:
+                parse_start = default_timer()
+                try:
+                    ofx, mtime = _parse_ofx_file(p)
+                except Exception:
+                    logger.error('Exception parsing file %s', p, exc_info=True)
+                    continue
+                parse_secs.append(default_timer() - parse_start)
+                paths.append(p)
+                statements.append((acct_id, ofx, mtime, os.path.basename(p)))
+            if not statements:
+                continue
+            logger.debug('Uploading batch of %d statements', len(statements))
+            for p, secs, res in zip(
+                paths, parse_secs, self._client.update_statements(statements)
+            ):
+                if isinstance(res, DuplicateFileException):
+                    self._record(p, res.stmt_id)
+                    already += 1
+                    logger.warning(
+                        'OFX is already parsed for account; skipping'
+                    )
+                elif isinstance(res, Exception):
+                    logger.error('Exception inserting file %s: %s', p, res)
+                else:
+                    self._add_metrics(res, 'parse', secs)
+                    self._record(p, res[0])
+                    success += 1
+        return success, already
+
     def _do_one_file(self, acct_id, path):
         """
         Parse one OFX file and use OFXUpdater to upsert it into the DB.
@@ -134,18 +434,57 @@ class OfxBackfiller(object):
         :type acct_id: int
         :param path: absolute path to OFX/QFX file
         :type path: str
+        :return: ID of the OFXStatement created
+        :rtype: int
         """
         logger.debug('Handle file %s for Account %d', path, acct_id)
-        with open(path, 'rb') as fh:
-            ofx_str = fh.read()
-        ofx = OfxParser.parse(BytesIO(ofx_str))
+        if self._stream:
+            mtime = datetime.fromtimestamp(os.path.getmtime(path), tz=UTC)
+            with open(path, 'rb') as fh:
+                # parsing is the "parse" stage of the import itself
+                res = self._client.update_statement_stream(
+                    acct_id, OfxStreamReader(fh), mtime=mtime,
+                    filename=os.path.basename(path)
+                )
+            self._add_metrics(res)
+            logger.debug('Done updating')
+            return res[0]
+        parse_start = default_timer()
+        ofx, mtime = _parse_ofx_file(path)
         logger.debug('Parsed OFX')
+        return self._update_one_file(
+            acct_id, path, ofx, mtime,
+            parse_secs=default_timer() - parse_start
+        )
+
+    def _update_one_file(self, acct_id, path, ofx, mtime, parse_secs=0.0,
+                         parse_stage='parse'):
+        """
+        Upsert one parsed OFX file into the DB.
+
+        :param acct_id: Account ID number
+        :type acct_id: int
+        :param path: absolute path to OFX/QFX file
+        :type path: str
+        :param ofx: parsed OFX
+        :type ofx: ``ofxparse.ofxparse.Ofx``
+        :param mtime: file modification time
+        :type mtime: datetime.datetime
+        :param parse_secs: seconds spent reading and parsing the file
+        :type parse_secs: float
+        :param parse_stage: name of the ingestion metrics stage to record
+          ``parse_secs`` as
+        :type parse_stage: str
+        :return: ID of the OFXStatement created
+        :rtype: int
+        """
         fname = os.path.basename(path)
-        mtime = datetime.fromtimestamp(os.path.getmtime(path), tz=UTC)
-        self._client.update_statement_ofx(
+        res = self._client.update_statement_ofx(
             acct_id, ofx, mtime=mtime, filename=fname
         )
+        self._add_metrics(res, parse_stage, parse_secs)
         logger.debug('Done updating')
+        return res[0]
 
 
 def parse_args():
@@ -175,6 +514,41 @@ def parse_args():
                    type=str, default=None,
                    help='path to unencrypted client key to use for SSL client '
                         'cert auth, if key is not contained in the cert file')
+    p.add_argument('-b', '--bulk-upsert', dest='bulk_upsert',
+                   action='store_true', default=False,
+                   help='upsert the transactions in each statement in bulk '
+                        '(direct DB access only; ignored with -r)')
+    p.add_argument('-j', '--jobs', dest='jobs', action='store', type=int,
+                   default=0,
+                   help='parse files in a pool of this many processes, and '
+                        'write them to the DB as they are parsed; default 0 '
+                        '(parse and write each file in turn)')
+    p.add_argument('--queue-size', dest='queue_size', action='store',
+                   type=int, default=None,
+                   help='with -j/--jobs, maximum number of files to parse '
+                        'ahead of the DB writer; default 4x jobs')
+    p.add_argument('-S', '--stream', dest='stream', action='store_true',
+                   default=False,
+                   help='read each file incrementally instead of parsing it '
+                        'all at once, to limit memory use on large files '
+                        '(direct DB access only; not with -j)')
+    p.add_argument('--no-manifest', dest='manifest', action='store_false',
+                   default=True,
+                   help='import all files, without reading or updating the '
+                        'import manifest of files already imported')
+    p.add_argument('--verify', dest='verify', action='store_true',
+                   default=False,
+                   help='compare the hashes of files in the import manifest '
+                        'instead of their sizes and modification times')
+    p.add_argument('-B', '--batch-size', dest='batch_size', action='store',
+                   type=int, default=0,
+                   help='upload statements in batches of this many per '
+                        'request, to reduce per-request overhead with -r; '
+                        'default 0 (one at a time; not with -j or -S)')
+    p.add_argument('-M', '--metrics', dest='metrics', action='store_true',
+                   default=False,
+                   help='when done, print a summary of the time spent in each '
+                        'stage of importing the statements')
     args = p.parse_args()
     return args
 
@@ -198,7 +572,8 @@ def main():
 
     client = apiclient(
         api_url=args.remote, ca_bundle=args.ca_bundle,
-        client_cert=args.client_cert, client_key=args.client_key
+        client_cert=args.client_cert, client_key=args.client_key,
+        bulk_upsert=args.bulk_upsert
     )
 
     if args.remote is None:
@@ -211,8 +586,27 @@ def main():
             raise SystemExit(1)
         save_path = os.path.abspath(args.save_path)
 
-    cls = OfxBackfiller(client, save_path)
+    if args.stream and (args.remote is not None or args.jobs > 0):
+        logger.error('ERROR: -S|--stream cannot be used with -r|--remote or '
+                     '-j|--jobs.')
+        raise SystemExit(1)
+
+    if args.batch_size > 0 and (args.stream or args.jobs > 0):
+        logger.error('ERROR: -B|--batch-size cannot be used with -S|--stream '
+                     'or -j|--jobs.')
+        raise SystemExit(1)
+
+    manifest = None
+    if args.manifest:
+        manifest = ImportManifest(save_path)
+    cls = OfxBackfiller(
+        client, save_path, jobs=args.jobs, queue_size=args.queue_size,
+        stream=args.stream, manifest=manifest, verify=args.verify,
+        batch_size=args.batch_size
+    )
     cls.run()
+    if args.metrics:
+        print(cls.summary.report())
 
 
 if __name__ == "__main__":
@@ -35,17 +35,39 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 ################################################################################
 """
 
+import logging
+import threading
+from uuid import uuid4
+from copy import deepcopy
 from datetime import timedelta, datetime, date
 from functools import total_ordering
 from sqlalchemy import or_, asc
+from sqlalchemy.orm import selectinload, joinedload
 from dateutil import relativedelta
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 from decimal import Decimal
 
 from biweeklybudget import settings
-from biweeklybudget.models import Transaction, ScheduledTransaction, Budget
+from biweeklybudget.models import (
+    Transaction, ScheduledTransaction, Budget, DBSetting
+)
 from biweeklybudget.utils import dtnow
 
+logger = logging.getLogger(__name__)
+
+#: Number of days between the start dates of consecutive pay periods.
+PERIOD_INTERVAL_DAYS = 14
+
+#: Mapping of relationship loading strategy names accepted by
+#: :py:class:`~.BiweeklyPayPeriod` to SQLAlchemy loader option functions. A
+#: value of None means the relationships are lazy-loaded (SQLAlchemy's
+#: default), issuing one query per object.
+LOAD_STRATEGIES = {
+    'selectin': selectinload,
+    'joined': joinedload,
+    'lazy': None
+}
+
 
 @total_ordering
 class BiweeklyPayPeriod(object):
@@ -57,7 +79,13 @@ class BiweeklyPayPeriod(object):
     simple.
     """
 
-    def __init__(self, start_date, db_session):
+    #: Default strategy for loading the relationships of Transactions and
+    #: ScheduledTransactions that are used when building
+    #: :py:attr:`~.transactions_list`; one of the keys of
+    #: :py:data:`~.LOAD_STRATEGIES`.
+    default_load_strategy = 'selectin'
+
+    def __init__(self, start_date, db_session, load_strategy=None):
         """
         Create a new BiweeklyPayPeriod instance.
 
@@ -66,14 +94,29 @@ class BiweeklyPayPeriod(object):
           :py:class:`datetime.datetime`
         :param db_session: active database session to use for queries
         :type db_session: sqlalchemy.orm.session.Session
+        :param load_strategy: strategy for loading relationships of
+          Transactions and ScheduledTransactions; one of the keys of
+          :py:data:`~.LOAD_STRATEGIES`. If None, use
+          :py:attr:`~.default_load_strategy`.
+        :type load_strategy: str
         """
         if isinstance(start_date, datetime):
             start_date = start_date.date()
+        if load_strategy is None:
+            load_strategy = self.default_load_strategy
+        if load_strategy not in LOAD_STRATEGIES:
+            raise ValueError(
+                'Invalid load_strategy "%s"; must be one of: %s' % (
+                    load_strategy, sorted(LOAD_STRATEGIES.keys())
+                )
+            )
+        self._load_strategy = load_strategy
         self._db = db_session
         self._start_date = start_date
         self._end_date = start_date + self.period_length
         self._data_cache = {}
         self._income_budget_id_list = None
+        self._periodic_budget_list = None
 
     @property
     def period_interval(self):
@@ -83,7 +126,7 @@ class BiweeklyPayPeriod(object):
         :return: interval between BiweeklyPayPeriods
         :rtype: datetime.timedelta
         """
-        return timedelta(days=14)
+        return timedelta(days=PERIOD_INTERVAL_DAYS)
 
     @property
     def period_length(self):
@@ -133,7 +176,7 @@ class BiweeklyPayPeriod(object):
         """
         return BiweeklyPayPeriod(
             (self.start_date + self.period_interval),
-            self._db
+            self._db, load_strategy=self._load_strategy
         )
 
     @property
@@ -146,7 +189,7 @@ class BiweeklyPayPeriod(object):
         """
         return BiweeklyPayPeriod(
             (self.start_date - self.period_interval),
-            self._db
+            self._db, load_strategy=self._load_strategy
         )
 
     def __repr__(self):
@@ -162,14 +205,101 @@ class BiweeklyPayPeriod(object):
             return NotImplemented
         return self.start_date < other.start_date
 
+    @staticmethod
+    def period_index(dt):
+        """
+        Given a datetime or date, return the integer index of the pay period
+        containing it, relative to :py:attr:`~.settings.PAY_PERIOD_START_DATE`.
+        The period starting on ``PAY_PERIOD_START_DATE`` has index 0, the one
+        following it has index 1, the one preceding it has index -1, etc.
+
+        This is a constant-time calculation; no pay periods are instantiated.
+
+        :param dt: datetime or date to find the pay period index for
+        :type dt: :py:class:`~datetime.datetime` or :py:class:`~datetime.date`
+        :return: index of the pay period containing ``dt``
+        :rtype: int
+        """
+        if isinstance(dt, datetime):
+            dt = dt.date()
+        anchor = settings.PAY_PERIOD_START_DATE
+        if isinstance(anchor, datetime):
+            anchor = anchor.date()
+        # floor division, so dates before the anchor get negative indices
+        return (dt - anchor).days // PERIOD_INTERVAL_DAYS
+
+    @staticmethod
+    def period_at(index, db_session, load_strategy=None):
+        """
+        Return the BiweeklyPayPeriod with the given index, as returned by
+        :py:meth:`~.period_index`.
+
+        :param index: index of the pay period to return
+        :type index: int
+        :param db_session: active database session to use for queries
+        :type db_session: sqlalchemy.orm.session.Session
+        :param load_strategy: relationship loading strategy; see
+          :py:meth:`~.__init__`
+        :type load_strategy: str
+        :return: BiweeklyPayPeriod with the specified index
+        :rtype: :py:class:`~.BiweeklyPayPeriod`
+        """
+        anchor = settings.PAY_PERIOD_START_DATE
+        if isinstance(anchor, datetime):
+            anchor = anchor.date()
+        return BiweeklyPayPeriod(
+            anchor + timedelta(days=(index * PERIOD_INTERVAL_DAYS)),
+            db_session, load_strategy=load_strategy
+        )
+
+    @staticmethod
+    def periods_between(start_dt, end_dt, db_session, load_strategy=None):
+        """
+        Return a list of all BiweeklyPayPeriods from the one containing
+        ``start_dt`` to the one containing ``end_dt``, inclusive, in order.
+        If ``end_dt`` is before ``start_dt``, return an empty list.
+
+        :param start_dt: datetime or date in the first pay period to return
+        :type start_dt: :py:class:`~datetime.datetime` or
+          :py:class:`~datetime.date`
+        :param end_dt: datetime or date in the last pay period to return
+        :type end_dt: :py:class:`~datetime.datetime` or
+          :py:class:`~datetime.date`
+        :param db_session: active database session to use for queries
+        :type db_session: sqlalchemy.orm.session.Session
+        :param load_strategy: relationship loading strategy; see
+          :py:meth:`~.__init__`
+        :type load_strategy: str
+        :return: list of BiweeklyPayPeriods
+        :rtype: list
+        """
+        return [
+            BiweeklyPayPeriod.period_at(
+                idx, db_session, load_strategy=load_strategy
+            )
+            for idx in range(
+                BiweeklyPayPeriod.period_index(start_dt),
+                BiweeklyPayPeriod.period_index(end_dt) + 1
+            )
+        ]
+
+    @property
+    def index(self):
+        """
+        Return the index of this pay period, as returned by
+        :py:meth:`~.period_index`.
+
+        :return: index of this pay period
+        :rtype: int
+        """
+        return BiweeklyPayPeriod.period_index(self.start_date)
+
     @staticmethod
     def period_for_date(dt, db_session):
         """
         Given a datetime, return the BiweeklyPayPeriod instance describing the
         pay period containing this date.
 
-        .. todo:: This is a very naive, poorly-performing implementation.
-
         :param dt: datetime or date to find the pay period for
         :type dt: :py:class:`~datetime.datetime` or :py:class:`~datetime.date`
         :param db_session: active database session to use for queries
@@ -177,20 +307,9 @@ class BiweeklyPayPeriod(object):
         :return: BiweeklyPayPeriod containing the specified date
         :rtype: :py:class:`~.BiweeklyPayPeriod`
         """
-        p = BiweeklyPayPeriod(settings.PAY_PERIOD_START_DATE, db_session)
-        if isinstance(dt, datetime):
-            dt = dt.date()
-        if dt < p.start_date:
-            while True:
-                if p.end_date >= dt >= p.start_date:
-                    return p
-                p = p.previous
-        if dt > p.end_date:
-            while True:
-                if p.end_date >= dt >= p.start_date:
-                    return p
-                p = p.next
-        return p
+        return BiweeklyPayPeriod.period_at(
+            BiweeklyPayPeriod.period_index(dt), db_session
+        )
 
     def filter_query(self, query, date_prop):
         """
@@ -216,6 +335,53 @@ class BiweeklyPayPeriod(object):
             date_prop >= self.start_date, date_prop <= self.end_date
         )
 
+    @staticmethod
+    def _transaction_load_options(load_strategy):
+        """
+        Return a list of query options to load the relationships of
+        :py:class:`~.Transaction` used by :py:meth:`~._dict_for_trans`, using
+        the specified loading strategy.
+
+        :param load_strategy: one of the keys of :py:data:`~.LOAD_STRATEGIES`
+        :type load_strategy: str
+        :return: list of query options
+        :rtype: list
+        """
+        loader = LOAD_STRATEGIES[load_strategy]
+        if loader is None:
+            return []
+        # Relationships are specified by name, as ``budget_transactions`` and
+        # ``reconcile`` are backrefs that don't exist until mappers are
+        # configured. Each BudgetTransaction's Budget is joined in to whatever
+        # query loads the BudgetTransactions, rather than needing another query.
+        return [
+            loader('account'),
+            loader('budget_transactions').joinedload('budget'),
+            loader('reconcile'),
+            loader('planned_budget')
+        ]
+
+    @staticmethod
+    def _sched_trans_load_options(load_strategy):
+        """
+        Return a list of query options to load the relationships of
+        :py:class:`~.ScheduledTransaction` used by
+        :py:meth:`~._dict_for_sched_trans`, using the specified loading
+        strategy.
+
+        :param load_strategy: one of the keys of :py:data:`~.LOAD_STRATEGIES`
+        :type load_strategy: str
+        :return: list of query options
+        :rtype: list
+        """
+        loader = LOAD_STRATEGIES[load_strategy]
+        if loader is None:
+            return []
+        return [
+            loader('account'),
+            loader('budget')
+        ]
+
     def _transactions(self):
         """
         Return a Query for all :py:class:`~.Transaction` for this pay period.
@@ -224,7 +390,9 @@ class BiweeklyPayPeriod(object):
         :rtype: sqlalchemy.orm.query.Query
         """
         return self.filter_query(
-            self._db.query(Transaction),
+            self._db.query(Transaction).options(
+                *self._transaction_load_options(self._load_strategy)
+            ),
             Transaction.date
         )
 
@@ -238,8 +406,9 @@ class BiweeklyPayPeriod(object):
         :rtype: sqlalchemy.orm.query.Query
         """
         return self.filter_query(
-            self._db.query(ScheduledTransaction).filter(
-                ScheduledTransaction.is_active.__eq__(True)),
+            self._db.query(ScheduledTransaction).options(
+                *self._sched_trans_load_options(self._load_strategy)
+            ).filter(ScheduledTransaction.is_active.__eq__(True)),
             ScheduledTransaction.date
         )
 
@@ -252,7 +421,9 @@ class BiweeklyPayPeriod(object):
           per period, for this pay period.
         :rtype: sqlalchemy.orm.query.Query
         """
-        return self._db.query(ScheduledTransaction).filter(
+        return self._db.query(ScheduledTransaction).options(
+            *self._sched_trans_load_options(self._load_strategy)
+        ).filter(
             ScheduledTransaction.schedule_type.__eq__('per period'),
             ScheduledTransaction.is_active.__eq__(True)
         ).order_by(
@@ -271,14 +442,18 @@ class BiweeklyPayPeriod(object):
         """
         if self.start_date.day < self.end_date.day:
             # start and end dates are contiguous, in the same month
-            return self._db.query(ScheduledTransaction).filter(
+            return self._db.query(ScheduledTransaction).options(
+                *self._sched_trans_load_options(self._load_strategy)
+            ).filter(
                 ScheduledTransaction.schedule_type.__eq__('monthly'),
                 ScheduledTransaction.is_active.__eq__(True),
                 ScheduledTransaction.day_of_month <= self.end_date.day,
                 ScheduledTransaction.day_of_month >= self.start_date.day
             )
         # else we span two months
-        return self._db.query(ScheduledTransaction).filter(
+        return self._db.query(ScheduledTransaction).options(
+            *self._sched_trans_load_options(self._load_strategy)
+        ).filter(
             ScheduledTransaction.schedule_type.__eq__('monthly'),
             ScheduledTransaction.is_active.__eq__(True),
             or_(
@@ -325,16 +500,161 @@ class BiweeklyPayPeriod(object):
         """
         if len(self._data_cache) > 0:
             return self._data_cache
+        cached = payperiod_cache.get(self)
+        if cached is not None:
+            self._data_cache = cached
+            return self._data_cache
+        self._build_data(
+            self._transactions().all(),
+            self._scheduled_transactions_date().all(),
+            self._scheduled_transactions_per_period().all(),
+            self._scheduled_transactions_monthly().all()
+        )
+        return self._data_cache
+
+    def _build_data(self, transactions, st_date, st_per_period, st_monthly):
+        """
+        Build the object-local data cache dict (returned by :py:attr:`~._data`)
+        from the given lists of Transactions and ScheduledTransactions for this
+        pay period, and store it in the shared :py:class:`~.PayPeriodDataCache`.
+
+        :param transactions: result of :py:meth:`~._transactions`
+        :type transactions: list
+        :param st_date: result of :py:meth:`~._scheduled_transactions_date`
+        :type st_date: list
+        :param st_per_period: result of
+          :py:meth:`~._scheduled_transactions_per_period`
+        :type st_per_period: list
+        :param st_monthly: result of
+          :py:meth:`~._scheduled_transactions_monthly`
+        :type st_monthly: list
+        """
         self._data_cache = {
-            'transactions': self._transactions().all(),
-            'st_date': self._scheduled_transactions_date().all(),
-            'st_per_period': self._scheduled_transactions_per_period().all(),
-            'st_monthly': self._scheduled_transactions_monthly().all()
+            'transactions': transactions,
+            'st_date': st_date,
+            'st_per_period': st_per_period,
+            'st_monthly': st_monthly
         }
         self._data_cache['all_trans_list'] = self._make_combined_transactions()
         self._data_cache['budget_sums'] = self._make_budget_sums()
         self._data_cache['overall_sums'] = self._make_overall_sums()
-        return self._data_cache
+        payperiod_cache.set(self, self._data_cache)
+
+    @staticmethod
+    def compute_range(start_dt, end_dt, db_session, load_strategy=None):
+        """
+        Return a list of all BiweeklyPayPeriods from the one containing
+        ``start_dt`` to the one containing ``end_dt``, inclusive (like
+        :py:meth:`~.periods_between`), with their data (i.e.
+        :py:attr:`~.transactions_list`, :py:attr:`~.budget_sums` and
+        :py:attr:`~.overall_sums`) already calculated.
+
+        Rather than each period running its own queries, the Transactions,
+        ScheduledTransactions and periodic Budgets for the whole range are
+        each retrieved with one query and then divided up between the periods
+        in memory. Periods already in the :py:class:`~.PayPeriodDataCache`
+        are not recalculated. The results are identical to calculating each
+        period individually.
+
+        :param start_dt: datetime or date in the first pay period to return
+        :type start_dt: :py:class:`~datetime.datetime` or
+          :py:class:`~datetime.date`
+        :param end_dt: datetime or date in the last pay period to return
+        :type end_dt: :py:class:`~datetime.datetime` or
+          :py:class:`~datetime.date`
+        :param db_session: active database session to use for queries
+        :type db_session: sqlalchemy.orm.session.Session
+        :param load_strategy: relationship loading strategy; see
+          :py:meth:`~.__init__`
+        :type load_strategy: str
+        :return: list of BiweeklyPayPeriods with data calculated
+        :rtype: list
+        """
+        periods = BiweeklyPayPeriod.periods_between(
+            start_dt, end_dt, db_session, load_strategy=load_strategy
+        )
+        todo = []
+        for p in periods:
+            cached = payperiod_cache.get(p)
+            if cached is not None:
+                p._data_cache = cached
+            else:
+                todo.append(p)
+        if len(todo) == 0:
+            return periods
+        first = todo[0]
+        last = todo[-1]
+        logger.debug(
+            'Calculating data for %d pay periods from %s to %s',
+            len(todo), first.start_date, last.end_date
+        )
+        load_strategy = first._load_strategy
+        trans = defaultdict(list)
+        for t in db_session.query(Transaction).options(
+            *BiweeklyPayPeriod._transaction_load_options(load_strategy)
+        ).filter(
+            Transaction.date >= first.start_date,
+            Transaction.date <= last.end_date
+        ).order_by(asc(Transaction.id)).all():
+            trans[BiweeklyPayPeriod.period_index(t.date)].append(t)
+        st_date = defaultdict(list)
+        st_per_period = []
+        st_monthly = []
+        for t in db_session.query(ScheduledTransaction).options(
+            *BiweeklyPayPeriod._sched_trans_load_options(load_strategy)
+        ).filter(
+            ScheduledTransaction.is_active.__eq__(True),
+            or_(
+                ScheduledTransaction.date.is_(None),
+                ScheduledTransaction.date.between(
+                    first.start_date, last.end_date
+                )
+            )
+        ).order_by(asc(ScheduledTransaction.id)).all():
+            stype = t.schedule_type
+            if stype == 'date':
+                st_date[BiweeklyPayPeriod.period_index(t.date)].append(t)
+            elif stype == 'per period':
+                st_per_period.append(t)
+            elif stype == 'monthly':
+                st_monthly.append(t)
+        st_per_period = sorted(
+            st_per_period, key=lambda x: (x.num_per_period, x.amount)
+        )
+        budgets = db_session.query(Budget).filter(
+            Budget.is_active.__eq__(True),
+            Budget.is_periodic.__eq__(True)
+        ).all()
+        for p in todo:
+            idx = p.index
+            p._periodic_budget_list = budgets
+            p._build_data(
+                trans[idx],
+                st_date[idx],
+                st_per_period,
+                [t for t in st_monthly if p._day_of_month_in_period(
+                    t.day_of_month
+                )]
+            )
+        return periods
+
+    def _day_of_month_in_period(self, day_of_month):
+        """
+        Return whether or not a monthly ScheduledTransaction on the given day
+        of the month falls within this pay period. This is the in-memory
+        equivalent of the filter used in
+        :py:meth:`~._scheduled_transactions_monthly`.
+
+        :param day_of_month: day of the month
+        :type day_of_month: int
+        :rtype: bool
+        """
+        if self.start_date.day < self.end_date.day:
+            return self.start_date.day <= day_of_month <= self.end_date.day
+        return (
+            day_of_month <= self.end_date.day or
+            day_of_month >= self.start_date.day
+        )
 
     def clear_cache(self):
         """
@@ -416,10 +736,13 @@ class BiweeklyPayPeriod(object):
         :rtype: dict
         """
         res = {}
-        for b in self._db.query(Budget).filter(
-            Budget.is_active.__eq__(True),
-            Budget.is_periodic.__eq__(True)
-        ).all():
+        budgets = self._periodic_budget_list
+        if budgets is None:
+            budgets = self._db.query(Budget).filter(
+                Budget.is_active.__eq__(True),
+                Budget.is_periodic.__eq__(True)
+            ).all()
+        for b in budgets:
             res[b.id] = {
                 'budget_amount': b.starting_balance,
                 'allocated': Decimal('0.0'),
@@ -747,3 +1070,199 @@ class BiweeklyPayPeriod(object):
             day=t.day_of_month
         ) + relativedelta.relativedelta(months=1)
         return res
+
+
+class PayPeriodDataCache(object):
+    """
+    Process-wide cache of the computed data for :py:class:`~.BiweeklyPayPeriod`
+    instances (the ``all_trans_list``, ``budget_sums`` and ``overall_sums``
+    values of :py:attr:`~.BiweeklyPayPeriod._data`), keyed by pay period start
+    date. This lets the data for a pay period be calculated once and reused
+    across requests until something that affects it changes.
+
+    Entries are invalidated from the ``before_flush`` event handler
+    (:py:func:`~.db_event_handlers.handle_payperiod_cache_invalidation`) when a
+    :py:class:`~.Transaction`, :py:class:`~.BudgetTransaction`,
+    :py:class:`~.ScheduledTransaction` or :py:class:`~.Budget` affecting the
+    period changes. Since this cache only lives in one process, any flush that
+    invalidates entries also writes a new random value to the
+    :py:class:`~.DBSetting` named by :py:attr:`~.GENERATION_SETTING`; other
+    processes (i.e. other web server workers) check that value once per DB
+    transaction and clear their whole cache when it has changed.
+
+    The maximum number of entries is set by
+    :py:attr:`~.settings.PAY_PERIOD_CACHE_SIZE`; when full, the least recently
+    used entry is evicted. Setting it to 0 disables the cache.
+    """
+
+    #: keys of :py:attr:`~.BiweeklyPayPeriod._data` that are cached. The other
+    #: keys hold ORM instances bound to a specific session.
+    CACHED_KEYS = ('all_trans_list', 'budget_sums', 'overall_sums')
+
+    #: name of the :py:class:`~.DBSetting` that stores the cache generation
+    GENERATION_SETTING = 'payperiod_cache_generation'
+
+    #: key in ``Session.info`` marking that the generation has been checked
+    #: during the current DB transaction
+    SESSION_INFO_KEY = 'payperiod_cache_generation_checked'
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries = OrderedDict()
+        self._generation = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def max_size(self):
+        """
+        Return the maximum number of entries to cache.
+
+        :return: maximum number of cache entries
+        :rtype: int
+        """
+        return getattr(settings, 'PAY_PERIOD_CACHE_SIZE', 0) or 0
+
+    @property
+    def enabled(self):
+        """
+        Return whether or not the cache is enabled.
+
+        :rtype: bool
+        """
+        return self.max_size > 0
+
+    def get(self, pp):
+        """
+        Return a copy of the cached data dict for the given pay period, or
+        None if it is not cached.
+
+        :param pp: pay period to get cached data for
+        :type pp: BiweeklyPayPeriod
+        :return: cached data or None
+        :rtype: dict
+        """
+        if not self.enabled:
+            return None
+        self.check_generation(pp._db)
+        with self._lock:
+            entry = self._entries.get(pp.start_date)
+            if entry is not None and entry['is_in_past'] != pp.is_in_past:
+                # overall_sums depends on whether the period is in the past
+                del self._entries[pp.start_date]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(pp.start_date)
+            self.hits += 1
+            return deepcopy(entry['data'])
+
+    def set(self, pp, data):
+        """
+        Store the cacheable parts of a pay period's data dict.
+
+        :param pp: pay period to cache data for
+        :type pp: BiweeklyPayPeriod
+        :param data: the pay period's data dict
+        :type data: dict
+        """
+        if not self.enabled:
+            return
+        self.check_generation(pp._db)
+        entry = {
+            'is_in_past': pp.is_in_past,
+            'data': deepcopy({k: data[k] for k in self.CACHED_KEYS})
+        }
+        with self._lock:
+            self._entries[pp.start_date] = entry
+            self._entries.move_to_end(pp.start_date)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, start_dates):
+        """
+        Remove the entries for the pay periods starting on the given dates.
+
+        :param start_dates: pay period start dates to invalidate
+        :type start_dates: set
+        """
+        with self._lock:
+            for d in start_dates:
+                if self._entries.pop(d, None) is not None:
+                    self.invalidations += 1
+
+    def invalidate_all(self):
+        """
+        Remove all entries from the cache.
+        """
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def check_generation(self, session):
+        """
+        Once per DB transaction, compare the cache generation stored in the
+        database to the one this process last saw; if it differs, another
+        process has made changes, so clear the whole cache.
+
+        :param session: active database session
+        :type session: sqlalchemy.orm.session.Session
+        """
+        if session.info.get(self.SESSION_INFO_KEY, False):
+            return
+        s = session.query(DBSetting).get(self.GENERATION_SETTING)
+        gen = None if s is None else s.value
+        with self._lock:
+            if gen != self._generation:
+                logger.debug(
+                    'Pay period cache generation changed from %s to %s; '
+                    'clearing cache', self._generation, gen
+                )
+                self.invalidate_all()
+                self._generation = gen
+        session.info[self.SESSION_INFO_KEY] = True
+
+    def new_generation(self, session):
+        """
+        Store a new cache generation in the database, so that other processes
+        will clear their caches. Must be called from within a flush; the new
+        value is committed along with the changes that triggered it.
+
+        :param session: active database session
+        :type session: sqlalchemy.orm.session.Session
+        """
+        s = session.query(DBSetting).get(self.GENERATION_SETTING)
+        if s is None:
+            s = DBSetting(name=self.GENERATION_SETTING, is_json=False)
+        s.value = uuid4().hex
+        session.add(s)
+        with self._lock:
+            self._generation = s.value
+        session.info[self.SESSION_INFO_KEY] = True
+
+    @property
+    def stats(self):
+        """
+        Return a dict of cache statistics.
+
+        :return: cache statistics
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+
+#: The process-wide :py:class:`~.PayPeriodDataCache` instance.
+payperiod_cache = PayPeriodDataCache()
@@ -40,16 +40,51 @@ This is mostly based on http://flask.pocoo.org/docs/0.12/patterns/sqlalchemy/
 import logging
 import time
 import os
-from sqlalchemy import event, inspect
+from collections import defaultdict
+from decimal import Decimal
+from itertools import chain
+from sqlalchemy import event, inspect, func, select, and_
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
 
 from biweeklybudget.models.account import Account
+from biweeklybudget.models.account_balance import AccountBalance
+from biweeklybudget.models.budget_balance import (
+    BudgetBalanceEntry, BudgetBalanceSnapshot, month_start
+)
 from biweeklybudget.models.budget_model import Budget
 from biweeklybudget.models.budget_transaction import BudgetTransaction
+from biweeklybudget.models.dbsetting import DBSetting
+from biweeklybudget.models.ofx_statement import OFXStatement
 from biweeklybudget.models.ofx_transaction import OFXTransaction
-from biweeklybudget.utils import fmt_currency
+from biweeklybudget.models.scheduled_transaction import ScheduledTransaction
+from biweeklybudget.models.search_token import (
+    transaction_search, ofx_transaction_search
+)
+from biweeklybudget.models.transaction import Transaction
+from biweeklybudget.models.txn_reconcile import TxnReconcile
+from biweeklybudget.biweeklypayperiod import BiweeklyPayPeriod, payperiod_cache
+from biweeklybudget.interest import payoff_cache
+from biweeklybudget.notifications_cache import notifications_cache
+from biweeklybudget.ofx_reclassify import ofx_reclassifier
+from biweeklybudget import ingest_metrics
+from biweeklybudget.fulltext import is_native
+from biweeklybudget.utils import fmt_currency, dtnow
 
 logger = logging.getLogger(__name__)
 
+#: OFXTransaction attributes whose changes require reclassifying its ``is_*``
+#: fields, in :py:func:`~.handle_ofx_transaction_new_or_change`.
+OFX_CLASSIFY_ATTRS = frozenset(['name', 'account_id', 'account'])
+
+#: Key in the session ``info`` dict for the IDs of Accounts whose
+#: OFXTransactions are to be reclassified after the transaction commits.
+RECLASSIFY_INFO_KEY = 'ofx_reclassify_pending'
+
+#: Key in the session ``info`` dict for the Transactions (and Transaction IDs)
+#: whose ``actual_amount`` is to be updated after the current flush.
+ACTUAL_AMOUNT_INFO_KEY = 'transaction_actual_amount_pending'
+
 
 def handle_budget_trans_amount_change(**kwargs):
     """
@@ -167,6 +202,364 @@ def handle_new_or_deleted_budget_transaction(session):
     )
 
 
+def handle_transaction_actual_amount(session):
+    """
+    ``before_flush`` event handler
+    (:py:meth:`sqlalchemy.orm.events.SessionEvents.before_flush`)
+    on the DB session, to find the Transactions whose stored
+    :py:attr:`.Transaction.actual_amount` may be changed by this flush; those
+    of any new, deleted or changed :py:class:`~.BudgetTransaction`
+    (including the previous Transaction of one that was moved), and new
+    Transactions. They're recorded in the session ``info`` dict, and updated
+    by :py:func:`~.handle_transaction_actual_amount_update` once the flush
+    has written the BudgetTransactions.
+
+    :param session: current database session
+    :type session: sqlalchemy.orm.session.Session
+    """
+    pending = session.info.setdefault(ACTUAL_AMOUNT_INFO_KEY, (set(), set()))
+    transactions, trans_ids = pending
+    moved = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Transaction):
+            if obj in session.new:
+                transactions.add(obj)
+            continue
+        if not isinstance(obj, BudgetTransaction):
+            continue
+        changed = (
+            _has_changes(obj, 'trans_id') or _has_changes(obj, 'transaction')
+        )
+        if obj in session.dirty and not (
+            changed or _has_changes(obj, 'amount')
+        ):
+            continue
+        transactions.update(_attr_values(obj, 'transaction'))
+        trans_ids.update(_attr_values(obj, 'trans_id'))
+        if obj in session.dirty and changed:
+            moved.add(obj.id)
+    if moved:
+        # the previous Transaction isn't in the attribute history if the
+        # BudgetTransaction was expired; it's still in the database, though.
+        trans_ids.update(r[0] for r in session.query(
+            BudgetTransaction.trans_id
+        ).filter(BudgetTransaction.id.in_(moved)).all())
+        trans_ids.discard(None)
+    if not transactions and not trans_ids:
+        session.info.pop(ACTUAL_AMOUNT_INFO_KEY, None)
+
+
+def handle_transaction_actual_amount_update(session, flush_context):
+    """
+    ``after_flush`` event handler
+    (:py:meth:`sqlalchemy.orm.events.SessionEvents.after_flush`) on the DB
+    session, to set the stored :py:attr:`.Transaction.actual_amount` of the
+    Transactions found by :py:func:`~.handle_transaction_actual_amount` to
+    the sum of their BudgetTransactions, in one UPDATE statement. The new
+    amounts are also set on any of those Transactions loaded in the session.
+
+    :param session: current database session
+    :type session: sqlalchemy.orm.session.Session
+    :param flush_context: internal SQLAlchemy object
+    :type flush_context: sqlalchemy.orm.session.UOWTransaction
+    """
+    pending = session.info.pop(ACTUAL_AMOUNT_INFO_KEY, None)
+    if pending is None:
+        return
+    transactions, trans_ids = pending
+    trans_ids = set(trans_ids)
+    trans_ids.update(t.id for t in transactions if t.id is not None)
+    if not trans_ids:
+        return
+    trans = Transaction.__table__
+    bts = BudgetTransaction.__table__
+    session.execute(
+        trans.update().where(trans.c.id.in_(trans_ids)).values(
+            actual_amount=select([
+                func.coalesce(func.sum(bts.c.amount), 0)
+            ]).where(bts.c.trans_id == trans.c.id).as_scalar()
+        )
+    )
+    amounts = dict(session.execute(
+        select([trans.c.id, trans.c.actual_amount]).where(
+            trans.c.id.in_(trans_ids)
+        )
+    ).fetchall())
+    for trans_id, amount in amounts.items():
+        obj = session.identity_map.get(identity_key(Transaction, trans_id))
+        if obj is None:
+            continue
+        if obj.actual_amount != amount:
+            logger.debug(
+                'Updated actual_amount of %s from %s to %s',
+                obj, obj.actual_amount, amount
+            )
+        set_committed_value(obj, 'actual_amount', amount)
+
+
+def handle_account_latest_balance(session):
+    """
+    ``before_flush`` event handler
+    (:py:meth:`sqlalchemy.orm.events.SessionEvents.before_flush`)
+    on the DB session, to keep :py:attr:`.Account.latest_balance` pointing to
+    each Account's latest :py:class:`~.AccountBalance`.
+    :py:meth:`.Account.set_balance` already sets it; this handles
+    AccountBalances that were created some other way, or deleted.
+
+    The last new AccountBalance (in the order they were added to the session)
+    for an Account becomes its latest balance. If an Account's latest balance
+    is deleted, the latest one that remains is found in the database.
+
+    :param session: current database session
+    :type session: sqlalchemy.orm.session.Session
+    """
+    newest = {}
+    deleted = defaultdict(set)
+    for obj in chain(session.new, session.deleted):
+        if not isinstance(obj, AccountBalance):
+            continue
+        acct = obj.account
+        if acct is None and obj.account_id is not None:
+            acct = session.query(Account).get(obj.account_id)
+        if acct is None:
+            continue
+        if obj in session.deleted:
+            deleted[acct].add(obj.id)
+            continue
+        order = inspect(obj).insert_order
+        if acct not in newest or order > newest[acct][0]:
+            newest[acct] = (order, obj)
+    for acct, (_, obj) in newest.items():
+        acct.latest_balance = obj
+    for acct, bal_ids in deleted.items():
+        if acct in newest or acct.latest_balance_id not in bal_ids:
+            continue
+        latest_id = session.query(func.max(AccountBalance.id)).filter(
+            AccountBalance.account_id.__eq__(acct.id),
+            AccountBalance.id.notin_(bal_ids)
+        ).scalar()
+        logger.debug(
+            'Latest balance of %s deleted; now AccountBalance %s',
+            acct, latest_id
+        )
+        acct.latest_balance = None if latest_id is None else session.query(
+            AccountBalance
+        ).get(latest_id)
+
+
+def _committed_value(obj, attr_name):
+    """
+    Return the value of the given attribute on a model instance as of the
+    last flush, i.e. before any pending changes.
+
+    :param obj: model instance
+    :param attr_name: name of the attribute
+    :type attr_name: str
+    :return: previous value of the attribute
+    """
+    hx = getattr(inspect(obj).attrs, attr_name).history
+    if hx.deleted:
+        return hx.deleted[0]
+    return getattr(obj, attr_name)
+
+
+def _budget_trans_ledger_state(session, bt, committed=False):
+    """
+    Return the (Budget, Transaction, date, amount) that a
+    :py:class:`~.BudgetTransaction` contributes to its budget's balance
+    ledger, either currently or (if ``committed`` is True) as of the last
+    flush.
+
+    :param session: current database session
+    :type session: sqlalchemy.orm.session.Session
+    :param bt: the BudgetTransaction
+    :type bt: biweeklybudget.models.budget_transaction.BudgetTransaction
+    :param committed: whether to return the pre-change state
+    :type committed: bool
+    :return: 4-tuple of Budget, Transaction, date and amount
+    :rtype: tuple
+    """
+    txn = bt.transaction
+    if txn is None and bt.trans_id is not None:
+        txn = session.query(Transaction).get(bt.trans_id)
+    if committed:
+        budg = session.query(Budget).get(_committed_value(bt, 'budget_id'))
+        amt = _committed_value(bt, 'amount')
+        dt = None if txn is None else _committed_value(txn, 'date')
+    else:
+        budg = bt.budget
+        if budg is None:
+            budg = session.query(Budget).get(bt.budget_id)
+        amt = bt.amount
+        dt = None if txn is None else txn.date
+    if dt is None:
+        dt = dtnow().date()
+    return budg, txn, dt, amt
+
+
+def handle_budget_balance_ledger(session):
+    """
+    ``before_flush`` event handler
+    (:py:meth:`sqlalchemy.orm.events.SessionEvents.before_flush`)
+    on the DB session, to append :py:class:`~.BudgetBalanceEntry` records to
+    the standing budget balance ledger for all pending changes. This must run
+    after :py:func:`~.handle_new_or_deleted_budget_transaction`.
+
+    For every new, changed or deleted :py:class:`~.BudgetTransaction` (or
+    BudgetTransaction of a :py:class:`~.Transaction` whose date changed)
+    against a standing budget, we append an entry reversing its previous
+    contribution and an entry for its new contribution. Any remaining change
+    in a standing budget's :py:attr:`~.Budget.current_balance`, such as a
+    direct edit of the balance, is recorded as an adjustment dated today.
+
+    :param session: current database session
+    :type session: sqlalchemy.orm.session.Session
+    """
+    bts = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, BudgetTransaction):
+            bts.add(obj)
+        elif (
+            isinstance(obj, Transaction) and obj in session.dirty and
+            _has_changes(obj, 'date')
+        ):
+            bts.update(obj.budget_transactions)
+    entries = []
+    for bt in bts:
+        old = new = None
+        if bt not in session.new:
+            old = _budget_trans_ledger_state(session, bt, committed=True)
+        if bt not in session.deleted:
+            new = _budget_trans_ledger_state(session, bt)
+        if old == new:
+            continue
+        if old is not None and old[0].is_periodic is False:
+            entries.append(BudgetBalanceEntry(
+                budget=old[0], transaction=old[1], date=old[2],
+                amount=old[3], note='Reverse BudgetTransaction'
+            ))
+        if new is not None and new[0].is_periodic is False:
+            entries.append(BudgetBalanceEntry(
+                budget=new[0], transaction=new[1], date=new[2],
+                amount=(new[3] * -1), note='BudgetTransaction'
+            ))
+    pending = defaultdict(Decimal)
+    for e in entries:
+        pending[e.budget] += e.amount
+    for obj in chain(session.new, session.dirty):
+        if not isinstance(obj, Budget) or obj.is_periodic is not False:
+            continue
+        if obj in session.new:
+            old_bal = Decimal('0')
+        else:
+            old_bal = _committed_value(obj, 'current_balance')
+        diff = (
+            (obj.current_balance or Decimal('0')) -
+            (old_bal or Decimal('0')) - pending[obj]
+        )
+        if diff == 0:
+            continue
+        entries.append(BudgetBalanceEntry(
+            budget=obj, date=dtnow().date(), amount=diff,
+            note='Balance adjustment'
+        ))
+    for e in entries:
+        logger.debug(
+            'Adding %s entry for budget %s: %s on %s', e.note, e.budget,
+            fmt_currency(e.amount), e.date
+        )
+        session.add(e)
+
+
+def handle_budget_balance_snapshots(session, flush_context):
+    """
+    ``after_flush`` event handler
+    (:py:meth:`sqlalchemy.orm.events.SessionEvents.after_flush`) on the DB
+    session, to keep the :py:class:`~.BudgetBalanceSnapshot` checkpoints
+    consistent with newly-flushed :py:class:`~.BudgetBalanceEntry` records.
+
+    Existing snapshots dated after a new entry have the entry's amount added
+    to them. Then, a snapshot is created for the month of each new entry if
+    one does not already exist, from the sum of all earlier entries.
+
+    :param session: current database session
+    :type session: sqlalchemy.orm.session.Session
+    :param flush_context: internal SQLAlchemy object
+    :type flush_context: sqlalchemy.orm.session.UOWTransaction
+    """
+    changes = defaultdict(Decimal)
+    for obj in session.new:
+        if isinstance(obj, BudgetBalanceEntry):
+            changes[(obj.budget_id, obj.date)] += obj.amount
+    if len(changes) == 0:
+        return
+    snaps = BudgetBalanceSnapshot.__table__
+    ents = BudgetBalanceEntry.__table__
+    for (budget_id, dt), amount in sorted(changes.items()):
+        session.execute(
+            snaps.update().where(and_(
+                snaps.c.budget_id == budget_id, snaps.c.date > dt
+            )).values(balance=(snaps.c.balance + amount))
+        )
+    for budget_id, dt in sorted(set(
+        (budget_id, month_start(dt)) for budget_id, dt in changes.keys()
+    )):
+        existing = session.execute(
+            select([snaps.c.id]).where(and_(
+                snaps.c.budget_id == budget_id, snaps.c.date == dt
+            ))
+        ).first()
+        if existing is not None:
+            continue
+        balance = session.execute(
+            select([func.coalesce(func.sum(ents.c.amount), 0)]).where(and_(
+                ents.c.budget_id == budget_id, ents.c.date < dt
+            ))
+        ).scalar()
+        logger.debug(
+            'Creating BudgetBalanceSnapshot for budget %s on %s: %s',
+            budget_id, dt, balance
+        )
+        session.execute(
+            snaps.insert().values(budget_id=budget_id, date=dt, balance=balance)
+        )
+
+
+def handle_search_index(session, flush_context):
+    """
+    ``after_flush`` event handler
+    (:py:meth:`sqlalchemy.orm.events.SessionEvents.after_flush`) on the DB
+    session, to keep the local full-text token tables of
+    :py:data:`~.transaction_search` and :py:data:`~.ofx_transaction_search`
+    up to date. New records, and existing records with changes to any of the
+    indexed columns, are re-tokenized; the tokens of deleted records are
+    removed. This does nothing on MySQL, which uses native ``FULLTEXT``
+    indexes instead.
+
+    :param session: current database session
+    :type session: sqlalchemy.orm.session.Session
+    :param flush_context: internal SQLAlchemy object
+    :type flush_context: sqlalchemy.orm.session.UOWTransaction
+    """
+    if is_native(session.get_bind()):
+        return
+    for idx in [transaction_search, ofx_transaction_search]:
+        changed = [o for o in session.new if isinstance(o, idx.model)]
+        changed.extend(
+            o for o in session.dirty if isinstance(o, idx.model) and any(
+                _has_changes(o, c) for c in idx.columns
+            )
+        )
+        deleted = [
+            idx.record_key(o) for o in session.deleted
+            if isinstance(o, idx.model)
+        ]
+        if deleted:
+            idx.remove(session, deleted)
+        if changed:
+            idx.index(session, changed)
+
+
 def handle_ofx_transaction_new_or_change(session):
     """
     ``before_flush`` event handler
@@ -174,23 +567,32 @@ def handle_ofx_transaction_new_or_change(session):
     on the DB session, to handle setting the ``is_*`` fields on new or changed
     OFXTransaction instances according to its Account.
 
+    The ``is_*`` fields depend only on the transaction name and its Account's
+    ``re_*`` patterns, so existing (dirty) transactions are only reclassified
+    if their name or account changed; changes to the patterns themselves are
+    handled by :py:func:`~.handle_account_re_change`.
+
     :param session: current database session
     :type session: sqlalchemy.orm.session.Session
     """
-    for obj in session.new:
-        if isinstance(obj, OFXTransaction):
-            try:
-                obj.update_is_fields()
-            except Exception:
-                logger.error('Error setting OFXTransaction is_ fields',
-                             exc_info=True)
+    txns = [obj for obj in session.new if isinstance(obj, OFXTransaction)]
     for obj in session.dirty:
-        if isinstance(obj, OFXTransaction):
-            try:
-                obj.update_is_fields()
-            except Exception:
-                logger.error('Error setting OFXTransaction is_ fields',
-                             exc_info=True)
+        if not isinstance(obj, OFXTransaction):
+            continue
+        # committed_state only holds attributes that were set since the last
+        # flush, so this cheaply skips the common case of other fields
+        # changing before checking the history of the relevant ones.
+        attrs = OFX_CLASSIFY_ATTRS.intersection(
+            inspect(obj).committed_state
+        )
+        if any(_has_changes(obj, a) for a in attrs):
+            txns.append(obj)
+    if len(txns) < 1:
+        return
+    try:
+        OFXTransaction.update_is_fields_many(txns)
+    except Exception:
+        logger.error('Error setting OFXTransaction is_ fields', exc_info=True)
 
 
 def handle_account_re_change(session):
@@ -203,9 +605,12 @@ def handle_account_re_change(session):
     * :py:attr:`~.Account.re_other_fee`
     * :py:attr:`~.Account.re_payment`
 
-    When one of these regexes is changed on an Account, we trigger a re-run
-    of :py:meth:`~.OFXTransaction.update_is_fields` on all OFXTransactions for
-    the account.
+    When one of these regexes is changed on an Account, the Account's ID is
+    recorded in the session's ``info`` dict. Once the transaction is
+    committed, :py:func:`~.handle_ofx_reclassify_commit` submits a
+    :py:class:`~.ReclassifyJob` to reclassify all of the Account's
+    OFXTransactions in batches, so that they aren't all loaded into this
+    session.
 
     :param session: current database session
     :type session: sqlalchemy.orm.session.Session
@@ -235,13 +640,241 @@ def handle_account_re_change(session):
         if len(changed) < 1:
             continue
         logger.debug(
-            '%s has regex changes; triggering update_is_fields() on all child '
-            'OFXTransactions.', obj
+            '%s has regex changes; reclassifying all child OFXTransactions '
+            'after commit.', obj
+        )
+        session.info.setdefault(RECLASSIFY_INFO_KEY, set()).add(obj.id)
+
+
+def handle_ofx_reclassify_commit(session):
+    """
+    ``after_commit`` event handler
+    (:py:meth:`sqlalchemy.orm.events.SessionEvents.after_commit`) on the DB
+    session. Submit a job to :py:data:`~.ofx_reclassifier` for each Account
+    whose ``re_*`` fields were changed in the transaction, as recorded by
+    :py:func:`~.handle_account_re_change`.
+
+    :param session: current database session
+    :type session: sqlalchemy.orm.session.Session
+    """
+    for acct_id in sorted(session.info.pop(RECLASSIFY_INFO_KEY, set())):
+        ofx_reclassifier.submit(acct_id)
+
+
+def handle_ofx_reclassify_rollback(session):
+    """
+    ``after_rollback`` event handler
+    (:py:meth:`sqlalchemy.orm.events.SessionEvents.after_rollback`) on the DB
+    session. Discard the Accounts recorded by
+    :py:func:`~.handle_account_re_change`, since their changes weren't saved.
+
+    :param session: current database session
+    :type session: sqlalchemy.orm.session.Session
+    """
+    session.info.pop(RECLASSIFY_INFO_KEY, None)
+
+
+def _attr_values(obj, attr_name):
+    """
+    Return a set of all current and previous (pre-change) non-None values of
+    the given attribute on a model instance.
+
+    :param obj: model instance
+    :param attr_name: name of the attribute
+    :type attr_name: str
+    :return: set of current and previous values
+    :rtype: set
+    """
+    hx = getattr(inspect(obj).attrs, attr_name).history
+    vals = set(hx.deleted or [])
+    vals.add(getattr(obj, attr_name))
+    vals.discard(None)
+    return vals
+
+
+def _has_changes(obj, attr_name):
+    """
+    Return whether or not the given attribute on a model instance has changes.
+
+    :param obj: model instance
+    :param attr_name: name of the attribute
+    :type attr_name: str
+    :rtype: bool
+    """
+    return getattr(inspect(obj).attrs, attr_name).history.has_changes()
+
+
+def _payperiod_cache_affected(session):
+    """
+    Determine which pay periods' cached data is affected by the pending
+    changes in ``session``. Called from
+    :py:func:`~.handle_payperiod_cache_invalidation`.
+
+    :param session: current database session
+    :type session: sqlalchemy.orm.session.Session
+    :return: 2-tuple of (set of dates of affected transactions, boolean
+      whether *all* pay periods are affected)
+    :rtype: tuple
+    """
+    dates = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Transaction):
+            dates.update(_attr_values(obj, 'date'))
+        elif isinstance(obj, BudgetTransaction):
+            if obj.transaction is not None:
+                dates.update(_attr_values(obj.transaction, 'date'))
+            elif obj.trans_id is not None:
+                dates.add(session.query(Transaction).get(obj.trans_id).date)
+        elif isinstance(obj, TxnReconcile):
+            for txn in _attr_values(obj, 'transaction'):
+                dates.update(_attr_values(txn, 'date'))
+        elif isinstance(obj, ScheduledTransaction):
+            if (
+                obj.schedule_type != 'date' or
+                _has_changes(obj, 'day_of_month') or
+                _has_changes(obj, 'num_per_period')
+            ):
+                # monthly and per-period transactions affect every period
+                return dates, True
+            dates.update(_attr_values(obj, 'date'))
+        elif isinstance(obj, Budget):
+            if obj not in session.dirty:
+                return dates, True
+            changed = [
+                a.key for a in inspect(obj).attrs if a.history.has_changes()
+            ]
+            # standing budget balances aren't part of pay period data
+            if set(changed) - {'current_balance'}:
+                return dates, True
+        elif isinstance(obj, Account):
+            if obj not in session.dirty or _has_changes(obj, 'name'):
+                return dates, True
+    return dates, False
+
+
+def handle_payperiod_cache_invalidation(session):
+    """
+    ``before_flush`` event handler
+    (:py:meth:`sqlalchemy.orm.events.SessionEvents.before_flush`)
+    on the DB session, to invalidate the entries in the
+    :py:class:`~.PayPeriodDataCache` for any pay periods affected by new,
+    changed or deleted :py:class:`~.Transaction`,
+    :py:class:`~.BudgetTransaction`, :py:class:`~.ScheduledTransaction` or
+    :py:class:`~.Budget` instances.
+
+    The affected pay periods are also recorded in the session's ``info`` dict,
+    and invalidated again by :py:func:`~.handle_payperiod_cache_txn_end` when
+    the transaction is committed or rolled back. This prevents the cache from
+    keeping data calculated from uncommitted or rolled-back changes.
+
+    :param session: current database session
+    :type session: sqlalchemy.orm.session.Session
+    """
+    if not payperiod_cache.enabled:
+        return
+    dates, everything = _payperiod_cache_affected(session)
+    if not everything and len(dates) == 0:
+        return
+    pending = session.info.setdefault('payperiod_cache_pending', set())
+    if everything:
+        logger.debug('Invalidating all pay period cache entries')
+        payperiod_cache.invalidate_all()
+        pending.add(None)
+    else:
+        start_dates = set(
+            BiweeklyPayPeriod.period_for_date(d, session).start_date
+            for d in dates
+        )
+        logger.debug(
+            'Invalidating pay period cache entries for: %s', start_dates
         )
-        for stmt in obj.all_statements:
-            for txn in stmt.ofx_trans:
-                txn.update_is_fields()
-        logger.debug('Done with update_is_fields() for %s', obj)
+        payperiod_cache.invalidate(start_dates)
+        pending.update(start_dates)
+    payperiod_cache.new_generation(session)
+
+
+def handle_payperiod_cache_txn_end(session, *args):
+    """
+    ``after_commit`` and ``after_rollback`` event handler
+    (:py:meth:`sqlalchemy.orm.events.SessionEvents.after_commit`) on the DB
+    session. Invalidate the :py:class:`~.PayPeriodDataCache` entries recorded
+    by :py:func:`~.handle_payperiod_cache_invalidation` during the transaction,
+    and ensure the cache generation is checked again in the next transaction.
+
+    :param session: current database session
+    :type session: sqlalchemy.orm.session.Session
+    """
+    session.info.pop(payperiod_cache.SESSION_INFO_KEY, None)
+    pending = session.info.pop('payperiod_cache_pending', None)
+    if not pending:
+        return
+    if None in pending:
+        payperiod_cache.invalidate_all()
+    else:
+        payperiod_cache.invalidate(pending)
+
+
+def handle_payoff_cache_invalidation(session):
+    """
+    ``before_flush`` event handler
+    (:py:meth:`sqlalchemy.orm.events.SessionEvents.before_flush`)
+    on the DB session, to clear the :py:class:`~.PayoffResultCache` when any
+    new, changed or deleted :py:class:`~.Account`,
+    :py:class:`~.AccountBalance`, :py:class:`~.OFXStatement` or
+    :py:class:`~.OFXTransaction` instances, or the ``credit-payoff``
+    :py:class:`~.DBSetting`, are being flushed.
+
+    Cached results are keyed on :py:attr:`~.InterestHelper.fingerprint`, so
+    they would not be returned after such a change anyway; this just keeps
+    stale entries from taking up space until they are evicted.
+
+    :param session: current database session
+    :type session: sqlalchemy.orm.session.Session
+    """
+    if not payoff_cache.enabled:
+        return
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, DBSetting) and obj.name != 'credit-payoff':
+            continue
+        if isinstance(
+            obj, (
+                Account, AccountBalance, OFXStatement, OFXTransaction,
+                DBSetting
+            )
+        ):
+            logger.debug('Invalidating credit payoff cache for %s', obj)
+            payoff_cache.invalidate_all()
+            return
+
+
+def handle_notifications_cache_invalidation(session):
+    """
+    ``before_flush`` event handler
+    (:py:meth:`sqlalchemy.orm.events.SessionEvents.before_flush`)
+    on the DB session, to store a new
+    :py:class:`~biweeklybudget.notifications_cache.NotificationsCache`
+    generation when any new, changed or deleted instances of the models that
+    the page notifications are calculated from are being flushed. Cached
+    notifications are then recalculated, in every process, once the change is
+    committed.
+
+    :param session: current database session
+    :type session: sqlalchemy.orm.session.Session
+    """
+    if not notifications_cache.enabled:
+        return
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(
+            obj, (
+                Account, AccountBalance, Budget, BudgetTransaction,
+                OFXStatement, OFXTransaction, ScheduledTransaction,
+                Transaction, TxnReconcile
+            )
+        ):
+            logger.debug('Invalidating notifications cache for %s', obj)
+            notifications_cache.invalidate()
+            notifications_cache.new_generation(session)
+            return
 
 
 def handle_before_flush(session, flush_context, instances):
@@ -253,6 +886,17 @@ def handle_before_flush(session, flush_context, instances):
     specific cases:
 
     * :py:func:`~.handle_new_or_deleted_budget_transaction`
+    * :py:func:`~.handle_transaction_actual_amount`
+    * :py:func:`~.handle_account_latest_balance`
+    * :py:func:`~.handle_budget_balance_ledger`
+    * :py:func:`~.handle_ofx_transaction_new_or_change`
+    * :py:func:`~.handle_account_re_change`
+    * :py:func:`~.handle_payperiod_cache_invalidation`
+    * :py:func:`~.handle_payoff_cache_invalidation`
+    * :py:func:`~.handle_notifications_cache_invalidation`
+
+    The time spent in these is recorded as the ``before_flush`` stage of the
+    active :py:class:`~biweeklybudget.ingest_metrics.IngestMetrics`, if any.
 
     :param session: current database session
     :type session: sqlalchemy.orm.session.Session
@@ -261,9 +905,16 @@ def handle_before_flush(session, flush_context, instances):
     :param instances: deprecated
     """
     logger.debug('handle_before_flush handler')
-    handle_new_or_deleted_budget_transaction(session)
-    handle_ofx_transaction_new_or_change(session)
-    handle_account_re_change(session)
+    with ingest_metrics.stage('before_flush'):
+        handle_new_or_deleted_budget_transaction(session)
+        handle_transaction_actual_amount(session)
+        handle_account_latest_balance(session)
+        handle_budget_balance_ledger(session)
+        handle_ofx_transaction_new_or_change(session)
+        handle_account_re_change(session)
+        handle_payperiod_cache_invalidation(session)
+        handle_payoff_cache_invalidation(session)
+        handle_notifications_cache_invalidation(session)
     logger.debug('handle_before_flush done')
 
 
@@ -312,6 +963,7 @@ def init_event_listeners(db_session, engine):
         logger.debug('Enabling SQL query timing event handlers.')
         event.listen(engine, 'before_cursor_execute', query_profile_before)
         event.listen(engine, 'after_cursor_execute', query_profile_after)
+    event.listen(engine, 'before_cursor_execute', ingest_metrics.count_query)
     logger.debug('Setting up DB model event listeners')
     event.listen(
         BudgetTransaction.amount,
@@ -325,3 +977,38 @@ def init_event_listeners(db_session, engine):
         'before_flush',
         handle_before_flush
     )
+    event.listen(
+        db_session,
+        'after_flush',
+        handle_budget_balance_snapshots
+    )
+    event.listen(
+        db_session,
+        'after_flush',
+        handle_search_index
+    )
+    event.listen(
+        db_session,
+        'after_flush',
+        handle_transaction_actual_amount_update
+    )
+    event.listen(
+        db_session,
+        'after_commit',
+        handle_payperiod_cache_txn_end
+    )
+    event.listen(
+        db_session,
+        'after_rollback',
+        handle_payperiod_cache_txn_end
+    )
+    event.listen(
+        db_session,
+        'after_commit',
+        handle_ofx_reclassify_commit
+    )
+    event.listen(
+        db_session,
+        'after_rollback',
+        handle_ofx_reclassify_rollback
+    )
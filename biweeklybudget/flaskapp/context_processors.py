@@ -50,7 +50,9 @@ def notifications():
     :return: template context with notifications added
     :rtype: dict
     """
-    return dict(notifications=NotificationsController().get_notifications())
+    return dict(
+        notifications=NotificationsController.get_cached_notifications()
+    )
 
 
 @app.context_processor
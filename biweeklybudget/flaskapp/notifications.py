@@ -36,38 +36,136 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 """
 
 import logging
-from sqlalchemy import func
+from sqlalchemy import func, exists
 from decimal import Decimal
 
 from biweeklybudget.db import db_session
+from biweeklybudget.settings import (
+    STALE_DATA_TIMEDELTA, RECONCILE_BEGIN_DATE
+)
 from biweeklybudget.utils import dtnow, fmt_currency
 from biweeklybudget.models.account import Account
+from biweeklybudget.models.account_balance import AccountBalance
 from biweeklybudget.models.budget_model import Budget
+from biweeklybudget.models.ofx_statement import OFXStatement
 from biweeklybudget.models.ofx_transaction import OFXTransaction
+from biweeklybudget.models.transaction import Transaction
+from biweeklybudget.models.txn_reconcile import TxnReconcile
 from biweeklybudget.biweeklypayperiod import BiweeklyPayPeriod
+from biweeklybudget.notifications_cache import notifications_cache
 
 logger = logging.getLogger(__name__)
 
 
 class NotificationsController(object):
 
+    @staticmethod
+    def _num_stale_accounts_query(sess):
+        """
+        Return a query for the number of active accounts whose latest
+        OFXStatement is older than :py:attr:`~.settings.STALE_DATA_TIMEDELTA`
+        (the set-based equivalent of :py:attr:`~.Account.is_stale`).
+
+        :param sess: active database session
+        :type sess: sqlalchemy.orm.session.Session
+        :return: query selecting the count of accounts with stale data
+        :rtype: sqlalchemy.orm.query.Query
+        """
+        latest = sess.query(
+            OFXStatement.account_id.label('account_id'),
+            func.max(OFXStatement.as_of).label('as_of')
+        ).group_by(OFXStatement.account_id).subquery()
+        return sess.query(func.count(Account.id)).join(
+            latest, latest.c.account_id.__eq__(Account.id)
+        ).filter(
+            Account.is_active.__eq__(True),
+            latest.c.as_of.__lt__(dtnow() - STALE_DATA_TIMEDELTA)
+        )
+
+    @staticmethod
+    def _budget_account_sum_query(sess):
+        """
+        Return a query for the sum of the latest AccountBalance
+        (:py:attr:`~.Account.latest_balance`) ledger amounts of all active
+        is_budget_source accounts.
+
+        :param sess: active database session
+        :type sess: sqlalchemy.orm.session.Session
+        :return: query selecting the combined balance
+        :rtype: sqlalchemy.orm.query.Query
+        """
+        return sess.query(func.sum(AccountBalance.ledger)).join(
+            Account, Account.latest_balance_id.__eq__(AccountBalance.id)
+        ).filter(
+            Account.is_budget_source.__eq__(True),
+            Account.is_active.__eq__(True)
+        )
+
+    @staticmethod
+    def _budget_account_unreconciled_query(sess):
+        """
+        Return a query for the sum of the amounts of unreconciled Transactions
+        (see :py:attr:`~.Account.unreconciled`) of all active is_budget_source
+        accounts.
+
+        :param sess: active database session
+        :type sess: sqlalchemy.orm.session.Session
+        :return: query selecting the combined unreconciled amount
+        :rtype: sqlalchemy.orm.query.Query
+        """
+        return sess.query(func.sum(Transaction.actual_amount)).join(
+            Account, Transaction.account_id.__eq__(Account.id)
+        ).filter(
+            Account.is_budget_source.__eq__(True),
+            Account.is_active.__eq__(True),
+            ~exists().where(TxnReconcile.txn_id.__eq__(Transaction.id)),
+            Transaction.date.__ge__(RECONCILE_BEGIN_DATE),
+            Transaction.date.__le__(dtnow())
+        )
+
+    @staticmethod
+    def _standing_budgets_sum_query(sess):
+        """
+        Return a query for the sum of current balances of all active standing
+        budgets.
+
+        :param sess: active database session
+        :type sess: sqlalchemy.orm.session.Session
+        :return: query selecting the sum of standing budget balances
+        :rtype: sqlalchemy.orm.query.Query
+        """
+        return sess.query(func.sum(Budget.current_balance)).filter(
+            Budget.is_periodic.__eq__(False),
+            Budget.is_active.__eq__(True)
+        )
+
+    @staticmethod
+    def _num_unreconciled_ofx_query(sess):
+        """
+        Return a query for the number of unreconciled OFXTransactions.
+
+        :param sess: active database session
+        :type sess: sqlalchemy.orm.session.Session
+        :return: query selecting the count of unreconciled OFXTransactions
+        :rtype: sqlalchemy.orm.query.Query
+        """
+        return OFXTransaction.unreconciled(sess).with_entities(
+            func.count(OFXTransaction.fitid)
+        )
+
     @staticmethod
     def num_stale_accounts(sess=None):
         """
         Return the number of accounts with stale data.
 
-        @TODO This is a hack because I just cannot figure out how to do this
-        natively in SQLAlchemy.
-
         :return: count of accounts with stale data
         :rtype: int
         """
         if sess is None:
             sess = db_session
-        return sum(
-            1 if a.is_stale else 0 for a in sess.query(
-                Account).filter(Account.is_active.__eq__(True)).all()
-        )
+        return NotificationsController._num_stale_accounts_query(
+            sess
+        ).scalar()
 
     @staticmethod
     def budget_account_sum(sess=None):
@@ -79,14 +177,10 @@ class NotificationsController(object):
         """
         if sess is None:
             sess = db_session
-        sum = Decimal('0.0')
-        for acct in sess.query(Account).filter(
-                Account.is_budget_source.__eq__(True),
-                Account.is_active.__eq__(True)
-        ):
-            if acct.balance is not None:
-                sum += acct.balance.ledger
-        return sum
+        res = NotificationsController._budget_account_sum_query(sess).scalar()
+        if res is None:
+            return Decimal('0.0')
+        return res
 
     @staticmethod
     def budget_account_unreconciled(sess=None):
@@ -98,13 +192,12 @@ class NotificationsController(object):
         """
         if sess is None:
             sess = db_session
-        sum = Decimal('0.0')
-        for acct in sess.query(Account).filter(
-                Account.is_budget_source.__eq__(True),
-                Account.is_active.__eq__(True)
-        ):
-            sum += acct.unreconciled_sum
-        return sum
+        res = NotificationsController._budget_account_unreconciled_query(
+            sess
+        ).scalar()
+        if res is None:
+            return Decimal('0.0')
+        return res
 
     @staticmethod
     def standing_budgets_sum(sess=None):
@@ -116,14 +209,61 @@ class NotificationsController(object):
         """
         if sess is None:
             sess = db_session
-        res = sess.query(func.sum(Budget.current_balance)).filter(
-            Budget.is_periodic.__eq__(False),
-            Budget.is_active.__eq__(True)
-        ).all()[0][0]
+        res = NotificationsController._standing_budgets_sum_query(
+            sess
+        ).scalar()
         if res is None:
             return 0
         return res
 
+    @staticmethod
+    def num_unreconciled_ofx(sess=None):
+        """
+        Return the number of unreconciled OFXTransactions.
+
+        :return: number of unreconciled OFXTransactions
+        :rtype: int
+        """
+        if sess is None:
+            sess = db_session
+        return NotificationsController._num_unreconciled_ofx_query(
+            sess
+        ).scalar()
+
+    @staticmethod
+    def totals(sess=None):
+        """
+        Return the values of :py:meth:`~.num_stale_accounts`,
+        :py:meth:`~.budget_account_sum`,
+        :py:meth:`~.budget_account_unreconciled`,
+        :py:meth:`~.standing_budgets_sum` and
+        :py:meth:`~.num_unreconciled_ofx`, calculated in a single query.
+
+        :return: dict with keys ``num_stale_accounts``,
+          ``budget_account_sum``, ``budget_account_unreconciled``,
+          ``standing_budgets_sum`` and ``num_unreconciled_ofx``
+        :rtype: dict
+        """
+        if sess is None:
+            sess = db_session
+        nc = NotificationsController
+        queries = [
+            ('num_stale_accounts', nc._num_stale_accounts_query, 0),
+            ('budget_account_sum', nc._budget_account_sum_query,
+             Decimal('0.0')),
+            ('budget_account_unreconciled',
+             nc._budget_account_unreconciled_query, Decimal('0.0')),
+            ('standing_budgets_sum', nc._standing_budgets_sum_query, 0),
+            ('num_unreconciled_ofx', nc._num_unreconciled_ofx_query, 0)
+        ]
+        row = sess.query(
+            *[q(sess).label(name) for name, q, _ in queries]
+        ).one()
+        return {
+            name: default if val is None else val
+            for (name, _, default), val in zip(queries, row)
+        }
+
     @staticmethod
     def pp_sum(sess=None):
         """
@@ -143,18 +283,6 @@ class NotificationsController(object):
                      pp, allocated, spent)
         return allocated - spent
 
-    @staticmethod
-    def num_unreconciled_ofx(sess=None):
-        """
-        Return the number of unreconciled OFXTransactions.
-
-        :return: number of unreconciled OFXTransactions
-        :rtype: int
-        """
-        if sess is None:
-            sess = db_session
-        return OFXTransaction.unreconciled(sess).count()
-
     @staticmethod
     def get_notifications():
         """
@@ -163,9 +291,14 @@ class NotificationsController(object):
         with keys "classes" and "content", where classes is the string that
         should appear in the notification div's "class" attribute, and content
         is the string content of the div.
+
+        The account and budget totals are calculated in one query by
+        :py:meth:`~.totals`; see :py:meth:`~.get_cached_notifications` to use
+        the :py:class:`~biweeklybudget.notifications_cache.NotificationsCache`.
         """
         res = []
-        num_stale = NotificationsController.num_stale_accounts()
+        totals = NotificationsController.totals()
+        num_stale = totals['num_stale_accounts']
         if num_stale > 0:
             a = 'Accounts'
             if num_stale == 1:
@@ -176,9 +309,9 @@ class NotificationsController(object):
                            'class="alert-link">View Accounts</a>.' % (num_stale,
                                                                       a)
             })
-        accounts_bal = NotificationsController.budget_account_sum()
-        unrec_amt = NotificationsController.budget_account_unreconciled()
-        standing_bal = NotificationsController.standing_budgets_sum()
+        accounts_bal = totals['budget_account_sum']
+        unrec_amt = totals['budget_account_unreconciled']
+        standing_bal = totals['standing_budgets_sum']
         curr_pp = NotificationsController.pp_sum()
         logger.info('accounts_bal=%s standing_bal=%s curr_pp=%s unrec=%s',
                     accounts_bal, standing_bal, curr_pp, unrec_amt)
@@ -219,7 +352,7 @@ class NotificationsController(object):
                                fmt_currency(unrec_amt)
                            )
             })
-        unreconciled_ofx = NotificationsController.num_unreconciled_ofx()
+        unreconciled_ofx = totals['num_unreconciled_ofx']
         if unreconciled_ofx > 0:
             res.append({
                 'classes': 'alert alert-warning unreconciled-alert',
@@ -228,3 +361,18 @@ class NotificationsController(object):
                            '</a>.' % unreconciled_ofx
             })
         return res
+
+    @staticmethod
+    def get_cached_notifications():
+        """
+        Return the result of :py:meth:`~.get_notifications`, from the
+        process-wide
+        :py:class:`~biweeklybudget.notifications_cache.NotificationsCache` if
+        it is current.
+
+        :return: list of notification dicts
+        :rtype: list
+        """
+        return notifications_cache.get(
+            db_session, NotificationsController.get_notifications
+        )
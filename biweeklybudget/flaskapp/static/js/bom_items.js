@@ -56,7 +56,7 @@ $(document).ready(function() {
     mytable = $('#table-items').dataTable({
         processing: true,
         serverSide: true,
-        ajax: "/ajax/projects/" + project_id + "/bom_items",
+        ajax: keyset_ajax("/ajax/projects/" + project_id + "/bom_items"),
         columns: [
             {
                 data: "name",
@@ -68,3 +68,20 @@ $(function() {
     });
   });
 });
+
+$(function() {
+  $.ajax('/ajax/chart-data/budget-balances').done(function(ajaxdata) {
+    Morris.Line({
+      element: 'budget-balance-chart',
+      data: ajaxdata['data'],
+      xkey: 'date',
+      ykeys: ajaxdata['keys'],
+      labels: ajaxdata['keys'],
+      pointSize: 2,
+      hideHover: 'auto',
+      resize: true,
+      preUnits: CURRENCY_SYMBOL,
+      continuousLine: true
+    });
+  });
+});
@@ -81,3 +81,34 @@ function isoformat(d) {
           (dd>9 ? '' : '0') + dd
          ].join('-');
 }
+
+/**
+ * Return a DataTables ``ajax`` option for a server-side endpoint that uses
+ * ``KeysetDataTable``. When the table moves to the next or previous page, the
+ * request includes the keyset cursor of the last or first row of the current
+ * page, so that the server can seek directly to the requested page instead
+ * of counting through all of the rows before it. Other requests are sent
+ * unchanged.
+ *
+ * @param {string} url - the URL of the DataTables ajax endpoint
+ * @returns {Object} DataTables ``ajax`` option
+ */
+function keyset_ajax(url) {
+    var last = null;
+    return {
+        url: url,
+        data: function(d) {
+            if (last === null || last.first === null) { return; }
+            if (d.length !== last.length) { return; }
+            if (d.start === last.start + last.length) {
+                d.keyset = { after: last.last, key: last.key };
+            } else if (d.start === last.start - last.length) {
+                d.keyset = { before: last.first, key: last.key };
+            }
+        },
+        dataSrc: function(json) {
+            last = json.keyset || null;
+            return json.data;
+        }
+    };
+}
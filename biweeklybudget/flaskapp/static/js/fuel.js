@@ -186,7 +186,7 @@ $(document).ready(function() {
     mytable = $('#table-fuel-log').dataTable({
         processing: true,
         serverSide: true,
-        ajax: "/ajax/fuelLog",
+        ajax: keyset_ajax("/ajax/fuelLog"),
         columns: [
             { data: "date" },
             {
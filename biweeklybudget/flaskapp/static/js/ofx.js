@@ -74,7 +74,7 @@ $(document).ready(function() {
     var mytable = $('#table-ofx-txn').dataTable({
         processing: true,
         serverSide: true,
-        ajax: "/ajax/ofx",
+        ajax: keyset_ajax("/ajax/ofx"),
         columns: [
             { data: "date" },
             {
@@ -87,7 +87,7 @@ $(document).ready(function() {
     mytable = $('#table-projects').dataTable({
         processing: true,
         serverSide: true,
-        ajax: "/ajax/projects",
+        ajax: keyset_ajax("/ajax/projects"),
         columns: [
             {
                 data: "name",
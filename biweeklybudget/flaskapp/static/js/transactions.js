@@ -42,7 +42,7 @@ $(document).ready(function() {
     mytable = $('#table-transactions').dataTable({
         processing: true,
         serverSide: true,
-        ajax: "/ajax/transactions",
+        ajax: keyset_ajax("/ajax/transactions"),
         columns: [
             { data: "date" },
             {
@@ -54,6 +54,7 @@ from biweeklybudget.db import db_session
 from biweeklybudget.interest import (
     INTEREST_CALCULATION_NAMES, MIN_PAYMENT_FORMULA_NAMES
 )
+from biweeklybudget.ofx_reclassify import ofx_reclassifier
 
 logger = logging.getLogger(__name__)
 
@@ -88,17 +89,22 @@ class AccountsView(MethodView):
                 f'{pa.item_id},{pa.account_id}'
             for pa in db_session.query(PlaidAccount).all()
         }
+        bank_accounts = db_session.query(Account).filter(
+            Account.acct_type == AcctType.Bank,
+            Account.is_active == True).all()  # noqa
+        credit_accounts = db_session.query(Account).filter(
+            Account.acct_type == AcctType.Credit,
+            Account.is_active == True).all()  # noqa
+        investment_accounts = db_session.query(Account).filter(
+            Account.acct_type == AcctType.Investment,
+            Account.is_active == True).all()  # noqa
+        # load the latest balances of all of them in one query
+        Account.latest_balances(db_session)
         return render_template(
             'accounts.html',
-            bank_accounts=db_session.query(Account).filter(
-                Account.acct_type == AcctType.Bank,
-                Account.is_active == True).all(),  # noqa
-            credit_accounts=db_session.query(Account).filter(
-                Account.acct_type == AcctType.Credit,
-                Account.is_active == True).all(),  # noqa
-            investment_accounts=db_session.query(Account).filter(
-                Account.acct_type == AcctType.Investment,
-                Account.is_active == True).all(),  # noqa
+            bank_accounts=bank_accounts,
+            credit_accounts=credit_accounts,
+            investment_accounts=investment_accounts,
             interest_class_names=INTEREST_CALCULATION_NAMES.keys(),
             min_pay_class_names=MIN_PAYMENT_FORMULA_NAMES.keys(),
             accts=accts,
@@ -131,17 +137,22 @@ class OneAccountView(MethodView):
                 f'{pa.item_id},{pa.account_id}'
             for pa in db_session.query(PlaidAccount).all()
         }
+        bank_accounts = db_session.query(Account).filter(
+            Account.acct_type == AcctType.Bank,
+            Account.is_active == True).all()  # noqa
+        credit_accounts = db_session.query(Account).filter(
+            Account.acct_type == AcctType.Credit,
+            Account.is_active == True).all()  # noqa
+        investment_accounts = db_session.query(Account).filter(
+            Account.acct_type == AcctType.Investment,
+            Account.is_active == True).all()  # noqa
+        # load the latest balances of all of them in one query
+        Account.latest_balances(db_session)
         return render_template(
             'accounts.html',
-            bank_accounts=db_session.query(Account).filter(
-                Account.acct_type == AcctType.Bank,
-                Account.is_active == True).all(),  # noqa
-            credit_accounts=db_session.query(Account).filter(
-                Account.acct_type == AcctType.Credit,
-                Account.is_active == True).all(),  # noqa
-            investment_accounts=db_session.query(Account).filter(
-                Account.acct_type == AcctType.Investment,
-                Account.is_active == True).all(),  # noqa
+            bank_accounts=bank_accounts,
+            credit_accounts=credit_accounts,
+            investment_accounts=investment_accounts,
             account_id=acct_id,
             interest_class_names=INTEREST_CALCULATION_NAMES.keys(),
             min_pay_class_names=MIN_PAYMENT_FORMULA_NAMES.keys(),
@@ -162,6 +173,17 @@ class AccountAjax(MethodView):
         return jsonify(acct.as_dict)
 
 
+class AccountReclassifyStatusView(MethodView):
+    """
+    Handle GET /ajax/account-reclassify-status endpoint, returning the
+    progress of the most recent OFXTransaction reclassification job for each
+    Account, from the :py:class:`~.OfxReclassifier` in this process.
+    """
+
+    def get(self):
+        return jsonify(ofx_reclassifier.status)
+
+
 class AccountFormHandler(FormHandlerView):
     """
     Handle POST /forms/account
@@ -452,6 +474,12 @@ app.add_url_rule(
     '/ajax/account/<int:account_id>',
     view_func=AccountAjax.as_view('account_ajax')
 )
+app.add_url_rule(
+    '/ajax/account-reclassify-status',
+    view_func=AccountReclassifyStatusView.as_view(
+        'account_reclassify_status'
+    )
+)
 app.add_url_rule(
     '/accounts/<int:acct_id>',
     view_func=OneAccountView.as_view('account_view')
@@ -38,12 +38,14 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 import logging
 from flask.views import MethodView
 from flask import render_template, jsonify
-from datetime import datetime
+from collections import defaultdict
+from datetime import datetime, timedelta
 from decimal import Decimal
 
 from biweeklybudget.flaskapp.app import app
 from biweeklybudget.db import db_session
 from biweeklybudget.models.budget_model import Budget
+from biweeklybudget.models.budget_balance import BudgetBalanceSnapshot
 from biweeklybudget.models.budget_transaction import BudgetTransaction
 from biweeklybudget.flaskapp.views.formhandlerview import FormHandlerView
 from biweeklybudget.models.account import Account
@@ -319,9 +321,12 @@ class BudgetSpendingChartView(MethodView):
         logger.debug('budget_names=%s', budget_names)
         records = []
         budgets_present = set()
-        pp = BiweeklyPayPeriod.period_for_date(min_txn.date, db_session)
         dt_now = dtnow().date()
-        while pp.end_date <= dt_now:
+        for pp in BiweeklyPayPeriod.compute_range(
+            min_txn.date, dt_now, db_session
+        ):
+            if pp.end_date > dt_now:
+                break
             sums = pp.budget_sums
             logger.debug('sums=%s', sums)
             records.append({
@@ -332,7 +337,6 @@ class BudgetSpendingChartView(MethodView):
             budgets_present.update(
                 [budget_names[y] for y in sums.keys() if y in budget_names]
             )
-            pp = pp.next
         res = {
             'data': records,
             'keys': sorted(list(budgets_present))
@@ -378,6 +382,56 @@ class BudgetSpendingChartView(MethodView):
         }
 
 
+class BudgetBalanceChartView(MethodView):
+    """
+    Handle GET /ajax/chart-data/budget-balances endpoint; end-of-month
+    balances of active standing budgets, from the
+    :py:class:`~.BudgetBalanceSnapshot` checkpoints.
+    """
+
+    def get(self):
+        dt_now = dtnow().date()
+        budgets = {
+            x.id: x for x in db_session.query(Budget).filter(
+                Budget.is_periodic.__eq__(False),
+                Budget.is_active.__eq__(True),
+                Budget.omit_from_graphs.__eq__(False)
+            ).all()
+        }
+        snaps = defaultdict(list)
+        for s in db_session.query(BudgetBalanceSnapshot).filter(
+            BudgetBalanceSnapshot.budget_id.in_(budgets.keys()),
+            BudgetBalanceSnapshot.date.__le__(dt_now)
+        ).order_by(
+            BudgetBalanceSnapshot.budget_id, BudgetBalanceSnapshot.date
+        ).all():
+            snaps[s.budget_id].append(s)
+        next_month = (dt_now.replace(day=1) + timedelta(days=32)).replace(
+            day=1
+        )
+        records = {}
+        for budg_id, budg_snaps in snaps.items():
+            budg = budgets[budg_id]
+            # each snapshot is the balance at the end of the previous month
+            # that had ledger entries, and therefore of every month since
+            points = [(x.date, x.balance) for x in budg_snaps[1:]]
+            points.append((next_month, budg.balance_as_of(dt_now)))
+            month = budg_snaps[0].date
+            idx = 0
+            while month <= dt_now:
+                while points[idx][0] <= month:
+                    idx += 1
+                ds = month.strftime('%Y-%m')
+                records.setdefault(ds, {'date': ds})[budg.name] = \
+                    points[idx][1]
+                month = (month + timedelta(days=32)).replace(day=1)
+        res = {
+            'data': [records[k] for k in sorted(records.keys())],
+            'keys': sorted([budgets[x].name for x in snaps.keys()])
+        }
+        return jsonify(res)
+
+
 app.add_url_rule('/budgets', view_func=BudgetsView.as_view('budgets_view'))
 app.add_url_rule(
     '/budgets/<int:budget_id>',
@@ -399,3 +453,7 @@ app.add_url_rule(
     '/ajax/chart-data/budget-spending/<string:aggregation>',
     view_func=BudgetSpendingChartView.as_view('budget_spending_chart_view')
 )
+app.add_url_rule(
+    '/ajax/chart-data/budget-balances',
+    view_func=BudgetBalanceChartView.as_view('budget_balance_chart_view')
+)
@@ -41,12 +41,13 @@ from decimal import Decimal, ROUND_UP
 from datetime import datetime, timedelta
 
 from flask.views import MethodView
-from flask import render_template, request, jsonify
+from flask import render_template, request, jsonify, make_response
 
+from biweeklybudget import settings
 from biweeklybudget.flaskapp.jsonencoder import MagicJSONEncoder
 from biweeklybudget.flaskapp.app import app
 from biweeklybudget.db import db_session
-from biweeklybudget.interest import InterestHelper
+from biweeklybudget.interest import InterestHelper, payoff_cache
 from biweeklybudget.models.dbsetting import DBSetting
 from biweeklybudget.utils import fmt_currency, dtnow
 from biweeklybudget.models.account import NoInterestChargedError, Account
@@ -67,12 +68,21 @@ class CreditPayoffsView(MethodView):
         """
         Return a payoffs list suitable for rendering.
 
+        Payoffs are calculated through the :py:class:`~.PayoffResultCache`;
+        the second element of the return value is whether or not they came
+        from the cache.
+
         :param ih: interest helper instance
         :type ih: biweeklybudget.interest.InterestHelper
-        :return: list of payoffs suitable for rendering
-        :rtype: list
+        :return: 2-tuple of list of payoffs suitable for rendering, and whether
+          or not they were retrieved from the cache
+        :rtype: tuple
         """
-        res = ih.calculate_payoffs()
+        res, cache_hit = payoff_cache.calculate_payoffs(
+            ih,
+            engine=settings.CREDIT_PAYOFF_ENGINE,
+            processes=settings.CREDIT_PAYOFF_PROCESSES
+        )
         payoffs = []
         for methname in sorted(res.keys(), reverse=True):
             tmp = {
@@ -116,7 +126,7 @@ class CreditPayoffsView(MethodView):
                 'next_payment': total_next
             }
             payoffs.append(tmp)
-        return payoffs
+        return payoffs, cache_hit
 
     def _payment_settings_dict(self, settings_json):
         """
@@ -152,7 +162,7 @@ class CreditPayoffsView(MethodView):
         try:
             ih = InterestHelper(db_session, **pymt_settings_kwargs)
             mps = sum(ih.min_payments.values())
-            payoffs = self._payoffs_list(ih)
+            payoffs, cache_hit = self._payoffs_list(ih)
         except NoInterestChargedError as ex:
             resp = render_template(
                 'credit-payoffs-no-interest-error.html',
@@ -160,12 +170,24 @@ class CreditPayoffsView(MethodView):
                 acct_id=ex.account.id
             )
             return resp, 500
-        return render_template(
+        resp = make_response(render_template(
             'credit-payoffs.html',
             monthly_pymt_sum=mps.quantize(Decimal('.01'), rounding=ROUND_UP),
             payoffs=payoffs,
             pymt_settings_json=pymt_settings_json
-        )
+        ))
+        resp.headers['X-Payoff-Cache'] = 'HIT' if cache_hit else 'MISS'
+        return resp
+
+
+class PayoffCacheStatsView(MethodView):
+    """
+    Handle GET /ajax/credit-payoff-cache-stats endpoint, returning the
+    statistics of the :py:class:`~.PayoffResultCache` in this process.
+    """
+
+    def get(self):
+        return jsonify(payoff_cache.stats)
 
 
 class PayoffSettingsFormHandler(MethodView):
@@ -300,6 +322,10 @@ app.add_url_rule(
     '/accounts/credit-payoff',
     view_func=CreditPayoffsView.as_view('credit_payoffs_view')
 )
+app.add_url_rule(
+    '/ajax/credit-payoff-cache-stats',
+    view_func=PayoffCacheStatsView.as_view('credit_payoff_cache_stats_view')
+)
 app.add_url_rule(
     '/settings/credit-payoff',
     view_func=PayoffSettingsFormHandler.as_view('payoff_settings_form')
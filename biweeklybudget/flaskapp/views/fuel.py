@@ -38,7 +38,6 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 import logging
 from flask.views import MethodView
 from flask import render_template, jsonify, request
-from datatables import DataTable
 from sqlalchemy import or_, asc
 from decimal import Decimal, ROUND_FLOOR
 from datetime import datetime
@@ -141,7 +140,7 @@ class FuelAjax(SearchableAjaxView):
         args_dict = self._args_dict(args)
         if self._have_column_search(args_dict) and args['search[value]'] == '':
             args['search[value]'] = 'FILTERHACK'
-        table = DataTable(
+        table = self._datatable(
             args,
             FuelFill,
             db_session.query(FuelFill).filter(
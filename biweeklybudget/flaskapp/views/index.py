@@ -61,15 +61,13 @@ class IndexView(MethodView):
         pp_curr_idx = 1
         pp_next_idx = 2
         pp_following_idx = 3
-        periods = [pp]
-        x = pp
-        # add another
-        for i in range(0, 8):
-            x = x.next
-            periods.append(x)
-        # trigger calculation/cache of data before passing on to jinja
-        for p in periods:
-            p.overall_sums
+        # calculate data for this and the next 8 periods before passing on to
+        # jinja
+        periods = BiweeklyPayPeriod.compute_range(
+            pp.start_date,
+            BiweeklyPayPeriod.period_at(pp.index + 8, db_session).start_date,
+            db_session
+        )
         accts = {a.name: a.id for a in db_session.query(Account).all()}
         budgets = {}
         active_budgets = {}
@@ -80,17 +78,22 @@ class IndexView(MethodView):
             budgets[b.id] = k
             if b.is_active:
                 active_budgets[b.id] = k
+        bank_accounts = db_session.query(Account).filter(
+            Account.acct_type == AcctType.Bank,
+            Account.is_active == True).all()  # noqa
+        credit_accounts = db_session.query(Account).filter(
+            Account.acct_type == AcctType.Credit,
+            Account.is_active == True).all()  # noqa
+        investment_accounts = db_session.query(Account).filter(
+            Account.acct_type == AcctType.Investment,
+            Account.is_active == True).all()  # noqa
+        # load the latest balances of all of them in one query
+        Account.latest_balances(db_session)
         return render_template(
             'index.html',
-            bank_accounts=db_session.query(Account).filter(
-                Account.acct_type == AcctType.Bank,
-                Account.is_active == True).all(),  # noqa
-            credit_accounts=db_session.query(Account).filter(
-                Account.acct_type == AcctType.Credit,
-                Account.is_active == True).all(),  # noqa
-            investment_accounts=db_session.query(Account).filter(
-                Account.acct_type == AcctType.Investment,
-                Account.is_active == True).all(),  # noqa
+            bank_accounts=bank_accounts,
+            credit_accounts=credit_accounts,
+            investment_accounts=investment_accounts,
             standing_budgets=standing,
             periods=periods,
             curr_pp=pp,
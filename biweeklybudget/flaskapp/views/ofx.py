@@ -38,18 +38,24 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 import logging
 from flask.views import MethodView
 from flask import render_template, jsonify, request
-from datatables import DataTable
 from sqlalchemy import or_
 import pickle
+import gzip
+import json
 from base64 import b64decode
+from timeit import default_timer
 
 from biweeklybudget.flaskapp.app import app
 from biweeklybudget.models.ofx_transaction import OFXTransaction
 from biweeklybudget.models.account import Account
+from biweeklybudget.models.search_token import ofx_transaction_search
 from biweeklybudget.db import db_session
 from biweeklybudget.flaskapp.views.searchableajaxview import SearchableAjaxView
 from biweeklybudget.ofxapi.local import OfxApiLocal
 from biweeklybudget.ofxapi.exceptions import DuplicateFileException
+from biweeklybudget.ofxapi.serialization import (
+    SCHEMA_VERSION, statement_from_dict
+)
 
 logger = logging.getLogger(__name__)
 
@@ -118,6 +124,48 @@ class OfxAccounts(MethodView):
         return jsonify(api.get_accounts())
 
 
+class OfxStatementIds(MethodView):
+    """
+    Handle POST /api/ofx/statement_ids endpoint.
+
+    This is a ReST API bridge between
+    :py:meth:`~.OfxApiRemote.get_statement_ids` on the client side and
+    :py:meth:`~.OfxApiLocal.get_statement_ids` on the server side.
+    """
+
+    def post(self):
+        """
+        Handle POST to /api/ofx/statement_ids. The POSTed body is a JSON
+        object with a ``statement_ids`` key, a list of integer OFXStatement
+        IDs. Returns a JSON object with ``statement_ids``, a sorted list of
+        the ones that exist.
+
+        HTTP Status Codes:
+
+        - 200 - success
+        - 400 - the body is missing or has an invalid ``statement_ids`` list
+        """
+        data = request.get_json(silent=True)
+        if (
+            not isinstance(data, dict) or
+            not isinstance(data.get('statement_ids'), list) or
+            not all(isinstance(x, int) for x in data['statement_ids'])
+        ):
+            logger.error('POST contained invalid or missing statement_ids')
+            resp = jsonify({
+                'success': False,
+                'message': 'Invalid or missing statement_ids.'
+            })
+            resp.status_code = 400
+            return resp
+        api = OfxApiLocal(db_session)
+        return jsonify({
+            'statement_ids': sorted(
+                api.get_statement_ids(data['statement_ids'])
+            )
+        })
+
+
 class OfxStatementPost(MethodView):
     """
     Handle POST /api/ofx/statement endpoint.
@@ -153,6 +201,10 @@ class OfxStatementPost(MethodView):
         - ``count_new`` (int) count of new transactions added
         - ``count_updated`` (int) count of transactions updated
         - ``statement_id`` (int) ID of the newly-added statement
+        - ``metrics`` (dict) per-stage timing, row and query counts for the
+          import; see
+          :py:attr:`biweeklybudget.ingest_metrics.IngestMetrics.as_dict`. The
+          time spent decoding the request is the ``decode`` stage.
 
         HTTP Status Codes:
 
@@ -170,6 +222,7 @@ class OfxStatementPost(MethodView):
             })
             resp.status_code = 400
             return resp
+        start = default_timer()
         try:
             ofx = pickle.loads(b64decode(data['ofx']))
             mtime = pickle.loads(b64decode(data['mtime']))
@@ -184,9 +237,10 @@ class OfxStatementPost(MethodView):
             })
             resp.status_code = 400
             return resp
+        decode_secs = default_timer() - start
         api = OfxApiLocal(db_session)
         try:
-            stmt_id, count_new, count_upd = api.update_statement_ofx(
+            res = api.update_statement_ofx(
                 data['acct_id'], ofx, mtime=mtime, filename=data['filename']
             )
         except DuplicateFileException as ex:
@@ -209,6 +263,8 @@ class OfxStatementPost(MethodView):
             })
             resp.status_code = 400
             return resp
+        stmt_id, count_new, count_upd = res
+        res.metrics.add_stage('decode', decode_secs)
         resp = jsonify({
             'success': True,
             'message': 'Successfully inserted Statement %d with %d new and %d '
@@ -217,12 +273,139 @@ class OfxStatementPost(MethodView):
                        ),
             'count_new': count_new,
             'count_updated': count_upd,
-            'statement_id': stmt_id
+            'statement_id': stmt_id,
+            'metrics': res.metrics.as_dict
         })
         resp.status_code = 201
         return resp
 
 
+class OfxStatementsBatchPost(MethodView):
+    """
+    Handle POST /api/ofx/statements endpoint.
+
+    This is a ReST API bridge between
+    :py:meth:`~.OfxApiRemote.update_statements` on the client side and
+    :py:meth:`~.OfxApiLocal.update_statements` on the server side.
+    """
+
+    def post(self):
+        """
+        Handle POST to /api/ofx/statements (from
+        :py:meth:`~.OfxApiRemote.update_statements`) to upload multiple OFX
+        Statements (via :py:meth:`~.OfxApiLocal.update_statements`).
+
+        The POSTed body is a JSON object, optionally gzip-compressed (with a
+        ``Content-Encoding: gzip`` header), with the following keys:
+
+        - ``version`` (int) must be
+          :py:data:`~biweeklybudget.ofxapi.serialization.SCHEMA_VERSION`
+        - ``statements`` (list) statements encoded by
+          :py:func:`~biweeklybudget.ofxapi.serialization.statement_to_dict`
+
+        Returns a JSON object with the following fields:
+
+        - ``success`` (bool) whether all Statements were added successfully
+        - ``results`` (list) one object per Statement, in the same order,
+          with the fields returned by :py:meth:`~.OfxStatementPost.post`;
+          Statements that were already recorded also have ``duplicate`` set
+          to true.
+
+        HTTP Status Codes:
+
+        - 200 - the batch was processed; see ``results`` for each Statement
+        - 400 - the body could not be decoded, or has the wrong version
+        """
+        try:
+            body = request.get_data()
+            if request.headers.get('Content-Encoding') == 'gzip':
+                body = gzip.decompress(body)
+            data = json.loads(body)
+        except Exception:
+            logger.error('Unable to decode OFX Statements batch', exc_info=True)
+            return self._error('Unable to decode request body.')
+        if (
+            not isinstance(data, dict) or
+            sorted(data.keys()) != ['statements', 'version'] or
+            not isinstance(data['statements'], list)
+        ):
+            logger.error('POST contained invalid or missing keys')
+            return self._error('Invalid or missing JSON keys.')
+        if data['version'] != SCHEMA_VERSION:
+            return self._error(
+                'Unsupported statement schema version %s; expected %d' % (
+                    data['version'], SCHEMA_VERSION
+                )
+            )
+        results = [None] * len(data['statements'])
+        statements = []
+        decode_secs = {}
+        for idx, stmt in enumerate(data['statements']):
+            start = default_timer()
+            try:
+                statements.append((idx, statement_from_dict(stmt)))
+            except ValueError as ex:
+                logger.error('Invalid statement in batch: %s', ex)
+                results[idx] = ex
+            decode_secs[idx] = default_timer() - start
+        api = OfxApiLocal(db_session)
+        for (idx, _), res in zip(
+            statements, api.update_statements([x[1] for x in statements])
+        ):
+            if getattr(res, 'metrics', None) is not None:
+                res.metrics.add_stage('decode', decode_secs[idx])
+            results[idx] = res
+        results = [self._result(r) for r in results]
+        return jsonify({
+            'success': all(r['success'] for r in results),
+            'results': results
+        })
+
+    def _error(self, message):
+        """
+        Return a HTTP 400 response for an invalid request.
+
+        :param message: error message
+        :type message: str
+        """
+        resp = jsonify({'success': False, 'message': message})
+        resp.status_code = 400
+        return resp
+
+    def _result(self, res):
+        """
+        Return the result dict for one Statement.
+
+        :param res: :py:class:`~biweeklybudget.ingest_metrics.IngestResult`
+          or exception from :py:meth:`~.OfxApiLocal.update_statements`
+        :rtype: dict
+        """
+        if isinstance(res, DuplicateFileException):
+            return {
+                'success': False,
+                'duplicate': True,
+                'message': 'File %s is a duplicate of stmt %d for account '
+                           '%d' % (res.filename, res.stmt_id, res.acct_id),
+                'account_id': res.acct_id,
+                'filename': res.filename,
+                'statement_id': res.stmt_id
+            }
+        if isinstance(res, Exception):
+            return {'success': False, 'message': 'Exception: %s' % str(res)}
+        stmt_id, count_new, count_upd = res
+        return {
+            'success': True,
+            'message': 'Successfully inserted Statement %d with %d new and %d '
+                       'updated Transactions' % (
+                           stmt_id, count_new, count_upd
+                       ),
+            'count_new': count_new,
+            'count_updated': count_upd,
+            'statement_id': stmt_id,
+            'metrics': res.metrics.as_dict
+        }
+
+
 class OfxAjax(SearchableAjaxView):
     """
     Handle GET /ajax/ofx endpoint.
@@ -267,6 +450,7 @@ class OfxAjax(SearchableAjaxView):
         if s != '' and s != 'FILTERHACK':
             if len(s) < 3:
                 return qs
+            qs = ofx_transaction_search.filter(qs, s)
             s = '%' + s + '%'
             qs = qs.filter(or_(
                 OFXTransaction.name.like(s),
@@ -284,7 +468,7 @@ class OfxAjax(SearchableAjaxView):
         args_dict = self._args_dict(args)
         if self._have_column_search(args_dict) and args['search[value]'] == '':
             args['search[value]'] = 'FILTERHACK'
-        table = DataTable(
+        table = self._datatable(
             args, OFXTransaction, db_session.query(OFXTransaction), [
                 (
                     'date',
@@ -334,10 +518,18 @@ app.add_url_rule(
     '/api/ofx/accounts',
     view_func=OfxAccounts.as_view('ofx_api_accounts')
 )
+app.add_url_rule(
+    '/api/ofx/statement_ids',
+    view_func=OfxStatementIds.as_view('ofx_api_statement_ids')
+)
 app.add_url_rule(
     '/api/ofx/statement',
     view_func=OfxStatementPost.as_view('ofx_api_statement')
 )
+app.add_url_rule(
+    '/api/ofx/statements',
+    view_func=OfxStatementsBatchPost.as_view('ofx_api_statements')
+)
 app.add_url_rule(
     '/ofx/<int:acct_id>/<fitid>',
     view_func=OfxTransView.as_view('ofx_trans')
@@ -40,11 +40,13 @@ import logging
 from decimal import Decimal
 
 from flask.views import MethodView
-from flask import render_template, request, redirect
+from flask import render_template, request, redirect, jsonify
 
 from biweeklybudget.flaskapp.app import app
 from biweeklybudget.utils import dtnow
-from biweeklybudget.biweeklypayperiod import BiweeklyPayPeriod
+from biweeklybudget.biweeklypayperiod import (
+    BiweeklyPayPeriod, payperiod_cache
+)
 from biweeklybudget.models.budget_model import Budget
 from biweeklybudget.models.account import Account
 from biweeklybudget.models.scheduled_transaction import ScheduledTransaction
@@ -66,18 +68,13 @@ class PayPeriodsView(MethodView):
         pp_curr_idx = 1
         pp_next_idx = 2
         pp_following_idx = 3
-        periods = [
-            pp.previous,
-            pp
-        ]
-        x = pp
-        # add another
-        for i in range(0, 8):
-            x = x.next
-            periods.append(x)
-        # trigger calculation/cache of data before passing on to jinja
-        for p in periods:
-            p.overall_sums
+        # calculate data for the previous, current and next 8 periods before
+        # passing on to jinja
+        periods = BiweeklyPayPeriod.compute_range(
+            pp.previous.start_date,
+            BiweeklyPayPeriod.period_at(pp.index + 8, db_session).start_date,
+            db_session
+        )
         return render_template(
             'payperiods.html',
             periods=periods,
@@ -115,7 +112,13 @@ class PayPeriodView(MethodView):
 
     def get(self, period_date):
         d = datetime.strptime(period_date, '%Y-%m-%d').date()
-        pp = BiweeklyPayPeriod.period_for_date(d, db_session)
+        idx = BiweeklyPayPeriod.period_index(d)
+        pp_prev, pp, pp_next, pp_following, pp_last = \
+            BiweeklyPayPeriod.compute_range(
+                BiweeklyPayPeriod.period_at(idx - 1, db_session).start_date,
+                BiweeklyPayPeriod.period_at(idx + 3, db_session).start_date,
+                db_session
+            )
         curr_pp = BiweeklyPayPeriod.period_for_date(dtnow(), db_session)
         budgets = {}
         active_budgets = {}
@@ -155,21 +158,21 @@ class PayPeriodView(MethodView):
         return render_template(
             'payperiod.html',
             pp=pp,
-            pp_prev_date=pp.previous.start_date,
-            pp_prev_sums=pp.previous.overall_sums,
-            pp_prev_suffix=self.suffix_for_period(curr_pp, pp.previous),
+            pp_prev_date=pp_prev.start_date,
+            pp_prev_sums=pp_prev.overall_sums,
+            pp_prev_suffix=self.suffix_for_period(curr_pp, pp_prev),
             pp_curr_date=pp.start_date,
             pp_curr_sums=pp.overall_sums,
             pp_curr_suffix=self.suffix_for_period(curr_pp, pp),
-            pp_next_date=pp.next.start_date,
-            pp_next_sums=pp.next.overall_sums,
-            pp_next_suffix=self.suffix_for_period(curr_pp, pp.next),
-            pp_following_date=pp.next.next.start_date,
-            pp_following_sums=pp.next.next.overall_sums,
-            pp_following_suffix=self.suffix_for_period(curr_pp, pp.next.next),
-            pp_last_date=pp.next.next.next.start_date,
-            pp_last_sums=pp.next.next.next.overall_sums,
-            pp_last_suffix=self.suffix_for_period(curr_pp, pp.next.next.next),
+            pp_next_date=pp_next.start_date,
+            pp_next_sums=pp_next.overall_sums,
+            pp_next_suffix=self.suffix_for_period(curr_pp, pp_next),
+            pp_following_date=pp_following.start_date,
+            pp_following_sums=pp_following.overall_sums,
+            pp_following_suffix=self.suffix_for_period(curr_pp, pp_following),
+            pp_last_date=pp_last.start_date,
+            pp_last_sums=pp_last.overall_sums,
+            pp_last_suffix=self.suffix_for_period(curr_pp, pp_last),
             budget_sums=pp.budget_sums,
             budgets=budgets,
             standing=standing,
@@ -203,6 +206,16 @@ class PeriodForDateView(MethodView):
         )
 
 
+class PayPeriodCacheStatsView(MethodView):
+    """
+    Handle GET /ajax/payperiod-cache-stats endpoint, returning the statistics
+    of the :py:class:`~.PayPeriodDataCache` in this process.
+    """
+
+    def get(self):
+        return jsonify(payperiod_cache.stats)
+
+
 class SchedToTransFormHandler(FormHandlerView):
     """
     Handle POST /forms/sched_to_trans
@@ -351,6 +364,11 @@ app.add_url_rule(
     view_func=PeriodForDateView.as_view('pay_period_for_view')
 )
 
+app.add_url_rule(
+    '/ajax/payperiod-cache-stats',
+    view_func=PayPeriodCacheStatsView.as_view('payperiod_cache_stats_view')
+)
+
 app.add_url_rule(
     '/forms/sched_to_trans',
     view_func=SchedToTransFormHandler.as_view('sched_to_trans_form')
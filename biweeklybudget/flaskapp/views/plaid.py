@@ -317,7 +317,10 @@ class PlaidUpdate(MethodView):
             items = [
                 db_session.query(PlaidItem).get(x) for x in ids
             ]
-        results = updater.update(items=items, days=num_days)
+        results = updater.update(
+            items=items, days=num_days, workers=settings.PLAID_UPDATE_WORKERS,
+            sync=bool(settings.PLAID_SYNC)
+        )
         if request.headers.get('accept') == 'text/plain':
             s = ''
             num_updated = 0
@@ -38,7 +38,6 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 import logging
 from flask.views import MethodView
 from flask import render_template, jsonify, request
-from datatables import DataTable
 from sqlalchemy import or_
 from decimal import Decimal
 
@@ -127,7 +126,7 @@ class ProjectsAjax(SearchableAjaxView):
         args_dict = self._args_dict(args)
         if self._have_column_search(args_dict) and args['search[value]'] == '':
             args['search[value]'] = 'FILTERHACK'
-        table = DataTable(
+        table = self._datatable(
             args,
             Project,
             db_session.query(Project),
@@ -299,7 +298,7 @@ class BoMItemsAjax(SearchableAjaxView):
         args_dict = self._args_dict(args)
         if self._have_column_search(args_dict) and args['search[value]'] == '':
             args['search[value]'] = 'FILTERHACK'
-        table = DataTable(
+        table = self._datatable(
             args,
             BoMItem,
             db_session.query(BoMItem).filter(
@@ -35,7 +35,263 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 ################################################################################
 """
 
+import hashlib
+import json
+
 from flask.views import MethodView
+from datatables import DataTable, DataTablesError
+from sqlalchemy import and_, or_, inspect
+
+
+class KeysetDataTable(DataTable):
+    """
+    :py:class:`datatables.DataTable` that pages with keyset (seek)
+    pagination where it can, instead of OFFSET/LIMIT. The response is the
+    same as for ``DataTable``, with one additional ``keyset`` object:
+
+    - ``start`` (int) and ``length`` (int) - the ``start`` and ``length``
+      request parameters
+    - ``first`` and ``last`` (str) - opaque cursors for the first and last
+      rows of the page, or null if it is empty
+    - ``key`` (str) - identifies the ordering and search of the request; a
+      cursor is only valid for a request with the same key
+
+    To request the next page, send the ``last`` cursor of the current page as
+    the ``keyset[after]`` parameter, along with ``keyset[key]``; to request
+    the previous page, send the ``first`` cursor as ``keyset[before]``. The
+    ``keyset_ajax()`` JavaScript function in ``custom.js`` does this.
+
+    The rows are ordered by the requested columns followed by the model's
+    primary key, so that the order is total. With a cursor, the page is
+    selected with a WHERE clause on those columns, which costs the same no
+    matter how deep the page is. Without a valid cursor (the first request,
+    a jump to an arbitrary page, or a changed ordering or search), it falls
+    back to OFFSET/LIMIT, counting from whichever end of the results is
+    closer, so the last page is as fast as the first.
+
+    Seek conditions assume that NULLs sort before all other values, as they
+    do in MySQL and SQLite.
+    """
+
+    def _json(self):
+        """
+        Return the response dict for the request; this overrides
+        ``DataTable._json()``, and applies the search and ordering in the
+        same way.
+
+        :rtype: dict
+        """
+        draw = self.get_integer_param('draw')
+        start = self.get_integer_param('start')
+        length = self.get_integer_param('length')
+        columns = self.query_into_dict('columns')
+        ordering = self.query_into_dict('order')
+        search = self.query_into_dict('search')
+        query = self.query
+        total_records = query.count()
+        filtered_records = total_records
+        if callable(self.search_func) and search.get('value', None):
+            query = self.search_func(query, str(search['value']))
+            filtered_records = query.count()
+        order = self._order_columns(columns, ordering)
+        key = self._keyset_key(columns, ordering, search)
+        rows = self._page(query, order, start, length, filtered_records, key)
+        return {
+            'draw': draw,
+            'recordsTotal': total_records,
+            'recordsFiltered': filtered_records,
+            'data': [self.output_instance(instance) for instance in rows],
+            'keyset': {
+                'start': start,
+                'length': length,
+                'first': self._cursor(rows[0]) if rows else None,
+                'last': self._cursor(rows[-1]) if rows else None,
+                'key': key
+            }
+        }
+
+    def _order_columns(self, columns, ordering):
+        """
+        Return the columns to order by, as a list of (column expression, bool
+        descending) 2-tuples: the requested orderable columns, followed by
+        the model's primary key columns.
+
+        :param columns: the request's ``columns`` parameters
+        :type columns: dict
+        :param ordering: the request's ``order`` parameters
+        :type ordering: dict
+        :rtype: list
+        """
+        order = []
+        for o in ordering.values():
+            if o['column'] not in columns:
+                raise DataTablesError(
+                    'Cannot order {}: column not found'.format(o['column'])
+                )
+            if not columns[o['column']]['orderable']:
+                continue
+            column = self.columns_dict[columns[o['column']]['data']]
+            model_column = self.get_column(column)
+            if isinstance(model_column, property):
+                raise DataTablesError(
+                    'Cannot order by column {} as it is a property'.format(
+                        column.model_name
+                    )
+                )
+            order.append((model_column, o['dir'] == 'desc'))
+        for col in inspect(self.model).primary_key:
+            order.append((col, False))
+        return order
+
+    def _keyset_key(self, columns, ordering, search):
+        """
+        Return a short string identifying the ordering and search parameters
+        of the request, which a keyset cursor is only valid for.
+
+        :param columns: the request's ``columns`` parameters
+        :type columns: dict
+        :param ordering: the request's ``order`` parameters
+        :type ordering: dict
+        :param search: the request's ``search`` parameters
+        :type search: dict
+        :rtype: str
+        """
+        return hashlib.sha1(json.dumps([
+            [[o['column'], o['dir']] for o in ordering.values()],
+            [
+                str(c.get('search', {}).get('value', ''))
+                for _, c in sorted(columns.items())
+            ],
+            str(search.get('value', ''))
+        ]).encode('utf-8')).hexdigest()[:16]
+
+    def _cursor(self, instance):
+        """
+        Return the keyset cursor for a row; the JSON-encoded list of its
+        primary key values.
+
+        :param instance: the model instance for the row
+        :rtype: str
+        """
+        return json.dumps(list(inspect(instance).identity))
+
+    def _boundary(self, cursor, order):
+        """
+        Return the values of the ``order`` columns for the row identified by
+        a keyset cursor, or None if the cursor is invalid or the row no
+        longer exists.
+
+        :param cursor: keyset cursor from :py:meth:`~._cursor`
+        :type cursor: str
+        :param order: return value of :py:meth:`~._order_columns`
+        :type order: list
+        :rtype: tuple
+        """
+        pk = inspect(self.model).primary_key
+        try:
+            values = json.loads(cursor)
+        except ValueError:
+            return None
+        if not isinstance(values, list) or len(values) != len(pk):
+            return None
+        return self.query.with_entities(*[c for c, _ in order]).filter(
+            *[col.__eq__(v) for col, v in zip(pk, values)]
+        ).first()
+
+    @staticmethod
+    def _seek(order, boundary):
+        """
+        Return a filter expression matching the rows that come after
+        ``boundary`` in ``order``.
+
+        :param order: return value of :py:meth:`~._order_columns`
+        :type order: list
+        :param boundary: values of the order columns for the boundary row
+        :type boundary: tuple
+        :rtype: sqlalchemy.sql.expression.ColumnElement
+        """
+        terms = []
+        equal = []
+        for (col, desc), value in zip(order, boundary):
+            nullable = getattr(
+                getattr(col, 'expression', col), 'nullable', True
+            )
+            after = None
+            if value is None:
+                # NULLs sort first; nothing comes after them descending
+                if not desc:
+                    after = col.isnot(None)
+            elif desc:
+                after = col < value
+                if nullable:
+                    after = or_(after, col.is_(None))
+            else:
+                after = col > value
+            if after is not None:
+                terms.append(and_(*(equal + [after])))
+            equal.append(col.is_(None) if value is None else col == value)
+        return or_(*terms)
+
+    @staticmethod
+    def _ordered(query, order, reverse=False):
+        """
+        Return ``query`` ordered by ``order``, optionally reversed.
+
+        :param query: the query to order
+        :type query: sqlalchemy.orm.query.Query
+        :param order: return value of :py:meth:`~._order_columns`
+        :type order: list
+        :param reverse: whether to reverse the order
+        :type reverse: bool
+        :rtype: sqlalchemy.orm.query.Query
+        """
+        return query.order_by(*[
+            c.desc() if desc != reverse else c.asc() for c, desc in order
+        ])
+
+    def _page(self, query, order, start, length, count, key):
+        """
+        Return the rows of the requested page.
+
+        :param query: the query, with any search applied
+        :type query: sqlalchemy.orm.query.Query
+        :param order: return value of :py:meth:`~._order_columns`
+        :type order: list
+        :param start: index of the first row of the page
+        :type start: int
+        :param length: page length, or -1 for all rows
+        :type length: int
+        :param count: number of rows matching ``query``
+        :type count: int
+        :param key: return value of :py:meth:`~._keyset_key`
+        :type key: str
+        :rtype: list
+        """
+        if length < 0:
+            return self._ordered(query, order).offset(start).all()
+        if start > 0 and self.params.get('keyset[key]') == key:
+            for param, reverse in [
+                ('keyset[after]', False), ('keyset[before]', True)
+            ]:
+                if param not in self.params:
+                    continue
+                boundary = self._boundary(self.params[param], order)
+                if boundary is None:
+                    break
+                rows = self._ordered(
+                    query.filter(self._seek(
+                        [(c, desc != reverse) for c, desc in order], boundary
+                    )), order, reverse=reverse
+                ).limit(length).all()
+                return rows[::-1] if reverse else rows
+        if start > count // 2 and start < count:
+            # closer to the end; count back from it
+            n = min(length, count - start)
+            rows = self._ordered(query, order, reverse=True).offset(
+                count - start - n
+            ).limit(n).all()
+            return rows[::-1]
+        return self._ordered(query, order).offset(start).limit(length).all()
 
 
 class SearchableAjaxView(MethodView):
@@ -43,6 +299,29 @@ class SearchableAjaxView(MethodView):
     MethodView with helper methods for searching via DataTables ajax.
     """
 
+    #: Whether :py:meth:`~._datatable` returns a :py:class:`~.KeysetDataTable`
+    #: (True) or a plain OFFSET/LIMIT ``datatables.DataTable`` (False).
+    keyset_pagination = True
+
+    def _datatable(self, params, model, query, columns):
+        """
+        Return the DataTable for a request; a :py:class:`~.KeysetDataTable`
+        if :py:attr:`~.keyset_pagination` is True, otherwise a
+        ``datatables.DataTable``. The arguments are those of
+        ``datatables.DataTable``.
+
+        :param params: request parameters
+        :type params: dict
+        :param model: the model class of the rows
+        :param query: query for all rows
+        :type query: sqlalchemy.orm.query.Query
+        :param columns: column definitions
+        :type columns: list
+        :rtype: datatables.DataTable
+        """
+        cls = KeysetDataTable if self.keyset_pagination else DataTable
+        return cls(params, model, query, columns)
+
     def _args_dict(self, args):
         """
         Given a 1-dimensional dict of request parameters like those used by
@@ -38,7 +38,6 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 import logging
 from flask.views import MethodView
 from flask import render_template, jsonify, request
-from datatables import DataTable
 from copy import copy
 from datetime import datetime
 from decimal import Decimal
@@ -49,6 +48,7 @@ from biweeklybudget.models.transaction import Transaction
 from biweeklybudget.models.budget_transaction import BudgetTransaction
 from biweeklybudget.models.account import Account
 from biweeklybudget.models.budget_model import Budget
+from biweeklybudget.models.search_token import transaction_search
 from biweeklybudget.flaskapp.views.searchableajaxview import SearchableAjaxView
 from biweeklybudget.flaskapp.views.formhandlerview import FormHandlerView
 
@@ -159,6 +159,7 @@ class TransactionsAjax(SearchableAjaxView):
         if s != '' and s != 'FILTERHACK':
             if len(s) < 3:
                 return qs
+            qs = transaction_search.filter(qs, s)
             s = '%' + s + '%'
             qs = qs.filter(Transaction.description.like(s))
         return qs
@@ -171,7 +172,7 @@ class TransactionsAjax(SearchableAjaxView):
         args_dict = self._args_dict(args)
         if self._have_column_search(args_dict) and args['search[value]'] == '':
             args['search[value]'] = 'FILTERHACK'
-        table = DataTable(
+        table = self._datatable(
             args, Transaction, db_session.query(Transaction),
             [
                 (
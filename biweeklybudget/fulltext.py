@@ -0,0 +1,354 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/biweeklybudget>
+
+################################################################################
+Copyright 2016-2024 Jason Antman <http://www.jasonantman.com>
+
+    This file is part of biweeklybudget, also known as biweeklybudget.
+
+    biweeklybudget is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    biweeklybudget is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with biweeklybudget.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/biweeklybudget> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+
+import re
+import logging
+from sqlalchemy import DDL, and_, select, text, tuple_
+
+logger = logging.getLogger(__name__)
+
+#: Shortest search term that is matched against a full-text index. This is
+#: the default ``innodb_ft_min_token_size`` of MySQL; shorter words are not
+#: in a MySQL FULLTEXT index, so the same limit is used for the local index.
+MIN_TOKEN_LENGTH = 3
+
+#: Longest token stored in the local index; longer words are truncated.
+MAX_TOKEN_LENGTH = 64
+
+#: Number of records whose local index tokens are deleted per query.
+CHUNK_SIZE = 500
+
+#: InnoDB's default full-text stopword list. These words are never in a MySQL
+#: FULLTEXT index, so they can't be required in a native search.
+INNODB_STOPWORDS = frozenset([
+    'a', 'about', 'an', 'are', 'as', 'at', 'be', 'by', 'com', 'de', 'en',
+    'for', 'from', 'how', 'i', 'in', 'is', 'it', 'la', 'of', 'on', 'or',
+    'that', 'the', 'this', 'to', 'was', 'what', 'when', 'where', 'who',
+    'will', 'with', 'und', 'www'
+])
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+_WORD_START_RE = re.compile(r'(?<=\s)\w+', re.UNICODE)
+
+
+def tokenize(*values):
+    """
+    Return the set of lower-cased word tokens in the given strings, each
+    truncated to :py:const:`~.MAX_TOKEN_LENGTH` characters. ``None`` values
+    are ignored.
+
+    :param values: strings to tokenize
+    :type values: str
+    :return: tokens in all of the values
+    :rtype: set
+    """
+    tokens = set()
+    for value in values:
+        if value is None:
+            continue
+        tokens.update(
+            t.lower()[:MAX_TOKEN_LENGTH] for t in _TOKEN_RE.findall(value)
+        )
+    return tokens
+
+
+def search_terms(s):
+    """
+    Return the sorted list of tokens in a search string that are at least
+    :py:const:`~.MIN_TOKEN_LENGTH` characters long, and can therefore be
+    matched against a full-text index.
+
+    :param s: user search string
+    :type s: str
+    :rtype: list
+    """
+    return sorted(t for t in tokenize(s) if len(t) >= MIN_TOKEN_LENGTH)
+
+
+def substring_terms(s):
+    """
+    Return the sorted list of search terms (see :py:func:`~.search_terms`)
+    that must begin a word in any text matching ``LIKE '%s%'``. These are the
+    tokens preceded by whitespace in ``s``; the first token of ``s`` may be
+    the end of a longer word in the matching text (e.g. ``zon mkt`` matches
+    ``AMAZON MKTPLACE``), so it isn't used unless ``s`` begins with
+    whitespace. Tokens containing ``_`` are also skipped, as it matches any
+    single character in a ``LIKE`` pattern.
+
+    :param s: user search string
+    :type s: str
+    :rtype: list
+    """
+    return sorted(set(
+        t for t in tokenize(*_WORD_START_RE.findall(s))
+        if len(t) >= MIN_TOKEN_LENGTH and '_' not in t
+    ))
+
+
+def is_native(bind):
+    """
+    Return whether or not the database behind ``bind`` has native full-text
+    indexes (i.e. is MySQL/MariaDB). If so, search uses ``FULLTEXT`` indexes
+    and the local token index is not maintained.
+
+    :param bind: database Engine or Connection
+    :type bind: sqlalchemy.engine.Connectable
+    :rtype: bool
+    """
+    return bind.dialect.name == 'mysql'
+
+
+def fulltext_index_ddl(table_name, index_name, column_names):
+    """
+    Return a DDL statement that creates a MySQL ``FULLTEXT`` index, for use
+    as an ``after_create`` listener on a model's Table. It is only executed
+    on MySQL; other databases use a :py:class:`~.SearchIndex`'s local token
+    table instead.
+
+    :param table_name: name of the table to index
+    :type table_name: str
+    :param index_name: name of the index
+    :type index_name: str
+    :param column_names: names of the columns to index
+    :type column_names: list
+    :rtype: sqlalchemy.schema.DDL
+    """
+    return DDL(
+        'CREATE FULLTEXT INDEX %s ON %s (%s)' % (
+            index_name, table_name, ', '.join(column_names)
+        )
+    ).execute_if(dialect='mysql')
+
+
+class SearchIndex(object):
+    """
+    Token-based full-text search over some text columns of a model, used in
+    place of ``LIKE '%term%'`` filters that can't use an index.
+
+    On MySQL, searches use ``MATCH ... AGAINST`` on a ``FULLTEXT`` index of
+    the columns (see :py:func:`~.fulltext_index_ddl`). On other databases,
+    the lower-cased word tokens of each record are stored in a token table,
+    one row per (token, record) with the token first in the primary key; a
+    search term is then an index range scan for tokens beginning with it,
+    joined to the model's table by primary key.
+    The token table is kept up to date by the
+    :py:func:`~.handle_search_index` ``after_flush`` event handler, and by
+    :py:meth:`~.index_mappings` for records inserted without the ORM.
+
+    Each search term matches records with any word beginning with the term,
+    in any of the indexed columns; records must match all of the terms. Only
+    the terms returned by :py:func:`~.substring_terms` are used, so that the
+    search never excludes a record that a ``LIKE '%s%'`` filter on one of the
+    indexed columns would match. It narrows the records to be scanned, and
+    the ``LIKE`` filter must still be applied to its results; if the search
+    string has no such terms, it is a plain ``LIKE`` scan.
+    """
+
+    def __init__(self, model, columns, token_model, key_map):
+        """
+        :param model: the model class to search
+        :type model: biweeklybudget.models.base.Base
+        :param columns: names of the text attributes of ``model`` to index
+        :type columns: tuple
+        :param token_model: model class of the local token table; it must
+          have a ``token`` column, and the columns named in ``key_map``
+        :type token_model: biweeklybudget.models.base.Base
+        :param key_map: list of 2-tuples, mapping each primary key attribute
+          of ``model`` to the corresponding attribute of ``token_model``
+        :type key_map: tuple
+        """
+        self.model = model
+        self.columns = tuple(columns)
+        self.token_model = token_model
+        self.key_map = tuple(key_map)
+
+    def record_key(self, obj):
+        """
+        Return the primary key of a model instance or column mapping.
+
+        :param obj: instance of the model, or dict of its column values
+        :return: tuple of primary key values, in ``key_map`` order
+        :rtype: tuple
+        """
+        if isinstance(obj, dict):
+            return tuple(obj[k] for k, _ in self.key_map)
+        return tuple(getattr(obj, k) for k, _ in self.key_map)
+
+    def record_tokens(self, obj):
+        """
+        Return the tokens of the indexed columns of a model instance or
+        column mapping.
+
+        :param obj: instance of the model, or dict of its column values
+        :return: tokens in the indexed columns
+        :rtype: set
+        """
+        if isinstance(obj, dict):
+            return tokenize(*[obj.get(c) for c in self.columns])
+        return tokenize(*[getattr(obj, c) for c in self.columns])
+
+    def _key_clause(self, keys):
+        """
+        Return a clause matching token table rows for the given record keys.
+
+        :param keys: record keys, as returned by :py:meth:`~.record_key`
+        :type keys: list
+        """
+        tbl = self.token_model.__table__
+        if len(self.key_map) == 1:
+            return tbl.c[self.key_map[0][1]].in_([k[0] for k in keys])
+        return tuple_(
+            *[tbl.c[tk] for _, tk in self.key_map]
+        ).in_(keys)
+
+    def remove(self, session, keys):
+        """
+        Delete the local index tokens of the records with the given keys.
+
+        :param session: database session
+        :type session: sqlalchemy.orm.session.Session
+        :param keys: record keys, as returned by :py:meth:`~.record_key`
+        :type keys: list
+        """
+        keys = list(keys)
+        tbl = self.token_model.__table__
+        for i in range(0, len(keys), CHUNK_SIZE):
+            session.execute(
+                tbl.delete().where(self._key_clause(keys[i:i + CHUNK_SIZE]))
+            )
+
+    def index(self, session, records):
+        """
+        Replace the local index tokens of the given records.
+
+        :param session: database session
+        :type session: sqlalchemy.orm.session.Session
+        :param records: model instances or column mappings to index
+        :type records: list
+        """
+        records = list(records)
+        if len(records) == 0:
+            return
+        self.remove(session, [self.record_key(r) for r in records])
+        rows = []
+        for r in records:
+            key = dict(zip(
+                [tk for _, tk in self.key_map], self.record_key(r)
+            ))
+            for token in sorted(self.record_tokens(r)):
+                row = dict(key)
+                row['token'] = token
+                rows.append(row)
+        logger.debug(
+            'Indexing %d %s token(s) for %d record(s)', len(rows),
+            self.model.__name__, len(records)
+        )
+        if rows:
+            session.execute(self.token_model.__table__.insert(), rows)
+
+    def index_mappings(self, session, mappings):
+        """
+        Add the local index tokens for records inserted without the ORM, such
+        as by :py:meth:`sqlalchemy.orm.session.Session.bulk_insert_mappings`,
+        which the ``after_flush`` event handler doesn't see. Does nothing on
+        databases with native full-text indexes.
+
+        :param session: database session
+        :type session: sqlalchemy.orm.session.Session
+        :param mappings: column mappings of the inserted records
+        :type mappings: list
+        """
+        if is_native(session.get_bind()):
+            return
+        self.index(session, mappings)
+
+    def _prefix_clause(self, term):
+        """
+        Return a clause matching tokens that begin with ``term``, as a range
+        comparison that can use the token table's primary key index.
+
+        :param term: search term
+        :type term: str
+        """
+        col = self.token_model.__table__.c.token
+        upper = term[:-1] + chr(ord(term[-1]) + 1)
+        return and_(col >= term, col < upper)
+
+    def filter(self, query, s):
+        """
+        Filter a Query of the model to records matching every search term in
+        ``s`` that must begin a word in a substring match of ``s`` (see
+        :py:func:`~.substring_terms`). If ``s`` has no such terms, the Query
+        is returned unchanged.
+
+        :param query: Query of the model
+        :type query: sqlalchemy.orm.query.Query
+        :param s: user search string
+        :type s: str
+        :return: Query with the search applied
+        :rtype: sqlalchemy.orm.query.Query
+        """
+        terms = substring_terms(s)
+        if is_native(query.session.get_bind()):
+            terms = [t for t in terms if t not in INNODB_STOPWORDS]
+            if len(terms) == 0:
+                return query
+            cols = ', '.join(
+                '%s.%s' % (self.model.__tablename__, c) for c in self.columns
+            )
+            return query.filter(
+                text(
+                    'MATCH (%s) AGAINST (:fulltext_terms IN BOOLEAN MODE)'
+                    % cols
+                ).bindparams(
+                    fulltext_terms=' '.join('+%s*' % t for t in terms)
+                )
+            )
+        if len(terms) == 0:
+            return query
+        tbl = self.token_model.__table__
+        for term in terms:
+            matches = select(
+                [tbl.c[tk] for _, tk in self.key_map]
+            ).where(self._prefix_clause(term)).distinct().alias()
+            query = query.join(matches, and_(*[
+                matches.c[tk] == getattr(self.model, k)
+                for k, tk in self.key_map
+            ]))
+        return query
@@ -0,0 +1,239 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/biweeklybudget>
+
+################################################################################
+Copyright 2016-2024 Jason Antman <http://www.jasonantman.com>
+
+    This file is part of biweeklybudget, also known as biweeklybudget.
+
+    biweeklybudget is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    biweeklybudget is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with biweeklybudget.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/biweeklybudget> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+
+import os
+import json
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ImportManifest(object):
+    """
+    Persistent record of the OFX/QFX statement files under a statement save
+    directory that have been imported into the database. For each file, keyed
+    by its path relative to the save directory, the manifest stores the
+    SHA-256 hash, size and modification time of the file and the ID of the
+    :py:class:`~biweeklybudget.models.ofx_statement.OFXStatement` it was
+    imported as. This lets :py:class:`~.OfxBackfiller` skip files that
+    haven't changed since they were imported using only a ``stat()`` call,
+    without reading or parsing them.
+
+    The manifest is stored as JSON in :py:attr:`~.FILENAME` in the save
+    directory. It is not aware of the database itself; callers should
+    :py:meth:`~.prune` entries whose statements no longer exist (e.g. after
+    the database is restored from an older backup) so that those files are
+    imported again.
+    """
+
+    #: name of the manifest file in the save directory
+    FILENAME = '.import_manifest.json'
+
+    #: size of the blocks that files are read in to hash them
+    HASH_BLOCK_SIZE = 1024 * 1024
+
+    def __init__(self, savedir):
+        """
+        Load the manifest for a statement save directory, if it exists.
+
+        :param savedir: statement save directory
+        :type savedir: str
+        """
+        self.savedir = savedir
+        self.path = os.path.join(savedir, self.FILENAME)
+        self._entries = {}
+        self._dirty = False
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as fh:
+                self._entries = json.load(fh)
+        logger.debug(
+            'Loaded %d import manifest entries from %s', len(self._entries),
+            self.path
+        )
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _key(self, path):
+        """
+        Return the manifest key for a file; its path relative to the save
+        directory, with forward slashes.
+
+        :param path: path to the file
+        :type path: str
+        :return: manifest key
+        :rtype: str
+        """
+        return os.path.relpath(path, self.savedir).replace(os.sep, '/')
+
+    @classmethod
+    def hash_file(cls, path):
+        """
+        Return the hex SHA-256 digest of a file's contents.
+
+        :param path: path to the file
+        :type path: str
+        :return: hex digest
+        :rtype: str
+        """
+        h = hashlib.sha256()
+        with open(path, 'rb') as fh:
+            for block in iter(lambda: fh.read(cls.HASH_BLOCK_SIZE), b''):
+                h.update(block)
+        return h.hexdigest()
+
+    def get(self, path):
+        """
+        Return the manifest entry for a file, or None if it is not in the
+        manifest. Entries are dicts with keys ``sha256``, ``size``,
+        ``mtime_ns`` and ``statement_id``.
+
+        :param path: path to the file
+        :type path: str
+        :return: manifest entry
+        :rtype: dict
+        """
+        return self._entries.get(self._key(path))
+
+    def is_unchanged(self, path, verify=False):
+        """
+        Return whether a file is in the manifest and unchanged since it was
+        recorded. By default, this only compares the size and modification
+        time of the file to the manifest. If ``verify`` is True, the file is
+        instead hashed and its hash compared to the manifest; if it matches
+        but the size or mtime has changed, the entry is updated.
+
+        :param path: path to the file
+        :type path: str
+        :param verify: whether to compare file hashes instead of stat results
+        :type verify: bool
+        :return: whether the file is unchanged since it was recorded
+        :rtype: bool
+        """
+        entry = self.get(path)
+        if entry is None:
+            return False
+        st = os.stat(path)
+        if not verify:
+            return (
+                entry['size'] == st.st_size and
+                entry['mtime_ns'] == st.st_mtime_ns
+            )
+        if self.hash_file(path) != entry['sha256']:
+            logger.info('Import manifest hash mismatch for %s', path)
+            return False
+        if entry['size'] != st.st_size or entry['mtime_ns'] != st.st_mtime_ns:
+            entry['size'] = st.st_size
+            entry['mtime_ns'] = st.st_mtime_ns
+            self._dirty = True
+        return True
+
+    def record(self, path, statement_id):
+        """
+        Record that a file was imported (or was found to already have been
+        imported) as the specified statement.
+
+        :param path: path to the file
+        :type path: str
+        :param statement_id: ID of the OFXStatement for the file
+        :type statement_id: int
+        """
+        st = os.stat(path)
+        self._entries[self._key(path)] = {
+            'sha256': self.hash_file(path),
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+            'statement_id': statement_id
+        }
+        self._dirty = True
+
+    def statement_ids(self):
+        """
+        Return the OFXStatement IDs recorded in the manifest.
+
+        :return: set of statement IDs
+        :rtype: set
+        """
+        return set(
+            e['statement_id'] for e in self._entries.values()
+            if e.get('statement_id') is not None
+        )
+
+    def prune(self, statement_ids):
+        """
+        Remove all entries whose OFXStatement ID is not in ``statement_ids``,
+        so that the files they are for are no longer considered unchanged
+        and will be imported again.
+
+        :param statement_ids: IDs of the statements that exist in the database
+        :type statement_ids: set
+        :return: number of entries removed
+        :rtype: int
+        """
+        remove = [
+            k for k, e in self._entries.items()
+            if e.get('statement_id') not in statement_ids
+        ]
+        for k in remove:
+            logger.debug(
+                'Removing import manifest entry for %s; statement %s not '
+                'found', k, self._entries[k].get('statement_id')
+            )
+            del self._entries[k]
+        if remove:
+            self._dirty = True
+        return len(remove)
+
+    def save(self):
+        """
+        Write the manifest to disk, if it has changed since it was loaded or
+        last saved. The file is written to a temporary file and then renamed
+        into place, so an interrupted save does not corrupt it.
+        """
+        if not self._dirty:
+            return
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as fh:
+            json.dump(self._entries, fh, sort_keys=True, indent=1)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+        logger.debug(
+            'Saved %d import manifest entries to %s', len(self._entries),
+            self.path
+        )
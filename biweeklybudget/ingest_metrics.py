@@ -0,0 +1,374 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/biweeklybudget>
+
+################################################################################
+Copyright 2016-2024 Jason Antman <http://www.jasonantman.com>
+
+    This file is part of biweeklybudget, also known as biweeklybudget.
+
+    biweeklybudget is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    biweeklybudget is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with biweeklybudget.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/biweeklybudget> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from timeit import default_timer
+
+logger = logging.getLogger(__name__)
+
+#: Per-thread stack of the active :py:class:`~.IngestMetrics` instances.
+_local = threading.local()
+
+
+def _active():
+    """
+    Return the current thread's stack of active :py:class:`~.IngestMetrics`.
+
+    :rtype: list
+    """
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+def current():
+    """
+    Return the innermost :py:class:`~.IngestMetrics` that is active (i.e.
+    used as a context manager) in the current thread, or None.
+
+    :rtype: IngestMetrics or None
+    """
+    stack = _active()
+    if len(stack) == 0:
+        return None
+    return stack[-1]
+
+
+@contextmanager
+def stage(name):
+    """
+    Context manager to time a stage of the current thread's active
+    :py:class:`~.IngestMetrics`, if any; otherwise, a no-op. This allows code
+    that's shared with non-import paths (such as the ``before_flush`` event
+    handler) to be instrumented without knowing whether an import is running.
+
+    :param name: name of the stage
+    :type name: str
+    """
+    m = current()
+    if m is None:
+        yield
+        return
+    with m.stage(name):
+        yield
+
+
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    """
+    SQLAlchemy engine ``before_cursor_execute`` event listener, to count the
+    queries issued while an :py:class:`~.IngestMetrics` is active in the
+    current thread. Registered by
+    :py:func:`~biweeklybudget.db_event_handlers.init_event_listeners`.
+    """
+    m = current()
+    if m is not None:
+        m.queries += 1
+
+
+class IngestMetrics(object):
+    """
+    Per-stage timing, row and query counts for the import of one statement.
+
+    When used as a context manager, the instance is made active for the
+    current thread, so that :py:func:`~.stage` and :py:func:`~.count_query`
+    record into it; any time within the ``with`` block that isn't inside a
+    stage is recorded as the ``other`` stage. Stage times are exclusive; the
+    time spent in a stage nested within another (such as the
+    ``before_flush`` handlers within ``commit``) is only counted in the inner
+    stage, so the stage times always add up to :py:attr:`~.total`.
+    """
+
+    def __init__(self, source, account_id=None, filename=None):
+        """
+        :param source: the kind of import, i.e. ``ofx``, ``ofx-stream`` or
+          ``plaid``
+        :type source: str
+        :param account_id: ID of the Account the statement is for
+        :type account_id: int
+        :param filename: statement file name
+        :type filename: str
+        """
+        self.source = source
+        self.account_id = account_id
+        self.filename = filename
+        #: dict of stage name to seconds, in the order first entered
+        self.stages = OrderedDict()
+        #: number of transactions (or positions) in the statement
+        self.rows = 0
+        #: count of new OFXTransactions created
+        self.count_new = 0
+        #: count of existing OFXTransactions updated
+        self.count_updated = 0
+        #: number of SQL statements executed
+        self.queries = 0
+        # stack of [name, start, seconds spent in nested stages]
+        self._frames = []
+        self._start = None
+        self._staged = 0.0
+
+    def __enter__(self):
+        _active().append(self)
+        self._start = default_timer()
+        self._staged = 0.0
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        other = default_timer() - self._start - self._staged
+        if other > 0:
+            self.add_stage('other', other)
+        _active().remove(self)
+        return False
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Context manager to time one stage of the import. A stage may be
+        entered more than once; its times are summed.
+
+        :param name: name of the stage
+        :type name: str
+        """
+        self.stages.setdefault(name, 0.0)
+        frame = [name, default_timer(), 0.0]
+        self._frames.append(frame)
+        try:
+            yield
+        finally:
+            self._frames.pop()
+            elapsed = default_timer() - frame[1]
+            self.add_stage(name, elapsed - frame[2])
+            if len(self._frames) > 0:
+                self._frames[-1][2] += elapsed
+            else:
+                self._staged += elapsed
+
+    def add_stage(self, name, secs):
+        """
+        Add time that was measured elsewhere (such as parsing, which happens
+        before the import starts) to a stage.
+
+        :param name: name of the stage
+        :type name: str
+        :param secs: seconds to add
+        :type secs: float
+        """
+        self.stages[name] = self.stages.get(name, 0.0) + secs
+
+    @property
+    def total(self):
+        """
+        Total seconds spent in all stages.
+
+        :rtype: float
+        """
+        return sum(self.stages.values())
+
+    @property
+    def rows_per_sec(self):
+        """
+        Rows imported per second of :py:attr:`~.total` time, or None if no
+        time has been recorded.
+
+        :rtype: float
+        """
+        if self.total <= 0:
+            return None
+        return self.rows / self.total
+
+    @property
+    def as_dict(self):
+        """
+        Return a JSON-serializable dict representation of the metrics.
+
+        :rtype: dict
+        """
+        return {
+            'source': self.source,
+            'account_id': self.account_id,
+            'filename': self.filename,
+            'stages': dict(self.stages),
+            'rows': self.rows,
+            'count_new': self.count_new,
+            'count_updated': self.count_updated,
+            'queries': self.queries,
+            'total_secs': self.total,
+            'rows_per_sec': self.rows_per_sec
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        """
+        Return an instance from its :py:attr:`~.as_dict` representation, such
+        as in an OFX API response.
+
+        :param d: dict representation of the metrics
+        :type d: dict
+        :rtype: IngestMetrics
+        """
+        m = cls(
+            d.get('source'), account_id=d.get('account_id'),
+            filename=d.get('filename')
+        )
+        for name, secs in d.get('stages', {}).items():
+            m.add_stage(name, secs)
+        for k in ['rows', 'count_new', 'count_updated', 'queries']:
+            setattr(m, k, d.get(k, 0))
+        return m
+
+
+class IngestResult(namedtuple(
+    'IngestResult', ['statement_id', 'count_new', 'count_updated']
+)):
+    """
+    The result of importing one statement: a 3-tuple of the int ID of the
+    :py:class:`~biweeklybudget.models.ofx_statement.OFXStatement` created,
+    int count of new :py:class:`~.OFXTransaction` created and int count of
+    :py:class:`~.OFXTransaction` updated, with the :py:class:`~.IngestMetrics`
+    for the import (or None) as the ``metrics`` attribute.
+    """
+
+    #: the :py:class:`~.IngestMetrics` for the import, or None
+    metrics = None
+
+    def __new__(cls, statement_id, count_new, count_updated, metrics=None):
+        self = super(IngestResult, cls).__new__(
+            cls, statement_id, count_new, count_updated
+        )
+        self.metrics = metrics
+        return self
+
+
+class IngestSummary(object):
+    """
+    Aggregate of the :py:class:`~.IngestMetrics` for all statements imported
+    in one run, such as of ``ofxgetter`` or ``ofxbackfiller``.
+    """
+
+    def __init__(self):
+        self.statements = 0
+        self.rows = 0
+        self.count_new = 0
+        self.count_updated = 0
+        self.queries = 0
+        #: dict of stage name to total seconds, in the order first seen
+        self.stages = OrderedDict()
+
+    def add(self, metrics):
+        """
+        Add the metrics for one statement to the summary.
+
+        :param metrics: the metrics to add; None is ignored
+        :type metrics: IngestMetrics
+        """
+        if metrics is None:
+            return
+        self.statements += 1
+        self.rows += metrics.rows
+        self.count_new += metrics.count_new
+        self.count_updated += metrics.count_updated
+        self.queries += metrics.queries
+        for name, secs in metrics.stages.items():
+            self.stages[name] = self.stages.get(name, 0.0) + secs
+
+    @property
+    def total(self):
+        """
+        Total seconds spent in all stages, for all statements.
+
+        :rtype: float
+        """
+        return sum(self.stages.values())
+
+    @property
+    def rows_per_sec(self):
+        """
+        Rows imported per second of :py:attr:`~.total` time, or None if no
+        time has been recorded.
+
+        :rtype: float
+        """
+        if self.total <= 0:
+            return None
+        return self.rows / self.total
+
+    @property
+    def as_dict(self):
+        """
+        Return a JSON-serializable dict representation of the summary.
+
+        :rtype: dict
+        """
+        return {
+            'statements': self.statements,
+            'stages': dict(self.stages),
+            'rows': self.rows,
+            'count_new': self.count_new,
+            'count_updated': self.count_updated,
+            'queries': self.queries,
+            'total_secs': self.total,
+            'rows_per_sec': self.rows_per_sec
+        }
+
+    def report(self):
+        """
+        Format the summary as a plain text table of per-stage time.
+
+        :return: report
+        :rtype: str
+        """
+        lines = [
+            'Imported %d statement(s): %d row(s) (%d new, %d updated), %d '
+            'queries in %.3fs (%s rows/sec)' % (
+                self.statements, self.rows, self.count_new,
+                self.count_updated, self.queries, self.total,
+                '-' if self.rows_per_sec is None
+                else '%.1f' % self.rows_per_sec
+            ),
+            '%-16s  %9s  %6s' % ('Stage', 'Seconds', 'Pct')
+        ]
+        total = self.total
+        for name, secs in sorted(
+            self.stages.items(), key=lambda x: x[1], reverse=True
+        ):
+            lines.append('%-16s  %9.3f  %5.1f%%' % (
+                name, secs, (secs / total * 100) if total > 0 else 0
+            ))
+        return '\n'.join(lines)
@@ -35,10 +35,12 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 ################################################################################
 """
 
+import sys
 import argparse
 import logging
 
-from biweeklybudget.db import init_db
+from biweeklybudget.db import init_db, db_session
+from biweeklybudget.models.transaction import Transaction
 from biweeklybudget.cliutils import set_log_debug, set_log_info
 
 logger = logging.getLogger(__name__)
@@ -48,6 +50,15 @@ def parse_args():
     p = argparse.ArgumentParser(description='Load initial data to DB')
     p.add_argument('-v', '--verbose', dest='verbose', action='count', default=0,
                    help='verbose output. specify twice for debug-level output.')
+    p.add_argument('--check-amounts', dest='check_amounts',
+                   action='store_true', default=False,
+                   help='after initializing the DB, check that the stored '
+                   'actual_amount of every Transaction matches its '
+                   'BudgetTransactions; exit 1 if any do not')
+    p.add_argument('--fix-amounts', dest='fix_amounts', action='store_true',
+                   default=False,
+                   help='like --check-amounts, but correct any Transactions '
+                   'that do not match')
     args = p.parse_args()
     return args
 
@@ -71,6 +82,19 @@ def main():
     logger.info('Initializing DB...')
     init_db()
     logger.info('Done initializing database')
+    if not args.check_amounts and not args.fix_amounts:
+        return
+    res = Transaction.check_actual_amounts(db_session, fix=args.fix_amounts)
+    if args.fix_amounts:
+        db_session.commit()
+        print('Fixed actual_amount of %d Transaction(s)' % len(res))
+        return
+    print(
+        '%d Transaction(s) have an actual_amount that does not match their '
+        'BudgetTransactions' % len(res)
+    )
+    if len(res) > 0:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -36,11 +36,18 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 """
 
 import logging
+import threading
+from collections import OrderedDict
+from copy import deepcopy
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import timedelta
-from decimal import Decimal
+from decimal import Decimal, localcontext
 from dateutil.relativedelta import relativedelta
 from calendar import monthrange
+import numpy as np
 
+from biweeklybudget import settings
 from biweeklybudget.models.account import Account, AcctType
 
 logger = logging.getLogger(__name__)
@@ -93,6 +100,8 @@ class InterestHelper(object):
             Account.is_active.__eq__(True)
         ).all()
         res = {a.id: a for a in accts}
+        # load all of their latest balances in one query
+        Account.latest_balances(self._sess, res.keys())
         return res
 
     def _make_statements(self, accounts):
@@ -139,10 +148,53 @@ class InterestHelper(object):
         logger.debug('Minimum payments by account_id: %s', res)
         return res
 
-    def calculate_payoffs(self):
+    @property
+    def fingerprint(self):
+        """
+        Return a hashable fingerprint of all of the inputs to
+        :py:meth:`~.calculate_payoffs`: for each account, its ID, the ID, ledger
+        balance and ledger date of its latest :py:class:`~.AccountBalance`, its
+        effective APR, interest calculation and minimum payment class names and
+        last interest charge, plus the payment increases and onetimes. Two
+        InterestHelpers with the same fingerprint will calculate the same
+        payoffs.
+
+        :return: fingerprint of payoff calculation inputs
+        :rtype: tuple
+        """
+        return (
+            tuple(
+                (
+                    a_id,
+                    acct.balance.id,
+                    acct.balance.ledger,
+                    acct.balance.ledger_date,
+                    acct.effective_apr,
+                    acct.interest_class_name,
+                    acct.min_payment_class_name,
+                    acct.last_interest_charge
+                ) for a_id, acct in sorted(self._accounts.items())
+            ),
+            tuple(sorted(self._increases.items())),
+            tuple(sorted(self._onetimes.items()))
+        )
+
+    def calculate_payoffs(self, engine='decimal', processes=0):
         """
         Calculate payoffs for each account/statement.
 
+        Each payoff method is an independent simulation, so if ``processes``
+        is greater than zero they are run concurrently in a pool of up to that
+        many worker processes (see :py:meth:`~._calc_payoff_methods_parallel`).
+        If the pool cannot be used for any reason, the methods are calculated
+        synchronously in this process instead.
+
+        :param engine: payoff simulation engine to use; one of the keys of
+          :py:data:`~.PAYOFF_ENGINES`
+        :type engine: str
+        :param processes: maximum number of worker processes to calculate
+          payoff methods in; 0 to calculate them synchronously
+        :type processes: int
         :return: dict of payoff information. Keys are payoff method names.
           Values are dicts, with keys "description" (str description of the
           payoff method), "doc" (the docstring of the class), and "results".
@@ -151,8 +203,10 @@ class InterestHelper(object):
           "total_interest" (Decimal) and ``next_payment`` (Decimal).
         :rtype: dict
         """
-        res = {}
+        if engine not in PAYOFF_ENGINES:
+            raise ValueError('Unknown payoff engine: %s' % engine)
         max_total = sum(list(self.min_payments.values()))
+        methods = {}
         for name in sorted(PAYOFF_METHOD_NAMES.keys()):
             cls = PAYOFF_METHOD_NAMES[name]['cls']
             klass = cls(
@@ -160,24 +214,107 @@ class InterestHelper(object):
             )
             if not cls.show_in_ui:
                 continue
+            methods[name] = klass
+        parallel = None
+        if processes > 0 and len(methods) > 1:
+            try:
+                parallel = self._calc_payoff_methods_parallel(
+                    methods, engine, processes
+                )
+            except Exception as ex:
+                logger.warning(
+                    'Unable to calculate payoff methods in process pool; '
+                    'falling back to synchronous calculation: %s', ex
+                )
+        res = {}
+        for name, klass in methods.items():
             res[name] = {
                 'description': PAYOFF_METHOD_NAMES[name]['description'],
                 'doc': PAYOFF_METHOD_NAMES[name]['doc']
             }
             try:
-                res[name]['results'] = self._calc_payoff_method(klass)
+                if parallel is None:
+                    res[name]['results'] = self._calc_payoff_method(
+                        klass, engine=engine
+                    )
+                elif isinstance(parallel[name], Exception):
+                    raise parallel[name]
+                else:
+                    res[name]['results'] = self._format_payoff_results(
+                        parallel[name]
+                    )
             except Exception as ex:
                 res[name]['error'] = str(ex)
                 logger.error('Minimum payment method %s failed: %s',
                              name, ex)
         return res
 
-    def _calc_payoff_method(self, cls):
+    def _calc_payoff_methods_parallel(self, methods, engine, processes):
+        """
+        Calculate payoffs for multiple methods concurrently, in a pool of
+        worker processes. The statements are sent to the workers in the
+        compact form returned by :py:meth:`~.CCStatement.to_compact`.
+
+        Exceptions raised by individual payoff methods are returned in place
+        of their results; any other failure (i.e. statements that cannot be
+        serialized, or a worker process dying) is raised.
+
+        :param methods: dict of payoff method name to payoff method instance
+        :type methods: dict
+        :param engine: payoff simulation engine to use; one of the keys of
+          :py:data:`~.PAYOFF_ENGINES`
+        :type engine: str
+        :param processes: maximum number of worker processes to use
+        :type processes: int
+        :return: dict of payoff method name to the list of results returned
+          by the engine, or the Exception raised by it
+        :rtype: dict
+        """
+        stmts = [x.to_compact() for x in self._statements.values()]
+        res = {}
+        with ProcessPoolExecutor(
+            max_workers=min(processes, len(methods))
+        ) as executor:
+            futures = {
+                name: executor.submit(
+                    _calc_compact_payoff_method, klass, stmts, engine
+                ) for name, klass in methods.items()
+            }
+            for name, future in futures.items():
+                try:
+                    res[name] = future.result()
+                except BrokenProcessPool:
+                    raise
+                except Exception as ex:
+                    res[name] = ex
+        return res
+
+    def _calc_payoff_method(self, cls, engine='decimal'):
         """
         Calculate payoffs using one method.
 
         :param cls: payoff method class
         :type cls: biweeklybudget.interest._PayoffMethod
+        :param engine: payoff simulation engine to use; one of the keys of
+          :py:data:`~.PAYOFF_ENGINES`
+        :type engine: str
+        :return: Dict with integer `account_id` as the key, and values are
+          dicts with keys "payoff_months" (int), "total_payments" (Decimal),
+          "total_interest" (Decimal), "next_payment" (Decimal).
+        :rtype: dict
+        """
+        return self._format_payoff_results(_run_payoff_engine(
+            cls, list(self._statements.values()), engine
+        ))
+
+    def _format_payoff_results(self, calc):
+        """
+        Convert the list of results from one payoff method calculation into
+        the per-account dict returned by :py:meth:`~._calc_payoff_method`.
+
+        :param calc: list of (payoff months, total payments, next payment)
+          tuples, in the same order as ``self._statements``
+        :type calc: list
         :return: Dict with integer `account_id` as the key, and values are
           dicts with keys "payoff_months" (int), "total_payments" (Decimal),
           "total_interest" (Decimal), "next_payment" (Decimal).
@@ -187,7 +324,6 @@ class InterestHelper(object):
             x: self._statements[x].principal for x in self._statements.keys()
         }
         res = {}
-        calc = calculate_payoffs(cls, list(self._statements.values()))
         for idx, result in enumerate(calc):
             a_id = list(self._statements.keys())[idx]
             res[a_id] = {
@@ -199,6 +335,51 @@ class InterestHelper(object):
         return res
 
 
+def _run_payoff_engine(payment_method, statements, engine):
+    """
+    Calculate payoffs for one payoff method using the specified engine.
+
+    :param payment_method: payoff method to calculate
+    :type payment_method: _PayoffMethod
+    :param statements: list of statements to calculate payoffs for
+    :type statements: list
+    :param engine: payoff simulation engine to use; one of the keys of
+      :py:data:`~.PAYOFF_ENGINES`
+    :type engine: str
+    :return: list of (payoff months, total payments, next payment) tuples
+    :rtype: list
+    """
+    if engine == 'numpy':
+        return calculate_payoffs_vectorized(payment_method, statements)
+    if engine == 'numpy-checked':
+        return calculate_payoffs_checked(payment_method, statements)
+    return calculate_payoffs(payment_method, statements)
+
+
+def _calc_compact_payoff_method(payment_method, statements, engine):
+    """
+    Process pool worker for
+    :py:meth:`~.InterestHelper._calc_payoff_methods_parallel`; rebuild the
+    statements from their compact form and calculate payoffs for one method.
+
+    :param payment_method: payoff method to calculate
+    :type payment_method: _PayoffMethod
+    :param statements: list of compact statements, as returned by
+      :py:meth:`~.CCStatement.to_compact`
+    :type statements: list
+    :param engine: payoff simulation engine to use; one of the keys of
+      :py:data:`~.PAYOFF_ENGINES`
+    :type engine: str
+    :return: list of (payoff months, total payments, next payment) tuples
+    :rtype: list
+    """
+    return _run_payoff_engine(
+        payment_method,
+        [CCStatement.from_compact(x) for x in statements],
+        engine
+    )
+
+
 class _InterestCalculation(object):
 
     #: Human-readable string name of the interest calculation type.
@@ -239,6 +420,55 @@ class _InterestCalculation(object):
         """
         raise NotImplementedError("Must implement in subclass")
 
+    def calculate_by_day(self, principal, first_d, last_d, transactions={}):
+        """
+        Reference implementation of :py:meth:`~.calculate` that iterates over
+        every day of the statement period. This is much slower than
+        :py:meth:`~.calculate`, but simple enough to verify by inspection.
+
+        :param principal: balance at beginning of statement period
+        :type principal: decimal.Decimal
+        :param first_d: date of beginning of statement period
+        :type first_d: datetime.date
+        :param last_d: last date of statement period
+        :type last_d: datetime.date
+        :param transactions: dict of datetime.date to float amount adjust
+          the balance by on the specified dates.
+        :type transactions: dict
+        :return: dict describing the result: end_balance (float),
+          interest_paid (float)
+        :rtype: dict
+        """
+        raise NotImplementedError("Must implement in subclass")
+
+    @staticmethod
+    def _segments(first_d, last_d, transactions):
+        """
+        Split a statement period into segments at each transaction date.
+        Yields 2-tuples of the amount to adjust the balance by at the start
+        of the segment (or None for the first segment, if there is no
+        transaction on ``first_d``) and the number of days in the segment.
+
+        :param first_d: date of beginning of statement period
+        :type first_d: datetime.date
+        :param last_d: last date of statement period
+        :type last_d: datetime.date
+        :param transactions: dict of datetime.date to amount
+        :type transactions: dict
+        :return: generator of (amount, num_days) tuples
+        """
+        amt = None
+        d = first_d
+        for trans_d in sorted(
+            x for x in transactions.keys() if first_d <= x <= last_d
+        ):
+            if trans_d > d:
+                yield amt, (trans_d - d).days
+                amt = None
+            amt = transactions[trans_d]
+            d = trans_d
+        yield amt, (last_d - d).days + 1
+
 
 class AdbCompoundedDaily(_InterestCalculation):
     """
@@ -252,6 +482,57 @@ class AdbCompoundedDaily(_InterestCalculation):
         """
         Calculate compound interest for the specified principal.
 
+        Rather than iterating over every day of the period like
+        :py:meth:`~.calculate_by_day`, the period is split into segments at
+        each transaction date and the balance growth and sum of daily balances
+        for each segment are calculated with compound growth formulas. This
+        is calculated with additional precision, so results may differ from
+        :py:meth:`~.calculate_by_day` in the last few significant digits.
+
+        :param principal: balance at beginning of statement period
+        :type principal: decimal.Decimal
+        :param first_d: date of beginning of statement period
+        :type first_d: datetime.date
+        :param last_d: last date of statement period
+        :type last_d: datetime.date
+        :param transactions: dict of datetime.date to float amount adjust
+          the balance by on the specified dates.
+        :type transactions: dict
+        :return: dict describing the result: end_balance (float),
+          interest_paid (float)
+        :rtype: dict
+        """
+        with localcontext() as ctx:
+            ctx.prec += 10
+            dpr = self._apr / Decimal(365.0)
+            growth = 1 + dpr
+            bal_total = Decimal(0.0)
+            bal = principal
+            for amt, days in self._segments(first_d, last_d, transactions):
+                if amt is not None:
+                    bal += amt
+                seg_growth = growth ** days
+                if dpr == 0:
+                    bal_total += bal * days
+                else:
+                    # sum of the balance at the end of each day in segment
+                    bal_total += bal * growth * (seg_growth - 1) / dpr
+                bal *= seg_growth
+            num_days = (last_d - first_d).days + 1
+            adb = bal_total / Decimal(num_days)
+            final = adb * self._apr * num_days / Decimal(365.0)
+            bal += final * dpr
+        return {
+            'interest_paid': +final,
+            'end_balance': +bal
+        }
+
+    def calculate_by_day(self, principal, first_d, last_d,
+                         transactions={}):
+        """
+        Reference implementation of :py:meth:`~.calculate` that iterates over
+        every day of the statement period.
+
         :param principal: balance at beginning of statement period
         :type principal: decimal.Decimal
         :param first_d: date of beginning of statement period
@@ -302,6 +583,40 @@ class SimpleInterest(_InterestCalculation):
         """
         Calculate compound interest for the specified principal.
 
+        Unlike :py:meth:`~.calculate_by_day`, this does not iterate over every
+        day of the period; the end balance is simply the principal plus all
+        transactions within the period.
+
+        :param principal: balance at beginning of statement period
+        :type principal: decimal.Decimal
+        :param first_d: date of beginning of statement period
+        :type first_d: datetime.date
+        :param last_d: last date of statement period
+        :type last_d: datetime.date
+        :param transactions: dict of datetime.date to float amount adjust
+          the balance by on the specified dates.
+        :type transactions: dict
+        :return: dict describing the result: end_balance (float),
+          interest_paid (float)
+        :rtype: dict
+        """
+        bal = principal
+        for amt, _ in self._segments(first_d, last_d, transactions):
+            if amt is not None:
+                bal += amt
+        num_days = max((last_d - first_d).days + 1, 0)
+        final = bal * self._apr * num_days / Decimal(365.0)
+        return {
+            'interest_paid': final,
+            'end_balance': bal + final
+        }
+
+    def calculate_by_day(self, principal, first_d, last_d,
+                         transactions={}):
+        """
+        Reference implementation of :py:meth:`~.calculate` that iterates over
+        every day of the statement period.
+
         :param principal: balance at beginning of statement period
         :type principal: decimal.Decimal
         :param first_d: date of beginning of statement period
@@ -1010,6 +1325,68 @@ class CCStatement(object):
             self._principal, self._interest_amt
         )
 
+    def to_compact(self):
+        """
+        Return a compact, picklable representation of this statement, made up
+        only of builtin and Decimal/date types, suitable for sending to another
+        process. The interest calculation and minimum payment formula are
+        referenced by class name, so they must be present in
+        :py:data:`~.INTEREST_CALCULATION_NAMES` and
+        :py:data:`~.MIN_PAYMENT_FORMULA_NAMES` respectively. Reverse with
+        :py:meth:`~.from_compact`.
+
+        :return: compact representation of this statement
+        :rtype: tuple
+        :raises: TypeError if the statement's interest calculation or minimum
+          payment formula class cannot be referenced by name
+        """
+        icls = self._interest_cls.__class__.__name__
+        if INTEREST_CALCULATION_NAMES.get(icls, {}).get('cls') is not \
+                self._interest_cls.__class__:
+            raise TypeError(
+                'Cannot serialize interest calculation class %s' % icls
+            )
+        mcls = self._min_pay_cls.__class__.__name__
+        if MIN_PAYMENT_FORMULA_NAMES.get(mcls, {}).get('cls') is not \
+                self._min_pay_cls.__class__:
+            raise TypeError(
+                'Cannot serialize minimum payment formula class %s' % mcls
+            )
+        return (
+            icls,
+            self._interest_cls.apr,
+            self._orig_principal,
+            mcls,
+            self._billing_period.end_date,
+            self._billing_period.start_date,
+            tuple(sorted(self._transactions.items())),
+            self._principal,
+            self._interest_amt
+        )
+
+    @classmethod
+    def from_compact(cls, compact):
+        """
+        Construct a CCStatement from the compact representation returned by
+        :py:meth:`~.to_compact`.
+
+        :param compact: compact representation of a statement
+        :type compact: tuple
+        :return: statement
+        :rtype: CCStatement
+        """
+        icls, apr, principal, mcls, end_d, start_d, trans, end_bal, \
+            interest_amt = compact
+        return cls(
+            INTEREST_CALCULATION_NAMES[icls]['cls'](apr),
+            principal,
+            MIN_PAYMENT_FORMULA_NAMES[mcls]['cls'](),
+            _BillingPeriod(end_d, start_date=start_d),
+            transactions=dict(trans),
+            end_balance=end_bal,
+            interest_amt=interest_amt
+        )
+
     def next_with_transactions(self, transactions={}):
         """
         Return a new CCStatement reflecting the next billing period, with a
@@ -1043,6 +1420,285 @@ class CCStatement(object):
         })
 
 
+def _vector_min_payments(is_amex, is_discover, balance, interest):
+    """
+    Vectorized equivalent of :py:meth:`~._MinPaymentFormula.calculate` for
+    :py:func:`~.calculate_payoffs_vectorized`.
+
+    :param is_amex: boolean array, whether each statement uses
+      :py:class:`~.MinPaymentAmEx`
+    :type is_amex: numpy.ndarray
+    :param is_discover: boolean array, whether each statement uses
+      :py:class:`~.MinPaymentDiscover`; statements that use neither use
+      :py:class:`~.MinPaymentCiti`
+    :type is_discover: numpy.ndarray
+    :param balance: array of statement balances
+    :type balance: numpy.ndarray
+    :param interest: array of statement interest amounts
+    :type interest: numpy.ndarray
+    :return: array of minimum payments
+    :rtype: numpy.ndarray
+    """
+    # a balance under $25 is never the greatest Citi option, so ignore it
+    return np.where(
+        is_amex,
+        np.maximum(interest + (balance * 0.01), 35),
+        np.where(
+            is_discover,
+            np.maximum(np.maximum(balance * 0.02, 20 + interest), 35),
+            np.maximum(
+                np.maximum(
+                    (balance * 0.01) + interest, np.round(balance * 0.015)
+                ),
+                25
+            )
+        )
+    )
+
+
+def _vector_find_payments(payment_method, period, principal, apr, min_pay):
+    """
+    Vectorized equivalent of :py:meth:`~._PayoffMethod.find_payments` for
+    :py:func:`~.calculate_payoffs_vectorized`.
+
+    :param payment_method: payoff method to find payments for
+    :type payment_method: _PayoffMethod
+    :param period: billing period of the first statement
+    :type period: _BillingPeriod
+    :param principal: array of statement principal amounts
+    :type principal: numpy.ndarray
+    :param apr: array of statement APRs
+    :type apr: numpy.ndarray
+    :param min_pay: array of statement minimum payments
+    :type min_pay: numpy.ndarray
+    :return: array of payment amounts to make
+    :rtype: numpy.ndarray
+    """
+    method_cls = type(payment_method)
+    if method_cls == MinPaymentMethod:
+        return min_pay
+    if method_cls == FixedPaymentMethod:
+        return np.full(len(min_pay), float(payment_method._max_total))
+    max_total = float(payment_method.max_total_for_period(period))
+    min_sum = min_pay.sum()
+    # allow half a cent of float error, so this only raises where the Decimal
+    # comparison in find_payments would
+    if min_sum > max_total + 0.005:
+        raise TypeError(
+            'ERROR: Max total payment of %s is less than sum of minimum '
+            'payments (%s)' % (max_total, min_sum)
+        )
+    values = principal if method_cls in [
+        HighestBalanceFirstMethod, LowestBalanceFirstMethod
+    ] else apr
+    if method_cls in [
+        HighestBalanceFirstMethod, HighestInterestRateFirstMethod
+    ]:
+        if values.max() <= 0:
+            raise TypeError('No statement with a value greater than zero')
+        # argmax/argmin return the first index, like the Decimal methods
+        idx = values.argmax()
+    else:
+        idx = values.argmin()
+    res = min_pay.copy()
+    res[idx] = max_total - (min_sum - min_pay[idx])
+    return res
+
+
+def _vector_next_statements(is_adb, apr, principal, payment, months):
+    """
+    Vectorized equivalent of :py:meth:`~.CCStatement.pay`; calculate the
+    ending balance and interest charged for the next statement of each card,
+    with a payment made on the :py:attr:`~._BillingPeriod.payment_date`.
+
+    Rather than iterating over each day of the period, balances are
+    calculated with compound growth formulas between the start of the period,
+    the payment date and the end of the period.
+
+    :param is_adb: boolean array, whether each statement uses
+      :py:class:`~.AdbCompoundedDaily`; others use
+      :py:class:`~.SimpleInterest`
+    :type is_adb: numpy.ndarray
+    :param apr: array of APRs
+    :type apr: numpy.ndarray
+    :param principal: array of starting balances
+    :type principal: numpy.ndarray
+    :param payment: array of payment amounts
+    :type payment: numpy.ndarray
+    :param months: array of ``numpy.datetime64`` months of the new
+      statements' billing periods
+    :type months: numpy.ndarray
+    :return: 2-tuple of arrays of end balances and interest charged
+    :rtype: tuple
+    """
+    num_days = (
+        (months + 1).astype('datetime64[D]') - months.astype('datetime64[D]')
+    ).astype(np.int64)
+    # days before the payment date, and from the payment date to the end
+    before = (num_days - 1) // 2
+    after = num_days - before
+    dpr = apr / 365.0
+    growth = 1 + dpr
+    no_interest = dpr == 0
+    safe_dpr = np.where(no_interest, 1, dpr)
+
+    def growth_sum(n):
+        # sum of growth ** i for i in 1..n
+        return np.where(no_interest, n, growth * (growth ** n - 1) / safe_dpr)
+
+    mid = (principal * (growth ** before)) - payment
+    bal_total = (principal * growth_sum(before)) + (mid * growth_sum(after))
+    adb_interest = bal_total * apr / 365.0
+    adb_balance = (mid * (growth ** after)) + (adb_interest * dpr)
+    simple_bal = principal - payment
+    simple_interest = simple_bal * apr * num_days / 365.0
+    return (
+        np.where(is_adb, adb_balance, simple_bal + simple_interest),
+        np.where(is_adb, adb_interest, simple_interest)
+    )
+
+
+def calculate_payoffs_vectorized(payment_method, statements):
+    """
+    NumPy-backed equivalent of :py:func:`~.calculate_payoffs`. All
+    statements are simulated together as arrays in floating point, one
+    billing period per iteration, with each period's interest calculated in
+    closed form. The results are rounded to the cent.
+
+    Only the built-in interest calculations, minimum payment formulas and
+    payoff methods are supported; ``NotImplementedError`` is raised for any
+    other classes.
+
+    :param payment_method: method used for calculating payment amount to make
+      on each statement; subclass of _PayoffMethod
+    :type payment_method: _PayoffMethod
+    :param statements: list of :py:class:`~.CCStatement` objects to pay off.
+    :type statements: list
+    :return: list of (`int` number of billing periods, `decimal.Decimal`
+      amount paid, `decimal.Decimal` first payment amount) tuples for each item
+      in `statements`
+    :rtype: list
+    """
+    if type(payment_method) not in _VECTOR_PAYOFF_METHODS:
+        raise NotImplementedError(
+            'Payoff method %s is not supported by the vectorized payoff '
+            'engine' % payment_method
+        )
+    for s in statements:
+        if (
+            type(s._interest_cls) not in _VECTOR_INTEREST_CALCULATIONS or
+            type(s._min_pay_cls) not in _VECTOR_MIN_PAYMENT_FORMULAS
+        ):
+            raise NotImplementedError(
+                'Statement %s is not supported by the vectorized payoff '
+                'engine' % s
+            )
+    logger.debug(
+        'calculating vectorized payoff via %s for: %s',
+        payment_method, statements
+    )
+    is_adb = np.array(
+        [isinstance(s._interest_cls, AdbCompoundedDaily) for s in statements]
+    )
+    is_amex = np.array(
+        [isinstance(s._min_pay_cls, MinPaymentAmEx) for s in statements]
+    )
+    is_discover = np.array(
+        [isinstance(s._min_pay_cls, MinPaymentDiscover) for s in statements]
+    )
+    apr = np.array([float(s.apr) for s in statements])
+    principal = np.array([float(s.principal) for s in statements])
+    interest = np.array([float(s.interest) for s in statements])
+    months = np.array(
+        [s.end_date for s in statements], dtype='datetime64[M]'
+    )
+    first_months = months.copy()
+    done = np.zeros(len(statements), dtype=bool)
+    num_periods = np.zeros(len(statements), dtype=np.int64)
+    paid = np.zeros(len(statements))
+    next_pymt = np.full(len(statements), np.nan)
+    while not done.all():
+        u = np.flatnonzero(~done)
+        if months[u[0]] == first_months[u[0]]:
+            period = statements[u[0]].billing_period
+        else:
+            start = months[u[0]].astype(object)
+            period = _BillingPeriod(start, start_date=start)
+        to_pay = _vector_find_payments(
+            payment_method, period, principal[u], apr[u],
+            _vector_min_payments(
+                is_amex[u], is_discover[u], principal[u], interest[u]
+            )
+        )
+        zero = principal[u] <= 0
+        payoff = ~zero & (principal[u] <= to_pay)
+        paying = ~(zero | payoff)
+        done[u[zero | payoff]] = True
+        # the final payment is the remaining principal
+        to_pay = np.where(payoff, principal[u], to_pay)
+        p = u[~zero]
+        num_periods[p] += 1
+        paid[p] += to_pay[~zero]
+        next_pymt[p] = np.where(
+            np.isnan(next_pymt[p]), to_pay[~zero], next_pymt[p]
+        )
+        p = u[paying]
+        months[p] += 1
+        principal[p], interest[p] = _vector_next_statements(
+            is_adb[p], apr[p], principal[p], to_pay[paying], months[p]
+        )
+    return [
+        (
+            int(num_periods[i]),
+            _cents(paid[i]),
+            Decimal('0.0') if np.isnan(next_pymt[i]) else _cents(next_pymt[i])
+        ) for i in range(len(statements))
+    ]
+
+
+def _cents(amt):
+    """
+    Convert a float amount to a :py:class:`decimal.Decimal` rounded to cents.
+
+    :param amt: amount
+    :type amt: float
+    :rtype: decimal.Decimal
+    """
+    return Decimal('%.2f' % amt)
+
+
+def calculate_payoffs_checked(payment_method, statements):
+    """
+    Run both :py:func:`~.calculate_payoffs_vectorized` and
+    :py:func:`~.calculate_payoffs`, and raise a ``RuntimeError`` unless they
+    agree on the number of billing periods and to the cent on every amount.
+    Returns the result of :py:func:`~.calculate_payoffs_vectorized`.
+
+    :param payment_method: method used for calculating payment amount to make
+      on each statement; subclass of _PayoffMethod
+    :type payment_method: _PayoffMethod
+    :param statements: list of :py:class:`~.CCStatement` objects to pay off.
+    :type statements: list
+    :return: list of (`int` number of billing periods, `decimal.Decimal`
+      amount paid, `decimal.Decimal` first payment amount) tuples for each item
+      in `statements`
+    :rtype: list
+    """
+    vec = calculate_payoffs_vectorized(payment_method, statements)
+    dec = calculate_payoffs(payment_method, statements)
+    for idx, (v, d) in enumerate(zip(vec, dec)):
+        if (
+            v[0] != d[0] or
+            abs(v[1] - d[1]) >= Decimal('0.01') or
+            abs(v[2] - d[2]) >= Decimal('0.01')
+        ):
+            raise RuntimeError(
+                'Vectorized payoff %s for %s via %s does not match Decimal '
+                'payoff %s' % (v, statements[idx], payment_method, d)
+            )
+    return vec
+
+
 def subclass_dict(klass):
     d = {}
     for cls in klass.__subclasses__():
@@ -1064,3 +1720,143 @@ MIN_PAYMENT_FORMULA_NAMES = subclass_dict(_MinPaymentFormula)
 
 #: Dict mapping Payoff Method class names to their description and docstring.
 PAYOFF_METHOD_NAMES = subclass_dict(_PayoffMethod)
+
+#: Interest calculation classes supported by
+#: :py:func:`~.calculate_payoffs_vectorized`.
+_VECTOR_INTEREST_CALCULATIONS = [AdbCompoundedDaily, SimpleInterest]
+
+#: Minimum payment formula classes supported by
+#: :py:func:`~.calculate_payoffs_vectorized`.
+_VECTOR_MIN_PAYMENT_FORMULAS = [
+    MinPaymentAmEx, MinPaymentDiscover, MinPaymentCiti
+]
+
+#: Payoff method classes supported by
+#: :py:func:`~.calculate_payoffs_vectorized`.
+_VECTOR_PAYOFF_METHODS = [
+    MinPaymentMethod, FixedPaymentMethod, HighestBalanceFirstMethod,
+    HighestInterestRateFirstMethod, LowestBalanceFirstMethod,
+    LowestInterestRateFirstMethod
+]
+
+#: Dict mapping payoff simulation engine names, as accepted by
+#: :py:meth:`~.InterestHelper.calculate_payoffs`, to their descriptions.
+PAYOFF_ENGINES = {
+    'decimal': 'Decimal simulation',
+    'numpy': 'Vectorized NumPy simulation',
+    'numpy-checked': 'Vectorized NumPy simulation, cross-checked against the '
+                     'Decimal simulation'
+}
+
+
+class PayoffResultCache(object):
+    """
+    Process-wide cache of :py:meth:`~.InterestHelper.calculate_payoffs` results,
+    keyed by :py:attr:`~.InterestHelper.fingerprint` and the payoff engine.
+    Since the fingerprint is built from the current database state, a new
+    statement, interest charge, APR or payment setting results in a new key
+    and the old results are never returned. Entries are also dropped from the
+    ``before_flush`` event handler
+    (:py:func:`~.db_event_handlers.handle_payoff_cache_invalidation`) when any
+    of these change, so that they don't linger until evicted.
+
+    The maximum number of entries is set by
+    :py:attr:`~.settings.CREDIT_PAYOFF_CACHE_SIZE`; when full, the least
+    recently used entry is evicted. Setting it to 0 disables the cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def max_size(self):
+        """
+        Return the maximum number of entries to cache.
+
+        :return: maximum number of cache entries
+        :rtype: int
+        """
+        return getattr(settings, 'CREDIT_PAYOFF_CACHE_SIZE', 0) or 0
+
+    @property
+    def enabled(self):
+        """
+        Return whether or not the cache is enabled.
+
+        :rtype: bool
+        """
+        return self.max_size > 0
+
+    def calculate_payoffs(self, ih, engine='decimal', processes=0):
+        """
+        Return the result of ``ih.calculate_payoffs()``, from the cache if
+        present or else calculating and caching it.
+
+        :param ih: interest helper to calculate payoffs with
+        :type ih: InterestHelper
+        :param engine: payoff simulation engine to use; one of the keys of
+          :py:data:`~.PAYOFF_ENGINES`
+        :type engine: str
+        :param processes: maximum number of worker processes to calculate
+          payoff methods in; 0 to calculate them synchronously
+        :type processes: int
+        :return: 2-tuple of the :py:meth:`~.InterestHelper.calculate_payoffs`
+          result and a boolean, whether or not it came from the cache
+        :rtype: tuple
+        """
+        if not self.enabled:
+            return ih.calculate_payoffs(
+                engine=engine, processes=processes
+            ), False
+        key = (engine, ih.fingerprint)
+        with self._lock:
+            res = self._entries.get(key)
+            if res is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return deepcopy(res), True
+            self.misses += 1
+        res = ih.calculate_payoffs(engine=engine, processes=processes)
+        with self._lock:
+            self._entries[key] = deepcopy(res)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return res, False
+
+    def invalidate_all(self):
+        """
+        Remove all entries from the cache.
+        """
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    @property
+    def stats(self):
+        """
+        Return a dict of cache statistics.
+
+        :return: cache statistics
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+
+#: The process-wide :py:class:`~.PayoffResultCache` instance.
+payoff_cache = PayoffResultCache()
@@ -37,6 +37,9 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 
 from biweeklybudget.models.account import Account, AcctType
 from biweeklybudget.models.account_balance import AccountBalance
+from biweeklybudget.models.budget_balance import (
+    BudgetBalanceEntry, BudgetBalanceSnapshot
+)
 from biweeklybudget.models.budget_model import Budget
 from biweeklybudget.models.budget_transaction import BudgetTransaction
 from biweeklybudget.models.dbsetting import DBSetting
@@ -48,5 +51,8 @@ from biweeklybudget.models.plaid_items import PlaidItem
 from biweeklybudget.models.projects import Project, BoMItem
 from biweeklybudget.models.reconcile_rule import ReconcileRule
 from biweeklybudget.models.scheduled_transaction import ScheduledTransaction
+from biweeklybudget.models.search_token import (
+    TransactionSearchToken, OFXTransactionSearchToken
+)
 from biweeklybudget.models.transaction import Transaction
 from biweeklybudget.models.txn_reconcile import TxnReconcile
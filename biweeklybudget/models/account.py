@@ -38,11 +38,13 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 import logging
 from sqlalchemy import (
     Column, Integer, String, Boolean, Text, Enum, Numeric, inspect, or_,
-    ForeignKeyConstraint
+    ForeignKey, ForeignKeyConstraint, func
 )
 from datetime import timedelta
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship, backref
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
 from sqlalchemy.sql.expression import null
 from decimal import Decimal
 
@@ -190,6 +192,24 @@ class Account(Base, ModelAsDict):
         foreign_keys=[plaid_item_id, plaid_account_id]
     )
 
+    #: ID of the latest (highest ID) :py:class:`~.AccountBalance` for this
+    #: account. Set by :py:meth:`~.set_balance` and kept up to date by
+    #: :py:func:`~.db_event_handlers.handle_account_latest_balance`.
+    latest_balance_id = Column(
+        Integer,
+        ForeignKey(
+            'account_balances.id', use_alter=True, ondelete='SET NULL'
+        ),
+        nullable=True
+    )
+
+    #: Relationship to the latest :py:class:`~.AccountBalance` for this
+    #: account; see :py:attr:`~.balance`.
+    latest_balance = relationship(
+        'AccountBalance', foreign_keys=[latest_balance_id], post_update=True,
+        uselist=False
+    )
+
     def __repr__(self):
         return "<Account(id=%s, name='%s')>" % (
             self.id, self.name
@@ -277,7 +297,9 @@ class Account(Base, ModelAsDict):
         the account. Add it to the current session.
         """
         kwargs['account'] = self
-        inspect(self).session.add(AccountBalance(**kwargs))
+        bal = AccountBalance(**kwargs)
+        inspect(self).session.add(bal)
+        self.latest_balance = bal
 
     @property
     def ofx_statement(self):
@@ -296,12 +318,56 @@ class Account(Base, ModelAsDict):
         """
         Return the latest AccountBalance object for this Account.
 
+        This is the :py:attr:`~.latest_balance` relationship, so it is only
+        queried the first time it is accessed in a session, by primary key, and
+        not at all if the AccountBalance is already in the session (i.e. after
+        :py:meth:`~.latest_balances`).
+
         :return: latest AccountBalance for this Account
         :rtype: biweeklybudget.models.account_balance.AccountBalance
         """
-        sess = inspect(self).session
-        res = sess.query(AccountBalance).with_parent(self).order_by(
-            AccountBalance.id.desc()).limit(1).first()
+        return self.latest_balance
+
+    @staticmethod
+    def latest_balances(sess, account_ids=None):
+        """
+        Return the latest :py:class:`~.AccountBalance` for all Accounts, or for
+        the Accounts with the given IDs, in one greatest-per-group query. The
+        :py:attr:`~.latest_balance` of each of those Accounts that is already
+        loaded in ``sess`` is set to the result, so that accessing
+        :py:attr:`~.balance` on them doesn't run any more queries.
+
+        :param sess: active database session
+        :type sess: sqlalchemy.orm.session.Session
+        :param account_ids: IDs of the Accounts to return balances for, or None
+          for all Accounts
+        :type account_ids: list
+        :return: dict of Account ID to its latest AccountBalance; Accounts
+          without any balances are omitted
+        :rtype: dict
+        """
+        latest = sess.query(
+            func.max(AccountBalance.id).label('id')
+        ).group_by(AccountBalance.account_id)
+        if account_ids is not None:
+            account_ids = list(account_ids)
+            if len(account_ids) == 0:
+                return {}
+            latest = latest.filter(AccountBalance.account_id.in_(account_ids))
+        latest = latest.subquery()
+        res = {
+            b.account_id: b for b in sess.query(AccountBalance).join(
+                latest, latest.c.id.__eq__(AccountBalance.id)
+            )
+        }
+        if account_ids is None:
+            account_ids = [
+                k[1][0] for k in sess.identity_map.keys() if k[0] is Account
+            ]
+        for acct_id in account_ids:
+            acct = sess.identity_map.get(identity_key(Account, acct_id))
+            if acct is not None and not inspect(acct).modified:
+                set_committed_value(acct, 'latest_balance', res.get(acct_id))
         return res
 
     @property
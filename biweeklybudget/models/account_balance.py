@@ -57,7 +57,7 @@ class AccountBalance(Base, ModelAsDict):
 
     #: Relationship to :py:class:`~.Account` this balance is for
     account = relationship(
-        "Account", backref="all_balances"
+        "Account", backref="all_balances", foreign_keys=[account_id]
     )
 
     #: Ledger balance, or investment account value, or credit card balance
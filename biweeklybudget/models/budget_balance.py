@@ -0,0 +1,194 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/biweeklybudget>
+
+################################################################################
+Copyright 2016-2024 Jason Antman <http://www.jasonantman.com>
+
+    This file is part of biweeklybudget, also known as biweeklybudget.
+
+    biweeklybudget is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    biweeklybudget is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with biweeklybudget.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/biweeklybudget> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import logging
+from datetime import date, datetime
+from decimal import Decimal
+from sqlalchemy import (
+    Column, Integer, Numeric, Date, String, ForeignKey, Index,
+    UniqueConstraint, func
+)
+from sqlalchemy_utc import UtcDateTime
+from sqlalchemy.orm import relationship
+from biweeklybudget.models.base import Base, ModelAsDict
+from biweeklybudget.utils import dtnow
+
+logger = logging.getLogger(__name__)
+
+
+def month_start(dt):
+    """
+    Return the first day of the month containing ``dt``.
+
+    :param dt: date or datetime
+    :type dt: datetime.date
+    :rtype: datetime.date
+    """
+    if isinstance(dt, datetime):
+        dt = dt.date()
+    return date(year=dt.year, month=dt.month, day=1)
+
+
+class BudgetBalanceEntry(Base, ModelAsDict):
+    """
+    Append-only ledger of changes to the
+    :py:attr:`~.Budget.current_balance` of standing budgets. Entries are
+    created by :py:func:`~.handle_budget_balance_ledger` whenever a
+    :py:class:`~.BudgetTransaction` against a standing budget is added,
+    removed or changed, or the budget's balance is edited directly; they are
+    never updated or deleted. The sum of all entries for a budget is its
+    current balance, and the sum of entries up to and including a given
+    :py:attr:`~.date` is its balance as of that date.
+    """
+
+    __tablename__ = 'budget_balance_entries'
+    __table_args__ = (
+        Index(
+            'ix_budget_balance_entries_budget_id_date',
+            'budget_id', 'date'
+        ),
+        {'mysql_engine': 'InnoDB'}
+    )
+
+    #: Primary Key
+    id = Column(Integer, primary_key=True)
+
+    #: ID of the Budget this entry is for
+    budget_id = Column(Integer, ForeignKey('budgets.id'), nullable=False)
+
+    #: Relationship - the :py:class:`~.Budget` this entry is for
+    budget = relationship("Budget", uselist=False)
+
+    #: Effective date of the balance change; the date of the
+    #: :py:class:`~.Transaction` that caused it, or the date the change was
+    #: made for direct edits to the budget's balance.
+    date = Column(Date, nullable=False)
+
+    #: Amount the balance changed by; negative for spending from the budget.
+    amount = Column(Numeric(precision=10, scale=4), nullable=False)
+
+    #: ID of the Transaction that caused this change, if any
+    trans_id = Column(Integer, ForeignKey('transactions.id'))
+
+    #: Relationship - the :py:class:`~.Transaction` that caused this change,
+    #: if any
+    transaction = relationship("Transaction", uselist=False)
+
+    #: Short description of the reason for the change
+    note = Column(String(254))
+
+    #: time when this entry was created
+    created = Column(UtcDateTime, default=dtnow)
+
+    def __repr__(self):
+        return "<BudgetBalanceEntry(id=%s, budget_id=%s, date=%s, " \
+               "amount=%s)>" % (
+                   self.id, self.budget_id, self.date, self.amount
+               )
+
+    @staticmethod
+    def balance_as_of(db_session, budget_id, dt):
+        """
+        Return the balance of a standing budget at the end of the given date,
+        using the most recent :py:class:`~.BudgetBalanceSnapshot` on or before
+        ``dt`` plus the (at most one month of) ledger entries after it. Both
+        queries use the ``(budget_id, date)`` indexes, so this does not need
+        to read the budget's full history.
+
+        :param db_session: active database session to use for queries
+        :type db_session: sqlalchemy.orm.session.Session
+        :param budget_id: ID of the Budget to get the balance for
+        :type budget_id: int
+        :param dt: date to get the balance as of
+        :type dt: datetime.date
+        :return: balance at the end of ``dt``
+        :rtype: decimal.Decimal
+        """
+        if isinstance(dt, datetime):
+            dt = dt.date()
+        snap = db_session.query(BudgetBalanceSnapshot).filter(
+            BudgetBalanceSnapshot.budget_id.__eq__(budget_id),
+            BudgetBalanceSnapshot.date.__le__(dt)
+        ).order_by(BudgetBalanceSnapshot.date.desc()).first()
+        q = db_session.query(func.sum(BudgetBalanceEntry.amount)).filter(
+            BudgetBalanceEntry.budget_id.__eq__(budget_id),
+            BudgetBalanceEntry.date.__le__(dt)
+        )
+        balance = Decimal('0')
+        if snap is not None:
+            q = q.filter(BudgetBalanceEntry.date.__ge__(snap.date))
+            balance = snap.balance
+        return balance + (q.scalar() or Decimal('0'))
+
+
+class BudgetBalanceSnapshot(Base, ModelAsDict):
+    """
+    Monthly checkpoint of a standing budget's balance, derived from
+    :py:class:`~.BudgetBalanceEntry`. There is a snapshot for the first day of
+    every month that has at least one ledger entry for the budget, holding the
+    sum of all of the budget's entries dated *before* that day (i.e. the
+    opening balance for the month). Snapshots are created and kept up to date
+    by :py:func:`~.handle_budget_balance_snapshots`.
+    """
+
+    __tablename__ = 'budget_balance_snapshots'
+    __table_args__ = (
+        UniqueConstraint('budget_id', 'date'),
+        {'mysql_engine': 'InnoDB'}
+    )
+
+    #: Primary Key
+    id = Column(Integer, primary_key=True)
+
+    #: ID of the Budget this snapshot is for
+    budget_id = Column(Integer, ForeignKey('budgets.id'), nullable=False)
+
+    #: Relationship - the :py:class:`~.Budget` this snapshot is for
+    budget = relationship("Budget", uselist=False)
+
+    #: First day of the month this snapshot is for
+    date = Column(Date, nullable=False)
+
+    #: Balance at the start of :py:attr:`~.date`; the sum of all ledger
+    #: entries for the budget dated before it.
+    balance = Column(Numeric(precision=10, scale=4), nullable=False)
+
+    def __repr__(self):
+        return "<BudgetBalanceSnapshot(id=%s, budget_id=%s, date=%s, " \
+               "balance=%s)>" % (
+                   self.id, self.budget_id, self.date, self.balance
+               )
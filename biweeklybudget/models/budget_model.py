@@ -35,8 +35,9 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 ################################################################################
 """
 
-from sqlalchemy import Column, Integer, Numeric, Boolean, String
+from sqlalchemy import Column, Integer, Numeric, Boolean, String, inspect
 from biweeklybudget.models.base import Base, ModelAsDict
+from biweeklybudget.models.budget_balance import BudgetBalanceEntry
 
 
 class Budget(Base, ModelAsDict):
@@ -78,3 +79,20 @@ class Budget(Base, ModelAsDict):
         return "<Budget(id=%s, name=%s)>" % (
             self.id, self.name
         )
+
+    def balance_as_of(self, dt):
+        """
+        Return the balance of this standing budget at the end of the given
+        date, from the :py:class:`~.BudgetBalanceEntry` ledger. See
+        :py:meth:`~.BudgetBalanceEntry.balance_as_of`.
+
+        :param dt: date to get the balance as of
+        :type dt: datetime.date
+        :return: balance at the end of ``dt``, or None for periodic budgets
+        :rtype: decimal.Decimal
+        """
+        if self.is_periodic:
+            return None
+        return BudgetBalanceEntry.balance_as_of(
+            inspect(self).session, self.id, dt
+        )
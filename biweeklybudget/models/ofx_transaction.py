@@ -45,12 +45,12 @@ from sqlalchemy.orm import relationship
 from pytz import UTC
 from datetime import datetime
 import logging
-import re
 from decimal import Decimal
 
 from biweeklybudget.models.base import Base, ModelAsDict
 from biweeklybudget.models.ofx_statement import OFXStatement
 from biweeklybudget.settings import RECONCILE_BEGIN_DATE
+from biweeklybudget.ofx_classifier import classifier_for, classify_many
 
 logger = logging.getLogger(__name__)
 
@@ -108,6 +108,10 @@ class OFXTransaction(Base, ModelAsDict):
     #: OFX - Checknum
     checknum = Column(String(32))
 
+    #: Plaid ``transaction_id``, for transactions retrieved from Plaid; this
+    #: is usually also the FITID, unless the transaction has a reference number
+    plaid_transaction_id = Column(String(255), index=True)
+
     # app-specific fields
 
     #: Description
@@ -241,40 +245,79 @@ class OFXTransaction(Base, ModelAsDict):
     def update_is_fields(self):
         """
         Method to update all ``is_*`` fields on this instance, given the
-        ``re_*`` properties of :py:attr:`~.account`.
+        ``re_*`` properties of :py:attr:`~.account`. Only fields whose values
+        differ are set.
+        """
+        self._set_is_fields(
+            self.is_fields_for(self._is_fields_account(), self.name)
+        )
+
+    @staticmethod
+    def update_is_fields_many(txns):
+        """
+        Equivalent to calling :py:meth:`~.update_is_fields` on each of
+        ``txns``, but classifying all of the transactions for each Account
+        with a single call to :py:func:`~.ofx_classifier.classify_many`.
+
+        :param txns: the OFXTransactions to update
+        :type txns: list
+        """
+        by_acct = {}
+        for txn in txns:
+            by_acct.setdefault(txn._is_fields_account(), []).append(txn)
+        for acct, acct_txns in by_acct.items():
+            for txn, fields in zip(
+                acct_txns, classify_many(acct, [t.name for t in acct_txns])
+            ):
+                txn._set_is_fields(fields)
+
+    def _is_fields_account(self):
+        """
+        Return the Account to classify this transaction with; this is
+        :py:attr:`~.account`, or the Account with ID :py:attr:`~.account_id`
+        if the relationship isn't set yet.
+
+        :rtype: biweeklybudget.models.account.Account
         """
-        fields = {
-            're_interest_charge': 'is_interest_charge',
-            're_interest_paid': 'is_interest_payment',
-            're_payment': 'is_payment',
-            're_late_fee': 'is_late_fee',
-            're_other_fee': 'is_other_fee'
-        }
         acct = self.account
         if acct is None:
             from biweeklybudget.models.account import Account
             sess = inspect(self).session
             acct = sess.query(Account).get(self.account_id)
-        for fname in fields.values():
-            if (
-                fname == 'is_interest_charge' and
-                self.name == 'Interest Charged - MANUALLY ENTERED'
-            ):
-                continue
-            setattr(self, fname, False)
-        for acct_attr, self_attr in fields.items():
-            if (
-                self_attr == 'is_interest_charge' and
-                self.name == 'Interest Charged - MANUALLY ENTERED'
-            ):
-                continue
-            r_str = getattr(acct, acct_attr)
-            if r_str is None:
-                continue
-            try:
-                if re.match(r_str, self.name, re.I):
-                    setattr(self, self_attr, True)
-            except Exception:
-                logger.error('Error performing regex comparison on %s using '
-                             'Account %s field %s (%s)', self, acct,
-                             acct_attr, r_str, exc_info=True)
+        return acct
+
+    def _set_is_fields(self, fields):
+        """
+        Set the ``is_*`` fields from a dict of field name to value, as
+        returned by :py:meth:`~.is_fields_for`, skipping unchanged fields.
+
+        :param fields: dict of ``is_*`` field name to boolean value
+        :type fields: dict
+        """
+        for k, v in fields.items():
+            # read from __dict__ to not initialize unset attributes on new
+            # instances; missing or expired attributes are just set again
+            if self.__dict__.get(k) is not v:
+                setattr(self, k, v)
+
+    @staticmethod
+    def is_fields_for(acct, name):
+        """
+        Return the values of the ``is_*`` fields for an OFXTransaction with the
+        given name on the given Account, according to the Account's ``re_*``
+        properties. This is used by :py:meth:`~.update_is_fields`; matching is
+        done by the Account's cached :py:class:`~.OfxClassifier`. To classify
+        many transactions at once, use :py:meth:`~.update_is_fields_many` or
+        :py:func:`~.ofx_classifier.classify_many` instead.
+
+        ``is_interest_charge`` is omitted for manually-entered interest
+        charges, which are never overridden.
+
+        :param acct: the Account the transaction is on
+        :type acct: biweeklybudget.models.account.Account
+        :param name: the transaction name
+        :type name: str
+        :return: dict of ``is_*`` field name to boolean value
+        :rtype: dict
+        """
+        return classifier_for(acct).classify(name)
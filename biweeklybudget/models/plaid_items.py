@@ -36,7 +36,7 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 """
 
 import logging
-from sqlalchemy import Column, String
+from sqlalchemy import Column, String, Text
 from sqlalchemy_utc import UtcDateTime
 from sqlalchemy.orm import relationship
 
@@ -67,6 +67,10 @@ class PlaidItem(Base, ModelAsDict):
     #: When this item was last updated
     last_updated = Column(UtcDateTime)
 
+    #: Plaid transactions sync cursor, as of the last successful incremental
+    #: update; None if this item has never been updated with sync enabled
+    sync_cursor = Column(Text)
+
     #: Relationship to all :py:class:`~.PlaidAccount` for this Item
     all_accounts = relationship(
         'PlaidAccount', order_by='PlaidAccount.account_id'
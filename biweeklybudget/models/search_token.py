@@ -0,0 +1,141 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/biweeklybudget>
+
+################################################################################
+Copyright 2016-2024 Jason Antman <http://www.jasonantman.com>
+
+    This file is part of biweeklybudget, also known as biweeklybudget.
+
+    biweeklybudget is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    biweeklybudget is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with biweeklybudget.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/biweeklybudget> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+
+from sqlalchemy import (
+    Column, Integer, String, ForeignKey, ForeignKeyConstraint, Index,
+    PrimaryKeyConstraint, event
+)
+from biweeklybudget.models.base import Base
+from biweeklybudget.models.ofx_transaction import OFXTransaction
+from biweeklybudget.models.transaction import Transaction
+from biweeklybudget.fulltext import (
+    SearchIndex, MAX_TOKEN_LENGTH, fulltext_index_ddl
+)
+
+
+class TransactionSearchToken(Base):
+    """
+    Local full-text index of :py:attr:`.Transaction.description`, for
+    databases without native full-text indexes. See
+    :py:class:`~.SearchIndex`.
+    """
+
+    __tablename__ = 'transaction_search_tokens'
+    __table_args__ = (
+        PrimaryKeyConstraint('token', 'transaction_id'),
+        Index('ix_transaction_search_tokens_transaction_id', 'transaction_id'),
+        {'mysql_engine': 'InnoDB'}
+    )
+
+    #: Lower-cased word token
+    token = Column(String(MAX_TOKEN_LENGTH), nullable=False)
+
+    #: ID of the Transaction the token is in
+    transaction_id = Column(
+        Integer, ForeignKey('transactions.id', ondelete='CASCADE'),
+        nullable=False
+    )
+
+    def __repr__(self):
+        return "<TransactionSearchToken(token=%s, transaction_id=%s)>" % (
+            self.token, self.transaction_id
+        )
+
+
+class OFXTransactionSearchToken(Base):
+    """
+    Local full-text index of the :py:attr:`.OFXTransaction.name`,
+    :py:attr:`~.OFXTransaction.memo`, :py:attr:`~.OFXTransaction.description`
+    and :py:attr:`~.OFXTransaction.notes` fields, for databases without
+    native full-text indexes. See :py:class:`~.SearchIndex`.
+    """
+
+    __tablename__ = 'ofx_trans_search_tokens'
+    __table_args__ = (
+        PrimaryKeyConstraint('token', 'account_id', 'fitid'),
+        ForeignKeyConstraint(
+            ['account_id', 'fitid'],
+            ['ofx_trans.account_id', 'ofx_trans.fitid'],
+            ondelete='CASCADE'
+        ),
+        Index(
+            'ix_ofx_trans_search_tokens_account_id_fitid',
+            'account_id', 'fitid'
+        ),
+        {'mysql_engine': 'InnoDB'}
+    )
+
+    #: Lower-cased word token
+    token = Column(String(MAX_TOKEN_LENGTH), nullable=False)
+
+    #: Account ID of the OFXTransaction the token is in
+    account_id = Column(Integer, nullable=False)
+
+    #: FITID of the OFXTransaction the token is in
+    fitid = Column(String(255), nullable=False)
+
+    def __repr__(self):
+        return "<OFXTransactionSearchToken(token=%s, account_id=%s, " \
+               "fitid=%s)>" % (self.token, self.account_id, self.fitid)
+
+
+#: :py:class:`~.SearchIndex` of :py:attr:`.Transaction.description`
+transaction_search = SearchIndex(
+    Transaction, ('description',), TransactionSearchToken,
+    (('id', 'transaction_id'),)
+)
+
+#: :py:class:`~.SearchIndex` of the text fields of :py:class:`~.OFXTransaction`
+ofx_transaction_search = SearchIndex(
+    OFXTransaction, ('name', 'memo', 'description', 'notes'),
+    OFXTransactionSearchToken,
+    (('account_id', 'account_id'), ('fitid', 'fitid'))
+)
+
+# On MySQL, searches use native FULLTEXT indexes instead of the token tables.
+event.listen(
+    Transaction.__table__, 'after_create', fulltext_index_ddl(
+        'transactions', 'ix_transactions_fulltext',
+        transaction_search.columns
+    )
+)
+event.listen(
+    OFXTransaction.__table__, 'after_create', fulltext_index_ddl(
+        'ofx_trans', 'ix_ofx_trans_fulltext', ofx_transaction_search.columns
+    )
+)
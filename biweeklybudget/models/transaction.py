@@ -37,11 +37,10 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 
 import logging
 from sqlalchemy import (
-    Column, Integer, Numeric, String, Date, ForeignKey, inspect, func, select
+    Column, Integer, Numeric, String, Date, ForeignKey, inspect, func
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql.expression import null
-from sqlalchemy.ext.hybrid import hybrid_property
 from biweeklybudget.models.base import Base, ModelAsDict
 from biweeklybudget.models.budget_transaction import BudgetTransaction
 from biweeklybudget.models.budget_model import Budget
@@ -66,9 +65,6 @@ class Transaction(Base, ModelAsDict):
         {'mysql_engine': 'InnoDB'}
     )
 
-    #: Class properties to include in :py:attr:`~.ModelAsDict.as_dict` result.
-    _dict_properties = ['actual_amount']
-
     #: Primary Key
     id = Column(Integer, primary_key=True)
 
@@ -82,6 +78,21 @@ class Transaction(Base, ModelAsDict):
     #: reason, by :py:func:`biweeklybudget.models.utils.do_budget_transfer`.
     budgeted_amount = Column(Numeric(precision=10, scale=4))
 
+    #: Actual total amount of the transaction; the sum of the
+    #: :py:attr:`~.BudgetTransaction.amount` of its
+    #: :py:class:`~.BudgetTransaction` objects. This is stored (and indexed)
+    #: so that Transactions can be sorted and filtered by amount without
+    #: aggregating ``budget_transactions``. It is set by
+    #: :py:meth:`~.set_budget_amounts`, and recalculated in the database for
+    #: any other changes to BudgetTransactions when the session is flushed
+    #: (see :py:func:`~.handle_transaction_actual_amount`).
+    #: :py:meth:`~.check_actual_amounts` finds (and optionally fixes)
+    #: Transactions where it differs from the BudgetTransactions.
+    actual_amount = Column(
+        Numeric(precision=10, scale=4), nullable=False, default=0.0,
+        index=True
+    )
+
     #: description
     description = Column(String(254), nullable=False, index=True)
 
@@ -157,28 +168,6 @@ class Transaction(Base, ModelAsDict):
     def __repr__(self):
         return "<Transaction(id=%s)>" % self.id
 
-    @hybrid_property
-    def actual_amount(self):
-        """
-        Actual amount of the transaction.
-
-        :return: actual total amount of the transaction
-        :rtype: decimal.Decimal
-        """
-        return sum([
-            bt.amount for bt in self.budget_transactions
-        ])
-
-    @actual_amount.expression
-    def actual_amount(cls):
-        # see: http://docs.sqlalchemy.org/en/latest/orm/extensions/hybrid.html
-        # #correlated-subquery-relationship-hybrid
-        return select(
-            [func.sum(BudgetTransaction.amount)]
-        ).where(
-            BudgetTransaction.trans_id.__eq__(cls.id)
-        ).label('actual_amount')
-
     @staticmethod
     def unreconciled(db):
         """
@@ -249,3 +238,43 @@ class Transaction(Base, ModelAsDict):
                 )
                 logger.debug('Adding %s to %s', bt, self)
                 # implicit sess.add() via cascade
+        self.actual_amount = sum(budget_amounts.values())
+
+    @staticmethod
+    def check_actual_amounts(db, fix=False):
+        """
+        Find Transactions whose stored :py:attr:`~.actual_amount` differs from
+        the sum of their BudgetTransactions' amounts, using one aggregate
+        query. If ``fix`` is True, set :py:attr:`~.actual_amount` on each of
+        them to the correct sum.
+
+        This method does NOT commit changes; if ``fix`` is True, the calling
+        code must commit them.
+
+        :param db: active database session to use for queries
+        :type db: sqlalchemy.orm.session.Session
+        :param fix: whether or not to correct the inconsistent Transactions
+        :type fix: bool
+        :return: list of (Transaction ID, stored actual_amount, sum of
+          BudgetTransaction amounts) tuples, for each inconsistent Transaction
+        :rtype: list
+        """
+        bt_sum = func.coalesce(func.sum(BudgetTransaction.amount), 0)
+        res = db.query(
+            Transaction.id, Transaction.actual_amount, bt_sum
+        ).outerjoin(
+            BudgetTransaction,
+            BudgetTransaction.trans_id.__eq__(Transaction.id)
+        ).group_by(
+            Transaction.id, Transaction.actual_amount
+        ).having(
+            Transaction.actual_amount.__ne__(bt_sum)
+        ).order_by(Transaction.id).all()
+        for trans_id, stored, computed in res:
+            logger.warning(
+                'Transaction %d has actual_amount %s but its '
+                'BudgetTransactions total %s', trans_id, stored, computed
+            )
+            if fix:
+                db.query(Transaction).get(trans_id).actual_amount = computed
+        return [tuple(r) for r in res]
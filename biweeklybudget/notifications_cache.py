@@ -0,0 +1,198 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/biweeklybudget>
+
+################################################################################
+Copyright 2016-2024 Jason Antman <http://www.jasonantman.com>
+
+    This file is part of biweeklybudget, also known as biweeklybudget.
+
+    biweeklybudget is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    biweeklybudget is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with biweeklybudget.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/biweeklybudget> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+
+import logging
+import threading
+import time
+from uuid import uuid4
+from copy import deepcopy
+
+from biweeklybudget import settings
+from biweeklybudget.models.dbsetting import DBSetting
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationsCache(object):
+    """
+    Process-wide cache of the notifications shown at the top of every page
+    (:py:meth:`~.NotificationsController.get_notifications`), so that they
+    don't have to be calculated again for every template render.
+
+    The notifications depend on nearly all of the data in the database, so
+    rather than tracking exactly what changed, any flush of a model that they
+    are calculated from writes a new random value to the :py:class:`~.DBSetting`
+    named by :py:attr:`~.GENERATION_SETTING`
+    (:py:func:`~.db_event_handlers.handle_notifications_cache_invalidation`).
+    The cached notifications are stored along with the generation that was
+    current when they were calculated; each lookup reads the current
+    generation from the database (a single primary key query) and only uses the
+    cached value if it matches. The new generation becomes visible when the
+    change is committed, so cached notifications are invalidated on commit in
+    every process, and a rolled-back change simply causes them to be calculated
+    again.
+
+    Some notifications (stale accounts, the current pay period) also depend on
+    the current time, so cached notifications are only used for
+    :py:attr:`~.settings.NOTIFICATIONS_CACHE_TTL` seconds. Setting that to 0
+    disables the cache.
+    """
+
+    #: name of the :py:class:`~.DBSetting` that stores the cache generation
+    GENERATION_SETTING = 'notifications_cache_generation'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entry = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def ttl(self):
+        """
+        Return the number of seconds that cached notifications are used for.
+
+        :return: cache TTL in seconds
+        :rtype: int
+        """
+        return getattr(settings, 'NOTIFICATIONS_CACHE_TTL', 0) or 0
+
+    @property
+    def enabled(self):
+        """
+        Return whether or not the cache is enabled.
+
+        :rtype: bool
+        """
+        return self.ttl > 0
+
+    def generation(self, session):
+        """
+        Return the current cache generation from the database.
+
+        :param session: active database session
+        :type session: sqlalchemy.orm.session.Session
+        :return: current cache generation, or None if it has never been set
+        :rtype: str
+        """
+        return session.query(DBSetting.value).filter(
+            DBSetting.name.__eq__(self.GENERATION_SETTING)
+        ).scalar()
+
+    def get(self, session, func):
+        """
+        Return the cached result of ``func()`` if it was calculated less than
+        :py:attr:`~.ttl` seconds ago at the current generation; otherwise call
+        ``func()``, cache its result and return it.
+
+        :param session: active database session
+        :type session: sqlalchemy.orm.session.Session
+        :param func: callable taking no arguments that calculates the
+          notifications
+        :type func: ``callable``
+        :return: return value of ``func()``
+        """
+        if not self.enabled:
+            return func()
+        gen = self.generation(session)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entry
+            if (
+                entry is not None and entry['generation'] == gen and
+                now - entry['time'] < self.ttl
+            ):
+                self.hits += 1
+                return deepcopy(entry['value'])
+            self.misses += 1
+        value = func()
+        with self._lock:
+            self._entry = {
+                'generation': gen,
+                'time': now,
+                'value': deepcopy(value)
+            }
+        return value
+
+    def invalidate(self):
+        """
+        Remove the cached notifications from this process' cache.
+        """
+        with self._lock:
+            if self._entry is not None:
+                self.invalidations += 1
+            self._entry = None
+
+    def new_generation(self, session):
+        """
+        Store a new cache generation in the database, so that cached
+        notifications will be recalculated in every process once the current
+        transaction is committed. Must be called from within a flush; the new
+        value is committed along with the changes that triggered it.
+
+        :param session: active database session
+        :type session: sqlalchemy.orm.session.Session
+        """
+        s = session.query(DBSetting).get(self.GENERATION_SETTING)
+        if s is None:
+            s = DBSetting(name=self.GENERATION_SETTING, is_json=False)
+        s.value = uuid4().hex
+        session.add(s)
+
+    @property
+    def stats(self):
+        """
+        Return a dict of cache statistics.
+
+        :return: cache statistics
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'ttl': self.ttl,
+                'cached': self._entry is not None,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations
+            }
+
+
+#: The process-wide :py:class:`~.NotificationsCache` instance.
+notifications_cache = NotificationsCache()
@@ -0,0 +1,237 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/biweeklybudget>
+
+################################################################################
+Copyright 2016-2024 Jason Antman <http://www.jasonantman.com>
+
+    This file is part of biweeklybudget, also known as biweeklybudget.
+
+    biweeklybudget is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    biweeklybudget is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with biweeklybudget.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/biweeklybudget> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+
+import re
+import logging
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+#: Pairs of (:py:class:`~.Account` ``re_*`` attribute,
+#: :py:class:`~.OFXTransaction` ``is_*`` field that it sets), in the order the
+#: fields are returned in.
+FIELDS = (
+    ('re_interest_charge', 'is_interest_charge'),
+    ('re_interest_paid', 'is_interest_payment'),
+    ('re_payment', 'is_payment'),
+    ('re_late_fee', 'is_late_fee'),
+    ('re_other_fee', 'is_other_fee')
+)
+
+#: Name of manually-entered interest charge transactions, whose
+#: ``is_interest_charge`` field is never overridden.
+MANUAL_INTEREST_NAME = 'Interest Charged - MANUALLY ENTERED'
+
+#: Maximum number of distinct sets of Account patterns to keep compiled
+#: classifiers for.
+CACHE_SIZE = 128
+
+#: Matches backreferences, which can't be safely combined into one pattern
+#: since combining renumbers groups.
+_BACKREF_RE = re.compile(r'\\[1-9]|\(\?P=')
+
+
+class OfxClassifier(object):
+    """
+    Classifier that sets the ``is_*`` fields of
+    :py:class:`~.OFXTransaction` instances from a single Account's ``re_*``
+    patterns. Each pattern is matched case-insensitively against the start
+    of the transaction name, exactly as ``re.match(pattern, name, re.I)``.
+
+    The patterns are compiled once, when the classifier is constructed. If
+    possible they're also combined into a single pattern of optional
+    lookaheads, one named group per field, so each name is only scanned by
+    one match call. Patterns that can't be combined (i.e. ones that use
+    backreferences, duplicate group names or global inline flags) fall back
+    to matching each compiled pattern separately. Patterns that don't
+    compile are logged once and never match.
+
+    Instances should generally be obtained from :py:func:`~.classifier_for`,
+    which caches them.
+    """
+
+    def __init__(self, patterns):
+        """
+        :param patterns: the pattern strings (or None) for each of
+          :py:data:`~.FIELDS`, in order
+        :type patterns: tuple
+        """
+        #: the pattern strings this classifier was built from
+        self.patterns = tuple(patterns)
+        #: list of (``is_*`` field name, compiled pattern) for each field
+        #: with a valid pattern
+        self._compiled = []
+        for (acct_attr, field), r_str in zip(FIELDS, self.patterns):
+            if r_str is None:
+                continue
+            try:
+                self._compiled.append((field, re.compile(r_str, re.I)))
+            except Exception:
+                logger.error('Error compiling Account field %s regex (%s)',
+                             acct_attr, r_str, exc_info=True)
+        #: combined pattern for all fields, or None to match separately
+        self._combined = self._combine()
+
+    def _combine(self):
+        """
+        Build a single compiled pattern that matches every field's pattern
+        at the start of the string, via optional lookaheads with one named
+        group per field.
+
+        :return: combined compiled pattern, or None if the patterns can't be
+          combined
+        :rtype: re.Pattern
+        """
+        if len(self._compiled) < 2:
+            return None
+        for _, c in self._compiled:
+            if _BACKREF_RE.search(c.pattern):
+                return None
+        combined = ''.join(
+            '(?:(?=(?P<%s>%s)))?' % (field, c.pattern)
+            for field, c in self._compiled
+        )
+        try:
+            return re.compile(combined, re.I)
+        except Exception:
+            logger.debug('Unable to combine patterns %s; matching each '
+                         'separately', self.patterns)
+            return None
+
+    def classify(self, name):
+        """
+        Return the values of the ``is_*`` fields for an OFXTransaction with
+        the given name. ``is_interest_charge`` is omitted for manually-entered
+        interest charges, which are never overridden.
+
+        :param name: the transaction name
+        :type name: str
+        :return: dict of ``is_*`` field name to boolean value
+        :rtype: dict
+        """
+        res = {field: False for _, field in FIELDS}
+        if not isinstance(name, str):
+            logger.error('Cannot classify non-string OFXTransaction name: %s',
+                         name)
+        elif self._combined is not None:
+            m = self._combined.match(name)
+            for field, _ in self._compiled:
+                if m.group(field) is not None:
+                    res[field] = True
+        else:
+            for field, c in self._compiled:
+                if c.match(name):
+                    res[field] = True
+        if name == MANUAL_INTEREST_NAME:
+            del res['is_interest_charge']
+        return res
+
+    def classify_many(self, names):
+        """
+        Return the values of the ``is_*`` fields for each of ``names``; see
+        :py:meth:`~.classify`. Each distinct name is only matched once.
+
+        :param names: the transaction names
+        :type names: list
+        :return: list of dicts of ``is_*`` field name to boolean value, one
+          per name, in the same order
+        :rtype: list
+        """
+        seen = {}
+        res = []
+        for name in names:
+            if name not in seen:
+                seen[name] = self.classify(name)
+            res.append(dict(seen[name]))
+        return res
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _classifier(patterns):
+    """
+    Return a (cached) :py:class:`~.OfxClassifier` for the given patterns.
+
+    :param patterns: the pattern strings (or None) for each of
+      :py:data:`~.FIELDS`, in order
+    :type patterns: tuple
+    :rtype: OfxClassifier
+    """
+    return OfxClassifier(patterns)
+
+
+def patterns_for(acct):
+    """
+    Return the tuple of ``re_*`` pattern strings for an Account, in the order
+    of :py:data:`~.FIELDS`.
+
+    :param acct: the Account
+    :type acct: biweeklybudget.models.account.Account
+    :rtype: tuple
+    """
+    return tuple(getattr(acct, acct_attr) for acct_attr, _ in FIELDS)
+
+
+def classifier_for(acct):
+    """
+    Return the :py:class:`~.OfxClassifier` for an Account's current ``re_*``
+    patterns. Classifiers are cached on the pattern strings themselves, so
+    an Account's patterns are only compiled once, and changing any of them
+    transparently yields a newly-compiled classifier.
+
+    :param acct: the Account
+    :type acct: biweeklybudget.models.account.Account
+    :rtype: OfxClassifier
+    """
+    return _classifier(patterns_for(acct))
+
+
+def classify_many(acct, names):
+    """
+    Return the values of the ``is_*`` fields for OFXTransactions with each of
+    the given names on the given Account. See
+    :py:meth:`~.OfxClassifier.classify_many`.
+
+    :param acct: the Account the transactions are on
+    :type acct: biweeklybudget.models.account.Account
+    :param names: the transaction names
+    :type names: list
+    :return: list of dicts of ``is_*`` field name to boolean value, one per
+      name, in the same order
+    :rtype: list
+    """
+    return classifier_for(acct).classify_many(names)
@@ -0,0 +1,314 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/biweeklybudget>
+
+################################################################################
+Copyright 2016-2024 Jason Antman <http://www.jasonantman.com>
+
+    This file is part of biweeklybudget, also known as biweeklybudget.
+
+    biweeklybudget is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    biweeklybudget is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with biweeklybudget.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/biweeklybudget> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+
+import logging
+import threading
+from timeit import default_timer
+from concurrent.futures import ThreadPoolExecutor
+
+from biweeklybudget import settings
+from biweeklybudget.models.account import Account
+from biweeklybudget.models.ofx_transaction import OFXTransaction
+from biweeklybudget.utils import dtnow
+
+logger = logging.getLogger(__name__)
+
+
+class ReclassifyJob(object):
+    """
+    Job to reclassify the ``is_*`` fields of all of one Account's
+    :py:class:`~.OFXTransaction` records, after the Account's ``re_*``
+    patterns change.
+
+    Transactions are processed in batches of ``batch_size``, paginated by
+    FITID within the Account (i.e. by primary key) rather than by offset.
+    Each batch is committed and then expunged from the session, so only one
+    batch is ever held in memory and a failure only loses the current batch.
+    The Account is re-read for each batch, so a job that's running when the
+    patterns change again finishes with the newest patterns.
+    """
+
+    def __init__(self, account_id, batch_size):
+        """
+        :param account_id: ID of the Account to reclassify transactions for
+        :type account_id: int
+        :param batch_size: number of transactions per batch
+        :type batch_size: int
+        """
+        #: ID of the Account to reclassify transactions for
+        self.account_id = account_id
+        #: number of transactions per batch
+        self.batch_size = batch_size
+        #: job status; one of ``pending``, ``running``, ``done`` or ``failed``
+        self.status = 'pending'
+        #: total number of transactions for the Account, once running
+        self.total = None
+        #: number of transactions processed so far
+        self.processed = 0
+        #: number of transactions whose ``is_*`` fields changed so far
+        self.changed = 0
+        #: number of batches committed so far
+        self.batches = 0
+        #: when the job was queued
+        self.queued = dtnow()
+        #: when the job started running
+        self.started = None
+        #: when the job finished
+        self.finished = None
+        #: seconds spent running the job
+        self.elapsed = 0.0
+        #: string error message, if the job failed
+        self.error = None
+
+    @property
+    def as_dict(self):
+        """
+        Return the status of this job as a dict.
+
+        :rtype: dict
+        """
+        return {
+            'account_id': self.account_id,
+            'status': self.status,
+            'total': self.total,
+            'processed': self.processed,
+            'changed': self.changed,
+            'batches': self.batches,
+            'queued': self.queued,
+            'started': self.started,
+            'finished': self.finished,
+            'elapsed': self.elapsed,
+            'error': self.error
+        }
+
+    def run(self, session):
+        """
+        Run the job. Exceptions are logged and recorded in :py:attr:`~.error`
+        rather than raised.
+
+        :param session: database session to use; this should not be the
+          session whose commit triggered the job
+        :type session: sqlalchemy.orm.session.Session
+        """
+        self.status = 'running'
+        self.started = dtnow()
+        start = default_timer()
+        try:
+            self._run(session)
+            self.status = 'done'
+        except Exception as ex:
+            logger.error(
+                'Error reclassifying OFXTransactions for Account %d',
+                self.account_id, exc_info=True
+            )
+            session.rollback()
+            self.status = 'failed'
+            self.error = str(ex)
+        self.finished = dtnow()
+        self.elapsed = default_timer() - start
+        logger.info(
+            'Reclassification of OFXTransactions for Account %d %s: %d '
+            'processed, %d changed, %d batches in %.3fs', self.account_id,
+            self.status, self.processed, self.changed, self.batches,
+            self.elapsed
+        )
+
+    def _run(self, session):
+        """
+        Reclassify the transactions, one batch at a time.
+
+        :param session: database session to use
+        :type session: sqlalchemy.orm.session.Session
+        """
+        self.total = session.query(OFXTransaction).filter(
+            OFXTransaction.account_id.__eq__(self.account_id)
+        ).count()
+        last_fitid = None
+        while True:
+            acct = session.query(Account).get(self.account_id)
+            if acct is None:
+                logger.warning(
+                    'Account %d no longer exists; not reclassifying its '
+                    'OFXTransactions', self.account_id
+                )
+                return
+            q = session.query(OFXTransaction).filter(
+                OFXTransaction.account_id.__eq__(self.account_id)
+            )
+            if last_fitid is not None:
+                q = q.filter(OFXTransaction.fitid.__gt__(last_fitid))
+            batch = q.order_by(
+                OFXTransaction.fitid.asc()
+            ).limit(self.batch_size).all()
+            if len(batch) == 0:
+                return
+            OFXTransaction.update_is_fields_many(batch)
+            changed = len([t for t in batch if session.is_modified(t)])
+            last_fitid = batch[-1].fitid
+            session.commit()
+            session.expunge_all()
+            self.processed += len(batch)
+            self.changed += changed
+            self.batches += 1
+            logger.info(
+                'Reclassified %d of %s OFXTransactions for Account %d (%d '
+                'changed)', self.processed, self.total, self.account_id,
+                self.changed
+            )
+            if len(batch) < self.batch_size:
+                return
+
+
+class OfxReclassifier(object):
+    """
+    Process-wide runner of :py:class:`~.ReclassifyJob` instances. Jobs are
+    submitted by the ``after_commit`` event handler
+    (:py:func:`~.db_event_handlers.handle_ofx_reclassify_commit`) when an
+    Account's ``re_*`` patterns have changed.
+
+    If :py:attr:`~.settings.OFX_RECLASSIFY_BACKGROUND` is true, jobs are run
+    one at a time, in the order submitted, in a single background thread;
+    otherwise, they're run synchronously when submitted. The most recent job
+    for each Account is kept so its progress can be reported by
+    :py:attr:`~.status`.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._executor = None
+        self._jobs = {}
+
+    @property
+    def batch_size(self):
+        """
+        Return the number of transactions to reclassify per batch.
+
+        :rtype: int
+        """
+        return getattr(settings, 'OFX_RECLASSIFY_BATCH_SIZE', 1000) or 1000
+
+    @property
+    def background(self):
+        """
+        Return whether or not to run jobs in a background thread.
+
+        :rtype: bool
+        """
+        return bool(getattr(settings, 'OFX_RECLASSIFY_BACKGROUND', 0))
+
+    @property
+    def status(self):
+        """
+        Return the status of the most recent job for each Account.
+
+        :return: dict of Account ID to :py:attr:`~.ReclassifyJob.as_dict`
+        :rtype: dict
+        """
+        with self._lock:
+            return {k: v.as_dict for k, v in self._jobs.items()}
+
+    def submit(self, account_id, session_factory=None):
+        """
+        Reclassify all OFXTransactions for an Account. If a job for the
+        Account is already queued but not yet running, it will see the
+        current patterns when it runs, so no new job is queued.
+
+        :param account_id: ID of the Account to reclassify transactions for
+        :type account_id: int
+        :param session_factory: callable returning a new database session for
+          the job; defaults to the ``session_factory`` of
+          :py:data:`~.db.db_session`
+        :type session_factory: ``callable``
+        :return: the job for the Account
+        :rtype: ReclassifyJob
+        """
+        with self._lock:
+            job = self._jobs.get(account_id)
+            if job is not None and job.status == 'pending':
+                logger.debug(
+                    'OFXTransaction reclassification for Account %d is '
+                    'already queued', account_id
+                )
+                return job
+            job = ReclassifyJob(account_id, self.batch_size)
+            self._jobs[account_id] = job
+            if self.background:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=1, thread_name_prefix='ofx-reclassify'
+                    )
+                logger.info(
+                    'Queueing reclassification of OFXTransactions for '
+                    'Account %d', account_id
+                )
+                self._executor.submit(self._run, job, session_factory)
+                return job
+        self._run(job, session_factory)
+        return job
+
+    def wait(self):
+        """
+        Block until all jobs submitted so far have finished.
+        """
+        with self._lock:
+            executor = self._executor
+        if executor is not None:
+            executor.submit(lambda: None).result()
+
+    def _run(self, job, session_factory):
+        """
+        Run a job in a new database session.
+
+        :param job: the job to run
+        :type job: ReclassifyJob
+        :param session_factory: callable returning a new database session, or
+          None to use the ``session_factory`` of :py:data:`~.db.db_session`
+        :type session_factory: ``callable``
+        """
+        if session_factory is None:
+            from biweeklybudget.db import db_session
+            session_factory = db_session.session_factory
+        session = session_factory()
+        try:
+            job.run(session)
+        finally:
+            session.close()
+
+
+#: Process-wide :py:class:`~.OfxReclassifier` instance.
+ofx_reclassifier = OfxReclassifier()
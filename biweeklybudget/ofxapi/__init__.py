@@ -41,7 +41,8 @@ from biweeklybudget.ofxapi.remote import OfxApiRemote
 logger = logging.getLogger(__name__)
 
 
-def apiclient(api_url=None, ca_bundle=None, client_cert=None, client_key=None):
+def apiclient(api_url=None, ca_bundle=None, client_cert=None, client_key=None,
+              bulk_upsert=False):
     if api_url is None:
         logger.info('Using OfxApiLocal direct database access')
         import atexit
@@ -49,7 +50,7 @@ def apiclient(api_url=None, ca_bundle=None, client_cert=None, client_key=None):
         atexit.register(cleanup_db)
         init_db()
         from biweeklybudget.ofxapi.local import OfxApiLocal
-        return OfxApiLocal(db_session)
+        return OfxApiLocal(db_session, bulk_upsert=bulk_upsert)
     logger.info('Using OfxApiRemote with base_url %s', api_url)
     return OfxApiRemote(
         api_url, ca_bundle=ca_bundle, client_cert_path=client_cert,
@@ -43,8 +43,11 @@ from ofxparse import AccountType, OfxParser
 from biweeklybudget.db import db_session, upsert_record
 from biweeklybudget.models.ofx_transaction import OFXTransaction
 from biweeklybudget.models.ofx_statement import OFXStatement
+from biweeklybudget.models.search_token import ofx_transaction_search
 from biweeklybudget.models.account import Account
 from biweeklybudget.utils import dtnow
+from biweeklybudget.ofx_classifier import classify_many
+from biweeklybudget.ingest_metrics import IngestMetrics, IngestResult
 from biweeklybudget.ofxapi.exceptions import DuplicateFileException
 
 logger = logging.getLogger(__name__)
@@ -52,7 +55,10 @@ logger = logging.getLogger(__name__)
 
 class OfxApiLocal(object):
 
-    def __init__(self, db_sess):
+    #: Maximum number of FITIDs to look up in one query, in bulk upsert mode.
+    BULK_QUERY_CHUNK_SIZE = 500
+
+    def __init__(self, db_sess, bulk_upsert=False):
         """
         Initialize a new Local OFX API client, when running ofxgetter or
         ofxbackfiller with direct database access, or used to back the OFX
@@ -60,8 +66,15 @@ class OfxApiLocal(object):
 
         :param db_sess: active database session to use for queries
         :type db_sess: sqlalchemy.orm.session.Session
+        :param bulk_upsert: if True, upsert the transactions in each statement
+          in bulk (see :py:meth:`~._bulk_upsert_transactions`) instead of one
+          at a time
+        :type bulk_upsert: bool
         """
         self._db = db_sess
+        self._bulk_upsert = bulk_upsert
+        self._bulk_inserted = 0
+        self._bulk_updated = 0
 
     def get_accounts(self):
         """
@@ -100,6 +113,30 @@ class OfxApiLocal(object):
         logger.debug('Query found %d ofxgetter-enabled Accounts', len(result))
         return result
 
+    def get_statement_ids(self, stmt_ids):
+        """
+        Return which of the specified
+        :py:class:`~biweeklybudget.models.ofx_statement.OFXStatement` IDs exist
+        in the database.
+
+        :param stmt_ids: OFXStatement IDs to look for
+        :type stmt_ids: list
+        :return: the IDs in ``stmt_ids`` that exist
+        :rtype: set
+        """
+        stmt_ids = set(stmt_ids)
+        if not stmt_ids:
+            return set()
+        res = set(
+            x[0] for x in self._db.query(OFXStatement.id).filter(
+                OFXStatement.id.in_(stmt_ids)
+            )
+        )
+        logger.debug(
+            'Found %d of %d OFXStatement IDs', len(res), len(stmt_ids)
+        )
+        return res
+
     def update_statement_ofx(self, acct_id, ofx, mtime=None, filename=None):
         """
         Update a single statement for the specified account, from an OFX file.
@@ -115,8 +152,10 @@ class OfxApiLocal(object):
         :returns: 3-tuple of the int ID of the
           :py:class:`~biweeklybudget.models.ofx_statement.OFXStatement`
           created by this run, int count of new :py:class:`~.OFXTransaction`
-          created, and int count of :py:class:`~.OFXTransaction` updated
-        :rtype: tuple
+          created, and int count of :py:class:`~.OFXTransaction` updated; its
+          ``metrics`` attribute has the per-stage timing and counts for the
+          import
+        :rtype: biweeklybudget.ingest_metrics.IngestResult
         :raises: :py:exc:`RuntimeError` on error parsing OFX or unknown account
           type; :py:exc:`~.DuplicateFileException` if the file (according to the
           OFX signon date/time) has already been recorded.
@@ -125,37 +164,207 @@ class OfxApiLocal(object):
             'Updating Account %d with OFX Statement filename="%s" (mtime %s)',
             acct_id, filename, mtime
         )
-        acct = db_session.query(Account).get(acct_id)
-        if mtime is None:
-            mtime = dtnow()
-        if hasattr(ofx, 'status') and ofx.status['severity'] == 'ERROR':
-            raise RuntimeError("OFX Error: %s" % vars(ofx))
-        stmt = self._create_statement(acct, ofx, mtime, filename)
-        if ofx.account.type == AccountType.Bank:
-            stmt.type = 'Bank'
-            s = self._update_bank_or_credit(acct, ofx, stmt)
-        elif ofx.account.type == AccountType.CreditCard:
-            stmt.type = 'CreditCard'
-            s = self._update_bank_or_credit(acct, ofx, stmt)
-        elif ofx.account.type == AccountType.Investment:
-            s = self._update_investment(acct, ofx, stmt)
-        else:
-            raise RuntimeError("Don't know how to update AccountType %d",
-                               ofx.account.type)
-        count_new, count_upd = self._new_updated_counts()
-        db_session.commit()
-        return s.id, count_new, count_upd
+        metrics = IngestMetrics('ofx', account_id=acct_id, filename=filename)
+        with metrics:
+            acct = db_session.query(Account).get(acct_id)
+            self._bulk_inserted = 0
+            self._bulk_updated = 0
+            if mtime is None:
+                mtime = dtnow()
+            if hasattr(ofx, 'status') and ofx.status['severity'] == 'ERROR':
+                raise RuntimeError("OFX Error: %s" % vars(ofx))
+            with metrics.stage('create_statement'):
+                stmt = self._create_statement(acct, ofx, mtime, filename)
+            with metrics.stage('upsert'):
+                if ofx.account.type == AccountType.Bank:
+                    stmt.type = 'Bank'
+                    s = self._update_bank_or_credit(acct, ofx, stmt)
+                elif ofx.account.type == AccountType.CreditCard:
+                    stmt.type = 'CreditCard'
+                    s = self._update_bank_or_credit(acct, ofx, stmt)
+                elif ofx.account.type == AccountType.Investment:
+                    s = self._update_investment(acct, ofx, stmt)
+                    metrics.rows = len(ofx.account.statement.positions)
+                else:
+                    raise RuntimeError(
+                        "Don't know how to update AccountType %d",
+                        ofx.account.type
+                    )
+            if ofx.account.type != AccountType.Investment:
+                metrics.rows = len(ofx.account.statement.transactions)
+            count_new, count_upd = self._new_updated_counts()
+            self._flush_and_commit(metrics)
+        return self._result(s.id, count_new, count_upd, metrics)
+
+    def update_statements(self, statements):
+        """
+        Update multiple statements, each as with
+        :py:meth:`~.update_statement_ofx`. Each statement is committed
+        separately; if one fails, its changes are rolled back and the rest
+        are still updated.
+
+        :param statements: list of (Account ID, ``ofxparse.ofxparse.Ofx``,
+          mtime, filename) 4-tuples, as the arguments to
+          :py:meth:`~.update_statement_ofx`
+        :type statements: list
+        :returns: list with one element per statement, in the same order;
+          either the 3-tuple returned by :py:meth:`~.update_statement_ofx`,
+          or the exception raised (:py:exc:`~.DuplicateFileException` if the
+          statement has already been recorded)
+        :rtype: list
+        """
+        results = []
+        for acct_id, ofx, mtime, filename in statements:
+            try:
+                results.append(self.update_statement_ofx(
+                    acct_id, ofx, mtime=mtime, filename=filename
+                ))
+            except Exception as ex:
+                if not isinstance(ex, DuplicateFileException):
+                    logger.error(
+                        'Exception updating Account %s with statement %s',
+                        acct_id, filename, exc_info=True
+                    )
+                db_session.rollback()
+                results.append(ex)
+        return results
+
+    def update_statement_stream(self, acct_id, reader, mtime=None,
+                                filename=None):
+        """
+        Update a single statement for the specified Bank or Credit account,
+        from an :py:class:`~biweeklybudget.ofxstream.OfxStreamReader`. The
+        statement's transactions are read and upserted in bulk (see
+        :py:meth:`~._bulk_upsert_transactions`) in chunks of
+        :py:attr:`~.BULK_QUERY_CHUNK_SIZE`, flushing after each chunk, so that
+        the whole statement is never held in memory.
+
+        :param acct_id: Account ID that statement is for
+        :type acct_id: int
+        :param reader: reader for the OFX file
+        :type reader: biweeklybudget.ofxstream.OfxStreamReader
+        :param mtime: OFX file modification time (or current time)
+        :type mtime: datetime.datetime
+        :param filename: OFX file name
+        :type filename: str
+        :returns: 3-tuple of the int ID of the
+          :py:class:`~biweeklybudget.models.ofx_statement.OFXStatement`
+          created by this run, int count of new :py:class:`~.OFXTransaction`
+          created, and int count of :py:class:`~.OFXTransaction` updated; its
+          ``metrics`` attribute has the per-stage timing and counts for the
+          import
+        :rtype: biweeklybudget.ingest_metrics.IngestResult
+        :raises: :py:exc:`RuntimeError` on error parsing OFX or if the file
+          has no Bank or Credit Card statement;
+          :py:exc:`~.DuplicateFileException` if the file has already been
+          recorded.
+        """
+        logger.info(
+            'Streaming OFX Statement filename="%s" (mtime %s) into Account %d',
+            filename, mtime, acct_id
+        )
+        metrics = IngestMetrics(
+            'ofx-stream', account_id=acct_id, filename=filename
+        )
+        with metrics:
+            acct = db_session.query(Account).get(acct_id)
+            self._bulk_inserted = 0
+            self._bulk_updated = 0
+            if mtime is None:
+                mtime = dtnow()
+            if (
+                hasattr(reader, 'status') and
+                reader.status['severity'] == 'ERROR'
+            ):
+                raise RuntimeError("OFX Error: %s" % reader.status)
+            if reader.account is None:
+                raise RuntimeError('OFX has no Bank or Credit Card statement')
+            with metrics.stage('create_statement'):
+                stmt = self._create_statement(acct, reader, mtime, filename)
+                if reader.account.type == AccountType.Bank:
+                    stmt.type = 'Bank'
+                else:
+                    stmt.type = 'CreditCard'
+                db_session.add(stmt)
+            chunks = reader.chunks(self.BULK_QUERY_CHUNK_SIZE)
+            while True:
+                # the file is parsed lazily, as each chunk is read
+                with metrics.stage('parse'):
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                metrics.rows += len(chunk)
+                with metrics.stage('upsert'):
+                    self._bulk_upsert_transactions(acct, chunk, stmt)
+                    # count updates before the flush clears them from
+                    # session.dirty
+                    self._bulk_updated += len([
+                        x for x in db_session.dirty
+                        if isinstance(x, OFXTransaction)
+                    ])
+                with metrics.stage('flush'):
+                    db_session.flush()
+            # balances follow the transaction list in the OFX
+            with metrics.stage('upsert'):
+                self._set_statement_balances(acct, reader, stmt)
+            count_new, count_upd = self._new_updated_counts()
+            self._flush_and_commit(metrics)
+        return self._result(stmt.id, count_new, count_upd, metrics)
+
+    def _flush_and_commit(self, metrics):
+        """
+        Flush and then commit the session, recording the time spent in each as
+        the ``flush`` and ``commit`` stages of ``metrics``. The flush is done
+        separately so that the time spent writing the statement (including in
+        the ``before_flush`` event handlers) can be told apart from the commit
+        itself.
+
+        :param metrics: metrics for the current import
+        :type metrics: biweeklybudget.ingest_metrics.IngestMetrics
+        """
+        with metrics.stage('flush'):
+            db_session.flush()
+        with metrics.stage('commit'):
+            db_session.commit()
+
+    def _result(self, stmt_id, count_new, count_upd, metrics):
+        """
+        Set the counts on the metrics for an import, log them, and return the
+        :py:class:`~biweeklybudget.ingest_metrics.IngestResult`.
+
+        :param stmt_id: ID of the OFXStatement created
+        :type stmt_id: int
+        :param count_new: count of new OFXTransactions created
+        :type count_new: int
+        :param count_upd: count of existing OFXTransactions updated
+        :type count_upd: int
+        :param metrics: metrics for the import
+        :type metrics: biweeklybudget.ingest_metrics.IngestMetrics
+        :rtype: biweeklybudget.ingest_metrics.IngestResult
+        """
+        metrics.count_new = count_new
+        metrics.count_updated = count_upd
+        logger.info(
+            'Imported OFXStatement %d: %d row(s), %d new, %d updated, %d '
+            'queries in %.3fs', stmt_id, metrics.rows, count_new, count_upd,
+            metrics.queries, metrics.total
+        )
+        logger.debug('Ingest metrics: %s', metrics.as_dict)
+        return IngestResult(stmt_id, count_new, count_upd, metrics=metrics)
 
     def _new_updated_counts(self):
         """
         Return integer counts of the number of :py:class:`~.OFXTransaction`
-        objects that have been created and updated.
+        objects that have been created and updated. This includes transactions
+        inserted without ORM instances by
+        :py:meth:`~._bulk_upsert_transactions`, and transactions updated in
+        chunks already flushed by :py:meth:`~.update_statement_stream`.
 
         :return: 2-tuple of new OFXTransactions created, OFXTransactions updated
         :rtype: tuple
         """
-        count_new = 0
-        count_upd = 0
+        count_new = self._bulk_inserted
+        count_upd = self._bulk_updated
         for obj in db_session.dirty:
             if isinstance(obj, OFXTransaction):
                 count_upd += 1
@@ -224,8 +433,42 @@ class OfxApiLocal(object):
         :returns: the OFXStatement object
         :rtype: biweeklybudget.models.ofx_statement.OFXStatement
         """
-        # Note that as of 0.16, OfxParser returns tz-naive UTC datetimes
         logger.debug('Updating Bank/Credit account')
+        self._set_statement_balances(acct, ofx, stmt)
+        db_session.add(stmt)
+        if self._bulk_upsert:
+            self._bulk_upsert_transactions(
+                acct, ofx.account.statement.transactions, stmt
+            )
+            return stmt
+        for txn in ofx.account.statement.transactions:
+            try:
+                kwargs = OFXTransaction.params_from_ofxparser_transaction(
+                    txn, acct.id, stmt, cat_memo=acct.ofx_cat_memo_to_name
+                )
+            except RuntimeError as ex:
+                logger.error(ex)
+                continue
+            upsert_record(
+                OFXTransaction,
+                ['account_id', 'fitid'],
+                **kwargs
+            )
+        return stmt
+
+    def _set_statement_balances(self, acct, ofx, stmt):
+        """
+        Set the ledger and available balances on a Bank or Credit statement
+        from the OFX, and set the Account's balance from them.
+
+        :param acct: the Account this statement is for
+        :type acct: biweeklybudget.models.account.Account
+        :param ofx: Ofx instance for parsed file
+        :type ofx: ``ofxparse.ofxparse.Ofx``
+        :param stmt: the OFXStatement for this statement
+        :type stmt: biweeklybudget.models.ofx_statement.OFXStatement
+        """
+        # Note that as of 0.16, OfxParser returns tz-naive UTC datetimes
         if hasattr(ofx.account.statement, 'available_balance'):
             stmt.avail_bal = ofx.account.statement.available_balance
         if hasattr(ofx.account.statement, 'available_balance_date'):
@@ -234,7 +477,6 @@ class OfxApiLocal(object):
         stmt.ledger_bal = ofx.account.statement.balance
         stmt.ledger_bal_as_of = \
             ofx.account.statement.balance_date.replace(tzinfo=UTC)
-        db_session.add(stmt)
         acct.set_balance(
             overall_date=stmt.as_of,
             ledger=stmt.ledger_bal,
@@ -242,7 +484,29 @@ class OfxApiLocal(object):
             avail=stmt.avail_bal,
             avail_date=stmt.avail_bal_as_of
         )
-        for txn in ofx.account.statement.transactions:
+
+    def _bulk_upsert_transactions(self, acct, transactions, stmt):
+        """
+        Bulk equivalent of calling :py:func:`~.db.upsert_record` for each
+        transaction in a Bank or Credit statement. All existing
+        :py:class:`~.OFXTransaction` records for the statement's FITIDs are
+        retrieved in as few queries as possible; only the fields that differ
+        are set on them. Transactions that don't exist yet are inserted in a
+        single bulk INSERT, with their ``is_*`` fields set by
+        :py:func:`~.ofx_classifier.classify_many` and their full-text search
+        tokens added by :py:meth:`~.SearchIndex.index_mappings`, since the
+        flush event handlers do not see them. The number inserted is added to
+        ``self._bulk_inserted`` for :py:meth:`~._new_updated_counts`.
+
+        :param acct: the Account this statement is for
+        :type acct: biweeklybudget.models.account.Account
+        :param transactions: the statement's transactions, or a chunk of them
+        :type transactions: list of ``ofxparse.ofxparse.Transaction``
+        :param stmt: the OFXStatement for this statement
+        :type stmt: biweeklybudget.models.ofx_statement.OFXStatement
+        """
+        rows = {}
+        for txn in transactions:
             try:
                 kwargs = OFXTransaction.params_from_ofxparser_transaction(
                     txn, acct.id, stmt, cat_memo=acct.ofx_cat_memo_to_name
@@ -250,12 +514,46 @@ class OfxApiLocal(object):
             except RuntimeError as ex:
                 logger.error(ex)
                 continue
-            upsert_record(
-                OFXTransaction,
-                ['account_id', 'fitid'],
-                **kwargs
-            )
-        return stmt
+            # as with upsert_record, later duplicates override earlier ones
+            rows[kwargs['fitid']] = kwargs
+        fitids = list(rows.keys())
+        existing = {}
+        for i in range(0, len(fitids), self.BULK_QUERY_CHUNK_SIZE):
+            for t in db_session.query(OFXTransaction).filter(
+                OFXTransaction.account_id.__eq__(acct.id),
+                OFXTransaction.fitid.in_(
+                    fitids[i:i + self.BULK_QUERY_CHUNK_SIZE]
+                )
+            ).all():
+                existing[t.fitid] = t
+        # flush the statement, to get its ID for the new transactions
+        db_session.flush()
+        new = []
+        for fitid, kwargs in rows.items():
+            if fitid in existing:
+                t = existing[fitid]
+                for k, v in kwargs.items():
+                    if k in ['account_id', 'fitid']:
+                        continue
+                    if getattr(t, k) != v:
+                        setattr(t, k, v)
+                continue
+            mapping = dict(kwargs)
+            del mapping['statement']
+            mapping['statement_id'] = stmt.id
+            new.append(mapping)
+        for mapping, fields in zip(
+            new, classify_many(acct, [m['name'] for m in new])
+        ):
+            mapping.update(fields)
+        logger.info(
+            'Bulk upserting %d OFXTransactions for account %d: %d new, %d '
+            'existing', len(rows), acct.id, len(new), len(existing)
+        )
+        if len(new) > 0:
+            db_session.bulk_insert_mappings(OFXTransaction, new)
+            ofx_transaction_search.index_mappings(db_session, new)
+        self._bulk_inserted += len(new)
 
     def _update_investment(self, acct, ofx, stmt):
         """
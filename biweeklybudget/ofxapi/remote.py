@@ -37,11 +37,17 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 
 import logging
 import pickle
+import gzip
+import json
 from base64 import b64encode
 
 import requests
 
 from biweeklybudget.ofxapi.exceptions import DuplicateFileException
+from biweeklybudget.ingest_metrics import IngestMetrics, IngestResult
+from biweeklybudget.ofxapi.serialization import (
+    SCHEMA_VERSION, statement_to_dict
+)
 
 try:
     from urllib.parse import urljoin
@@ -95,6 +101,8 @@ class OfxApiRemote(object):
                 )
             else:
                 self._requests_kwargs['cert'] = client_cert_path
+        #: HTTP session, so that connections are kept alive and reused
+        self._session = requests.Session()
 
     def get_accounts(self):
         """
@@ -120,10 +128,35 @@ class OfxApiRemote(object):
         """
         url = urljoin(self._base_url, '/api/ofx/accounts')
         logger.debug('GET ofx accounts from: %s', url)
-        r = requests.get(url, **self._requests_kwargs)
+        r = self._session.get(url, **self._requests_kwargs)
         logger.debug('API Response: HTTP %d; text: %s', r.status_code, r.text)
         return r.json()
 
+    def get_statement_ids(self, stmt_ids):
+        """
+        Return which of the specified
+        :py:class:`~biweeklybudget.models.ofx_statement.OFXStatement` IDs exist
+        in the database.
+
+        :param stmt_ids: OFXStatement IDs to look for
+        :type stmt_ids: list
+        :return: the IDs in ``stmt_ids`` that exist
+        :rtype: set
+        :raises: :py:exc:`RuntimeError` if the request fails
+        """
+        url = urljoin(self._base_url, '/api/ofx/statement_ids')
+        logger.debug('POST %d statement IDs to: %s', len(stmt_ids), url)
+        r = self._session.post(
+            url, json={'statement_ids': sorted(stmt_ids)},
+            **self._requests_kwargs
+        )
+        logger.debug('API Response: HTTP %d; text: %s', r.status_code, r.text)
+        if r.status_code != 200:
+            raise RuntimeError('OFX API Error (HTTP %d): %s' % (
+                r.status_code, r.text
+            ))
+        return set(r.json()['statement_ids'])
+
     def update_statement_ofx(self, acct_id, ofx, mtime=None, filename=None):
         """
         Update a single statement for the specified account, from an OFX file.
@@ -139,8 +172,10 @@ class OfxApiRemote(object):
         :returns: 3-tuple of the int ID of the
           :py:class:`~biweeklybudget.models.ofx_statement.OFXStatement`
           created by this run, int count of new :py:class:`~.OFXTransaction`
-          created, and int count of :py:class:`~.OFXTransaction` updated
-        :rtype: tuple
+          created, and int count of :py:class:`~.OFXTransaction` updated; its
+          ``metrics`` attribute has the per-stage timing and counts reported
+          by the server
+        :rtype: biweeklybudget.ingest_metrics.IngestResult
         :raises: :py:exc:`RuntimeError` on error parsing OFX or unknown account
           type; :py:exc:`~.DuplicateFileException` if the file (according to the
           OFX signon date/time) has already been recorded.
@@ -158,7 +193,7 @@ class OfxApiRemote(object):
         }
         url = urljoin(self._base_url, '/api/ofx/statement')
         logger.debug('POST ofx statement to: %s; data: %s', url, postdata)
-        r = requests.post(url, json=postdata, **self._requests_kwargs)
+        r = self._session.post(url, json=postdata, **self._requests_kwargs)
         logger.debug('API Response: HTTP %d; text: %s', r.status_code, r.text)
         try:
             resp = r.json()
@@ -180,4 +215,87 @@ class OfxApiRemote(object):
             )
         # success
         logger.debug('Successfully uploaded statement: %s', resp['message'])
-        return resp['statement_id'], resp['count_new'], resp['count_updated']
+        return self._result(resp)
+
+    def update_statements(self, statements):
+        """
+        Update multiple statements in a single request, each as with
+        :py:meth:`~.update_statement_ofx`. The statements are encoded with
+        :py:func:`~biweeklybudget.ofxapi.serialization.statement_to_dict` and
+        sent as one gzip-compressed JSON document.
+
+        :param statements: list of (Account ID, ``ofxparse.ofxparse.Ofx``,
+          mtime, filename) 4-tuples, as the arguments to
+          :py:meth:`~.update_statement_ofx`
+        :type statements: list
+        :returns: list with one element per statement, in the same order;
+          either a 3-tuple as returned by :py:meth:`~.update_statement_ofx`,
+          or an exception (:py:exc:`~.DuplicateFileException` if the statement
+          has already been recorded, otherwise :py:exc:`RuntimeError`)
+        :rtype: list
+        :raises: :py:exc:`RuntimeError` if the request as a whole fails
+        """
+        body = gzip.compress(json.dumps({
+            'version': SCHEMA_VERSION,
+            'statements': [statement_to_dict(*x) for x in statements]
+        }).encode('utf-8'))
+        url = urljoin(self._base_url, '/api/ofx/statements')
+        logger.debug(
+            'POST %d ofx statements to: %s (%d bytes)', len(statements), url,
+            len(body)
+        )
+        r = self._session.post(
+            url, data=body, headers={
+                'Content-Type': 'application/json',
+                'Content-Encoding': 'gzip'
+            }, **self._requests_kwargs
+        )
+        logger.debug('API Response: HTTP %d; text: %s', r.status_code, r.text)
+        try:
+            resp = r.json()
+        except Exception:
+            raise RuntimeError(
+                'API response could not be JSON deserialized: %s' % r.text
+            )
+        if r.status_code != 200:
+            raise RuntimeError('OFX API Error (HTTP %d): %s' % (
+                r.status_code, resp.get('message')
+            ))
+        if len(resp['results']) != len(statements):
+            raise RuntimeError(
+                'OFX API returned %d results for %d statements' % (
+                    len(resp['results']), len(statements)
+                )
+            )
+        results = []
+        for res in resp['results']:
+            if res['success']:
+                results.append(self._result(res))
+            elif res.get('duplicate'):
+                results.append(DuplicateFileException(
+                    res['account_id'], res['filename'], res['statement_id']
+                ))
+            else:
+                results.append(
+                    RuntimeError('OFX API Error: %s' % res.get('message'))
+                )
+        return results
+
+    @staticmethod
+    def _result(resp):
+        """
+        Return the :py:class:`~biweeklybudget.ingest_metrics.IngestResult` for
+        one successful statement upload API response. Its ``metrics`` are
+        None if the server didn't return any.
+
+        :param resp: API response for one statement
+        :type resp: dict
+        :rtype: biweeklybudget.ingest_metrics.IngestResult
+        """
+        metrics = None
+        if resp.get('metrics') is not None:
+            metrics = IngestMetrics.from_dict(resp['metrics'])
+        return IngestResult(
+            resp['statement_id'], resp['count_new'], resp['count_updated'],
+            metrics=metrics
+        )
@@ -0,0 +1,263 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/biweeklybudget>
+
+################################################################################
+Copyright 2016-2024 Jason Antman <http://www.jasonantman.com>
+
+    This file is part of biweeklybudget, also known as biweeklybudget.
+
+    biweeklybudget is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    biweeklybudget is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with biweeklybudget.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/biweeklybudget> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+from datetime import datetime
+from decimal import Decimal
+
+from ofxparse.ofxparse import (
+    Ofx, Account, InvestmentAccount, AccountType, Institution, Signon,
+    Statement, Transaction, Position
+)
+
+#: Version of the statement schema. It is sent with each batch of statements,
+#: and the server rejects batches with any other version.
+SCHEMA_VERSION = 1
+
+
+def _identity(value):
+    return value
+
+
+def _datetime(value):
+    return value.isoformat()
+
+
+#: (encode, decode) functions for plain JSON values
+_PLAIN = (_identity, _identity)
+
+#: (encode, decode) functions for datetimes, as ISO 8601 strings
+_DATETIME = (_datetime, datetime.fromisoformat)
+
+#: (encode, decode) functions for Decimals, as strings
+_DECIMAL = (str, Decimal)
+
+#: Attributes of ``ofxparse.Signon`` and how to encode them
+SIGNON_SCHEMA = {
+    'code': _PLAIN,
+    'severity': _PLAIN,
+    'message': _PLAIN,
+    'dtserver': _PLAIN,
+    'language': _PLAIN,
+    'dtprofup': _PLAIN,
+    'fi_org': _PLAIN,
+    'fi_fid': _PLAIN,
+    'intu_bid': _PLAIN
+}
+
+#: Attributes of ``ofxparse.Account`` and how to encode them
+ACCOUNT_SCHEMA = {
+    'type': _PLAIN,
+    'curdef': _PLAIN,
+    'account_id': _PLAIN,
+    'routing_number': _PLAIN,
+    'branch_id': _PLAIN,
+    'account_type': _PLAIN,
+    'brokerid': _PLAIN
+}
+
+#: Attributes of ``ofxparse.Institution`` and how to encode them
+INSTITUTION_SCHEMA = {
+    'organization': _PLAIN,
+    'fid': _PLAIN
+}
+
+#: Attributes of ``ofxparse.Statement`` and how to encode them
+STATEMENT_SCHEMA = {
+    'balance': _DECIMAL,
+    'balance_date': _DATETIME,
+    'available_balance': _DECIMAL,
+    'available_balance_date': _DATETIME
+}
+
+#: Attributes of ``ofxparse.Transaction`` and how to encode them
+TRANSACTION_SCHEMA = {
+    'id': _PLAIN,
+    'type': _PLAIN,
+    'date': _DATETIME,
+    'amount': _DECIMAL,
+    'payee': _PLAIN,
+    'memo': _PLAIN,
+    'sic': _PLAIN,
+    'mcc': _PLAIN,
+    'checknum': _PLAIN
+}
+
+#: Attributes of ``ofxparse.Position`` and how to encode them
+POSITION_SCHEMA = {
+    'date': _DATETIME,
+    'units': _DECIMAL,
+    'unit_price': _DECIMAL,
+    'market_value': _DECIMAL
+}
+
+
+def _encode(obj, schema):
+    """
+    Return a JSON-serializable dict of the attributes of ``obj`` that are in
+    ``schema``. Attributes that ``obj`` does not have are omitted.
+
+    :param obj: object to encode
+    :param schema: dict of attribute name to (encode, decode) functions
+    :type schema: dict
+    :rtype: dict
+    """
+    res = {}
+    for name, (encode, _) in schema.items():
+        if not hasattr(obj, name):
+            continue
+        value = getattr(obj, name)
+        res[name] = None if value is None else encode(value)
+    return res
+
+
+def _decode(obj, data, schema):
+    """
+    Set attributes on ``obj`` from a dict created by :py:func:`~._encode`.
+
+    :param obj: object to set attributes on
+    :param data: encoded attributes
+    :type data: dict
+    :param schema: dict of attribute name to (encode, decode) functions
+    :type schema: dict
+    :return: ``obj``
+    :raises: :py:exc:`ValueError` if ``data`` has an attribute that is not in
+      ``schema`` or cannot be decoded
+    """
+    for name, value in data.items():
+        if name not in schema:
+            raise ValueError('Unknown %s attribute: %s' % (
+                type(obj).__name__, name
+            ))
+        try:
+            setattr(obj, name, None if value is None else schema[name][1](
+                value
+            ))
+        except Exception as ex:
+            raise ValueError('Invalid %s %s: %s (%s)' % (
+                type(obj).__name__, name, value, ex
+            ))
+    return obj
+
+
+def statement_to_dict(acct_id, ofx, mtime=None, filename=None):
+    """
+    Encode the arguments to :py:meth:`~.OfxApiLocal.update_statement_ofx` as
+    a JSON-serializable dict. Only the parts of the ``ofx`` that
+    :py:class:`~.OfxApiLocal` uses are included.
+
+    :param acct_id: Account ID that statement is for
+    :type acct_id: int
+    :param ofx: Ofx instance for parsed file
+    :type ofx: ``ofxparse.ofxparse.Ofx``
+    :param mtime: OFX file modification time (or current time)
+    :type mtime: datetime.datetime
+    :param filename: OFX file name
+    :type filename: str
+    :return: encoded statement
+    :rtype: dict
+    """
+    stmt = ofx.account.statement
+    res = {
+        'acct_id': acct_id,
+        'filename': filename,
+        'mtime': None if mtime is None else mtime.isoformat(),
+        'signon': _encode(ofx.signon, SIGNON_SCHEMA),
+        'account': _encode(ofx.account, ACCOUNT_SCHEMA),
+        'institution': None,
+        'statement': _encode(stmt, STATEMENT_SCHEMA),
+        'transactions': [
+            _encode(t, TRANSACTION_SCHEMA)
+            for t in getattr(stmt, 'transactions', [])
+        ],
+        'positions': [
+            _encode(p, POSITION_SCHEMA) for p in getattr(stmt, 'positions', [])
+        ]
+    }
+    if hasattr(ofx, 'status'):
+        res['status'] = dict(ofx.status)
+    if ofx.account.institution is not None:
+        res['institution'] = _encode(
+            ofx.account.institution, INSTITUTION_SCHEMA
+        )
+    return res
+
+
+def statement_from_dict(data):
+    """
+    Decode a dict created by :py:func:`~.statement_to_dict` into the
+    arguments to :py:meth:`~.OfxApiLocal.update_statement_ofx`. The ``ofx``
+    is built from ``ofxparse`` classes, with only the encoded attributes set.
+
+    :param data: encoded statement
+    :type data: dict
+    :return: 4-tuple of Account ID, ``ofxparse.ofxparse.Ofx``, mtime
+      (datetime or None) and filename
+    :rtype: tuple
+    :raises: :py:exc:`ValueError` if ``data`` does not match the schema
+    """
+    try:
+        ofx = Ofx()
+        signon = Signon.__new__(Signon)
+        ofx.signon = _decode(signon, data['signon'], SIGNON_SCHEMA)
+        if data['account'].get('type') == AccountType.Investment:
+            acct = InvestmentAccount()
+        else:
+            acct = Account()
+        ofx.account = _decode(acct, data['account'], ACCOUNT_SCHEMA)
+        if data['institution'] is not None:
+            acct.institution = _decode(
+                Institution(), data['institution'], INSTITUTION_SCHEMA
+            )
+        stmt = _decode(Statement(), data['statement'], STATEMENT_SCHEMA)
+        acct.statement = stmt
+        stmt.transactions = [
+            _decode(Transaction(), t, TRANSACTION_SCHEMA)
+            for t in data['transactions']
+        ]
+        if acct.type == AccountType.Investment:
+            stmt.positions = [
+                _decode(Position(), p, POSITION_SCHEMA)
+                for p in data['positions']
+            ]
+        if 'status' in data:
+            ofx.status = data['status']
+        mtime = data['mtime']
+        if mtime is not None:
+            mtime = datetime.fromisoformat(mtime)
+        return data['acct_id'], ofx, mtime, data['filename']
+    except (KeyError, TypeError, AttributeError) as ex:
+        raise ValueError('Invalid statement data: %s' % ex)
@@ -39,8 +39,13 @@ from datetime import datetime
 import os
 import argparse
 import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from copy import deepcopy
 from io import StringIO
+from timeit import default_timer
 import importlib
 import json
 
@@ -51,6 +56,8 @@ from biweeklybudget.vendored.ofxclient.account \
 from biweeklybudget.vault import Vault
 from biweeklybudget.cliutils import set_log_debug, set_log_info
 from biweeklybudget.ofxapi import apiclient
+from biweeklybudget.import_manifest import ImportManifest
+from biweeklybudget.ingest_metrics import IngestSummary
 
 logger = logging.getLogger(__name__)
 
@@ -77,7 +84,7 @@ class OfxGetter(object):
         """
         return client.get_accounts()
 
-    def __init__(self, client, savedir='./'):
+    def __init__(self, client, savedir='./', manifest=None):
         """
         Initialize OfxGetter class.
 
@@ -86,9 +93,14 @@ class OfxGetter(object):
           :py:class:`~.OfxApiRemote`
         :param savedir: directory/path to save statements in
         :type savedir: str
+        :param manifest: import manifest for ``savedir``, to record the
+          statement files that are written and imported in, so that
+          ofxbackfiller doesn't parse them again; or None
+        :type manifest: biweeklybudget.import_manifest.ImportManifest
         """
         self._client = client
         self.savedir = savedir
+        self._manifest = manifest
         self._account_data = self.accounts(self._client)
         logger.debug('Initialized with data for %d accounts',
                      len(self._account_data))
@@ -120,6 +132,8 @@ class OfxGetter(object):
                 self._accounts[acct_name] = OfxClientAccount.deserialize(data)
         logger.debug('Initialized %d accounts', len(self._accounts))
         self.now_str = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+        #: aggregated ingestion metrics for all statements updated
+        self.summary = IngestSummary()
 
     def get_ofx(self, account_name, write_to_file=True, days=30):
         """
@@ -135,30 +149,206 @@ class OfxGetter(object):
         :return: OFX string
         :rtype: str
         """
+        ofxdata, fname = self._download_ofx(
+            account_name, write_to_file=write_to_file, days=days
+        )
+        self._ofx_to_db(account_name, fname, ofxdata)
+        return ofxdata
+
+    def _download_ofx(self, account_name, write_to_file=True, days=30,
+                      quiet=True):
+        """
+        Download OFX from the specified account, and optionally write it to a
+        file, but do not update it in the database. This does not touch the
+        database, the API client or Vault, and each call uses its own
+        ScreenScraper instance or ofxclient Account, so when ``quiet`` is
+        False it is safe to call from multiple threads at once for different
+        accounts.
+
+        :param account_name: account name to download
+        :type account_name: str
+        :param write_to_file: if True, also write to a file named
+          "<account_name>_<date stamp>.ofx"
+        :type write_to_file: bool
+        :param days: number of days of data to download
+        :type days: int
+        :param quiet: if True, raise the root logger level to WARNING while
+          downloading with ofxclient, unless debug logging is enabled. This
+          changes process-wide logging state.
+        :type quiet: bool
+        :return: 2-tuple of OFX string and the name of the file it was written
+          to (or None)
+        :rtype: tuple
+        """
         fname = None
         logger.debug('Downloading OFX for account: %s', account_name)
         if 'class_name' in self._account_data[account_name]['config']:
             ofxdata = self._get_ofx_scraper(account_name, days=days)
         else:
             acct = self._accounts[account_name]
-            if logger.getEffectiveLevel() != logging.DEBUG:
+            quiet = quiet and logger.getEffectiveLevel() != logging.DEBUG
+            if quiet:
                 logger.debug(
                     'Disabling logging for ofxclient, which has bad logging'
                 )
                 oldlvl = logging.getLogger().getEffectiveLevel()
                 logging.getLogger().setLevel(logging.WARNING)
             ofxdata = acct.download(days=days).read()
-            if logger.getEffectiveLevel() != logging.DEBUG:
+            if quiet:
                 logging.getLogger().setLevel(oldlvl)
                 logger.debug('Re-enabling ofxclient logging')
         if write_to_file:
             fname = self._write_ofx_file(account_name, ofxdata)
-        self._ofx_to_db(account_name, fname, ofxdata)
-        return ofxdata
+        return ofxdata, fname
+
+    def _institution_key(self, account_name):
+        """
+        Return a string identifying the institution that the specified account
+        is downloaded from, for limiting concurrent downloads per institution
+        in :py:meth:`~.get_ofx_concurrent`. This is the module and class name
+        for ScreenScraper accounts, or the institution URL (or organization
+        name) for ofxclient accounts.
+
+        :param account_name: account name
+        :type account_name: str
+        :return: institution key
+        :rtype: str
+        """
+        data = self._account_data[account_name]['config']
+        if 'class_name' in data:
+            return '%s.%s' % (data['module_name'], data['class_name'])
+        inst = data.get('institution', {})
+        return inst.get('url') or inst.get('org') or account_name
+
+    def get_ofx_concurrent(self, account_names, write_to_file=True, days=30,
+                           jobs=4, per_institution=1):
+        """
+        Download OFX for multiple accounts concurrently, in a pool of ``jobs``
+        threads, with at most ``per_institution`` simultaneous downloads from
+        any one institution (see :py:meth:`~._institution_key`). Downloaded
+        statements are written to the database one at a time, in the calling
+        thread, as each download completes. The worker threads only run
+        :py:meth:`~._download_ofx`; all Vault secrets were already read in
+        ``__init__``, so the Vault client, API client and database session
+        are only used from the calling thread.
+
+        Returns an OrderedDict of account name to a dict of results, with keys
+        ``status`` (``ok``, ``download failed`` or ``update failed``),
+        ``download_secs`` and ``update_secs`` (float seconds spent downloading
+        and updating the database, or None if not reached), and ``count_new``
+        and ``count_upd`` (counts of OFXTransactions inserted and updated, or
+        None).
+
+        :param account_names: names of the accounts to download
+        :type account_names: list
+        :param write_to_file: if True, also write each statement to a file
+          named "<account_name>_<date stamp>.ofx"
+        :type write_to_file: bool
+        :param days: number of days of data to download
+        :type days: int
+        :param jobs: maximum number of concurrent downloads
+        :type jobs: int
+        :param per_institution: maximum number of concurrent downloads from
+          any one institution
+        :type per_institution: int
+        :return: dict of account name to results
+        :rtype: collections.OrderedDict
+        """
+        by_inst = OrderedDict()
+        for name in account_names:
+            by_inst.setdefault(self._institution_key(name), []).append(name)
+        limits = {
+            k: threading.BoundedSemaphore(per_institution)
+            for k in by_inst.keys()
+        }
+        # interleave institutions, so workers don't all queue up behind one
+        ordered = []
+        while any(by_inst.values()):
+            for names in by_inst.values():
+                if names:
+                    ordered.append(names.pop(0))
+        res = OrderedDict()
+        for name in account_names:
+            res[name] = {
+                'status': None,
+                'download_secs': None,
+                'update_secs': None,
+                'count_new': None,
+                'count_upd': None
+            }
+
+        def download(name):
+            with limits[self._institution_key(name)]:
+                start = time.time()
+                ofxdata, fname = self._download_ofx(
+                    name, write_to_file=write_to_file, days=days, quiet=False
+                )
+                return ofxdata, fname, time.time() - start
+
+        logger.info(
+            'Downloading %d accounts from %d institutions with %d jobs',
+            len(ordered), len(limits), jobs
+        )
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = {executor.submit(download, n): n for n in ordered}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    ofxdata, fname, res[name]['download_secs'] = \
+                        future.result()
+                except Exception:
+                    logger.error(
+                        'Failed to download account %s', name, exc_info=True
+                    )
+                    res[name]['status'] = 'download failed'
+                    continue
+                start = time.time()
+                try:
+                    res[name]['count_new'], res[name]['count_upd'] = \
+                        self._ofx_to_db(name, fname, ofxdata)
+                    res[name]['status'] = 'ok'
+                except Exception:
+                    logger.error(
+                        'Failed to update account %s', name, exc_info=True
+                    )
+                    res[name]['status'] = 'update failed'
+                res[name]['update_secs'] = time.time() - start
+        return res
+
+    @staticmethod
+    def timing_report(results):
+        """
+        Format the results of :py:meth:`~.get_ofx_concurrent` as a plain text
+        table of per-account status, timing and transaction counts.
+
+        :param results: return value of :py:meth:`~.get_ofx_concurrent`
+        :type results: dict
+        :return: report
+        :rtype: str
+        """
+        def fmt(val, spec):
+            return '-' if val is None else spec % val
+
+        width = max([len('Account')] + [len(k) for k in results.keys()])
+        lines = [
+            '%-*s  %-15s  %8s  %8s  %5s  %7s' % (
+                width, 'Account', 'Status', 'Download', 'Update', 'New',
+                'Updated'
+            )
+        ]
+        for name, r in results.items():
+            lines.append('%-*s  %-15s  %8s  %8s  %5s  %7s' % (
+                width, name, r['status'],
+                fmt(r['download_secs'], '%.2fs'),
+                fmt(r['update_secs'], '%.2fs'),
+                fmt(r['count_new'], '%d'), fmt(r['count_upd'], '%d')
+            ))
+        return '\n'.join(lines)
 
     def _ofx_to_db(self, account_name, fname, ofxdata):
         """
-        Put OFX Data to the DB
+        Put OFX Data to the DB, and add the ingestion metrics for it (with the
+        time spent parsing it as the ``parse`` stage) to :py:attr:`~.summary`.
 
         :param account_name: account name to download
         :type account_name: str
@@ -166,21 +356,37 @@ class OfxGetter(object):
         :type ofxdata: str
         :param fname: filename OFX was written to
         :type fname: str
+        :return: 2-tuple of count of new OFXTransactions inserted and count of
+          existing OFXTransactions updated
+        :rtype: tuple
         """
         logger.debug('Parsing OFX')
+        start = default_timer()
         ofx = OfxParser.parse(StringIO(ofxdata))
+        parse_secs = default_timer() - start
         logger.debug('Updating OFX in DB')
-        _, count_new, count_upd = self._client.update_statement_ofx(
+        res = self._client.update_statement_ofx(
             self._account_data[account_name]['id'], ofx, filename=fname
         )
+        stmt_id, count_new, count_upd = res
+        if getattr(res, 'metrics', None) is not None:
+            res.metrics.add_stage('parse', parse_secs)
+            self.summary.add(res.metrics)
+        if self._manifest is not None and fname is not None:
+            self._manifest.record(
+                os.path.join(self.savedir, account_name, fname), stmt_id
+            )
+            self._manifest.save()
         logger.info('Account "%s" - inserted %d new OFXTransaction(s), updated '
                     '%d existing OFXTransaction(s)',
                     account_name, count_new, count_upd)
         logger.debug('Done updating OFX in DB')
+        return count_new, count_upd
 
     def _get_ofx_scraper(self, account_name, days=30):
         """
-        Get OFX via a ScreenScraper subclass.
+        Get OFX via a new instance of a ScreenScraper subclass, using the
+        username and password that were read from Vault in ``__init__``.
 
         :param account_name: account name
         :type account_name: str
@@ -198,16 +404,14 @@ class OfxGetter(object):
             importlib.import_module(modname),
             clsname
         )
-        logger.debug('Getting secrets for account %s', account_name)
-        secrets = self.vault.read(
-            self._account_data[account_name]['vault_path']
-        )
         if 'kwargs' in data:
             kwargs = deepcopy(data['kwargs'])
         else:
             kwargs = {}
-        kwargs['username'] = secrets['username']
-        kwargs['password'] = secrets['password']
+        # secrets were read from Vault in __init__; the Vault client is not
+        # used after that, as this may be running in a worker thread
+        kwargs['username'] = data['institution']['username']
+        kwargs['password'] = data['institution']['password']
         kwargs['savedir'] = os.path.join(self.savedir, account_name)
         acct = cls(**kwargs)
         ofxdata = acct.run()
@@ -235,6 +439,26 @@ class OfxGetter(object):
         return fname
 
 
+def positive_int(value):
+    """
+    argparse ``type`` for options that must be an integer of at least 1.
+
+    :param value: command line argument value
+    :type value: str
+    :return: integer value
+    :rtype: int
+    :raises: :py:exc:`argparse.ArgumentTypeError` if ``value`` is not an
+      integer greater than zero
+    """
+    try:
+        res = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError('invalid int value: %r' % value)
+    if res < 1:
+        raise argparse.ArgumentTypeError('must be at least 1: %r' % value)
+    return res
+
+
 def parse_args():
     p = argparse.ArgumentParser(description='Download OFX transactions')
     p.add_argument('-v', '--verbose', dest='verbose', action='count', default=0,
@@ -267,6 +491,18 @@ def parse_args():
     p.add_argument('-d', '--days', dest='days', action='store', type=int,
                    default=30,
                    help='number of days of history to get; default 30')
+    p.add_argument('-j', '--jobs', dest='jobs', action='store',
+                   type=positive_int, default=None,
+                   help='download all accounts concurrently with this many '
+                        'workers, and print a timing report at the end')
+    p.add_argument('-M', '--metrics', dest='metrics', action='store_true',
+                   default=False,
+                   help='when done, print a summary of the time spent in each '
+                        'stage of updating the statements in the database')
+    p.add_argument('--per-institution', dest='per_institution',
+                   action='store', type=positive_int, default=1,
+                   help='with -j/--jobs, maximum number of concurrent '
+                        'downloads from one institution; default 1')
     p.add_argument('ACCOUNT_NAME', type=str, action='store', default=None,
                    nargs='?',
                    help='Account name; omit to download all accounts')
@@ -313,7 +549,7 @@ def main():
             raise SystemExit(1)
         save_path = os.path.abspath(args.save_path)
 
-    getter = OfxGetter(client, save_path)
+    getter = OfxGetter(client, save_path, manifest=ImportManifest(save_path))
 
     if args.institution:
         if args.ACCOUNT_NAME is None:
@@ -331,8 +567,21 @@ def main():
 
     if args.ACCOUNT_NAME is not None:
         getter.get_ofx(args.ACCOUNT_NAME, days=args.days)
-        raise SystemExit(0)
+        _exit(getter, args, 0)
     # else all of them
+    if args.jobs is not None:
+        results = getter.get_ofx_concurrent(
+            sorted(OfxGetter.accounts(client).keys()), days=args.days,
+            jobs=args.jobs, per_institution=args.per_institution
+        )
+        print(OfxGetter.timing_report(results))
+        success = len([x for x in results.values() if x['status'] == 'ok'])
+        if success != len(results):
+            logger.warning(
+                'Downloaded %d of %d accounts', success, len(results)
+            )
+            _exit(getter, args, 1)
+        _exit(getter, args, 0)
     total = 0
     success = 0
     for acctname in sorted(OfxGetter.accounts(client).keys()):
@@ -346,8 +595,24 @@ def main():
             )
     if success != total:
         logger.warning('Downloaded %d of %d accounts', success, total)
-        raise SystemExit(1)
-    raise SystemExit(0)
+        _exit(getter, args, 1)
+    _exit(getter, args, 0)
+
+
+def _exit(getter, args, code):
+    """
+    Print the aggregated ingestion metrics if requested, and then exit.
+
+    :param getter: the OfxGetter that was run
+    :type getter: OfxGetter
+    :param args: parsed command-line arguments
+    :type args: argparse.Namespace
+    :param code: exit code
+    :type code: int
+    """
+    if args.metrics:
+        print(getter.summary.report())
+    raise SystemExit(code)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,386 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/biweeklybudget>
+
+################################################################################
+Copyright 2016-2024 Jason Antman <http://www.jasonantman.com>
+
+    This file is part of biweeklybudget, also known as biweeklybudget.
+
+    biweeklybudget is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    biweeklybudget is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with biweeklybudget.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/biweeklybudget> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+
+import codecs
+import html
+import re
+from collections import OrderedDict
+
+from ofxparse import OfxParser, AccountType
+from ofxparse.ofxparse import OfxParserException
+
+
+class _StreamOfxParser(OfxParser):
+    """
+    :py:class:`ofxparse.OfxParser` with the class attributes that
+    ``OfxParser.parse()`` would normally set, so that its per-element
+    classmethods can be called without parsing a whole document.
+    """
+
+    fail_fast = True
+    custom_date_format = None
+
+
+class _Node(object):
+    """
+    Minimal stand-in for the parts of a BeautifulSoup ``Tag`` that the
+    ``OfxParser`` classmethods use. :py:meth:`~.find` returns the first
+    descendant with the given name, as with BeautifulSoup, but only
+    descendants seen while this node was being collected are known.
+    """
+
+    __slots__ = ['name', 'contents', '_children']
+
+    def __init__(self, name, contents):
+        self.name = name
+        self.contents = contents
+        self._children = {}
+
+    def add(self, node):
+        """
+        Record a descendant node, if none with its name was seen yet.
+
+        :param node: descendant node
+        :type node: _Node
+        """
+        self._children.setdefault(node.name, node)
+
+    def find(self, name):
+        return self._children.get(name)
+
+    def findAll(self, name):
+        # transactions are streamed, never collected
+        return []
+
+
+class OfxStreamReader(object):
+    """
+    Incremental reader for Bank and Credit Card OFX/QFX files, which does not
+    build a tree of the whole document in memory like
+    :py:meth:`ofxparse.OfxParser.parse` does.
+
+    On initialization, the file is read up to the first transaction of the
+    first statement, and the :py:attr:`~.headers`,
+    :py:attr:`~.signon`, :py:attr:`~.account` and (if present)
+    :py:attr:`~.status` attributes are set the same as on an
+    ``ofxparse.ofxparse.Ofx`` for the file, except that
+    ``account.statement.transactions`` is empty. Transactions are then read
+    one at a time from :py:meth:`~.transactions` (or in lists from
+    :py:meth:`~.chunks`) as ``ofxparse.ofxparse.Transaction`` instances.
+    As OFX puts the statement balances after the transaction list, the
+    ``balance`` and ``available_balance`` attributes of ``account.statement``
+    are only set once all transactions have been read.
+
+    Each element is parsed with the same ``OfxParser`` classmethods that
+    ``OfxParser.parse()`` uses, so the results can be passed to
+    :py:meth:`~.OFXTransaction.params_from_ofxparser_transaction` and
+    :py:meth:`~.OfxApiLocal.update_statement_stream`. Only the first Bank or
+    Credit Card statement in the file is read; Investment statements are not
+    supported.
+    """
+
+    #: regex matching an OFX opening or closing tag
+    _TAG_RE = re.compile(r'(?i)<(/?)([a-z0-9_.]+)>')
+
+    #: regex splitting text on CDATA sections, capturing their contents
+    _CDATA_RE = re.compile(r'<!\[CDATA\[(.*?)\]\]>', re.DOTALL)
+
+    #: aggregates whose descendants are collected for the OfxParser methods
+    _COLLECT = [
+        'sonrs', 'fi', 'status', 'stmttrnrs', 'ccstmttrnrs', 'stmtrs',
+        'ccstmtrs', 'stmttrn', 'ledgerbal', 'availbal'
+    ]
+
+    #: statement aggregates to AccountType
+    _STATEMENT_TYPES = {
+        'stmtrs': AccountType.Bank,
+        'ccstmtrs': AccountType.CreditCard
+    }
+
+    def __init__(self, fh, read_size=65536):
+        """
+        Initialize the reader and read the file up to the first transaction of
+        the first statement.
+
+        :param fh: OFX file, opened in binary mode
+        :type fh: ``io.BufferedIOBase``
+        :param read_size: number of bytes to read from ``fh`` at a time
+        :type read_size: int
+        :raises: :py:exc:`ofxparse.ofxparse.OfxParserException` if the file
+          is empty or contains an Investment statement
+        """
+        self._fh = fh
+        self._read_size = read_size
+        #: OFX headers, as in ``ofxparse.ofxparse.Ofx.headers``
+        self.headers = OrderedDict()
+        #: ``ofxparse.ofxparse.Signon`` for the file, or None
+        self.signon = None
+        #: ``ofxparse.ofxparse.Account`` for the first statement, or None
+        self.account = None
+        self._encoding = 'ascii'
+        self._doc = _Node(None, [])
+        self._stack = [self._doc]
+        self._stmt = None
+        self._read = False
+        self._tokens = self._iter_tokens(self._read_headers())
+        self._read_statement_header()
+
+    def _read_headers(self):
+        """
+        Read and decode the OFX headers in the same way as
+        ``ofxparse.ofxparse.OfxFile``, and set :py:attr:`~.headers` and the
+        body encoding.
+
+        :return: the bytes read from the file
+        :rtype: bytes
+        """
+        data = self._fh.read(1024 * 10)
+        head_data = data[:data.find(b'<')]
+        headers = OrderedDict()
+        for line in head_data.splitlines():
+            if line.strip() == b'':
+                break
+            header, value = line.split(b':')
+            headers[header.strip().upper()] = value.strip()
+        ascii_headers = OrderedDict(
+            (k.decode('ascii', 'replace'), v.decode('ascii', 'replace'))
+            for k, v in headers.items()
+        )
+        enc_type = ascii_headers.get('ENCODING')
+        if not enc_type:
+            self._encoding = 'ascii'
+            self.headers = ascii_headers
+        else:
+            if enc_type == 'USASCII':
+                self._encoding = 'cp%s' % ascii_headers.get('CHARSET', '1252')
+            elif enc_type in ('UNICODE', 'UTF-8'):
+                self._encoding = 'utf-8'
+            else:
+                raise OfxParserException(
+                    'Unknown OFX encoding: %s' % enc_type
+                )
+            self.headers = OrderedDict(
+                (k.decode(self._encoding), v.decode(self._encoding))
+                for k, v in headers.items()
+            )
+        for k in self.headers:
+            if self.headers[k].upper() == 'NONE':
+                self.headers[k] = None
+        return data
+
+    def _iter_tokens(self, data):
+        """
+        Generator over the tags in the file. Yields 3-tuples of a boolean
+        whether the tag is a closing tag, the lower-case tag name, and a list
+        containing the (entity-decoded) text between this tag and the next
+        one if there is any, or an empty list otherwise.
+
+        :param data: bytes already read from the file
+        :type data: bytes
+        """
+        decoder = codecs.getincrementaldecoder(self._encoding)()
+        buf = ''
+        final = False
+        while not final:
+            final = len(data) == 0
+            buf += decoder.decode(data, final=final)
+            matches = list(self._TAG_RE.finditer(buf))
+            if len(matches) > 0:
+                ends = [m.start() for m in matches[1:]]
+                if final:
+                    ends.append(len(buf))
+                for m, end in zip(matches, ends):
+                    text = buf[m.end():end]
+                    yield (
+                        m.group(1) == '/', m.group(2).lower(),
+                        [self._decode_text(text)] if text else []
+                    )
+                if not final:
+                    # the last tag's text may continue in the next read
+                    buf = buf[matches[-1].start():]
+            if not final:
+                data = self._fh.read(self._read_size)
+
+    def _decode_text(self, text):
+        """
+        Decode the text between two tags like OfxParser does; CDATA sections
+        are replaced with their literal contents and entities in the rest of
+        the text are decoded.
+
+        :param text: raw text
+        :type text: str
+        :return: decoded text
+        :rtype: str
+        """
+        parts = self._CDATA_RE.split(text)
+        # odd-numbered parts are the contents of CDATA sections
+        return ''.join(
+            x if idx % 2 else html.unescape(x) for idx, x in enumerate(parts)
+        )
+
+    def _feed(self, closing, name, contents):
+        """
+        Update the collected nodes for one token from
+        :py:meth:`~._iter_tokens`.
+
+        :param closing: whether the tag is a closing tag
+        :type closing: bool
+        :param name: lower-case tag name
+        :type name: str
+        :param contents: text content list
+        :type contents: list
+        :return: for closing tags of collected aggregates, the closed node;
+          otherwise None
+        :rtype: _Node
+        """
+        if closing:
+            if name not in self._COLLECT:
+                return None
+            for idx in range(len(self._stack) - 1, 0, -1):
+                if self._stack[idx].name == name:
+                    node = self._stack[idx]
+                    del self._stack[idx:]
+                    return node
+            return None
+        node = _Node(name, contents)
+        for parent in self._stack:
+            parent.add(node)
+        if name in self._COLLECT:
+            self._stack.append(node)
+        if self._stmt is None and name in self._STATEMENT_TYPES:
+            self._stmt = node
+        elif self._stmt is None and name == 'invstmtrs':
+            raise OfxParserException(
+                'Investment statements are not supported by OfxStreamReader'
+            )
+        return None
+
+    def _read_statement_header(self):
+        """
+        Read tokens up to the first transaction in the first statement (or the
+        end of its transaction list, the statement or the file), and set
+        :py:attr:`~.signon`, :py:attr:`~.status` and :py:attr:`~.account`
+        from them.
+        """
+        for closing, name, contents in self._tokens:
+            self._feed(closing, name, contents)
+            if self._stmt is None:
+                continue
+            if (
+                (not closing and name == 'stmttrn') or
+                (closing and name in ['banktranlist', self._stmt.name])
+            ):
+                break
+        if self._doc.find('ofx') is None:
+            raise OfxParserException('The ofx file is empty!')
+        sonrs = self._doc.find('sonrs')
+        if sonrs is not None:
+            self.signon = _StreamOfxParser.parseSonrs(sonrs)
+        for trnrs_name in ['stmttrnrs', 'ccstmttrnrs']:
+            trnrs = self._doc.find(trnrs_name)
+            if trnrs is None or trnrs.find('status') is None:
+                continue
+            status = trnrs.find('status')
+            message = status.find('message')
+            # like Ofx.status, only set if present in the file
+            self.status = {
+                'code': int(status.find('code').contents[0].strip()),
+                'severity': status.find('severity').contents[0].strip(),
+                'message': message.contents[0].strip() if message else None
+            }
+        if self._stmt is None:
+            return
+        self.account = _StreamOfxParser.parseStmtrs(
+            [self._stmt], self._STATEMENT_TYPES[self._stmt.name]
+        )[0]
+        fi = self._doc.find('fi')
+        if fi is not None:
+            self.account.institution = _StreamOfxParser.parseOrg(fi)
+
+    def transactions(self):
+        """
+        Generator over the transactions in the first statement in the file.
+        This can only be iterated once. After it is exhausted, the balances
+        on ``account.statement`` are set.
+
+        :return: generator of transactions
+        :rtype: ``ofxparse.ofxparse.Transaction``
+        :raises: :py:exc:`ofxparse.ofxparse.OfxParserException` on a
+          transaction that ``OfxParser`` would fail to parse
+        """
+        if self._read:
+            raise RuntimeError('OfxStreamReader transactions already read')
+        self._read = True
+        if self._stmt is None:
+            return
+        if self._stmt in self._stack:
+            for closing, name, contents in self._tokens:
+                node = self._feed(closing, name, contents)
+                if node is None:
+                    continue
+                if node.name == 'stmttrn':
+                    yield _StreamOfxParser.parseTransaction(node)
+                elif node is self._stmt:
+                    break
+        for tag, attr in [
+            ('ledgerbal', 'balance'), ('availbal', 'available_balance')
+        ]:
+            # OfxParser.parseStatement uses 'ledger' for both
+            _StreamOfxParser.parseBalance(
+                self.account.statement, self._stmt, tag, attr,
+                attr + '_date', 'ledger'
+            )
+
+    def chunks(self, size):
+        """
+        Generator over the transactions in the first statement in the file, in
+        lists of up to ``size`` transactions. See :py:meth:`~.transactions`.
+
+        :param size: maximum number of transactions per list
+        :type size: int
+        :return: generator of lists of transactions
+        :rtype: list
+        """
+        chunk = []
+        for txn in self.transactions():
+            chunk.append(txn)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if len(chunk) > 0:
+            yield chunk
@@ -36,11 +36,15 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 """
 
 import logging
+import threading
+import time as timer
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta, time
 from decimal import Decimal, ROUND_HALF_DOWN
 from typing import Optional, List, Dict
 
 from pytz import UTC
+from sqlalchemy import and_, or_
 
 from biweeklybudget.db import db_session, upsert_record
 from biweeklybudget.models.ofx_transaction import OFXTransaction
@@ -49,9 +53,12 @@ from biweeklybudget.models.account import Account
 from biweeklybudget.models.plaid_items import PlaidItem
 from biweeklybudget.models.plaid_accounts import PlaidAccount
 from biweeklybudget.utils import plaid_client, dtnow
+from biweeklybudget.ingest_metrics import IngestMetrics, IngestResult
 
+from plaid import ApiException
 from plaid.models import (
-    ItemGetRequest, TransactionsGetRequest, TransactionsGetRequestOptions
+    ItemGetRequest, TransactionsGetRequest, TransactionsGetRequestOptions,
+    TransactionsSyncRequest, AccountsGetRequest
 )
 
 logger = logging.getLogger(__name__)
@@ -62,7 +69,10 @@ class PlaidUpdateResult:
 
     def __init__(
         self, item: PlaidItem, success: bool, updated: int, added: int,
-        exc: Optional[Exception], stmt_ids: Optional[List[int]]
+        exc: Optional[Exception], stmt_ids: Optional[List[int]],
+        fetch_secs: Optional[float] = None,
+        apply_secs: Optional[float] = None, removed: int = 0,
+        metrics: Optional[List[IngestMetrics]] = None
     ):
         """
         Store the result of an update.
@@ -73,6 +83,11 @@ class PlaidUpdateResult:
         :param added: count of added transactions
         :param exc: exception encountered, if any
         :param stmt_ids: list of added Statement IDs
+        :param fetch_secs: seconds spent retrieving data from Plaid, if reached
+        :param apply_secs: seconds spent updating the database, if reached
+        :param removed: count of transactions deleted because Plaid reported
+          them as removed
+        :param metrics: ingestion metrics for each added Statement
         """
         self.item = item
         self.success = success
@@ -80,6 +95,10 @@ class PlaidUpdateResult:
         self.added = added
         self.exc = exc
         self.stmt_ids = stmt_ids
+        self.fetch_secs = fetch_secs
+        self.apply_secs = apply_secs
+        self.removed = removed
+        self.metrics = metrics
 
     @property
     def as_dict(self):
@@ -89,14 +108,33 @@ class PlaidUpdateResult:
             'exception': str(self.exc),
             'statement_ids': self.stmt_ids,
             'added': self.added,
-            'updated': self.updated
+            'updated': self.updated,
+            'removed': self.removed,
+            'fetch_secs': self.fetch_secs,
+            'apply_secs': self.apply_secs,
+            'metrics': None if self.metrics is None else [
+                x.as_dict for x in self.metrics
+            ]
         }
 
 
 class PlaidUpdater:
 
+    #: Number of transactions to request per ``/transactions/sync`` page; this
+    #: is the maximum that Plaid allows.
+    SYNC_PAGE_SIZE = 500
+
+    #: Number of times to restart a ``/transactions/sync`` pagination loop from
+    #: its starting cursor, if Plaid reports that the Item's transactions
+    #: changed during pagination.
+    SYNC_RESTARTS = 3
+
     def __init__(self):
         self.client = plaid_client()
+        #: While :py:meth:`~._update_concurrent` is running, a semaphore
+        #: limiting the number of requests to Plaid in flight at once, across
+        #: all of its threads; see :py:meth:`~._request`.
+        self._request_slots: Optional[threading.BoundedSemaphore] = None
 
     @classmethod
     def available_items(cls):
@@ -111,7 +149,7 @@ class PlaidUpdater:
             PlaidItem.institution_name
         ).all()
 
-    def update(self, items=None, days=30):
+    def update(self, items=None, days=30, workers=0, sync=False):
         """
         Update account balances and transactions from Plaid, for either all
         Plaid Items that are available or a specified list of Item IDs.
@@ -120,6 +158,14 @@ class PlaidUpdater:
         :type items: list or None
         :param days: number of days of transactions to get from Plaid
         :type days: int
+        :param workers: if greater than zero, retrieve data from Plaid in
+          threads; see :py:meth:`~._update_concurrent`
+        :type workers: int
+        :param sync: if True, retrieve only the transactions that were added,
+          modified or removed since the last update of each Item that has a
+          ``sync_cursor``, instead of the last ``days`` days of transactions;
+          see :py:meth:`~._fetch_item`
+        :type sync: bool
         :return: list of :py:class:`~.PlaidUpdateResult` instances
         :rtype: list
         """
@@ -129,12 +175,107 @@ class PlaidUpdater:
             'Running Plaid update for %d items: %s',
             len(items), items
         )
+        if workers > 0:
+            return self._update_concurrent(items, days, workers, sync=sync)
         result = []
         for item in items:
-            result.append(self._do_item(item, days=days))
+            result.append(self._do_item(item, days=days, sync=sync))
         return result
 
-    def _do_item(self, item, days):
+    def _update_concurrent(self, items, days, workers, sync=False):
+        """
+        Update the specified Items, retrieving data from Plaid for up to
+        ``workers`` Items at once in a thread pool, and the remaining pages of
+        each Item's transactions concurrently (see
+        :py:meth:`~._get_transactions`). All of these threads share one limit
+        of ``workers`` requests to Plaid in flight at once (see
+        :py:meth:`~._request`). The retrieved data for each Item is applied to
+        the database in the calling thread, one Item at a time, as each Item's
+        requests complete.
+
+        :param items: a list of :py:class:`~.PlaidItem` objects to update
+        :type items: list
+        :param days: number of days of transactions to get from Plaid
+        :type days: int
+        :param workers: maximum number of concurrent requests to Plaid
+        :type workers: int
+        :param sync: whether to use incremental sync; see :py:meth:`~.update`
+        :type sync: bool
+        :return: list of :py:class:`~.PlaidUpdateResult` instances, in the
+          same order as ``items``
+        :rtype: list
+        """
+        result = [None] * len(items)
+        self._request_slots = threading.BoundedSemaphore(workers)
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {}
+                for idx, item in enumerate(items):
+                    logger.info('Plaid update for %s', item)
+                    # ORM attributes must not be loaded from the worker threads
+                    futures[executor.submit(
+                        self._fetch_item, str(item), item.access_token, days,
+                        page_workers=workers, sync=sync,
+                        cursor=item.sync_cursor
+                    )] = idx
+                for future in as_completed(futures):
+                    item = items[futures[future]]
+                    try:
+                        fetched = future.result()
+                    except Exception as ex:
+                        result[futures[future]] = self._failed_result(
+                            item, ex
+                        )
+                        continue
+                    result[futures[future]] = self._apply_item(item, *fetched)
+        finally:
+            self._request_slots = None
+        return result
+
+    def _request(self, method, req):
+        """
+        Issue one request to Plaid. While :py:meth:`~._update_concurrent` is
+        running, first wait until fewer than its ``workers`` requests are in
+        flight, so that the Item and page threads together never exceed the
+        ``PLAID_UPDATE_WORKERS`` limit. The slot is only held for the duration
+        of the request itself, never while waiting on other threads.
+
+        :param method: the Plaid API client method to call
+        :type method: callable
+        :param req: the request object to pass to ``method``
+        :return: the Plaid API response
+        """
+        slots = self._request_slots
+        if slots is None:
+            return method(req)
+        with slots:
+            return method(req)
+
+    def _failed_result(self, item, ex, fetch_secs=None, apply_secs=None):
+        """
+        Log an exception encountered while updating an Item, and return a
+        failed :py:class:`~.PlaidUpdateResult` for it.
+
+        :param item: the item that failed
+        :type item: PlaidItem
+        :param ex: the exception
+        :type ex: Exception
+        :param fetch_secs: seconds spent retrieving data from Plaid, if reached
+        :type fetch_secs: float
+        :param apply_secs: seconds spent updating the database, if reached
+        :type apply_secs: float
+        :rtype: PlaidUpdateResult
+        """
+        logger.error(
+            'Exception encountered when updating item: %s (%s)',
+            item.institution_name, item.item_id, exc_info=ex
+        )
+        return PlaidUpdateResult(
+            item, False, 0, 0, ex, None, fetch_secs=fetch_secs,
+            apply_secs=apply_secs
+        )
+
+    def _do_item(self, item, days, sync=False):
         """
         Request transactions from Plaid for one Item. Update balances and
         transactions for each Account in that item.
@@ -143,28 +284,126 @@ class PlaidUpdater:
         :type item: PlaidItem
         :param days: number of days of transactions to get from Plaid
         :type days: int
+        :param sync: whether to use incremental sync; see :py:meth:`~.update`
+        :type sync: bool
         :rtype: PlaidUpdateResult
         """
         logger.info('Plaid update for %s', item)
         try:
-            end_date: datetime = dtnow()
-            start_date: datetime = end_date - timedelta(days=days)
-            iteminfo = self.client.item_get(
-                ItemGetRequest(access_token=item.access_token)
+            fetched = self._fetch_item(
+                str(item), item.access_token, days, sync=sync,
+                cursor=item.sync_cursor
+            )
+        except Exception as ex:
+            return self._failed_result(item, ex)
+        return self._apply_item(item, *fetched)
+
+    def _fetch_item(
+        self, item_desc, access_token, days, page_workers=0, sync=False,
+        cursor=None
+    ):
+        """
+        Request item information and transactions from Plaid for one Item.
+        This does not use the database, so it is safe to call from a worker
+        thread.
+
+        If ``sync`` is True, the Item's transactions are requested via
+        :py:meth:`~._sync_transactions` and ``days`` is ignored: if the Item
+        has a ``cursor``, only the changes since that cursor are requested;
+        otherwise, all of the Item's transactions are, and they are returned
+        to be applied along with the Item's initial cursor. If ``sync`` is
+        False, the last ``days`` days of transactions are requested.
+
+        :param item_desc: description of the item, for logging
+        :type item_desc: str
+        :param access_token: the item's Plaid access token
+        :type access_token: str
+        :param days: number of days of transactions to get from Plaid
+        :type days: int
+        :param page_workers: passed through to :py:meth:`~._get_transactions`
+        :type page_workers: int
+        :param sync: whether to use incremental sync
+        :type sync: bool
+        :param cursor: the Item's current sync cursor, if any
+        :type cursor: str
+        :return: 6-tuple of end datetime of the transaction request, list of
+          added or modified transactions, dict of account ID to account
+          information, float seconds spent, list of removed transaction IDs
+          (None unless ``sync`` is True), and the Item's new sync cursor (None
+          unless ``sync`` is True)
+        :rtype: tuple
+        """
+        start = timer.time()
+        end_date: datetime = dtnow()
+        start_date: datetime = end_date - timedelta(days=days)
+        iteminfo = self._request(
+            self.client.item_get, ItemGetRequest(access_token=access_token)
+        )
+        logger.info(
+            'Item %s transactions status: %s', item_desc,
+            iteminfo.get('status', {}).get('transactions')
+        )
+        if sync:
+            if cursor is None:
+                logger.debug(
+                    'Syncing all Plaid transactions for item: %s', item_desc
+                )
+            else:
+                logger.debug(
+                    'Syncing Plaid transactions for item: %s', item_desc
+                )
+            txns, removed, next_cursor = self._sync_transactions(
+                access_token, cursor
             )
-            logger.info(
-                'Item %s transactions status: %s', item,
-                iteminfo.get('status', {}).get('transactions')
+            return (
+                end_date, txns, self._get_accounts(access_token),
+                timer.time() - start, removed, next_cursor
             )
-            logger.debug(
-                'Downloading Plaid transactions for item: %s from %s to %s',
-                item, start_date, end_date
+        logger.debug(
+            'Downloading Plaid transactions for item: %s from %s to %s',
+            item_desc, start_date, end_date
+        )
+        txns: List[dict]
+        accts: Dict
+        if page_workers > 0:
+            txns, accts = self._get_transactions(
+                access_token, start_date, end_date, page_workers=page_workers
             )
-            txns: List[dict]
-            accts: Dict
+        else:
             txns, accts = self._get_transactions(
-                item.access_token, start_date, end_date
+                access_token, start_date, end_date
             )
+        return end_date, txns, accts, timer.time() - start, None, None
+
+    def _apply_item(
+        self, item, end_date, txns, accts, fetch_secs, removed=None,
+        cursor=None
+    ):
+        """
+        Update balances and transactions for each Account in an Item, from
+        the data returned by :py:meth:`~._fetch_item`. Transactions that Plaid
+        reports as removed are deleted, and the Item's sync cursor is updated,
+        in the same transaction as the Item's ``last_updated`` time.
+
+        :param item: the item to update
+        :type item: PlaidItem
+        :param end_date: end datetime of the transaction request
+        :type end_date: datetime.datetime
+        :param txns: list of transactions from Plaid
+        :type txns: list
+        :param accts: dict of Plaid account ID to account information
+        :type accts: dict
+        :param fetch_secs: seconds spent retrieving data from Plaid
+        :type fetch_secs: float
+        :param removed: list of Plaid transaction IDs removed since the
+          previous sync, if any
+        :type removed: list
+        :param cursor: the Item's new sync cursor, if any
+        :type cursor: str
+        :rtype: PlaidUpdateResult
+        """
+        start = timer.time()
+        try:
             accounts: Dict[str, PlaidAccount] = {}
             pa: PlaidAccount
             for pa in db_session.query(PlaidAccount).filter(
@@ -172,6 +411,7 @@ class PlaidUpdater:
             ).all():
                 accounts[pa.account_id] = pa
             stmt_ids: List[int] = []
+            metrics: List[IngestMetrics] = []
             added: int = 0
             updated: int = 0
             txns_per_acct: Dict[str, list] = {}
@@ -188,31 +428,53 @@ class PlaidUpdater:
                         'not mapped to an Account.', item, plaid_acct
                     )
                     continue
-                sid, a, u = self._stmt_for_acct(
+                res: IngestResult = self._stmt_for_acct(
                     acct, accts[plaid_account_id],
                     txns_per_acct.get(plaid_account_id, []), end_date
                 )
+                sid, a, u = res
                 added += a
                 updated += u
                 stmt_ids.append(sid)
+                metrics.append(res.metrics)
+            count_rm: int = 0
+            if removed:
+                count_rm = self._remove_transactions(accounts, removed)
+            if cursor is not None:
+                item.sync_cursor = cursor
             item.last_updated = dtnow()
             db_session.add(item)
             db_session.commit()
             return PlaidUpdateResult(
-                item, True, updated, added, None, stmt_ids
+                item, True, updated, added, None, stmt_ids,
+                fetch_secs=fetch_secs, apply_secs=timer.time() - start,
+                removed=count_rm, metrics=metrics
             )
         except Exception as ex:
-            logger.error(
-                'Exception encountered when updating item: %s (%s)',
-                item.institution_name, item.item_id, exc_info=True
-            )
-            return PlaidUpdateResult(
-                item, False, 0, 0, ex, None
+            return self._failed_result(
+                item, ex, fetch_secs=fetch_secs,
+                apply_secs=timer.time() - start
             )
 
     def _get_transactions(
-            self, access_token: str, start_dt: datetime, end_dt: datetime
+            self, access_token: str, start_dt: datetime, end_dt: datetime,
+            page_workers: int = 0
     ):
+        """
+        Retrieve all transactions for an Item from Plaid, one page at a time.
+        If ``page_workers`` is greater than zero, once the first page has been
+        retrieved, the offsets of the remaining pages are calculated from its
+        size and ``total_transactions``, and they are requested concurrently
+        with up to ``page_workers`` threads.
+
+        :param access_token: the item's Plaid access token
+        :param start_dt: start of the date range to retrieve
+        :param end_dt: end of the date range to retrieve
+        :param page_workers: maximum number of concurrent page requests
+        :return: 2-tuple of list of transactions, and dict of Plaid account ID
+          to account information
+        :rtype: tuple
+        """
         kwargs = {
             'access_token': access_token,
             'start_date': start_dt.date(),
@@ -223,7 +485,7 @@ class PlaidUpdater:
         accts: dict = {}
         req = TransactionsGetRequest(**kwargs)
         logger.debug('Issuing transactions get request')
-        resp = self.client.transactions_get(req)
+        resp = self._request(self.client.transactions_get, req)
         txns = resp['transactions']
         for acct in resp['accounts']:
             accts[acct['account_id']] = acct
@@ -231,6 +493,23 @@ class PlaidUpdater:
             'Got %d transactions; expecting %d total',
             len(txns), resp['total_transactions']
         )
+        if page_workers > 0 and 0 < len(txns) < resp['total_transactions']:
+            offsets = list(range(
+                len(txns), resp['total_transactions'], len(txns)
+            ))
+            logger.debug(
+                'Requesting %d more pages with up to %d threads',
+                len(offsets), page_workers
+            )
+            with ThreadPoolExecutor(max_workers=page_workers) as executor:
+                pages = list(executor.map(
+                    lambda o: self._get_transactions_page(kwargs, o), offsets
+                ))
+            for resp in pages:
+                txns.extend(resp['transactions'])
+                for acct in resp['accounts']:
+                    accts[acct['account_id']] = acct
+        # fall back to requesting pages in turn, if any are still missing
         while len(txns) < resp['total_transactions']:
             kwargs['options'] = TransactionsGetRequestOptions(
                 offset=len(txns)
@@ -239,12 +518,164 @@ class PlaidUpdater:
             logger.debug(
                 'Issuing transactions get request with offset=%d', len(txns)
             )
-            resp = self.client.transactions_get(req)
+            resp = self._request(self.client.transactions_get, req)
             txns.extend(resp['transactions'])
             for acct in resp['accounts']:
                 accts[acct['account_id']] = acct
         return txns, accts
 
+    def _sync_transactions(self, access_token: str, cursor: Optional[str]):
+        """
+        Retrieve all changes to an Item's transactions since ``cursor`` (or
+        all of its transactions, if ``cursor`` is None) from Plaid's
+        ``/transactions/sync`` endpoint, one page at a time. If Plaid reports
+        that the transactions changed during pagination, start again from
+        ``cursor``, up to :py:attr:`~.SYNC_RESTARTS` times.
+
+        A transaction that is added and then modified while paginating is
+        only returned once, in its latest form; one that is removed is only
+        returned in the list of removed transaction IDs.
+
+        :param access_token: the item's Plaid access token
+        :param cursor: the cursor to sync from, or None
+        :return: 3-tuple of list of added or modified transactions, list of
+          removed transaction IDs, and the new cursor
+        :rtype: tuple
+        """
+        restarts: int = 0
+        while True:
+            changed: Dict[str, dict] = {}
+            removed: List[str] = []
+            kwargs = {
+                'access_token': access_token, 'count': self.SYNC_PAGE_SIZE
+            }
+            if cursor is not None:
+                kwargs['cursor'] = cursor
+            try:
+                while True:
+                    logger.debug(
+                        'Issuing transactions sync request with cursor=%s',
+                        kwargs.get('cursor')
+                    )
+                    resp = self._request(
+                        self.client.transactions_sync,
+                        TransactionsSyncRequest(**kwargs)
+                    )
+                    for t in resp['added'] + resp['modified']:
+                        changed.pop(t['transaction_id'], None)
+                        changed[t['transaction_id']] = t
+                    for r in resp['removed']:
+                        changed.pop(r['transaction_id'], None)
+                        removed.append(r['transaction_id'])
+                    kwargs['cursor'] = resp['next_cursor']
+                    if not resp['has_more']:
+                        break
+            except ApiException as ex:
+                if (
+                    restarts >= self.SYNC_RESTARTS or
+                    'TRANSACTIONS_SYNC_MUTATION_DURING_PAGINATION' not in
+                    str(ex.body)
+                ):
+                    raise
+                restarts += 1
+                logger.warning(
+                    'Transactions changed during sync pagination; restarting '
+                    'from cursor %s', cursor
+                )
+                continue
+            logger.debug(
+                'Sync got %d added or modified and %d removed transactions',
+                len(changed), len(removed)
+            )
+            return list(changed.values()), removed, kwargs['cursor']
+
+    def _get_accounts(self, access_token: str) -> dict:
+        """
+        Retrieve account information, including balances, for an Item from
+        Plaid.
+
+        :param access_token: the item's Plaid access token
+        :return: dict of Plaid account ID to account information
+        :rtype: dict
+        """
+        logger.debug('Issuing accounts get request')
+        resp = self._request(
+            self.client.accounts_get,
+            AccountsGetRequest(access_token=access_token)
+        )
+        return {acct['account_id']: acct for acct in resp['accounts']}
+
+    def _remove_transactions(
+        self, accounts: Dict[str, PlaidAccount], txn_ids: List[str]
+    ) -> int:
+        """
+        Delete the :py:class:`~.OFXTransaction` objects for transactions that
+        Plaid reported as removed. Transactions are matched on
+        ``plaid_transaction_id`` within the Accounts mapped to this Item, or
+        on ``fitid`` (which is the Plaid transaction ID unless the transaction
+        had a reference number) for transactions retrieved before that column
+        was added. Reconciled transactions are left in place, with a warning.
+        Removed transaction IDs that don't match any OFXTransaction, such as
+        pending transactions (which are not saved), are logged.
+
+        :param accounts: dict of Plaid account ID to PlaidAccount, for the Item
+        :param txn_ids: removed Plaid transaction IDs
+        :return: number of OFXTransactions deleted
+        :rtype: int
+        """
+        acct_ids = [
+            pa.account.id for pa in accounts.values() if pa.account is not None
+        ]
+        if not acct_ids:
+            return 0
+        count: int = 0
+        found: set = set()
+        t: OFXTransaction
+        for t in db_session.query(OFXTransaction).filter(
+            OFXTransaction.account_id.in_(acct_ids),
+            or_(
+                OFXTransaction.plaid_transaction_id.in_(txn_ids),
+                and_(
+                    OFXTransaction.plaid_transaction_id.is_(None),
+                    OFXTransaction.fitid.in_(txn_ids)
+                )
+            )
+        ).all():
+            found.add(t.plaid_transaction_id or t.fitid)
+            if t.reconcile is not None:
+                logger.warning(
+                    'Plaid reported reconciled transaction %s as removed; '
+                    'not deleting it', t
+                )
+                continue
+            logger.info('Deleting transaction removed by Plaid: %s', t)
+            db_session.delete(t)
+            count += 1
+        for txn_id in txn_ids:
+            if txn_id not in found:
+                logger.info(
+                    'Plaid reported transaction %s as removed, but it does '
+                    'not match any OFXTransaction; it may have been pending',
+                    txn_id
+                )
+        return count
+
+    def _get_transactions_page(self, kwargs: dict, offset: int):
+        """
+        Request one page of transactions from Plaid, for
+        :py:meth:`~._get_transactions`.
+
+        :param kwargs: TransactionsGetRequest kwargs, other than ``options``
+        :param offset: offset of the first transaction to request
+        :return: Plaid transactions get response
+        """
+        kwargs = dict(kwargs)
+        kwargs['options'] = TransactionsGetRequestOptions(offset=offset)
+        logger.debug('Issuing transactions get request with offset=%d', offset)
+        return self._request(
+            self.client.transactions_get, TransactionsGetRequest(**kwargs)
+        )
+
     def _stmt_for_acct(
         self, account: Account, plaid_acct_info: dict, plaid_txns: List[dict],
         end_dt: datetime
@@ -256,45 +687,67 @@ class PlaidUpdater:
         :param plaid_acct_info: dict of account information from Plaid
         :param txns: list of transactions from Plaid
         :param end_dt: current time, as of when transactions were retrieved
+        :return: the Statement ID and counts of new and updated transactions,
+          with the ingestion metrics for the Statement
+        :rtype: biweeklybudget.ingest_metrics.IngestResult
         """
-        stmt = OFXStatement(
-            account_id=account.id,
-            filename=f'Plaid_{account.name}_{int(end_dt.timestamp())}.ofx',
-            file_mtime=end_dt,
-            as_of=end_dt,
-            currency=plaid_acct_info['balances']['iso_currency_code'],
-            acctid=plaid_acct_info['mask']
+        filename = f'Plaid_{account.name}_{int(end_dt.timestamp())}.ofx'
+        metrics = IngestMetrics(
+            'plaid', account_id=account.id, filename=filename
         )
-        stmt.bankid = account.plaid_account.plaid_item.institution_id
-        if account.plaid_account.account_type == 'credit':
-            stmt.type = 'CreditCard'
-            self._update_bank_or_credit(
-                end_dt, account, plaid_acct_info, plaid_txns, stmt
-            )
-        elif account.plaid_account.account_type == 'depository':
-            stmt.type = 'Bank'
-            self._update_bank_or_credit(
-                end_dt, account, plaid_acct_info, plaid_txns, stmt
-            )
-        elif account.plaid_account.account_type == 'investment':
-            stmt.type = 'Investment'
-            self._update_investment(end_dt, account, plaid_acct_info, stmt)
-        elif account.plaid_account.account_type == 'loan':
-            # For now, this should work...
-            stmt.type = 'Investment'
-            self._update_investment(end_dt, account, plaid_acct_info, stmt)
-        else:
-            raise RuntimeError(
-                'ERROR: Unknown account type: ' +
-                account.plaid_account.account_type
-            )
-        count_new, count_upd = self._new_updated_counts()
-        db_session.commit()
+        with metrics:
+            with metrics.stage('create_statement'):
+                stmt = OFXStatement(
+                    account_id=account.id,
+                    filename=filename,
+                    file_mtime=end_dt,
+                    as_of=end_dt,
+                    currency=plaid_acct_info['balances']['iso_currency_code'],
+                    acctid=plaid_acct_info['mask']
+                )
+                stmt.bankid = account.plaid_account.plaid_item.institution_id
+            acct_type = account.plaid_account.account_type
+            with metrics.stage('upsert'):
+                if acct_type == 'credit':
+                    stmt.type = 'CreditCard'
+                    self._update_bank_or_credit(
+                        end_dt, account, plaid_acct_info, plaid_txns, stmt
+                    )
+                    metrics.rows = len(plaid_txns)
+                elif acct_type == 'depository':
+                    stmt.type = 'Bank'
+                    self._update_bank_or_credit(
+                        end_dt, account, plaid_acct_info, plaid_txns, stmt
+                    )
+                    metrics.rows = len(plaid_txns)
+                elif acct_type == 'investment':
+                    stmt.type = 'Investment'
+                    self._update_investment(
+                        end_dt, account, plaid_acct_info, stmt
+                    )
+                elif acct_type == 'loan':
+                    # For now, this should work...
+                    stmt.type = 'Investment'
+                    self._update_investment(
+                        end_dt, account, plaid_acct_info, stmt
+                    )
+                else:
+                    raise RuntimeError(
+                        'ERROR: Unknown account type: ' + acct_type
+                    )
+            count_new, count_upd = self._new_updated_counts()
+            with metrics.stage('flush'):
+                db_session.flush()
+            with metrics.stage('commit'):
+                db_session.commit()
+        metrics.count_new = count_new
+        metrics.count_updated = count_upd
         logger.info('Account "%s" - inserted %d new OFXTransaction(s), updated '
                     '%d existing OFXTransaction(s)',
                     account.name, count_new, count_upd)
+        logger.debug('Ingest metrics: %s', metrics.as_dict)
         logger.debug('Done updating OFX in DB')
-        return stmt.id, count_new, count_upd
+        return IngestResult(stmt.id, count_new, count_upd, metrics=metrics)
 
     def _new_updated_counts(self):
         """
@@ -352,6 +805,7 @@ class PlaidUpdater:
                     pt["date"], time(0, 0, 0), tzinfo=UTC
                 ),
                 'fitid': pt['payment_meta']['reference_number'],
+                'plaid_transaction_id': pt['transaction_id'],
                 'name': pt['name'],
                 'account_id': account.id,
                 'statement': stmt
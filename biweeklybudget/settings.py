@@ -63,7 +63,15 @@ _TIMEDELTA_VARS = [
 _INT_VARS = [
     'DEFAULT_ACCOUNT_ID',
     'FUEL_BUDGET_ID',
-    'BIWEEKLYBUDGET_TEST_TIMESTAMP'
+    'BIWEEKLYBUDGET_TEST_TIMESTAMP',
+    'PAY_PERIOD_CACHE_SIZE',
+    'CREDIT_PAYOFF_PROCESSES',
+    'CREDIT_PAYOFF_CACHE_SIZE',
+    'PLAID_UPDATE_WORKERS',
+    'PLAID_SYNC',
+    'OFX_RECLASSIFY_BATCH_SIZE',
+    'OFX_RECLASSIFY_BACKGROUND',
+    'NOTIFICATIONS_CACHE_TTL'
 ]
 _STRING_VARS = [
     'DB_CONNSTRING',
@@ -81,6 +89,7 @@ _STRING_VARS = [
     'PLAID_PRODUCTS',
     'PLAID_COUNTRY_CODES',
     'PLAID_USER_ID',
+    'CREDIT_PAYOFF_ENGINE',
 ]
 
 #: A `RFC 5646 / BCP 47 <https://tools.ietf.org/html/bcp47>`_ Language Tag
@@ -142,6 +151,29 @@ FUEL_BUDGET_ID = 1
 #: :py:meth:`datetime.datetime.strptime` with ``%Y-%m-%d`` format).
 PAY_PERIOD_START_DATE = None
 
+#: int - Maximum number of pay periods to keep calculated data for in the
+#: process-wide :py:class:`~.PayPeriodDataCache`. Set to 0 to disable caching
+#: of pay period data.
+PAY_PERIOD_CACHE_SIZE = 128
+
+#: str - Name of the payoff simulation engine used on the Credit Card Payoffs
+#: view; one of the keys of :py:data:`~biweeklybudget.interest.PAYOFF_ENGINES`.
+#: ``decimal`` (the default) is the original Decimal simulation,
+#: ``numpy`` is a much faster vectorized simulation whose results are rounded
+#: to the cent, and ``numpy-checked`` runs both and reports an error for any
+#: payoff method where they differ.
+CREDIT_PAYOFF_ENGINE = 'decimal'
+
+#: int - Maximum number of worker processes used to calculate the payoff
+#: methods on the Credit Card Payoffs view concurrently. Set to 0 (the default)
+#: to calculate them one after another in the web server process.
+CREDIT_PAYOFF_PROCESSES = 0
+
+#: int - Maximum number of sets of credit payoff results to keep in the
+#: process-wide :py:class:`~biweeklybudget.interest.PayoffResultCache`. Set to 0
+#: to disable caching of credit payoff results.
+CREDIT_PAYOFF_CACHE_SIZE = 16
+
 #: :py:class:`datetime.date` - When listing unreconciled transactions that need
 #: to be reconciled, any transaction before this date will be ignored. This must
 #: be specified in Y-m-d format (i.e. parsable by
@@ -193,6 +225,38 @@ PLAID_COUNTRY_CODES = None
 #: Since this is a single-user app, we just hard-code to "1"
 PLAID_USER_ID = '1'
 
+#: int - Maximum number of concurrent requests to Plaid when updating Plaid
+#: Items; Items are retrieved in parallel, as are the pages of each Item's
+#: transactions, and then written to the database one Item at a time. Set to 0
+#: (the default) to update one Item at a time.
+PLAID_UPDATE_WORKERS = 0
+
+#: int - Set to 1 to update Plaid Items incrementally. The first update of
+#: each Item retrieves all of its transactions that Plaid has, along with a
+#: Plaid transactions sync cursor; each later update retrieves only the
+#: transactions added, modified or removed since then. The number of days
+#: requested is ignored. Set to 0 (the default) to always retrieve the
+#: requested window.
+PLAID_SYNC = 0
+
+#: int - When an Account's ``re_*`` fields change, its OFXTransactions are
+#: reclassified in batches of this many transactions, committing after each
+#: batch. See :py:class:`~.OfxReclassifier`.
+OFX_RECLASSIFY_BATCH_SIZE = 1000
+
+#: int - Set to 1 (the default) to reclassify an Account's OFXTransactions in
+#: a background thread after a change to its ``re_*`` fields is committed,
+#: or 0 to do so synchronously, before the commit returns.
+OFX_RECLASSIFY_BACKGROUND = 1
+
+#: int - Number of seconds to reuse the notifications shown at the top of every
+#: page, from the process-wide
+#: :py:class:`~biweeklybudget.notifications_cache.NotificationsCache`, before
+#: calculating them again. Cached notifications are also recalculated after any
+#: change to the data they are calculated from is committed. Set to 0 to
+#: disable caching of notifications.
+NOTIFICATIONS_CACHE_TTL = 30
+
 if 'SETTINGS_MODULE' in os.environ:
     logger.debug('Attempting to import settings module %s',
                  os.environ['SETTINGS_MODULE'])
@@ -520,13 +520,21 @@ class TestOfxApi(AcceptanceHelper):
             ofx_str = fh.read()
         ofx = OfxParser.parse(BytesIO(ofx_str))
         client = apiclient(base_url)
-        stmt_id, count_new, count_upd = client.update_statement_ofx(
+        res = client.update_statement_ofx(
             3, ofx, filename='/statements/CreditOne/'
                              'CreditOne_2017-07-28_05-30-00.ofx'
         )
+        stmt_id, count_new, count_upd = res
         assert stmt_id == 10
         assert count_new == 1
         assert count_upd == 0
+        assert res.metrics.source == 'ofx'
+        assert res.metrics.account_id == 3
+        assert res.metrics.rows == 1
+        assert res.metrics.count_new == 1
+        assert res.metrics.queries > 0
+        for k in ['decode', 'create_statement', 'upsert', 'flush', 'commit']:
+            assert k in res.metrics.stages
 
     def test_4_verify_db(self, testdb):
         assert testdb.query(OFXStatement).with_entities(
@@ -592,3 +600,214 @@ class TestOfxApi(AcceptanceHelper):
         assert ex.value.stmt_id == 10
         assert ex.value.filename == '/statements/CreditOne/' \
                                     'CreditOne_2017-07-28_05-30-00.ofx'
+
+
+@pytest.mark.acceptance
+@pytest.mark.usefixtures('class_refresh_db', 'refreshdb', 'testflask')
+@pytest.mark.incremental
+class TestOfxBatchApi(AcceptanceHelper):
+
+    def ofx(self, replacements={}):
+        ofxpath = os.path.join(fixturedir, 'CreditOne_2017-07-28_05-30-00.ofx')
+        with open(ofxpath, 'r') as fh:
+            ofx_str = fh.read()
+        for k, v in replacements.items():
+            ofx_str = ofx_str.replace(k, v)
+        return OfxParser.parse(BytesIO(ofx_str.encode('utf-8')))
+
+    def test_1_post_batch(self, base_url):
+        client = apiclient(base_url)
+        mtime = datetime(2017, 7, 28, 6, 0, 0, tzinfo=UTC)
+        res = client.update_statements([
+            (3, self.ofx(), mtime, 'batch1.ofx'),
+            (3, self.ofx(), mtime, 'batch1.ofx'),
+            (3, self.ofx({
+                '<DTSERVER>20170728053000': '<DTSERVER>20170729053000',
+                '<TRNAMT>123<': '<TRNAMT>124<'
+            }), mtime, 'batch2.ofx'),
+            (9999, self.ofx(), mtime, 'batch3.ofx')
+        ])
+        assert res[0] == (10, 1, 0)
+        assert isinstance(res[1], DuplicateFileException)
+        assert res[1].acct_id == 3
+        assert res[1].stmt_id == 10
+        assert res[1].filename == 'batch1.ofx'
+        assert res[2] == (11, 0, 1)
+        assert isinstance(res[3], RuntimeError)
+        assert res[0].metrics.filename == 'batch1.ofx'
+        assert res[0].metrics.count_new == 1
+        assert res[2].metrics.filename == 'batch2.ofx'
+        assert res[2].metrics.count_updated == 1
+        assert 'decode' in res[2].metrics.stages
+
+    def test_2_verify_db(self, testdb):
+        stmt = testdb.query(OFXStatement).get(11)
+        assert stmt.account_id == 3
+        assert stmt.filename == 'batch2.ofx'
+        assert stmt.file_mtime == datetime(2017, 7, 28, 6, 0, 0, tzinfo=UTC)
+        assert stmt.as_of == datetime(2017, 7, 29, 5, 30, 0, tzinfo=UTC)
+        assert stmt.ledger_bal == Decimal('-1234.5600')
+        trans = testdb.query(OFXTransaction).get((3, 'FITID20170727144.0G53TY'))
+        assert trans.statement_id == 11
+        assert trans.amount == Decimal('124.0000')
+        assert trans.date_posted == datetime(2017, 7, 27, 16, 0, 0, tzinfo=UTC)
+        assert testdb.query(OFXStatement).filter(
+            OFXStatement.filename == 'batch3.ofx'
+        ).count() == 0
+
+    def test_3_post_invalid(self, base_url):
+        url = base_url + '/api/ofx/statements'
+        r = requests.post(
+            url, data=b'not gzip', headers={'Content-Encoding': 'gzip'}
+        )
+        assert r.status_code == 400
+        assert r.json()['message'] == 'Unable to decode request body.'
+        r = requests.post(url, json={'version': 0, 'statements': []})
+        assert r.status_code == 400
+        assert r.json()['message'].startswith(
+            'Unsupported statement schema version 0'
+        )
+        r = requests.post(url, json={'version': 1, 'statements': [{}]})
+        assert r.status_code == 200
+        assert r.json()['success'] is False
+        assert r.json()['results'][0]['message'].startswith(
+            'Exception: Invalid statement data'
+        )
+
+    def test_4_statement_ids(self, base_url):
+        client = apiclient(base_url)
+        assert client.get_statement_ids([1, 11, 9999]) == {1, 11}
+        r = requests.post(
+            base_url + '/api/ofx/statement_ids', json={'statement_ids': 'x'}
+        )
+        assert r.status_code == 400
+        assert r.json()['message'] == 'Invalid or missing statement_ids.'
+
+
+class OfxAjaxHelper(AcceptanceHelper):
+    """
+    Helpers for requesting ``/ajax/ofx`` directly.
+    """
+
+    columns = [
+        'date', 'amount', 'account', 'type', 'name', 'memo', 'description',
+        'fitid', 'last_stmt', 'last_stmt_date', 'reconcile_id'
+    ]
+
+    def params(self, start, length, order_col, order_dir, keyset=None):
+        p = {
+            'draw': '1',
+            'start': str(start),
+            'length': str(length),
+            'search[value]': '',
+            'search[regex]': 'false',
+            'order[0][column]': str(order_col),
+            'order[0][dir]': order_dir
+        }
+        for idx, name in enumerate(self.columns):
+            p['columns[%d][data]' % idx] = name
+            p['columns[%d][name]' % idx] = ''
+            p['columns[%d][searchable]' % idx] = 'true'
+            p['columns[%d][orderable]' % idx] = (
+                'false' if name == 'reconcile_id' else 'true'
+            )
+            p['columns[%d][search][value]' % idx] = ''
+            p['columns[%d][search][regex]' % idx] = 'false'
+        for k, v in (keyset or {}).items():
+            p['keyset[%s]' % k] = v
+        return p
+
+    def get_page(self, base_url, params):
+        r = requests.get(base_url + '/ajax/ofx', params=params)
+        assert r.status_code == 200
+        return r.json()
+
+    def rows(self, data):
+        return [(r['DT_RowData']['acct_id'], r['fitid']) for r in data]
+
+
+@pytest.mark.acceptance
+@pytest.mark.usefixtures('class_refresh_db', 'refreshdb', 'testflask')
+class TestOfxKeysetPaging(OfxAjaxHelper):
+
+    @pytest.mark.parametrize('order_col,order_dir', [
+        (0, 'desc'), (0, 'asc'), (1, 'asc'), (4, 'desc'), (9, 'asc')
+    ])
+    def test_pages_match_offset(self, base_url, order_col, order_dir):
+        full = self.get_page(
+            base_url, self.params(0, 1000, order_col, order_dir)
+        )
+        expected = self.rows(full['data'])
+        assert len(expected) == full['recordsTotal']
+        assert len(set(expected)) == len(expected)
+        length = 3
+        # walk forward using the ``after`` cursor
+        res = self.get_page(
+            base_url, self.params(0, length, order_col, order_dir)
+        )
+        assert res['keyset']['start'] == 0
+        assert res['keyset']['length'] == length
+        seen = self.rows(res['data'])
+        for start in range(length, len(expected), length):
+            res = self.get_page(base_url, self.params(
+                start, length, order_col, order_dir, keyset={
+                    'after': res['keyset']['last'],
+                    'key': res['keyset']['key']
+                }
+            ))
+            assert res['keyset']['start'] == start
+            seen.extend(self.rows(res['data']))
+        assert seen == expected
+        # walk backward from the last page using the ``before`` cursor
+        last = (len(expected) - 1) // length * length
+        res = self.get_page(
+            base_url, self.params(last, length, order_col, order_dir)
+        )
+        assert self.rows(res['data']) == expected[last:]
+        for start in range(last - length, -1, -length):
+            res = self.get_page(base_url, self.params(
+                start, length, order_col, order_dir, keyset={
+                    'before': res['keyset']['first'],
+                    'key': res['keyset']['key']
+                }
+            ))
+            assert self.rows(res['data']) == expected[start:start + length]
+
+    def test_stale_key_uses_offset(self, base_url):
+        first = self.get_page(base_url, self.params(0, 3, 0, 'desc'))
+        # cursor from a "date desc" page, but the request orders by amount
+        res = self.get_page(base_url, self.params(3, 3, 1, 'asc', keyset={
+            'after': first['keyset']['last'],
+            'key': first['keyset']['key']
+        }))
+        by_amount = self.rows(
+            self.get_page(base_url, self.params(0, 1000, 1, 'asc'))['data']
+        )
+        assert self.rows(res['data']) == by_amount[3:6]
+
+
+@pytest.mark.acceptance
+@pytest.mark.usefixtures('class_refresh_db', 'refreshdb', 'testflask')
+class TestOfxSubstringSearch(OfxAjaxHelper):
+    """
+    The full-text search must return the same records as a substring match,
+    including for search strings that begin or end mid-word.
+    """
+
+    @pytest.mark.parametrize('s', [
+        'inte', 'nterest', 'rest charged', 'line payment', 'Purchase T1',
+        'ansfer to oth', 'fee'
+    ])
+    def test_search(self, base_url, testdb, s):
+        expected = sorted(
+            (t.account_id, t.fitid) for t in testdb.query(OFXTransaction).all()
+            if any(
+                s.lower() in (getattr(t, a) or '').lower()
+                for a in ['name', 'memo', 'description', 'notes']
+            )
+        )
+        assert len(expected) > 0
+        params = self.params(0, 1000, 0, 'desc')
+        params['search[value]'] = s
+        res = self.get_page(base_url, params)
+        assert sorted(self.rows(res['data'])) == expected
@@ -37,9 +37,10 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 
 import sys
 import pytest
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 from pytz import UTC
 from decimal import Decimal
+from sqlalchemy import event
 
 from biweeklybudget.tests.acceptance_helpers import AcceptanceHelper
 from biweeklybudget.models.scheduled_transaction import ScheduledTransaction
@@ -49,6 +50,7 @@ from biweeklybudget.models.budget_model import Budget
 from biweeklybudget.models.budget_transaction import BudgetTransaction
 from biweeklybudget.models.txn_reconcile import TxnReconcile
 from biweeklybudget.biweeklypayperiod import BiweeklyPayPeriod
+from biweeklybudget.utils import dtnow
 from biweeklybudget.tests.conftest import get_db_engine
 from biweeklybudget.tests.sqlhelpers import restore_mysqldump
 
@@ -687,6 +689,18 @@ class TestSums(AcceptanceHelper):
             ['Transaction', 4]
         ]
 
+    @patch('%s.settings.PAY_PERIOD_START_DATE' % pbm, date(2017, 4, 7))
+    def test_16_compute_range_matches(self, testdb):
+        periods = BiweeklyPayPeriod.compute_range(
+            date(2017, 3, 20), date(2017, 5, 10), testdb
+        )
+        assert len(periods) == 4
+        for p in periods:
+            single = BiweeklyPayPeriod(p.start_date, testdb)
+            assert p.transactions_list == single.transactions_list
+            assert p.budget_sums == single.budget_sums
+            assert p.overall_sums == single.overall_sums
+
     @patch('%s.settings.PAY_PERIOD_START_DATE' % pbm, date(2017, 4, 7))
     def test_17_spent_greater_than_allocated(self, testdb):
         acct = testdb.query(Account).get(1)
@@ -937,3 +951,59 @@ class TestSums(AcceptanceHelper):
             'remaining': Decimal('-577.55'),
             'spent': Decimal('200.0')
         }
+
+
+@pytest.mark.acceptance
+@pytest.mark.usefixtures('class_refresh_db', 'refreshdb')
+class TestQueryCount(AcceptanceHelper):
+
+    def num_queries(self, testdb, start_date, load_strategy):
+        """
+        Return the number of queries executed to build the data for the pay
+        period starting on ``start_date``, with an empty identity map.
+        """
+        testdb.expunge_all()
+        counter = {'count': 0}
+
+        def before_execute(*args):
+            counter['count'] += 1
+
+        event.listen(testdb.bind, 'before_cursor_execute', before_execute)
+        try:
+            pp = BiweeklyPayPeriod(
+                start_date, testdb, load_strategy=load_strategy
+            )
+            pp.transactions_list
+            pp.budget_sums
+            pp.overall_sums
+        finally:
+            event.remove(testdb.bind, 'before_cursor_execute', before_execute)
+        return counter['count']
+
+    def test_query_count_bounded(self, testdb):
+        pp = BiweeklyPayPeriod.period_for_date(dtnow(), testdb)
+        start = pp.start_date
+        before = {
+            x: self.num_queries(testdb, start, x)
+            for x in ['selectin', 'joined']
+        }
+        acct = testdb.query(Account).get(1)
+        budgets = [testdb.query(Budget).get(1), testdb.query(Budget).get(2)]
+        for i in range(100):
+            b = budgets[i % 2]
+            t = Transaction(
+                date=start + timedelta(days=(i % 14)),
+                description='QueryCount%d' % i,
+                budget_amounts={b: Decimal('1.23')},
+                budgeted_amount=Decimal('1.00'),
+                planned_budget=b,
+                account=acct
+            )
+            testdb.add(t)
+            if i % 3 == 0:
+                testdb.add(TxnReconcile(transaction=t, note='QueryCount'))
+        testdb.commit()
+        for strategy in ['selectin', 'joined']:
+            num = self.num_queries(testdb, start, strategy)
+            assert num == before[strategy]
+            assert num <= 15
@@ -36,14 +36,32 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 """
 
 import pytest
+from datetime import date
 from decimal import Decimal
+from sqlalchemy import func
+from unittest.mock import patch, Mock, PropertyMock
 
 from biweeklybudget.tests.acceptance_helpers import AcceptanceHelper
+from biweeklybudget.biweeklypayperiod import BiweeklyPayPeriod, payperiod_cache
+from biweeklybudget.interest import InterestHelper, payoff_cache
+from biweeklybudget.notifications_cache import notifications_cache
+from biweeklybudget.flaskapp.notifications import NotificationsController
+from biweeklybudget.utils import dtnow
 from biweeklybudget.models.transaction import Transaction
 from biweeklybudget.models.account import Account
+from biweeklybudget.models.account_balance import AccountBalance
 from biweeklybudget.models.budget_model import Budget
+from biweeklybudget.models.budget_transaction import BudgetTransaction
+from biweeklybudget.models.budget_balance import (
+    BudgetBalanceEntry, BudgetBalanceSnapshot
+)
 from biweeklybudget.models.ofx_transaction import OFXTransaction
 from biweeklybudget.models.ofx_statement import OFXStatement
+from biweeklybudget.models.dbsetting import DBSetting
+
+pb_settings = 'biweeklybudget.biweeklypayperiod.settings'
+pbi_settings = 'biweeklybudget.interest.settings'
+pbn_settings = 'biweeklybudget.notifications_cache.settings'
 
 
 @pytest.mark.acceptance
@@ -353,3 +371,412 @@ class TestIsFieldsSet(AcceptanceHelper):
         assert txn3.is_interest_charge is False
         assert txn3.is_other_fee is False
         assert txn3.is_interest_payment is False
+
+    def test_2_unrelated_change_does_not_reclassify(self, testdb):
+        """
+        Test that
+        :py:func:`~.db_event_handlers.handle_ofx_transaction_new_or_change`
+        doesn't reclassify transactions whose name and account didn't change.
+        """
+        txn = testdb.query(OFXTransaction).get((1, 'BankOne-9-2'))
+        assert txn.is_other_fee is True
+        # set directly in the DB, bypassing the event handlers
+        testdb.execute(
+            'UPDATE ofx_trans SET is_other_fee=0 WHERE account_id=1 AND '
+            'fitid=\'BankOne-9-2\''
+        )
+        testdb.commit()
+        txn = testdb.query(OFXTransaction).get((1, 'BankOne-9-2'))
+        assert txn.is_other_fee is False
+        txn.memo = 'changed memo'
+        testdb.commit()
+        txn = testdb.query(OFXTransaction).get((1, 'BankOne-9-2'))
+        assert txn.memo == 'changed memo'
+        assert txn.is_other_fee is False
+
+    def test_3_name_change_reclassifies(self, testdb):
+        """
+        Test that
+        :py:func:`~.db_event_handlers.handle_ofx_transaction_new_or_change`
+        reclassifies transactions whose name changed.
+        """
+        txn = testdb.query(OFXTransaction).get((1, 'BankOne-9-2'))
+        assert txn.is_other_fee is False
+        assert txn.is_payment is False
+        txn.name = 'Late Fee re-other-fee'
+        testdb.commit()
+        txn = testdb.query(OFXTransaction).get((1, 'BankOne-9-2'))
+        assert txn.is_other_fee is False
+        assert txn.is_payment is True
+
+
+@pytest.mark.acceptance
+@pytest.mark.usefixtures('class_refresh_db', 'refreshdb')
+class TestPayPeriodCacheInvalidation(AcceptanceHelper):
+
+    @patch('%s.PAY_PERIOD_CACHE_SIZE' % pb_settings, 10)
+    def test_new_transaction_invalidates_period(self, testdb):
+        payperiod_cache.invalidate_all()
+        pp = BiweeklyPayPeriod.period_for_date(dtnow(), testdb)
+        before = pp.overall_sums
+        pp.next.overall_sums
+        hits = payperiod_cache.hits
+        assert BiweeklyPayPeriod(
+            pp.start_date, testdb
+        ).overall_sums == before
+        assert payperiod_cache.hits == hits + 1
+        t = Transaction(
+            date=pp.start_date,
+            budget_amounts={testdb.query(Budget).get(2): Decimal('222.22')},
+            description='CacheTest',
+            account=testdb.query(Account).get(1)
+        )
+        testdb.add(t)
+        testdb.commit()
+        assert payperiod_cache.get(
+            BiweeklyPayPeriod(pp.start_date, testdb)
+        ) is None
+        assert payperiod_cache.get(
+            BiweeklyPayPeriod(pp.next.start_date, testdb)
+        ) is not None
+        after = BiweeklyPayPeriod(pp.start_date, testdb).overall_sums
+        assert after['spent'] == before['spent'] + Decimal('222.22')
+
+    @patch('%s.PAY_PERIOD_CACHE_SIZE' % pb_settings, 10)
+    def test_budget_change_invalidates_all(self, testdb):
+        payperiod_cache.invalidate_all()
+        pp = BiweeklyPayPeriod.period_for_date(dtnow(), testdb)
+        pp.overall_sums
+        pp.next.overall_sums
+        assert payperiod_cache.stats['size'] == 2
+        budg = testdb.query(Budget).get(2)
+        budg.starting_balance = budg.starting_balance + Decimal('10.00')
+        testdb.commit()
+        assert payperiod_cache.stats['size'] == 0
+
+
+@pytest.mark.acceptance
+@pytest.mark.usefixtures('class_refresh_db', 'refreshdb')
+class TestPayoffCacheInvalidation(AcceptanceHelper):
+
+    def _fill_cache(self, fingerprint):
+        ih = Mock(spec_set=InterestHelper)
+        type(ih).fingerprint = PropertyMock(return_value=fingerprint)
+        ih.calculate_payoffs.return_value = {'foo': 'bar'}
+        payoff_cache.calculate_payoffs(ih)
+
+    @patch('%s.CREDIT_PAYOFF_CACHE_SIZE' % pbi_settings, 10)
+    def test_setting_change_invalidates(self, testdb):
+        payoff_cache.invalidate_all()
+        self._fill_cache(('a',))
+        self._fill_cache(('b',))
+        assert payoff_cache.stats['size'] == 2
+        testdb.add(DBSetting(name='unrelated', value='foo', is_json=False))
+        testdb.commit()
+        assert payoff_cache.stats['size'] == 2
+        testdb.add(DBSetting(
+            name='credit-payoff', value='{"increases": [], "onetimes": []}'
+        ))
+        testdb.commit()
+        assert payoff_cache.stats['size'] == 0
+
+    @patch('%s.CREDIT_PAYOFF_CACHE_SIZE' % pbi_settings, 10)
+    def test_ofx_statement_invalidates(self, testdb):
+        payoff_cache.invalidate_all()
+        self._fill_cache(('a',))
+        assert payoff_cache.stats['size'] == 1
+        acct = testdb.query(Account).get(3)
+        testdb.add(OFXStatement(
+            account=acct,
+            filename='payoff_cache_test',
+            file_mtime=dtnow(),
+            as_of=dtnow(),
+            currency='USD',
+            acctid='1234',
+            bankid='1234',
+            routing_number='1234',
+            ledger_bal=Decimal('-123.45'),
+            ledger_bal_as_of=dtnow()
+        ))
+        testdb.commit()
+        assert payoff_cache.stats['size'] == 0
+
+
+@pytest.mark.acceptance
+@pytest.mark.usefixtures('class_refresh_db', 'refreshdb')
+class TestNotificationsCacheInvalidation(AcceptanceHelper):
+
+    def _totals(self, testdb):
+        return notifications_cache.get(
+            testdb, lambda: NotificationsController.totals(testdb)
+        )
+
+    @patch('%s.NOTIFICATIONS_CACHE_TTL' % pbn_settings, 30)
+    def test_unrelated_commit(self, testdb):
+        notifications_cache.invalidate()
+        before = self._totals(testdb)
+        hits = notifications_cache.hits
+        testdb.add(DBSetting(
+            name='notifications-unrelated', value='foo', is_json=False
+        ))
+        testdb.commit()
+        assert self._totals(testdb) == before
+        assert notifications_cache.hits == hits + 1
+
+    @patch('%s.NOTIFICATIONS_CACHE_TTL' % pbn_settings, 30)
+    def test_balance_commit_recalculates(self, testdb):
+        notifications_cache.invalidate()
+        before = self._totals(testdb)
+        misses = notifications_cache.misses
+        acct = testdb.query(Account).get(1)
+        assert acct.is_budget_source is True
+        acct.set_balance(
+            ledger=acct.balance.ledger + Decimal('100.00'),
+            ledger_date=dtnow()
+        )
+        testdb.commit()
+        after = self._totals(testdb)
+        assert notifications_cache.misses == misses + 1
+        assert after['budget_account_sum'] == (
+            before['budget_account_sum'] + Decimal('100.00')
+        )
+
+
+@pytest.mark.acceptance
+@pytest.mark.usefixtures('class_refresh_db', 'refreshdb')
+@pytest.mark.incremental
+class TestBudgetBalanceLedger(AcceptanceHelper):
+
+    def _snapshots(self, testdb):
+        return {
+            s.date: s.balance for s in testdb.query(
+                BudgetBalanceSnapshot
+            ).filter(BudgetBalanceSnapshot.budget_id.__eq__(5)).all()
+        }
+
+    def test_0_verify_db(self, testdb):
+        """initial state verification"""
+        standing = testdb.query(Budget).get(5)
+        assert standing.current_balance == Decimal('9482.29')
+        assert standing.balance_as_of(date(2017, 7, 27)) == Decimal('0')
+        assert standing.balance_as_of(
+            date(2017, 7, 28)
+        ) == Decimal('9482.29')
+        assert testdb.query(Budget).get(2).balance_as_of(
+            date(2017, 7, 28)
+        ) is None
+        assert self._snapshots(testdb) == {date(2017, 7, 1): Decimal('0')}
+
+    def test_1_add_backdated_trans(self, testdb):
+        t = Transaction(
+            date=date(2017, 5, 10),
+            budget_amounts={testdb.query(Budget).get(5): Decimal('222.22')},
+            description='T5',
+            account=testdb.query(Account).get(1)
+        )
+        testdb.add(t)
+        testdb.commit()
+        standing = testdb.query(Budget).get(5)
+        assert standing.current_balance == Decimal('9260.07')
+        assert standing.balance_as_of(date(2017, 5, 9)) == Decimal('0')
+        assert standing.balance_as_of(
+            date(2017, 5, 10)
+        ) == Decimal('-222.22')
+        assert standing.balance_as_of(
+            date(2017, 7, 28)
+        ) == Decimal('9260.07')
+        assert self._snapshots(testdb) == {
+            date(2017, 5, 1): Decimal('0'),
+            date(2017, 7, 1): Decimal('-222.22')
+        }
+
+    def test_2_change_trans_date(self, testdb):
+        t = testdb.query(Transaction).filter(
+            Transaction.description.__eq__('T5')
+        ).one()
+        t.date = date(2017, 6, 15)
+        testdb.commit()
+        standing = testdb.query(Budget).get(5)
+        assert standing.current_balance == Decimal('9260.07')
+        assert standing.balance_as_of(date(2017, 5, 31)) == Decimal('0')
+        assert standing.balance_as_of(
+            date(2017, 6, 15)
+        ) == Decimal('-222.22')
+        assert self._snapshots(testdb) == {
+            date(2017, 5, 1): Decimal('0'),
+            date(2017, 6, 1): Decimal('0'),
+            date(2017, 7, 1): Decimal('-222.22')
+        }
+
+    def test_3_change_trans_amount(self, testdb):
+        t = testdb.query(Transaction).filter(
+            Transaction.description.__eq__('T5')
+        ).one()
+        t.set_budget_amounts({testdb.query(Budget).get(5): Decimal('100')})
+        testdb.commit()
+        standing = testdb.query(Budget).get(5)
+        assert standing.current_balance == Decimal('9382.29')
+        assert standing.balance_as_of(
+            date(2017, 6, 15)
+        ) == Decimal('-100')
+        assert self._snapshots(testdb)[date(2017, 7, 1)] == Decimal('-100')
+
+    def test_4_edit_balance(self, testdb):
+        standing = testdb.query(Budget).get(5)
+        standing.current_balance = Decimal('9400')
+        testdb.commit()
+        e = testdb.query(BudgetBalanceEntry).order_by(
+            BudgetBalanceEntry.id.desc()
+        ).first()
+        assert e.budget_id == 5
+        assert e.date == date(2017, 7, 28)
+        assert e.amount == Decimal('17.71')
+        assert e.note == 'Balance adjustment'
+        assert standing.balance_as_of(
+            date(2017, 7, 28)
+        ) == Decimal('9400')
+
+    def test_5_ledger_matches_balances(self, testdb):
+        for b in testdb.query(Budget).filter(
+            Budget.is_periodic.__eq__(False)
+        ).all():
+            assert sum(
+                e.amount for e in testdb.query(BudgetBalanceEntry).filter(
+                    BudgetBalanceEntry.budget_id.__eq__(b.id)
+                ).all()
+            ) == b.current_balance
+
+
+@pytest.mark.acceptance
+@pytest.mark.usefixtures('class_refresh_db', 'refreshdb')
+@pytest.mark.incremental
+class TestTransactionActualAmount(AcceptanceHelper):
+
+    def _stored(self, testdb, trans_id):
+        return testdb.query(Transaction.actual_amount).filter(
+            Transaction.id.__eq__(trans_id)
+        ).scalar()
+
+    def test_0_verify_db(self, testdb):
+        assert Transaction.check_actual_amounts(testdb) == []
+        assert self._stored(testdb, 1) == Decimal('111.13')
+        assert self._stored(testdb, 2) == Decimal('-333.33')
+
+    def test_1_add_trans(self, testdb):
+        t = Transaction(
+            date=date(2017, 7, 10),
+            budget_amounts={
+                testdb.query(Budget).get(1): Decimal('10.00'),
+                testdb.query(Budget).get(2): Decimal('5.50')
+            },
+            description='AA1',
+            account=testdb.query(Account).get(1)
+        )
+        assert t.actual_amount == Decimal('15.50')
+        testdb.add(t)
+        testdb.commit()
+        assert self._stored(testdb, t.id) == Decimal('15.50')
+
+    def test_2_change_budget_trans(self, testdb):
+        t = testdb.query(Transaction).filter(
+            Transaction.description.__eq__('AA1')
+        ).one()
+        bt = [b for b in t.budget_transactions if b.budget_id == 1][0]
+        bt.amount = Decimal('20.00')
+        testdb.commit()
+        assert self._stored(testdb, t.id) == Decimal('25.50')
+        assert t.actual_amount == Decimal('25.50')
+
+    def test_3_move_budget_trans(self, testdb):
+        t = testdb.query(Transaction).filter(
+            Transaction.description.__eq__('AA1')
+        ).one()
+        bt = [b for b in t.budget_transactions if b.budget_id == 1][0]
+        bt.transaction = testdb.query(Transaction).get(1)
+        testdb.commit()
+        assert self._stored(testdb, t.id) == Decimal('5.50')
+        assert self._stored(testdb, 1) == Decimal('131.13')
+
+    def test_4_delete_budget_trans(self, testdb):
+        bt = testdb.query(BudgetTransaction).filter(
+            BudgetTransaction.trans_id.__eq__(1),
+            BudgetTransaction.amount.__eq__(Decimal('20.00'))
+        ).one()
+        testdb.delete(bt)
+        testdb.commit()
+        assert self._stored(testdb, 1) == Decimal('111.13')
+        assert Transaction.check_actual_amounts(testdb) == []
+
+    def test_5_check_and_fix(self, testdb):
+        testdb.execute(
+            'UPDATE transactions SET actual_amount=0 WHERE id=2'
+        )
+        testdb.commit()
+        assert Transaction.check_actual_amounts(testdb, fix=True) == [
+            (2, Decimal('0'), Decimal('-333.33'))
+        ]
+        testdb.commit()
+        assert self._stored(testdb, 2) == Decimal('-333.33')
+        assert Transaction.check_actual_amounts(testdb) == []
+
+
+@pytest.mark.acceptance
+@pytest.mark.usefixtures('class_refresh_db', 'refreshdb')
+@pytest.mark.incremental
+class TestAccountLatestBalance(AcceptanceHelper):
+
+    def _pointers(self, testdb):
+        return dict(testdb.query(Account.id, Account.latest_balance_id).all())
+
+    def _max_ids(self, testdb):
+        res = {a_id: None for a_id, in testdb.query(Account.id).all()}
+        res.update(dict(testdb.query(
+            AccountBalance.account_id, func.max(AccountBalance.id)
+        ).group_by(AccountBalance.account_id).all()))
+        return res
+
+    def test_0_verify_db(self, testdb):
+        assert self._pointers(testdb) == self._max_ids(testdb)
+        assert testdb.query(Account).get(1).balance.ledger == Decimal(
+            '12789.01'
+        )
+
+    def test_1_set_balance(self, testdb):
+        acct = testdb.query(Account).get(1)
+        acct.set_balance(ledger=Decimal('100.00'), ledger_date=dtnow())
+        assert acct.balance.ledger == Decimal('100.00')
+        testdb.commit()
+        assert self._pointers(testdb) == self._max_ids(testdb)
+        assert testdb.query(Account).get(1).balance.ledger == Decimal(
+            '100.00'
+        )
+
+    def test_2_add_balances(self, testdb):
+        testdb.add(AccountBalance(account_id=2, ledger=Decimal('1.00')))
+        b2 = AccountBalance(account_id=2, ledger=Decimal('2.00'))
+        testdb.add(b2)
+        testdb.commit()
+        assert self._pointers(testdb)[2] == b2.id
+        assert self._pointers(testdb) == self._max_ids(testdb)
+
+    def test_3_delete_latest(self, testdb):
+        acct = testdb.query(Account).get(2)
+        assert acct.balance.ledger == Decimal('2.00')
+        testdb.delete(acct.balance)
+        testdb.commit()
+        assert self._pointers(testdb) == self._max_ids(testdb)
+        assert testdb.query(Account).get(2).balance.ledger == Decimal('1.00')
+
+    def test_4_latest_balances(self, testdb):
+        testdb.expire_all()
+        accts = testdb.query(Account).all()
+        res = Account.latest_balances(testdb)
+        assert {
+            k: v.id for k, v in res.items()
+        } == {k: v for k, v in self._max_ids(testdb).items() if v is not None}
+        for acct in accts:
+            assert 'latest_balance' in acct.__dict__
+            assert acct.balance is res.get(acct.id)
+        res = Account.latest_balances(testdb, [1, 3])
+        assert sorted(res.keys()) == [1, 3]
+        assert Account.latest_balances(testdb, []) == {}
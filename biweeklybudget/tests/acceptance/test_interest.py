@@ -125,20 +125,20 @@ class TestInterestHelper(AcceptanceHelper):
                     3: {
                         'payoff_months': 28,
                         'total_interest': Decimal(
-                            '10.9388625702411101133192793'
+                            '10.9388625702411101133192802'
                         ),
                         'total_payments': Decimal(
-                            '962.9988625702411101133192793'
+                            '962.9988625702411101133192802'
                         ),
                         'next_payment': Decimal('35')
                     },
                     4: {
                         'payoff_months': 55,
                         'total_interest': Decimal(
-                            '1457.695228060182432444990377'
+                            '1457.695228060182432444990373'
                         ),
                         'total_payments': Decimal(
-                            '6956.345228060182432444990377'
+                            '6956.345228060182432444990373'
                         ),
                         'next_payment': Decimal('109.9730')
                     }
@@ -152,20 +152,20 @@ class TestInterestHelper(AcceptanceHelper):
                     3: {
                         'payoff_months': 28,
                         'total_interest': Decimal(
-                            '10.9388625702411101133192793'
+                            '10.9388625702411101133192802'
                         ),
                         'total_payments': Decimal(
-                            '962.9988625702411101133192793'
+                            '962.9988625702411101133192802'
                         ),
                         'next_payment': Decimal('35')
                     },
                     4: {
                         'payoff_months': 55,
                         'total_interest': Decimal(
-                            '1457.695228060182432444990377'
+                            '1457.695228060182432444990373'
                         ),
                         'total_payments': Decimal(
-                            '6956.345228060182432444990377'
+                            '6956.345228060182432444990373'
                         ),
                         'next_payment': Decimal('109.9730')
                     }
@@ -180,20 +180,20 @@ class TestInterestHelper(AcceptanceHelper):
                     3: {
                         'payoff_months': 21,
                         'total_interest': Decimal(
-                            '8.8578327498502165965138131'
+                            '8.8578327498502165965138137'
                         ),
                         'total_payments': Decimal(
-                            '960.9178327498502165965138131'
+                            '960.9178327498502165965138137'
                         ),
                         'next_payment': Decimal('35')
                     },
                     4: {
                         'payoff_months': 56,
                         'total_interest': Decimal(
-                            '1489.587124948955044765363412'
+                            '1489.587124948955044765363422'
                         ),
                         'total_payments': Decimal(
-                            '6988.237124948955044765363412'
+                            '6988.237124948955044765363422'
                         ),
                         'next_payment': Decimal('109.9730')
                     }
@@ -207,20 +207,20 @@ class TestInterestHelper(AcceptanceHelper):
                     3: {
                         'payoff_months': 21,
                         'total_interest': Decimal(
-                            '8.8578327498502165965138131'
+                            '8.8578327498502165965138137'
                         ),
                         'total_payments': Decimal(
-                            '960.9178327498502165965138131'
+                            '960.9178327498502165965138137'
                         ),
                         'next_payment': Decimal('35')
                     },
                     4: {
                         'payoff_months': 56,
                         'total_interest': Decimal(
-                            '1489.587124948955044765363412'
+                            '1489.587124948955044765363422'
                         ),
                         'total_payments': Decimal(
-                            '6988.237124948955044765363412'
+                            '6988.237124948955044765363422'
                         ),
                         'next_payment': Decimal('109.9730')
                     }
@@ -233,20 +233,20 @@ class TestInterestHelper(AcceptanceHelper):
                     3: {
                         'payoff_months': 28,
                         'total_interest': Decimal(
-                            '10.9388625702411101133192793'
+                            '10.9388625702411101133192802'
                         ),
                         'total_payments': Decimal(
-                            '962.9988625702411101133192793'
+                            '962.9988625702411101133192802'
                         ),
                         'next_payment': Decimal('35')
                     },
                     4: {
                         'payoff_months': 162,
                         'total_interest': Decimal(
-                            '3166.211877369277471400473622'
+                            '3166.211877369277471400473654'
                         ),
                         'total_payments': Decimal(
-                            '8664.861877369277471400473622'
+                            '8664.861877369277471400473654'
                         ),
                         'next_payment': Decimal('109.9730')
                     }
@@ -0,0 +1,138 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/biweeklybudget>
+
+################################################################################
+Copyright 2016-2024 Jason Antman <http://www.jasonantman.com>
+
+    This file is part of biweeklybudget, also known as biweeklybudget.
+
+    biweeklybudget is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    biweeklybudget is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with biweeklybudget.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/biweeklybudget> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import pytest
+from unittest.mock import patch
+
+from biweeklybudget.tests.acceptance_helpers import AcceptanceHelper
+from biweeklybudget.models.account import Account
+from biweeklybudget.models.ofx_transaction import OFXTransaction
+from biweeklybudget.ofx_reclassify import ofx_reclassifier, ReclassifyJob
+
+pb_settings = 'biweeklybudget.ofx_reclassify.settings'
+
+
+def is_fields(testdb):
+    """
+    Return a dict of FITID to (is_interest_charge, is_payment) for Account 3.
+    """
+    testdb.expire_all()
+    return {
+        t.fitid: (t.is_interest_charge, t.is_payment)
+        for t in testdb.query(OFXTransaction).filter(
+            OFXTransaction.account_id.__eq__(3)
+        ).all()
+    }
+
+
+@pytest.mark.acceptance
+@pytest.mark.usefixtures('class_refresh_db', 'refreshdb')
+class TestOfxReclassify(AcceptanceHelper):
+
+    def test_0_verify_db(self, testdb):
+        acct = testdb.query(Account).get(3)
+        assert acct.re_interest_charge == '^INTEREST CHARGED TO'
+        assert acct.re_payment == '.*Online Payment, thank you.*'
+        assert is_fields(testdb) == {
+            'T1': (False, False),
+            'T2': (False, True),
+            'T2-1': (False, True),
+            'T2-2': (True, False),
+            'T3': (True, False)
+        }
+
+    @patch('%s.OFX_RECLASSIFY_BACKGROUND' % pb_settings, 0)
+    @patch('%s.OFX_RECLASSIFY_BATCH_SIZE' % pb_settings, 2)
+    def test_1_batches_after_commit(self, testdb):
+        before = ofx_reclassifier.status.get(3)
+        acct = testdb.query(Account).get(3)
+        acct.re_interest_charge = '.*Credit Purchase'
+        testdb.flush()
+        # not reclassified until commit
+        assert ofx_reclassifier.status.get(3) == before
+        testdb.commit()
+        status = ofx_reclassifier.status[3]
+        assert status['status'] == 'done'
+        assert status['total'] == 5
+        assert status['processed'] == 5
+        assert status['changed'] == 3
+        assert status['batches'] == 3
+        assert status['error'] is None
+        assert is_fields(testdb) == {
+            'T1': (True, False),
+            'T2': (False, True),
+            'T2-1': (False, True),
+            'T2-2': (False, False),
+            'T3': (False, False)
+        }
+
+    @patch('%s.OFX_RECLASSIFY_BACKGROUND' % pb_settings, 0)
+    def test_2_rollback_does_not_reclassify(self, testdb):
+        before = ofx_reclassifier.status[3]
+        acct = testdb.query(Account).get(3)
+        acct.re_payment = None
+        testdb.flush()
+        testdb.rollback()
+        assert ofx_reclassifier.status[3] == before
+        assert is_fields(testdb)['T2'] == (False, True)
+
+    @patch('%s.OFX_RECLASSIFY_BACKGROUND' % pb_settings, 1)
+    def test_3_background(self, testdb):
+        acct = testdb.query(Account).get(3)
+        acct.re_payment = None
+        testdb.commit()
+        ofx_reclassifier.wait()
+        status = ofx_reclassifier.status[3]
+        assert status['status'] == 'done'
+        assert status['processed'] == 5
+        assert status['changed'] == 2
+        assert status['batches'] == 1
+        assert is_fields(testdb) == {
+            'T1': (True, False),
+            'T2': (False, False),
+            'T2-1': (False, False),
+            'T2-2': (False, False),
+            'T3': (False, False)
+        }
+
+    def test_4_missing_account(self, testdb):
+        job = ReclassifyJob(9999, 2)
+        job.run(testdb)
+        assert job.status == 'done'
+        assert job.total == 0
+        assert job.processed == 0
+        assert job.batches == 0
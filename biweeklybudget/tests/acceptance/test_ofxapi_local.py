@@ -0,0 +1,305 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/biweeklybudget>
+
+################################################################################
+Copyright 2016-2024 Jason Antman <http://www.jasonantman.com>
+
+    This file is part of biweeklybudget, also known as biweeklybudget.
+
+    biweeklybudget is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    biweeklybudget is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with biweeklybudget.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/biweeklybudget> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import os
+import pytest
+from datetime import datetime
+from io import BytesIO
+from decimal import Decimal
+from unittest.mock import patch
+
+from pytz import UTC
+from ofxparse import OfxParser
+
+from biweeklybudget.tests.acceptance_helpers import AcceptanceHelper
+from biweeklybudget.ofxapi.local import OfxApiLocal
+from biweeklybudget.ofxstream import OfxStreamReader
+from biweeklybudget.ofxapi.exceptions import DuplicateFileException
+from biweeklybudget.ofxapi.serialization import (
+    statement_to_dict, statement_from_dict
+)
+from biweeklybudget.models.ofx_statement import OFXStatement
+from biweeklybudget.models.ofx_transaction import OFXTransaction
+
+fixturedir = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..', 'fixtures')
+)
+
+pbm = 'biweeklybudget.ofxapi.local'
+
+
+def fixture_bytes(replacements={}):
+    """
+    Return the CreditOne OFX fixture, after applying the given string
+    replacements to it.
+    """
+    ofxpath = os.path.join(fixturedir, 'CreditOne_2017-07-28_05-30-00.ofx')
+    with open(ofxpath, 'r') as fh:
+        ofx_str = fh.read()
+    for k, v in replacements.items():
+        ofx_str = ofx_str.replace(k, v)
+    return ofx_str.encode('utf-8')
+
+
+def fixture_ofx(replacements={}):
+    """
+    Return the parsed CreditOne OFX fixture, after applying the given string
+    replacements to it.
+    """
+    return OfxParser.parse(BytesIO(fixture_bytes(replacements)))
+
+
+@pytest.mark.acceptance
+@pytest.mark.usefixtures('class_refresh_db', 'refreshdb')
+@pytest.mark.incremental
+class TestBulkUpsert(AcceptanceHelper):
+
+    def test_1_new_statement(self, testdb):
+        api = OfxApiLocal(testdb, bulk_upsert=True)
+        with patch('%s.db_session' % pbm, testdb):
+            stmt_id, count_new, count_upd = api.update_statement_ofx(
+                3, fixture_ofx(), filename='bulk1.ofx'
+            )
+        assert count_new == 1
+        assert count_upd == 0
+        stmt = testdb.query(OFXStatement).get(stmt_id)
+        assert stmt.account_id == 3
+        assert stmt.filename == 'bulk1.ofx'
+        assert stmt.type == 'CreditCard'
+        assert stmt.ledger_bal == Decimal('-1234.5600')
+        trans = testdb.query(OFXTransaction).get((3, 'FITID20170727144.0G53TY'))
+        assert trans.statement_id == stmt_id
+        assert trans.trans_type == 'credit'
+        assert trans.date_posted == datetime(2017, 7, 27, 16, 0, 0, tzinfo=UTC)
+        assert trans.amount == Decimal('123.0000')
+        assert trans.name == 'INTERNET PAYMENT - THANK YOU'
+        assert trans.is_interest_charge is False
+        assert trans.is_interest_payment is False
+        assert trans.is_late_fee is False
+        assert trans.is_other_fee is False
+        assert trans.is_payment is False
+
+    def test_2_update_and_insert(self, testdb):
+        ofx = fixture_ofx({
+            '<DTSERVER>20170728053000': '<DTSERVER>20170729053000',
+            '<TRNAMT>123<': '<TRNAMT>124<',
+            '</BANKTRANLIST>': '<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>'
+                               '20170728160000.000<TRNAMT>-12.34<FITID>'
+                               'BULKNEW1<NAME>INTEREST CHARGED TO STANDARD '
+                               'PUR</STMTTRN></BANKTRANLIST>'
+        })
+        api = OfxApiLocal(testdb, bulk_upsert=True)
+        with patch('%s.db_session' % pbm, testdb):
+            stmt_id, count_new, count_upd = api.update_statement_ofx(
+                3, ofx, filename='bulk2.ofx'
+            )
+        assert count_new == 1
+        assert count_upd == 1
+        trans = testdb.query(OFXTransaction).get((3, 'FITID20170727144.0G53TY'))
+        testdb.refresh(trans)
+        assert trans.statement_id == stmt_id
+        assert trans.amount == Decimal('124.0000')
+        trans = testdb.query(OFXTransaction).get((3, 'BULKNEW1'))
+        assert trans.statement_id == stmt_id
+        assert trans.amount == Decimal('-12.3400')
+        assert trans.is_interest_charge is True
+        assert trans.is_payment is False
+
+
+@pytest.mark.acceptance
+@pytest.mark.usefixtures('class_refresh_db', 'refreshdb')
+@pytest.mark.incremental
+class TestStreamUpsert(AcceptanceHelper):
+
+    def test_1_new_statement(self, testdb):
+        api = OfxApiLocal(testdb)
+        reader = OfxStreamReader(BytesIO(fixture_bytes()))
+        with patch('%s.db_session' % pbm, testdb):
+            stmt_id, count_new, count_upd = api.update_statement_stream(
+                3, reader, filename='stream1.ofx'
+            )
+        assert count_new == 1
+        assert count_upd == 0
+        stmt = testdb.query(OFXStatement).get(stmt_id)
+        assert stmt.account_id == 3
+        assert stmt.filename == 'stream1.ofx'
+        assert stmt.type == 'CreditCard'
+        assert stmt.as_of == datetime(2017, 7, 28, 5, 30, 0, tzinfo=UTC)
+        assert stmt.currency == 'USD'
+        assert stmt.acctid == 'CreditOneAcctId'
+        assert stmt.bankid == '4321'
+        assert stmt.ledger_bal == Decimal('-1234.5600')
+        assert stmt.ledger_bal_as_of == datetime(
+            2017, 7, 28, 5, 29, 32, tzinfo=UTC
+        )
+        trans = testdb.query(OFXTransaction).get((3, 'FITID20170727144.0G53TY'))
+        assert trans.statement_id == stmt_id
+        assert trans.trans_type == 'credit'
+        assert trans.amount == Decimal('123.0000')
+        assert trans.name == 'INTERNET PAYMENT - THANK YOU'
+
+    def test_2_update_and_insert_chunked(self, testdb):
+        data = fixture_bytes({
+            '<DTSERVER>20170728053000': '<DTSERVER>20170729053000',
+            '<TRNAMT>123<': '<TRNAMT>124<',
+            '<BALAMT>-1234.56': '<BALAMT>-1000.01',
+            '</BANKTRANLIST>': '<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>'
+                               '20170728160000.000<TRNAMT>-12.34<FITID>'
+                               'STREAMNEW1<NAME>INTEREST CHARGED TO STANDARD '
+                               'PUR</STMTTRN><STMTTRN><TRNTYPE>DEBIT'
+                               '<DTPOSTED>20170728160000.000<TRNAMT>-1.00'
+                               '<FITID>STREAMNEW2<NAME>Foo</STMTTRN>'
+                               '</BANKTRANLIST>'
+        })
+        api = OfxApiLocal(testdb)
+        reader = OfxStreamReader(BytesIO(data))
+        with patch('%s.db_session' % pbm, testdb):
+            with patch.object(OfxApiLocal, 'BULK_QUERY_CHUNK_SIZE', 2):
+                stmt_id, count_new, count_upd = api.update_statement_stream(
+                    3, reader, filename='stream2.ofx'
+                )
+        assert count_new == 2
+        assert count_upd == 1
+        stmt = testdb.query(OFXStatement).get(stmt_id)
+        assert stmt.ledger_bal == Decimal('-1000.0100')
+        trans = testdb.query(OFXTransaction).get((3, 'FITID20170727144.0G53TY'))
+        testdb.refresh(trans)
+        assert trans.statement_id == stmt_id
+        assert trans.amount == Decimal('124.0000')
+        trans = testdb.query(OFXTransaction).get((3, 'STREAMNEW1'))
+        assert trans.statement_id == stmt_id
+        assert trans.is_interest_charge is True
+        trans = testdb.query(OFXTransaction).get((3, 'STREAMNEW2'))
+        assert trans.statement_id == stmt_id
+        assert trans.amount == Decimal('-1.0000')
+
+
+@pytest.mark.acceptance
+@pytest.mark.usefixtures('class_refresh_db', 'refreshdb')
+class TestUpdateStatements(AcceptanceHelper):
+
+    def test_batch(self, testdb):
+        mtime = datetime(2017, 7, 28, 6, 0, 0, tzinfo=UTC)
+        # the second statement is decoded from the batch upload format
+        decoded = statement_from_dict(statement_to_dict(
+            3, fixture_ofx({
+                '<DTSERVER>20170728053000': '<DTSERVER>20170729053000',
+                '<TRNAMT>123<': '<TRNAMT>124<'
+            }), mtime, 'batch2.ofx'
+        ))
+        api = OfxApiLocal(testdb)
+        with patch('%s.db_session' % pbm, testdb):
+            with patch('biweeklybudget.db.db_session', testdb):
+                res = api.update_statements([
+                    (3, fixture_ofx(), mtime, 'batch1.ofx'),
+                    (3, fixture_ofx(), mtime, 'batch1.ofx'),
+                    (9999, fixture_ofx(), mtime, 'batch3.ofx'),
+                    decoded
+                ])
+        assert len(res) == 4
+        stmt_id = res[0][0]
+        assert res[0] == (stmt_id, 1, 0)
+        assert isinstance(res[1], DuplicateFileException)
+        assert res[1].stmt_id == stmt_id
+        assert isinstance(res[2], AttributeError)
+        assert res[3] == (stmt_id + 1, 0, 1)
+        stmt = testdb.query(OFXStatement).get(stmt_id + 1)
+        assert stmt.filename == 'batch2.ofx'
+        assert stmt.file_mtime == mtime
+        assert stmt.as_of == datetime(2017, 7, 29, 5, 30, 0, tzinfo=UTC)
+        assert stmt.bankid == '4321'
+        trans = testdb.query(OFXTransaction).get((3, 'FITID20170727144.0G53TY'))
+        testdb.refresh(trans)
+        assert trans.statement_id == stmt_id + 1
+        assert trans.amount == Decimal('124.0000')
+        assert trans.date_posted == datetime(2017, 7, 27, 16, 0, 0, tzinfo=UTC)
+        assert testdb.query(OFXStatement).filter(
+            OFXStatement.filename == 'batch3.ofx'
+        ).count() == 0
+
+
+@pytest.mark.acceptance
+@pytest.mark.usefixtures('class_refresh_db', 'refreshdb')
+@pytest.mark.incremental
+class TestIngestMetrics(AcceptanceHelper):
+
+    def test_1_update_statement_ofx(self, testdb):
+        api = OfxApiLocal(testdb)
+        with patch('%s.db_session' % pbm, testdb):
+            with patch('biweeklybudget.db.db_session', testdb):
+                res = api.update_statement_ofx(
+                    3, fixture_ofx(), filename='metrics1.ofx'
+                )
+        assert res == (res.statement_id, 1, 0)
+        m = res.metrics
+        assert m.source == 'ofx'
+        assert m.account_id == 3
+        assert m.filename == 'metrics1.ofx'
+        assert m.rows == 1
+        assert m.count_new == 1
+        assert m.count_updated == 0
+        assert m.queries > 0
+        assert sorted(m.stages.keys()) == [
+            'before_flush', 'commit', 'create_statement', 'flush', 'other',
+            'upsert'
+        ]
+        assert m.total == pytest.approx(sum(m.stages.values()))
+        assert m.as_dict['rows_per_sec'] == m.rows / m.total
+
+    def test_2_update_statement_stream(self, testdb):
+        api = OfxApiLocal(testdb)
+        reader = OfxStreamReader(BytesIO(fixture_bytes({
+            '<DTSERVER>20170728053000': '<DTSERVER>20170729053000',
+            '<TRNAMT>123<': '<TRNAMT>124<'
+        })))
+        with patch('%s.db_session' % pbm, testdb):
+            res = api.update_statement_stream(
+                3, reader, filename='metrics2.ofx'
+            )
+        assert res == (res.statement_id, 0, 1)
+        m = res.metrics
+        assert m.source == 'ofx-stream'
+        assert m.filename == 'metrics2.ofx'
+        assert m.rows == 1
+        assert m.count_new == 0
+        assert m.count_updated == 1
+        assert m.queries > 0
+        for k in [
+            'create_statement', 'parse', 'upsert', 'flush', 'before_flush',
+            'commit'
+        ]:
+            assert k in m.stages
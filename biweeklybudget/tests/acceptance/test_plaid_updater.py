@@ -0,0 +1,255 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/biweeklybudget>
+
+################################################################################
+Copyright 2016-2024 Jason Antman <http://www.jasonantman.com>
+
+    This file is part of biweeklybudget, also known as biweeklybudget.
+
+    biweeklybudget is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    biweeklybudget is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with biweeklybudget.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/biweeklybudget> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import pytest
+from copy import deepcopy
+from datetime import date, datetime
+from decimal import Decimal
+from unittest.mock import patch
+
+from pytz import UTC
+from biweeklybudget.tests.acceptance_helpers import AcceptanceHelper
+from biweeklybudget.plaid_updater import PlaidUpdater
+from biweeklybudget.models.ofx_transaction import OFXTransaction
+from biweeklybudget.models.plaid_items import PlaidItem
+
+pbm = 'biweeklybudget.plaid_updater'
+
+
+class FakePlaidClient:
+    """
+    Local stand-in for the Plaid API client, backed by an in-memory log of
+    transaction changes. A sync cursor is ``c<N>``, the number of changes in
+    the log when it was issued; sync responses are paged two changes at a
+    time.
+    """
+
+    def __init__(self):
+        self.txns = {}
+        self.log = []
+        self.calls = []
+
+    def change(self, op, txn_id, **kwargs):
+        if op == 'removed':
+            del self.txns[txn_id]
+        else:
+            txn = dict(
+                {'pending': False, 'payment_meta': {'reference_number': None}},
+                **self.txns.get(txn_id, {})
+            )
+            txn.update(transaction_id=txn_id, **kwargs)
+            self.txns[txn_id] = txn
+        self.log.append((op, txn_id, deepcopy(self.txns.get(txn_id))))
+
+    def item_get(self, req):
+        self.calls.append('item_get')
+        return {'item': {}, 'status': {'transactions': {}}}
+
+    def accounts_get(self, req):
+        self.calls.append('accounts_get')
+        return {'accounts': self._accounts()}
+
+    def transactions_get(self, req):
+        self.calls.append('transactions_get')
+        txns = [
+            t for t in self.txns.values()
+            if req.start_date <= t['date'] <= req.end_date
+        ]
+        return {
+            'transactions': txns,
+            'accounts': self._accounts(),
+            'total_transactions': len(txns)
+        }
+
+    def transactions_sync(self, req):
+        self.calls.append('transactions_sync')
+        start = int(req.get('cursor', 'c0')[1:])
+        resp = {
+            'added': [], 'modified': [], 'removed': [],
+            'next_cursor': f'c{min(start + 2, len(self.log))}',
+            'has_more': start + 2 < len(self.log)
+        }
+        for op, txn_id, txn in self.log[start:start + 2]:
+            if op == 'removed':
+                resp['removed'].append({'transaction_id': txn_id})
+            else:
+                resp[op].append(txn)
+        return resp
+
+    def _accounts(self):
+        return [
+            {
+                'account_id': acct_id,
+                'mask': 'foo',
+                'balances': {
+                    'current': bal, 'available': None,
+                    'iso_currency_code': 'USD'
+                }
+            } for acct_id, bal in [
+                ('PlaidAcct1', 1234.56), ('PlaidAcct2', 432.1)
+            ]
+        ]
+
+
+@pytest.mark.acceptance
+@pytest.mark.usefixtures('class_refresh_db', 'refreshdb')
+@pytest.mark.incremental
+class TestPlaidSync(AcceptanceHelper):
+
+    client = FakePlaidClient()
+
+    def _update(self, testdb, hour):
+        with patch(f'{pbm}.plaid_client') as m_pc:
+            m_pc.return_value = self.client
+            updater = PlaidUpdater()
+        self.client.calls = []
+        # statement filenames include the update time, so it must differ
+        with patch(f'{pbm}.dtnow') as m_dtnow:
+            m_dtnow.return_value = datetime(2017, 7, 28, hour, tzinfo=UTC)
+            with patch(f'{pbm}.db_session', testdb):
+                with patch('biweeklybudget.db.db_session', testdb):
+                    res = updater.update(
+                        items=[testdb.query(PlaidItem).get('PlaidItem1')],
+                        sync=True
+                    )
+        assert len(res) == 1
+        assert res[0].success is True
+        return res[0]
+
+    def _txns(self, testdb):
+        testdb.expire_all()
+        return {
+            (t.account_id, t.fitid): t.amount
+            for t in testdb.query(OFXTransaction).filter(
+                OFXTransaction.plaid_transaction_id.isnot(None)
+            ).all()
+        }
+
+    def test_1_initial_sync(self, testdb):
+        self.client.change(
+            'added', 'plaid1', account_id='PlaidAcct1', amount=10.5,
+            date=date(2017, 7, 20), name='One'
+        )
+        self.client.change(
+            'added', 'plaid2', account_id='PlaidAcct1', amount=-20,
+            date=date(2017, 7, 21), name='Two'
+        )
+        self.client.change(
+            'added', 'plaid3', account_id='PlaidAcct2', amount=30,
+            date=date(2017, 7, 22), name='Three'
+        )
+        self.client.change(
+            'added', 'plaid0', account_id='PlaidAcct1', amount=1,
+            date=date(2017, 1, 1), name='Outside window'
+        )
+        res = self._update(testdb, 6)
+        # the initial sync's transactions are applied, not downloaded again
+        assert self.client.calls == [
+            'item_get', 'transactions_sync', 'transactions_sync',
+            'accounts_get'
+        ]
+        assert res.removed == 0
+        assert self._txns(testdb) == {
+            (1, 'plaid0'): Decimal('1'),
+            (1, 'plaid1'): Decimal('10.5'),
+            (1, 'plaid2'): Decimal('-20'),
+            (3, 'plaid3'): Decimal('-30')
+        }
+        assert testdb.query(PlaidItem).get('PlaidItem1').sync_cursor == 'c4'
+
+    def test_2_sync(self, testdb):
+        self.client.change('modified', 'plaid1', amount=11.5)
+        self.client.change('removed', 'plaid2')
+        self.client.change(
+            'added', 'plaid4', account_id='PlaidAcct2', amount=-40,
+            date=date(2017, 7, 27), name='Four'
+        )
+        res = self._update(testdb, 7)
+        assert self.client.calls == [
+            'item_get', 'transactions_sync', 'transactions_sync',
+            'accounts_get'
+        ]
+        assert res.added == 1
+        assert res.updated == 1
+        assert res.removed == 1
+        assert self._txns(testdb) == {
+            (1, 'plaid0'): Decimal('1'),
+            (1, 'plaid1'): Decimal('11.5'),
+            (3, 'plaid3'): Decimal('-30'),
+            (3, 'plaid4'): Decimal('40')
+        }
+        assert testdb.query(PlaidItem).get('PlaidItem1').sync_cursor == 'c7'
+
+    def test_3_no_changes(self, testdb):
+        res = self._update(testdb, 8)
+        assert self.client.calls == [
+            'item_get', 'transactions_sync', 'accounts_get'
+        ]
+        assert res.added == 0
+        assert res.updated == 0
+        assert res.removed == 0
+        assert len(res.stmt_ids) == 2
+        assert len(self._txns(testdb)) == 4
+        assert testdb.query(PlaidItem).get('PlaidItem1').sync_cursor == 'c7'
+
+    def test_4_add_reference_number(self, testdb):
+        self.client.change(
+            'added', 'plaid5', account_id='PlaidAcct1', amount=50,
+            date=date(2017, 7, 27), name='Five',
+            payment_meta={'reference_number': 'REF5'}
+        )
+        self.client.change(
+            'added', 'plaid6', account_id='PlaidAcct1', amount=60,
+            date=date(2017, 7, 28), name='Six', pending=True
+        )
+        res = self._update(testdb, 9)
+        assert res.added == 1
+        assert self._txns(testdb)[(1, 'REF5')] == Decimal('50')
+        t = testdb.query(OFXTransaction).get((1, 'REF5'))
+        assert t.plaid_transaction_id == 'plaid5'
+
+    def test_5_remove_reference_number(self, testdb):
+        self.client.change('removed', 'plaid5')
+        self.client.change('removed', 'plaid6')
+        res = self._update(testdb, 10)
+        assert res.removed == 1
+        assert self._txns(testdb) == {
+            (1, 'plaid0'): Decimal('1'),
+            (1, 'plaid1'): Decimal('11.5'),
+            (3, 'plaid3'): Decimal('-30'),
+            (3, 'plaid4'): Decimal('40')
+        }
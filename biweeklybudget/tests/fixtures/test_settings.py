@@ -74,6 +74,17 @@ STALE_DATA_TIMEDELTA = timedelta(days=2)
 BIWEEKLYBUDGET_TEST_TIMESTAMP = os.environ.get('BIWEEKLYBUDGET_TEST_TIMESTAMP')
 PAY_PERIOD_START_DATE = date(2017, 7, 21)
 
+#: Disable the pay period data cache; the acceptance tests' live server runs in
+#: a different process than the tests that modify the database.
+PAY_PERIOD_CACHE_SIZE = 0
+
+#: Disable the notifications cache, for the same reason.
+NOTIFICATIONS_CACHE_TTL = 0
+
+#: Reclassify OFXTransactions synchronously when Account patterns change, so
+#: that tests see the results as soon as they commit.
+OFX_RECLASSIFY_BACKGROUND = 0
+
 #: When listing unreconciled transactions that need to be reconciled, any
 #: :py:class:`~.OFXTransaction` before this date will be ignored.
 RECONCILE_BEGIN_DATE = date(2017, 1, 1)
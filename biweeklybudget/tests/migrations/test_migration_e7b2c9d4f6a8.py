@@ -0,0 +1,100 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/biweeklybudget>
+
+################################################################################
+Copyright 2016-2024 Jason Antman <http://www.jasonantman.com>
+
+    This file is part of biweeklybudget, also known as biweeklybudget.
+
+    biweeklybudget is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    biweeklybudget is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with biweeklybudget.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/biweeklybudget> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import pytest
+import logging
+
+from biweeklybudget.tests.migrations.migration_test_helpers import MigrationTest
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.mark.migrations
+class TestAddAccountLatestBalanceId(MigrationTest):
+    """
+    Test for revision e7b2c9d4f6a8
+    """
+
+    migration_rev = 'e7b2c9d4f6a8'
+
+    def data_setup(self, engine):
+        """method to setup sample data in empty tables"""
+        sql = [
+            "INSERT INTO accounts SET name='acct1', acct_type=1, "
+            "reconcile_trans=0;",
+            "INSERT INTO accounts SET name='acct2', acct_type=2, "
+            "reconcile_trans=0;",
+            "INSERT INTO accounts SET name='acct3', acct_type=1, "
+            "reconcile_trans=0;",
+            "INSERT INTO account_balances SET account_id=1, ledger=10.00, "
+            "overall_date='2018-01-05 12:00:00';",
+            "INSERT INTO account_balances SET account_id=2, ledger=-20.00, "
+            "overall_date='2018-01-05 12:00:00';",
+            "INSERT INTO account_balances SET account_id=1, ledger=11.00, "
+            "overall_date='2018-01-06 12:00:00';",
+            "INSERT INTO account_balances SET account_id=2, ledger=-21.00, "
+            "overall_date='2018-01-06 12:00:00';",
+            "INSERT INTO account_balances SET account_id=1, ledger=12.00, "
+            "overall_date='2018-01-07 12:00:00';",
+        ]
+        conn = engine.connect()
+        for s in sql:
+            logger.debug('Executing: %s', s)
+            conn.execute(s)
+        conn.close()
+
+    def verify_before(self, engine):
+        """method to verify data before forward migration, and after reverse"""
+        conn = engine.connect()
+        columns = conn.execute('SELECT * FROM accounts WHERE 1=2;').keys()
+        conn.close()
+        assert 'latest_balance_id' not in columns
+
+    def verify_after(self, engine):
+        """method to verify data after forward migration"""
+        conn = engine.connect()
+        pointers = [
+            tuple(r) for r in conn.execute(
+                'SELECT id, latest_balance_id FROM accounts ORDER BY id;'
+            )
+        ]
+        conn.close()
+        assert pointers == [
+            (1, 5),
+            (2, 4),
+            (3, None)
+        ]
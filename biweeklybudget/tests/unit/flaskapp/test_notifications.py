@@ -35,8 +35,8 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 ################################################################################
 """
 import sys
+from decimal import Decimal
 
-from biweeklybudget.models.account import Account
 from biweeklybudget.flaskapp.notifications import NotificationsController
 
 # https://code.google.com/p/mock/issues/detail?id=249
@@ -56,33 +56,84 @@ pb = '%s.NotificationsController' % pbm
 class TestNotifications(object):
 
     def test_num_stale_accounts(self):
-        accts = [
-            Mock(is_stale=True, is_active=True),
-            Mock(is_stale=False, is_active=True)
-        ]
         with patch('%s.db_session' % pbm) as mock_db:
-            mock_db.query.return_value.filter.return_value\
-                .all.return_value = accts
-            res = NotificationsController.num_stale_accounts()
+            with patch('%s._num_stale_accounts_query' % pb) as mock_q:
+                mock_q.return_value.scalar.return_value = 1
+                res = NotificationsController.num_stale_accounts()
         assert res == 1
-        assert mock_db.mock_calls[0] == call.query(Account)
-        assert mock_db.mock_calls[2] == call.query().filter().all()
+        assert mock_q.mock_calls == [call(mock_db), call().scalar()]
+
+    def test_budget_account_sum_none(self):
+        m_sess = Mock()
+        with patch('%s._budget_account_sum_query' % pb) as mock_q:
+            mock_q.return_value.scalar.return_value = None
+            res = NotificationsController.budget_account_sum(m_sess)
+        assert res == Decimal('0.0')
+        assert mock_q.mock_calls == [call(m_sess), call().scalar()]
+
+    def test_totals(self):
+        m_sess = Mock()
+        m_sess.query.return_value.one.return_value = (
+            2, Decimal('123.45'), None, Decimal('67.89'), 3
+        )
+        with patch.multiple(
+            pb,
+            _num_stale_accounts_query=DEFAULT,
+            _budget_account_sum_query=DEFAULT,
+            _budget_account_unreconciled_query=DEFAULT,
+            _standing_budgets_sum_query=DEFAULT,
+            _num_unreconciled_ofx_query=DEFAULT
+        ) as mocks:
+            res = NotificationsController.totals(m_sess)
+        assert res == {
+            'num_stale_accounts': 2,
+            'budget_account_sum': Decimal('123.45'),
+            'budget_account_unreconciled': Decimal('0.0'),
+            'standing_budgets_sum': Decimal('67.89'),
+            'num_unreconciled_ofx': 3
+        }
+        for name, m in mocks.items():
+            assert m.mock_calls == [
+                call(m_sess), call().label(name[1:-6])
+            ]
+        assert m_sess.mock_calls == [
+            call.query(
+                mocks['_num_stale_accounts_query'].return_value.label
+                .return_value,
+                mocks['_budget_account_sum_query'].return_value.label
+                .return_value,
+                mocks['_budget_account_unreconciled_query'].return_value
+                .label.return_value,
+                mocks['_standing_budgets_sum_query'].return_value.label
+                .return_value,
+                mocks['_num_unreconciled_ofx_query'].return_value.label
+                .return_value
+            ),
+            call.query().one()
+        ]
+
+    def test_get_cached_notifications(self):
+        with patch('%s.db_session' % pbm) as mock_db:
+            with patch('%s.notifications_cache' % pbm) as mock_cache:
+                res = NotificationsController.get_cached_notifications()
+        assert res is mock_cache.get.return_value
+        assert mock_cache.mock_calls == [
+            call.get(mock_db, NotificationsController.get_notifications)
+        ]
 
     def test_get_notifications_no_stale(self):
         with patch.multiple(
             pb,
-            num_stale_accounts=DEFAULT,
-            budget_account_sum=DEFAULT,
-            standing_budgets_sum=DEFAULT,
-            num_unreconciled_ofx=DEFAULT,
-            budget_account_unreconciled=DEFAULT,
+            totals=DEFAULT,
             pp_sum=DEFAULT
         ) as mocks:
-            mocks['num_stale_accounts'].return_value = 0
-            mocks['budget_account_sum'].return_value = 1000
-            mocks['standing_budgets_sum'].return_value = 1000
-            mocks['num_unreconciled_ofx'].return_value = 0
-            mocks['budget_account_unreconciled'].return_value = 0
+            mocks['totals'].return_value = {
+                'num_stale_accounts': 0,
+                'budget_account_sum': 1000,
+                'budget_account_unreconciled': 0,
+                'standing_budgets_sum': 1000,
+                'num_unreconciled_ofx': 0
+            }
             mocks['pp_sum'].return_value = 0
             res = NotificationsController.get_notifications()
         assert res == []
@@ -90,18 +141,16 @@ class TestNotifications(object):
     def test_get_notifications_over_balance(self):
         with patch.multiple(
                 pb,
-                num_stale_accounts=DEFAULT,
-                budget_account_sum=DEFAULT,
-                standing_budgets_sum=DEFAULT,
-                num_unreconciled_ofx=DEFAULT,
-                budget_account_unreconciled=DEFAULT,
+                totals=DEFAULT,
                 pp_sum=DEFAULT
         ) as mocks:
-            mocks['num_stale_accounts'].return_value = 0
-            mocks['budget_account_sum'].return_value = 1000
-            mocks['standing_budgets_sum'].return_value = 500
-            mocks['num_unreconciled_ofx'].return_value = 0
-            mocks['budget_account_unreconciled'].return_value = 700
+            mocks['totals'].return_value = {
+                'num_stale_accounts': 0,
+                'budget_account_sum': 1000,
+                'budget_account_unreconciled': 700,
+                'standing_budgets_sum': 500,
+                'num_unreconciled_ofx': 0
+            }
             mocks['pp_sum'].return_value = 600
             res = NotificationsController.get_notifications()
         assert res == [
@@ -123,18 +172,16 @@ class TestNotifications(object):
     def test_get_notifications_under_balance(self):
         with patch.multiple(
                 pb,
-                num_stale_accounts=DEFAULT,
-                budget_account_sum=DEFAULT,
-                standing_budgets_sum=DEFAULT,
-                num_unreconciled_ofx=DEFAULT,
-                budget_account_unreconciled=DEFAULT,
+                totals=DEFAULT,
                 pp_sum=DEFAULT
         ) as mocks:
-            mocks['num_stale_accounts'].return_value = 0
-            mocks['budget_account_sum'].return_value = 2000
-            mocks['standing_budgets_sum'].return_value = 500
-            mocks['num_unreconciled_ofx'].return_value = 0
-            mocks['budget_account_unreconciled'].return_value = 700
+            mocks['totals'].return_value = {
+                'num_stale_accounts': 0,
+                'budget_account_sum': 2000,
+                'budget_account_unreconciled': 700,
+                'standing_budgets_sum': 500,
+                'num_unreconciled_ofx': 0
+            }
             mocks['pp_sum'].return_value = 600
             res = NotificationsController.get_notifications()
         assert res == [
@@ -156,18 +203,16 @@ class TestNotifications(object):
     def test_get_notifications_one_stale(self):
         with patch.multiple(
                 pb,
-                num_stale_accounts=DEFAULT,
-                budget_account_sum=DEFAULT,
-                standing_budgets_sum=DEFAULT,
-                num_unreconciled_ofx=DEFAULT,
-                budget_account_unreconciled=DEFAULT,
+                totals=DEFAULT,
                 pp_sum=DEFAULT
         ) as mocks:
-            mocks['num_stale_accounts'].return_value = 1
-            mocks['budget_account_sum'].return_value = 1000
-            mocks['standing_budgets_sum'].return_value = 1000
-            mocks['num_unreconciled_ofx'].return_value = 28
-            mocks['budget_account_unreconciled'].return_value = 0
+            mocks['totals'].return_value = {
+                'num_stale_accounts': 1,
+                'budget_account_sum': 1000,
+                'budget_account_unreconciled': 0,
+                'standing_budgets_sum': 1000,
+                'num_unreconciled_ofx': 28
+            }
             mocks['pp_sum'].return_value = 0
             res = NotificationsController.get_notifications()
         assert res == [
@@ -186,18 +231,16 @@ class TestNotifications(object):
     def test_get_notifications_three_stale(self):
         with patch.multiple(
                 pb,
-                num_stale_accounts=DEFAULT,
-                budget_account_sum=DEFAULT,
-                standing_budgets_sum=DEFAULT,
-                num_unreconciled_ofx=DEFAULT,
-                budget_account_unreconciled=DEFAULT,
+                totals=DEFAULT,
                 pp_sum=DEFAULT
         ) as mocks:
-            mocks['num_stale_accounts'].return_value = 3
-            mocks['budget_account_sum'].return_value = 1000
-            mocks['standing_budgets_sum'].return_value = 1000
-            mocks['num_unreconciled_ofx'].return_value = 28
-            mocks['budget_account_unreconciled'].return_value = 0
+            mocks['totals'].return_value = {
+                'num_stale_accounts': 3,
+                'budget_account_sum': 1000,
+                'budget_account_unreconciled': 0,
+                'standing_budgets_sum': 1000,
+                'num_unreconciled_ofx': 28
+            }
             mocks['pp_sum'].return_value = 0
             res = NotificationsController.get_notifications()
         assert res == [
@@ -979,10 +979,10 @@ class TestPlaidUpdate:
         assert mocks['PlaidUpdater'].mock_calls == [
             call(),
             call.available_items(),
-            call().update(items=items, days=30)
+            call().update(items=items, days=30, workers=0, sync=False)
         ]
         assert mock_updater.mock_calls == [
-            call.update(items=items, days=30)
+            call.update(items=items, days=30, workers=0, sync=False)
         ]
         assert mocks['render_template'].mock_calls == [call(
             'plaid_result.html',
@@ -1053,10 +1053,10 @@ class TestPlaidUpdate:
         assert res == mock_json
         assert mocks['PlaidUpdater'].mock_calls == [
             call(),
-            call().update(items=[items[0]], days=30)
+            call().update(items=[items[0]], days=30, workers=0, sync=False)
         ]
         assert mock_updater.mock_calls == [
-            call.update(items=[items[0]], days=30)
+            call.update(items=[items[0]], days=30, workers=0, sync=False)
         ]
         assert mocks['render_template'].mock_calls == []
         assert mocks['jsonify'].mock_calls == [
@@ -1137,10 +1137,10 @@ class TestPlaidUpdate:
                       "TOTAL: 1 updated, 2 added, 1 account(s) failed"
         assert mocks['PlaidUpdater'].mock_calls == [
             call(),
-            call().update(items=[items[0]], days=30)
+            call().update(items=[items[0]], days=30, workers=0, sync=False)
         ]
         assert mock_updater.mock_calls == [
-            call.update(items=[items[0]], days=30)
+            call.update(items=[items[0]], days=30, workers=0, sync=False)
         ]
         assert mocks['render_template'].mock_calls == []
         assert mocks['jsonify'].mock_calls == []
@@ -1219,10 +1219,10 @@ class TestPlaidUpdate:
                       "TOTAL: 1 updated, 2 added, 1 account(s) failed"
         assert mocks['PlaidUpdater'].mock_calls == [
             call(),
-            call().update(items=[items[0]], days=12)
+            call().update(items=[items[0]], days=12, workers=0, sync=False)
         ]
         assert mock_updater.mock_calls == [
-            call.update(items=[items[0]], days=12)
+            call.update(items=[items[0]], days=12, workers=0, sync=False)
         ]
         assert mocks['render_template'].mock_calls == []
         assert mocks['jsonify'].mock_calls == []
@@ -0,0 +1,125 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/biweeklybudget>
+
+################################################################################
+Copyright 2016-2024 Jason Antman <http://www.jasonantman.com>
+
+    This file is part of biweeklybudget, also known as biweeklybudget.
+
+    biweeklybudget is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    biweeklybudget is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with biweeklybudget.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/biweeklybudget> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+import sys
+from decimal import Decimal
+from datetime import date, datetime
+from sqlalchemy.orm.query import Query
+
+from biweeklybudget.models.budget_balance import (
+    BudgetBalanceEntry, BudgetBalanceSnapshot, month_start
+)
+from biweeklybudget.models.budget_model import Budget
+
+# https://code.google.com/p/mock/issues/detail?id=249
+# py>=3.4 should use unittest.mock not the mock package on pypi
+if (
+        sys.version_info[0] < 3 or
+        sys.version_info[0] == 3 and sys.version_info[1] < 4
+):
+    from mock import Mock, patch, call  # noqa
+else:
+    from unittest.mock import Mock, patch, call  # noqa
+
+pbm = 'biweeklybudget.models.budget_model'
+
+
+class TestMonthStart(object):
+
+    def test_date(self):
+        assert month_start(date(2017, 7, 28)) == date(2017, 7, 1)
+
+    def test_datetime(self):
+        assert month_start(datetime(2017, 2, 1, 12, 3)) == date(2017, 2, 1)
+
+
+class TestBalanceAsOf(object):
+
+    def setup_method(self):
+        self.snap_q = Mock(spec_set=Query)
+        self.snap_q.filter.return_value = self.snap_q
+        self.snap_q.order_by.return_value = self.snap_q
+        self.sum_q = Mock(spec_set=Query)
+        self.sum_q.filter.return_value = self.sum_q
+        self.sum_q.scalar.return_value = Decimal('-12.34')
+        self.mock_sess = Mock()
+
+        def se_query(*args):
+            if args[0] is BudgetBalanceSnapshot:
+                return self.snap_q
+            return self.sum_q
+
+        self.mock_sess.query.side_effect = se_query
+
+    def test_snapshot(self):
+        self.snap_q.first.return_value = BudgetBalanceSnapshot(
+            budget_id=3, date=date(2017, 7, 1), balance=Decimal('100.00')
+        )
+        res = BudgetBalanceEntry.balance_as_of(
+            self.mock_sess, 3, date(2017, 7, 15)
+        )
+        assert res == Decimal('87.66')
+        # entries filtered by budget and date, then from the snapshot date
+        assert len(self.sum_q.filter.mock_calls) == 2
+        assert str(self.sum_q.filter.mock_calls[1][1][0]) == str(
+            BudgetBalanceEntry.date.__ge__(date(2017, 7, 1))
+        )
+
+    def test_no_snapshot(self):
+        self.snap_q.first.return_value = None
+        self.sum_q.scalar.return_value = None
+        res = BudgetBalanceEntry.balance_as_of(
+            self.mock_sess, 3, datetime(2017, 7, 15, 1, 2, 3)
+        )
+        assert res == Decimal('0')
+        assert len(self.sum_q.filter.mock_calls) == 1
+
+    def test_budget_periodic(self):
+        b = Budget(is_periodic=True)
+        with patch('%s.BudgetBalanceEntry' % pbm) as mock_bbe:
+            assert b.balance_as_of(date(2017, 7, 15)) is None
+        assert mock_bbe.mock_calls == []
+
+    def test_budget_standing(self):
+        b = Budget(id=5, is_periodic=False)
+        with patch('%s.BudgetBalanceEntry' % pbm) as mock_bbe:
+            with patch('%s.inspect' % pbm) as mock_inspect:
+                type(mock_inspect.return_value).session = self.mock_sess
+                mock_bbe.balance_as_of.return_value = Decimal('1.23')
+                assert b.balance_as_of(date(2017, 7, 15)) == Decimal('1.23')
+        assert mock_bbe.mock_calls == [
+            call.balance_as_of(self.mock_sess, 5, date(2017, 7, 15))
+        ]
@@ -179,3 +179,85 @@ class TestParamsFromOfxparserTransaction(object):
         assert str(
             OFXTransaction.is_interest_payment.__ne__(True)
         ) == str(kall[1][7])
+
+
+class TestIsFields(object):
+
+    def setup_method(self):
+        self.acct = Mock(
+            spec_set=Account,
+            re_interest_charge='^INTEREST CHARGED',
+            re_interest_paid=None,
+            re_payment='.*payment.*',
+            re_late_fee='^LATE FEE',
+            re_other_fee='('
+        )
+
+    def test_is_fields_for(self):
+        assert OFXTransaction.is_fields_for(
+            self.acct, 'Online Payment, thank you'
+        ) == {
+            'is_interest_charge': False,
+            'is_interest_payment': False,
+            'is_payment': True,
+            'is_late_fee': False,
+            'is_other_fee': False
+        }
+        assert OFXTransaction.is_fields_for(
+            self.acct, 'INTEREST CHARGED TO STANDARD PUR'
+        ) == {
+            'is_interest_charge': True,
+            'is_interest_payment': False,
+            'is_payment': False,
+            'is_late_fee': False,
+            'is_other_fee': False
+        }
+
+    def test_is_fields_for_manual_interest(self):
+        assert OFXTransaction.is_fields_for(
+            self.acct, 'Interest Charged - MANUALLY ENTERED'
+        ) == {
+            'is_interest_payment': False,
+            'is_payment': False,
+            'is_late_fee': False,
+            'is_other_fee': False
+        }
+
+    def test_update_is_fields(self):
+        t = OFXTransaction(
+            name='LATE FEE', is_payment=True, is_interest_charge=True
+        )
+        with patch(
+            '%s.OFXTransaction.account' % pbm, self.acct
+        ):
+            t.update_is_fields()
+        assert t.is_payment is False
+        assert t.is_interest_charge is False
+        assert t.is_late_fee is True
+        assert t.is_other_fee is False
+        assert t.is_interest_payment is False
+
+    def test_update_is_fields_many(self):
+        acct2 = Mock(
+            spec_set=Account,
+            re_interest_charge=None,
+            re_interest_paid=None,
+            re_payment=None,
+            re_late_fee=None,
+            re_other_fee='^LATE FEE'
+        )
+        t1 = OFXTransaction(name='LATE FEE', is_payment=True)
+        t2 = OFXTransaction(name='LATE FEE', is_late_fee=True)
+        t3 = OFXTransaction(name='my payment')
+        with patch(
+            '%s.OFXTransaction._is_fields_account' % pbm, autospec=True
+        ) as mock_acct:
+            mock_acct.side_effect = lambda t: acct2 if t is t2 else self.acct
+            OFXTransaction.update_is_fields_many([t1, t2, t3])
+        assert t1.is_payment is False
+        assert t1.is_late_fee is True
+        assert t1.is_other_fee is False
+        assert t2.is_late_fee is False
+        assert t2.is_other_fee is True
+        assert t3.is_payment is True
+        assert t3.is_late_fee is False
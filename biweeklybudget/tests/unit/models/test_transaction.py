@@ -162,6 +162,7 @@ class TestSetBudgetAmounts(object):
                 b2: Decimal('10.00'),
                 b3: Decimal('40.00')
             }
+            assert t.actual_amount == Decimal('100.00')
         assert mock_sess.mock_calls == []
 
     def test_sync(self):
@@ -194,8 +195,52 @@ class TestSetBudgetAmounts(object):
             b2: Decimal('90.00'),
             b3: Decimal('60.00')
         }
+        assert t.actual_amount == Decimal('100.00')
 
         assert len(mock_sess.mock_calls) == 1
         assert mock_sess.mock_calls[0][0] == 'delete'
         assert mock_sess.mock_calls[0][1][0].budget == b2
         assert mock_sess.mock_calls[0][1][0].amount == Decimal('90.00')
+
+
+class TestCheckActualAmounts(object):
+
+    def test_consistent(self):
+        m_db = Mock()
+        m_db.query.return_value.outerjoin.return_value.group_by.return_value\
+            .having.return_value.order_by.return_value.all.return_value = []
+        assert Transaction.check_actual_amounts(m_db, fix=True) == []
+        assert len(m_db.mock_calls) == 6
+        kall = m_db.mock_calls[0]
+        assert kall[0] == 'query'
+        assert kall[1][0] is Transaction.id
+        assert kall[1][1] is Transaction.actual_amount
+
+    def test_fix(self):
+        m_db = Mock()
+        m_t1 = Mock(actual_amount=Decimal('1.00'))
+        m_t2 = Mock(actual_amount=Decimal('0'))
+        m_db.query.return_value.outerjoin.return_value.group_by.return_value\
+            .having.return_value.order_by.return_value.all.return_value = [
+                (1, Decimal('1.00'), Decimal('2.00')),
+                (5, Decimal('0'), Decimal('-3.50'))
+            ]
+        m_db.query.return_value.get.side_effect = [m_t1, m_t2]
+        res = Transaction.check_actual_amounts(m_db, fix=True)
+        assert res == [
+            (1, Decimal('1.00'), Decimal('2.00')),
+            (5, Decimal('0'), Decimal('-3.50'))
+        ]
+        assert m_t1.actual_amount == Decimal('2.00')
+        assert m_t2.actual_amount == Decimal('-3.50')
+        assert m_db.query.return_value.get.mock_calls == [call(1), call(5)]
+
+    def test_no_fix(self):
+        m_db = Mock()
+        m_db.query.return_value.outerjoin.return_value.group_by.return_value\
+            .having.return_value.order_by.return_value.all.return_value = [
+                (1, Decimal('1.00'), Decimal('2.00'))
+            ]
+        res = Transaction.check_actual_amounts(m_db)
+        assert res == [(1, Decimal('1.00'), Decimal('2.00'))]
+        assert m_db.query.return_value.get.mock_calls == []
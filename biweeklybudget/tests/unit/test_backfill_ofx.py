@@ -0,0 +1,312 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/biweeklybudget>
+
+################################################################################
+Copyright 2016-2024 Jason Antman <http://www.jasonantman.com>
+
+    This file is part of biweeklybudget, also known as biweeklybudget.
+
+    biweeklybudget is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    biweeklybudget is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with biweeklybudget.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/biweeklybudget> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+import os
+import shutil
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from unittest.mock import Mock, patch, call
+
+import pytest
+from pytz import UTC
+
+from biweeklybudget.backfill_ofx import OfxBackfiller
+from biweeklybudget.import_manifest import ImportManifest
+from biweeklybudget.ofxapi.exceptions import DuplicateFileException
+
+pbm = 'biweeklybudget.backfill_ofx'
+
+FIXTURE = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), '..', 'fixtures',
+    'CreditOne_2017-07-28_05-30-00.ofx'
+))
+
+#: per-account statement files, in the order of their modification times
+FILES = {
+    'AcctA': ['z.ofx', 'dup.qfx', 'm.ofx', 'bad.ofx', 'a.ofx', 'k.ofx'],
+    'AcctB': ['y.ofx', 'b.ofx', 'x.ofx']
+}
+
+
+class TrackingExecutor(ThreadPoolExecutor):
+    """
+    Thread pool standing in for ProcessPoolExecutor, which records the
+    maximum number of submitted parses whose results have not yet been
+    retrieved.
+    """
+
+    instances = []
+
+    def __init__(self, max_workers=None):
+        super().__init__(max_workers=max_workers)
+        self.lock = threading.Lock()
+        self.outstanding = 0
+        self.max_outstanding = 0
+        self.instances.append(self)
+
+    def submit(self, fn, *args, **kwargs):
+        future = super().submit(fn, *args, **kwargs)
+        with self.lock:
+            self.outstanding += 1
+            self.max_outstanding = max(
+                self.max_outstanding, self.outstanding
+            )
+        orig_result = future.result
+
+        def result(timeout=None):
+            with self.lock:
+                self.outstanding -= 1
+            return orig_result(timeout=timeout)
+
+        future.result = result
+        return future
+
+
+def se_parse(path):
+    """
+    Stand-in for ``_parse_ofx_file``; later files finish parsing sooner.
+    """
+    name = os.path.basename(path)
+    files = FILES[os.path.basename(os.path.dirname(path))]
+    time.sleep(0.002 * (len(files) - files.index(name)))
+    if name.startswith('bad'):
+        raise ValueError(f'cannot parse {name}')
+    return f'ofx:{name}', datetime.fromtimestamp(
+        os.path.getmtime(path), tz=UTC
+    )
+
+
+class TestManifestPrune:
+
+    def test_missing_statements_imported(self, tmpdir):
+        d = tmpdir.mkdir('AcctA')
+        paths = []
+        for idx, name in enumerate(['a.ofx', 'b.ofx', 'c.ofx']):
+            p = str(d.join(name))
+            with open(p, 'w') as fh:
+                fh.write(name)
+            os.utime(p, (1500000000 + idx, 1500000000 + idx))
+            paths.append(p)
+        manifest = ImportManifest(str(tmpdir))
+        for idx, p in enumerate(paths):
+            manifest.record(p, idx + 1)
+        client = Mock()
+        client.get_accounts.return_value = {'AcctA': {'id': 1}}
+        client.get_statement_ids.return_value = {1, 3}
+        client.update_statement_ofx.return_value = 4, 1, 0
+        cls = OfxBackfiller(client, str(tmpdir), manifest=manifest)
+        with patch(f'{pbm}._parse_ofx_file') as m_parse:
+            m_parse.return_value = 'ofx', None
+            cls.run()
+        assert client.get_statement_ids.mock_calls == [call({1, 2, 3})]
+        assert m_parse.mock_calls == [call(paths[1])]
+        assert [
+            x.kwargs['filename'] for x in
+            client.update_statement_ofx.mock_calls
+        ] == ['b.ofx']
+        assert manifest.statement_ids() == {1, 3, 4}
+        assert ImportManifest(str(tmpdir)).get(paths[1])['statement_id'] == 4
+
+    def test_empty_manifest(self, tmpdir):
+        client = Mock()
+        client.get_accounts.return_value = {}
+        cls = OfxBackfiller(
+            client, str(tmpdir), manifest=ImportManifest(str(tmpdir))
+        )
+        cls.run()
+        assert client.get_statement_ids.mock_calls == []
+
+
+class TestPipelined:
+
+    @pytest.fixture
+    def savedir(self, tmpdir):
+        mtime = 1500000000
+        for acct, files in FILES.items():
+            d = tmpdir.mkdir(acct)
+            d.join('notes.txt').write('not a statement')
+            for f in files:
+                p = d.join(f)
+                p.write(f)
+                os.utime(str(p), (mtime, mtime))
+                mtime += 10
+        return str(tmpdir)
+
+    def setup_method(self):
+        TrackingExecutor.instances = []
+        self.updates = []
+        self.client = Mock()
+        self.client.get_accounts.return_value = {
+            'AcctA': {'id': 1}, 'AcctB': {'id': 2}, 'AcctC': {'id': 3}
+        }
+        self.client.update_statement_ofx.side_effect = self.se_update
+
+    def se_update(self, acct_id, ofx, mtime=None, filename=None):
+        self.updates.append((acct_id, ofx, filename))
+        if filename.startswith('dup'):
+            raise DuplicateFileException(acct_id, filename, 99)
+        return len(self.updates), 1, 0
+
+    def run(self, savedir, jobs, queue_size=None):
+        manifest = Mock(spec_set=ImportManifest)
+        manifest.is_unchanged.return_value = False
+        manifest.statement_ids.return_value = set()
+        cls = OfxBackfiller(
+            self.client, savedir, jobs=jobs, queue_size=queue_size,
+            manifest=manifest
+        )
+        with patch(f'{pbm}._parse_ofx_file') as m_parse:
+            m_parse.side_effect = se_parse
+            with patch(f'{pbm}.ProcessPoolExecutor', TrackingExecutor):
+                cls.run()
+        return manifest
+
+    @pytest.mark.parametrize('jobs, queue_size', [
+        (1, None), (3, 1), (3, 2), (4, 5), (2, 100)
+    ])
+    def test_order_and_queue_size(self, savedir, jobs, queue_size):
+        manifest = self.run(savedir, jobs, queue_size)
+        # applied strictly in mtime order, despite finishing out of order
+        assert self.updates == [
+            (1, 'ofx:z.ofx', 'z.ofx'),
+            (1, 'ofx:dup.qfx', 'dup.qfx'),
+            (1, 'ofx:m.ofx', 'm.ofx'),
+            (1, 'ofx:a.ofx', 'a.ofx'),
+            (1, 'ofx:k.ofx', 'k.ofx'),
+            (2, 'ofx:y.ofx', 'y.ofx'),
+            (2, 'ofx:b.ofx', 'b.ofx'),
+            (2, 'ofx:x.ofx', 'x.ofx')
+        ]
+        assert len(TrackingExecutor.instances) == 1
+        executor = TrackingExecutor.instances[0]
+        expected = min(
+            jobs * 4 if queue_size is None else queue_size, 9
+        )
+        assert executor.max_outstanding == expected
+        assert executor.outstanding == 0
+        assert manifest.record.mock_calls == [
+            call(os.path.join(savedir, 'AcctA', 'z.ofx'), 1),
+            call(os.path.join(savedir, 'AcctA', 'dup.qfx'), 99),
+            call(os.path.join(savedir, 'AcctA', 'm.ofx'), 3),
+            call(os.path.join(savedir, 'AcctA', 'a.ofx'), 4),
+            call(os.path.join(savedir, 'AcctA', 'k.ofx'), 5),
+            call(os.path.join(savedir, 'AcctB', 'y.ofx'), 6),
+            call(os.path.join(savedir, 'AcctB', 'b.ofx'), 7),
+            call(os.path.join(savedir, 'AcctB', 'x.ofx'), 8)
+        ]
+
+    def log_messages(self, caplog):
+        res = {'summary': [], 'file': []}
+        for r in caplog.records:
+            if r.name != pbm:
+                continue
+            msg = r.getMessage()
+            if msg.startswith('Successfully parsed and inserted'):
+                res['summary'].append((r.levelname, msg))
+            elif (
+                msg.startswith('OFX is already parsed') or
+                msg.startswith('Exception parsing and inserting')
+            ):
+                res['file'].append((
+                    r.levelname, msg,
+                    None if r.exc_info is None else repr(r.exc_info[1])
+                ))
+        return res
+
+    def test_same_as_serial(self, savedir, caplog):
+        caplog.set_level(logging.DEBUG, logger=pbm)
+        serial_manifest = self.run(savedir, 0)
+        serial_updates = self.updates
+        serial_logs = self.log_messages(caplog)
+        caplog.clear()
+        self.updates = []
+        manifest = self.run(savedir, 2, 3)
+        assert self.updates == serial_updates
+        assert manifest.record.mock_calls == \
+            serial_manifest.record.mock_calls
+        assert self.log_messages(caplog) == serial_logs
+        assert serial_logs == {
+            'summary': [
+                ('INFO', 'Successfully parsed and inserted 4 of 6 files for '
+                         'account 1; 1 files already in DB'),
+                ('INFO', 'Successfully parsed and inserted 3 of 3 files for '
+                         'account 2; 0 files already in DB')
+            ],
+            'file': [
+                ('WARNING', 'OFX is already parsed for account; skipping',
+                 None),
+                ('ERROR', 'Exception parsing and inserting file %s' %
+                 os.path.join(savedir, 'AcctA', 'bad.ofx'),
+                 "ValueError('cannot parse bad.ofx')")
+            ]
+        }
+
+    def test_counts(self, savedir):
+        cls = OfxBackfiller(self.client, savedir, jobs=2, queue_size=2)
+        with patch(f'{pbm}._parse_ofx_file') as m_parse:
+            m_parse.side_effect = se_parse
+            with patch(f'{pbm}.ProcessPoolExecutor', TrackingExecutor):
+                res = cls._run_pipelined([
+                    (1, os.path.join(savedir, 'AcctA')),
+                    (2, os.path.join(savedir, 'AcctB'))
+                ])
+        assert res[:2] == (7, 1)
+        assert res[2] > 0
+
+    def test_real_files(self, tmpdir):
+        """parse small real OFX files in a real process pool"""
+        d = tmpdir.mkdir('AcctA')
+        for idx, name in enumerate(['c.ofx', 'a.ofx', 'b.ofx']):
+            p = str(d.join(name))
+            shutil.copy(FIXTURE, p)
+            os.utime(p, (1500000000 + idx, 1500000000 + idx))
+        cls = OfxBackfiller(self.client, str(tmpdir), jobs=2, queue_size=1)
+        res = cls._run_pipelined([(1, str(d))])
+        assert res[:2] == (3, 0)
+        assert [x[0] for x in self.updates] == [1, 1, 1]
+        assert [x[2] for x in self.updates] == ['c.ofx', 'a.ofx', 'b.ofx']
+        assert [
+            x[1].account.account_id for x in self.updates
+        ] == ['CreditOneAcctId'] * 3
+        assert [
+            x.kwargs['mtime'] for x in
+            self.client.update_statement_ofx.mock_calls
+        ] == [
+            datetime.fromtimestamp(1500000000 + x, tz=UTC) for x in range(3)
+        ]
@@ -42,12 +42,15 @@ from sqlalchemy.orm.session import Session
 from sqlalchemy import asc
 from decimal import Decimal
 
-from biweeklybudget.biweeklypayperiod import BiweeklyPayPeriod
+from biweeklybudget.biweeklypayperiod import (
+    BiweeklyPayPeriod, PayPeriodDataCache
+)
 from biweeklybudget.models.ofx_transaction import OFXTransaction
 from biweeklybudget.models.transaction import Transaction
 from biweeklybudget.models.scheduled_transaction import ScheduledTransaction
 from biweeklybudget.models.budget_model import Budget
 from biweeklybudget.models.budget_transaction import BudgetTransaction
+from biweeklybudget.models.dbsetting import DBSetting
 from biweeklybudget.tests.unit_helpers import binexp_to_dict
 from biweeklybudget.utils import dtnow
 
@@ -57,12 +60,13 @@ if (
         sys.version_info[0] < 3 or
         sys.version_info[0] == 3 and sys.version_info[1] < 4
 ):
-    from mock import Mock, patch, call, DEFAULT
+    from mock import Mock, patch, call, DEFAULT, PropertyMock
 else:
-    from unittest.mock import Mock, patch, call, DEFAULT
+    from unittest.mock import Mock, patch, call, DEFAULT, PropertyMock
 
 pbm = 'biweeklybudget.biweeklypayperiod'
 pb = '%s.BiweeklyPayPeriod' % pbm
+pbc = '%s.PayPeriodDataCache' % pbm
 
 
 class TestInit(object):
@@ -170,6 +174,70 @@ class TestForDate(object):
             date(2017, 5, 2), self.mock_sess) == BiweeklyPayPeriod(
             date(2017, 4, 28), self.mock_sess)
 
+    @patch('%s.settings.PAY_PERIOD_START_DATE' % pbm, date(2017, 3, 17))
+    def test_period_for_date_far(self):
+        assert BiweeklyPayPeriod.period_for_date(
+            date(2117, 3, 17), self.mock_sess) == BiweeklyPayPeriod(
+            date(2117, 3, 5), self.mock_sess)
+        assert BiweeklyPayPeriod.period_for_date(
+            datetime(1917, 3, 17, 13, 45), self.mock_sess) == BiweeklyPayPeriod(
+            date(1917, 3, 16), self.mock_sess)
+
+    @patch('%s.settings.PAY_PERIOD_START_DATE' % pbm, date(2017, 3, 17))
+    def test_period_index(self):
+        assert BiweeklyPayPeriod.period_index(date(2017, 3, 17)) == 0
+        assert BiweeklyPayPeriod.period_index(date(2017, 3, 30)) == 0
+        assert BiweeklyPayPeriod.period_index(date(2017, 3, 31)) == 1
+        assert BiweeklyPayPeriod.period_index(date(2017, 3, 16)) == -1
+        assert BiweeklyPayPeriod.period_index(date(2017, 3, 3)) == -1
+        assert BiweeklyPayPeriod.period_index(date(2017, 3, 2)) == -2
+        assert BiweeklyPayPeriod.period_index(
+            datetime(2017, 4, 14, 23, 59, 59)) == 2
+
+    @patch(
+        '%s.settings.PAY_PERIOD_START_DATE' % pbm, datetime(2017, 3, 17)
+    )
+    def test_period_index_datetime_setting(self):
+        assert BiweeklyPayPeriod.period_index(date(2017, 3, 31)) == 1
+        assert BiweeklyPayPeriod.period_at(
+            -1, self.mock_sess).start_date == date(2017, 3, 3)
+
+    @patch('%s.settings.PAY_PERIOD_START_DATE' % pbm, date(2017, 3, 17))
+    def test_period_at(self):
+        assert BiweeklyPayPeriod.period_at(0, self.mock_sess) == \
+            BiweeklyPayPeriod(date(2017, 3, 17), self.mock_sess)
+        assert BiweeklyPayPeriod.period_at(2, self.mock_sess) == \
+            BiweeklyPayPeriod(date(2017, 4, 14), self.mock_sess)
+        res = BiweeklyPayPeriod.period_at(-3, self.mock_sess)
+        assert res == BiweeklyPayPeriod(date(2017, 2, 3), self.mock_sess)
+        assert res._db == self.mock_sess
+        assert res.index == -3
+
+    @patch('%s.settings.PAY_PERIOD_START_DATE' % pbm, date(2017, 3, 17))
+    def test_periods_between(self):
+        res = BiweeklyPayPeriod.periods_between(
+            date(2017, 3, 10), date(2017, 4, 14), self.mock_sess
+        )
+        assert res == [
+            BiweeklyPayPeriod(date(2017, 3, 3), self.mock_sess),
+            BiweeklyPayPeriod(date(2017, 3, 17), self.mock_sess),
+            BiweeklyPayPeriod(date(2017, 3, 31), self.mock_sess),
+            BiweeklyPayPeriod(date(2017, 4, 14), self.mock_sess)
+        ]
+
+    @patch('%s.settings.PAY_PERIOD_START_DATE' % pbm, date(2017, 3, 17))
+    def test_periods_between_same(self):
+        res = BiweeklyPayPeriod.periods_between(
+            date(2017, 3, 18), date(2017, 3, 20), self.mock_sess
+        )
+        assert res == [BiweeklyPayPeriod(date(2017, 3, 17), self.mock_sess)]
+
+    @patch('%s.settings.PAY_PERIOD_START_DATE' % pbm, date(2017, 3, 17))
+    def test_periods_between_reversed(self):
+        assert BiweeklyPayPeriod.periods_between(
+            date(2017, 4, 14), date(2017, 3, 10), self.mock_sess
+        ) == []
+
 
 class TestFilterQuery(object):
 
@@ -199,15 +267,78 @@ class TestTransactions(object):
     def test_transactions(self):
         mock_res = Mock()
         with patch('%s.filter_query' % pb, autospec=True) as mock_filter:
-            mock_filter.return_value = mock_res
-            res = self.cls._transactions()
+            with patch(
+                '%s._transaction_load_options' % pb
+            ) as mock_opts:
+                mock_opts.return_value = ['opt1', 'opt2']
+                mock_filter.return_value = mock_res
+                res = self.cls._transactions()
         assert res == mock_res
         assert mock_filter.mock_calls == [
-            call(self.cls, self.mock_sess.query.return_value, Transaction.date)
+            call(
+                self.cls,
+                self.mock_sess.query.return_value.options.return_value,
+                Transaction.date
+            )
         ]
         assert self.mock_sess.mock_calls == [
-            call.query(Transaction)
+            call.query(Transaction),
+            call.query().options('opt1', 'opt2')
+        ]
+        assert mock_opts.mock_calls == [call('selectin')]
+
+
+class TestLoadStrategy(object):
+
+    def setup_method(self):
+        self.mock_sess = Mock(spec_set=Session)
+
+    def test_default(self):
+        cls = BiweeklyPayPeriod(date(2017, 3, 17), self.mock_sess)
+        assert cls._load_strategy == 'selectin'
+        assert cls.next._load_strategy == 'selectin'
+
+    def test_specified(self):
+        cls = BiweeklyPayPeriod(
+            date(2017, 3, 17), self.mock_sess, load_strategy='joined'
+        )
+        assert cls._load_strategy == 'joined'
+        assert cls.next._load_strategy == 'joined'
+        assert cls.previous._load_strategy == 'joined'
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            BiweeklyPayPeriod(
+                date(2017, 3, 17), self.mock_sess, load_strategy='foo'
+            )
+
+    def test_transaction_load_options_lazy(self):
+        assert BiweeklyPayPeriod._transaction_load_options('lazy') == []
+        assert BiweeklyPayPeriod._sched_trans_load_options('lazy') == []
+
+    def test_transaction_load_options(self):
+        with patch.dict(
+            '%s.LOAD_STRATEGIES' % pbm, {'selectin': Mock()}
+        ) as mock_strategies:
+            loader = mock_strategies['selectin']
+            res = BiweeklyPayPeriod._transaction_load_options('selectin')
+        assert loader.mock_calls == [
+            call('account'),
+            call('budget_transactions'),
+            call().joinedload('budget'),
+            call('reconcile'),
+            call('planned_budget')
         ]
+        assert len(res) == 4
+
+    def test_sched_trans_load_options(self):
+        with patch.dict(
+            '%s.LOAD_STRATEGIES' % pbm, {'joined': Mock()}
+        ) as mock_strategies:
+            loader = mock_strategies['joined']
+            res = BiweeklyPayPeriod._sched_trans_load_options('joined')
+        assert loader.mock_calls == [call('account'), call('budget')]
+        assert len(res) == 2
 
 
 class TestSTDate(object):
@@ -222,19 +353,22 @@ class TestSTDate(object):
             mock_filter.return_value = mock_res
             res = self.cls._scheduled_transactions_date()
         assert res == mock_res
+        qopts = self.mock_sess.query.return_value.options.return_value
         assert mock_filter.mock_calls == [
             call(
                 self.cls,
-                self.mock_sess.query.return_value.filter.return_value,
+                qopts.filter.return_value,
                 ScheduledTransaction.date
             )
         ]
-        assert len(self.mock_sess.mock_calls) == 2
+        assert len(self.mock_sess.mock_calls) == 3
         assert self.mock_sess.mock_calls[0] == call.query(ScheduledTransaction)
-        assert self.mock_sess.mock_calls[1][0] == 'query().filter'
+        assert self.mock_sess.mock_calls[1][0] == 'query().options'
+        assert len(self.mock_sess.mock_calls[1][1]) == 2
+        assert self.mock_sess.mock_calls[2][0] == 'query().options().filter'
         expected = ScheduledTransaction.is_active.__eq__(True)
         assert str(expected) == str(
-            self.mock_sess.mock_calls[1][1][0]
+            self.mock_sess.mock_calls[2][1][0]
         )
 
 
@@ -246,16 +380,18 @@ class TestSTPeriod(object):
 
     def test_scheduled_transactions_per_period(self):
         res = self.cls._scheduled_transactions_per_period()
-        frv = self.mock_sess.query.return_value.filter.return_value
+        frv = self.mock_sess.query.return_value.options.return_value\
+            .filter.return_value
         assert res == frv.order_by.return_value
-        assert len(self.mock_sess.mock_calls) == 3
+        assert len(self.mock_sess.mock_calls) == 4
         assert self.mock_sess.mock_calls[0] == call.query(ScheduledTransaction)
-        kall = self.mock_sess.mock_calls[1]
-        assert kall[0] == 'query().filter'
+        assert self.mock_sess.mock_calls[1][0] == 'query().options'
+        kall = self.mock_sess.mock_calls[2]
+        assert kall[0] == 'query().options().filter'
         expected = ScheduledTransaction.schedule_type.__eq__('per period')
         assert binexp_to_dict(expected) == binexp_to_dict(kall[1][0])
-        kall = self.mock_sess.mock_calls[2]
-        assert kall[0] == 'query().filter().order_by'
+        kall = self.mock_sess.mock_calls[3]
+        assert kall[0] == 'query().options().filter().order_by'
         assert str(kall[1][0]) == str(asc(ScheduledTransaction.num_per_period))
         assert str(kall[1][1]) == str(asc(ScheduledTransaction.amount))
 
@@ -268,11 +404,13 @@ class TestSTMonthly(object):
     def test_contiguous(self):
         cls = BiweeklyPayPeriod(date(2017, 3, 2), self.mock_sess)
         res = cls._scheduled_transactions_monthly()
-        assert res == self.mock_sess.query.return_value.filter.return_value
-        assert len(self.mock_sess.mock_calls) == 2
+        assert res == self.mock_sess.query.return_value.options\
+            .return_value.filter.return_value
+        assert len(self.mock_sess.mock_calls) == 3
         assert self.mock_sess.mock_calls[0] == call.query(ScheduledTransaction)
-        kall = self.mock_sess.mock_calls[1]
-        assert kall[0] == 'query().filter'
+        assert self.mock_sess.mock_calls[1][0] == 'query().options'
+        kall = self.mock_sess.mock_calls[2]
+        assert kall[0] == 'query().options().filter'
         expected = [
             ScheduledTransaction.schedule_type.__eq__('monthly'),
             ScheduledTransaction.is_active.__eq__(True),
@@ -290,11 +428,13 @@ class TestSTMonthly(object):
         with patch('%s.or_' % pbm) as mock_or:
             mock_or.return_value = mock_or_result
             res = cls._scheduled_transactions_monthly()
-        assert res == self.mock_sess.query.return_value.filter.return_value
-        assert len(self.mock_sess.mock_calls) == 2
+        assert res == self.mock_sess.query.return_value.options\
+            .return_value.filter.return_value
+        assert len(self.mock_sess.mock_calls) == 3
         assert self.mock_sess.mock_calls[0] == call.query(ScheduledTransaction)
-        kall = self.mock_sess.mock_calls[1]
-        assert kall[0] == 'query().filter'
+        assert self.mock_sess.mock_calls[1][0] == 'query().options'
+        kall = self.mock_sess.mock_calls[2]
+        assert kall[0] == 'query().options().filter'
         expected = ScheduledTransaction.schedule_type.__eq__('monthly')
         assert binexp_to_dict(kall[1][0]) == binexp_to_dict(expected)
         assert str(kall[1][1]) == str(
@@ -493,6 +633,110 @@ class TestData(object):
         assert mocks['_make_overall_sums'].mock_calls == []
 
 
+class TestComputeRange(object):
+
+    def setup_method(self):
+        self.mock_sess = Mock(spec_set=Session)
+
+    @patch('%s.settings.PAY_PERIOD_START_DATE' % pbm, date(2017, 3, 17))
+    def test_compute_range(self):
+        t1 = Mock(spec_set=Transaction, date=date(2017, 3, 3), id=1)
+        t2 = Mock(spec_set=Transaction, date=date(2017, 3, 30), id=2)
+        t3 = Mock(spec_set=Transaction, date=date(2017, 3, 17), id=3)
+        std1 = Mock(
+            spec_set=ScheduledTransaction, schedule_type='date',
+            date=date(2017, 3, 31)
+        )
+        stp1 = Mock(
+            spec_set=ScheduledTransaction, schedule_type='per period',
+            num_per_period=2, amount=Decimal('10.00')
+        )
+        stp2 = Mock(
+            spec_set=ScheduledTransaction, schedule_type='per period',
+            num_per_period=1, amount=Decimal('20.00')
+        )
+        stm1 = Mock(
+            spec_set=ScheduledTransaction, schedule_type='monthly',
+            day_of_month=1
+        )
+        stm2 = Mock(
+            spec_set=ScheduledTransaction, schedule_type='monthly',
+            day_of_month=20
+        )
+        budgets = [Mock(spec_set=Budget)]
+        results = {
+            Transaction: [t1, t2, t3],
+            ScheduledTransaction: [std1, stp1, stp2, stm1, stm2]
+        }
+
+        def se_query(cls):
+            m = Mock()
+            if cls == Budget:
+                m.filter.return_value.all.return_value = budgets
+            else:
+                m.options.return_value.filter.return_value.order_by\
+                    .return_value.all.return_value = results[cls]
+            return m
+
+        self.mock_sess.query.side_effect = se_query
+        cached = {'overall_sums': {'foo': 'bar'}}
+
+        def se_get(pp):
+            if pp.start_date == date(2017, 4, 14):
+                return cached
+            return None
+
+        with patch('%s._build_data' % pb, autospec=True) as mock_build:
+            with patch('%s.payperiod_cache' % pbm,
+                       autospec=True) as mock_cache:
+                mock_cache.get.side_effect = se_get
+                res = BiweeklyPayPeriod.compute_range(
+                    date(2017, 3, 10), date(2017, 4, 20), self.mock_sess
+                )
+        assert res == [
+            BiweeklyPayPeriod(date(2017, 3, 3), self.mock_sess),
+            BiweeklyPayPeriod(date(2017, 3, 17), self.mock_sess),
+            BiweeklyPayPeriod(date(2017, 3, 31), self.mock_sess),
+            BiweeklyPayPeriod(date(2017, 4, 14), self.mock_sess)
+        ]
+        assert res[3]._data_cache == cached
+        assert mock_build.mock_calls == [
+            call(res[0], [t1], [], [stp2, stp1], []),
+            call(res[1], [t2, t3], [], [stp2, stp1], [stm2]),
+            call(res[2], [], [std1], [stp2, stp1], [stm1])
+        ]
+        for p in res[:3]:
+            assert p._periodic_budget_list == budgets
+        assert [x[1][0] for x in self.mock_sess.query.mock_calls] == [
+            Transaction, ScheduledTransaction, Budget
+        ]
+
+    @patch('%s.settings.PAY_PERIOD_START_DATE' % pbm, date(2017, 3, 17))
+    def test_compute_range_all_cached(self):
+        with patch('%s._build_data' % pb, autospec=True) as mock_build:
+            with patch('%s.payperiod_cache' % pbm,
+                       autospec=True) as mock_cache:
+                mock_cache.get.return_value = {'foo': 'bar'}
+                res = BiweeklyPayPeriod.compute_range(
+                    date(2017, 3, 10), date(2017, 3, 20), self.mock_sess
+                )
+        assert len(res) == 2
+        assert mock_build.mock_calls == []
+        assert self.mock_sess.mock_calls == []
+
+    def test_day_of_month_in_period(self):
+        cls = BiweeklyPayPeriod(date(2017, 3, 2), self.mock_sess)
+        assert cls._day_of_month_in_period(1) is False
+        assert cls._day_of_month_in_period(2) is True
+        assert cls._day_of_month_in_period(15) is True
+        assert cls._day_of_month_in_period(16) is False
+        cls = BiweeklyPayPeriod(date(2017, 3, 24), self.mock_sess)
+        assert cls._day_of_month_in_period(6) is True
+        assert cls._day_of_month_in_period(7) is False
+        assert cls._day_of_month_in_period(23) is False
+        assert cls._day_of_month_in_period(24) is True
+
+
 class TestMakeCombinedTransactions(object):
 
     def setup_method(self):
@@ -1350,3 +1594,161 @@ class TestDictForSchedTrans(object):
                 3: {'name': 'bar', 'amount': Decimal('123.45')}
             }
         }
+
+
+class TestDataSharedCache(object):
+
+    def setup_method(self):
+        self.mock_sess = Mock(spec_set=Session)
+        self.cls = BiweeklyPayPeriod(date(2017, 3, 17), self.mock_sess)
+
+    def test_hit(self):
+        cached = {
+            'all_trans_list': [1],
+            'budget_sums': {2: 3},
+            'overall_sums': {'a': 4}
+        }
+        with patch('%s.payperiod_cache' % pbm, autospec=True) as mock_cache:
+            mock_cache.get.return_value = cached
+            res = self.cls._data
+        assert res == cached
+        assert self.cls._data_cache == cached
+        assert mock_cache.mock_calls == [call.get(self.cls)]
+        assert self.mock_sess.mock_calls == []
+
+    def test_miss(self):
+        with patch.multiple(
+            pb,
+            _transactions=DEFAULT,
+            _scheduled_transactions_date=DEFAULT,
+            _scheduled_transactions_per_period=DEFAULT,
+            _scheduled_transactions_monthly=DEFAULT,
+            _make_combined_transactions=DEFAULT,
+            _make_budget_sums=DEFAULT,
+            _make_overall_sums=DEFAULT
+        ):
+            with patch('%s.payperiod_cache' % pbm,
+                       autospec=True) as mock_cache:
+                mock_cache.get.return_value = None
+                res = self.cls._data
+        assert mock_cache.mock_calls == [
+            call.get(self.cls),
+            call.set(self.cls, res)
+        ]
+
+
+class TestPayPeriodDataCache(object):
+
+    def setup_method(self):
+        self.mock_sess = Mock(spec_set=Session)
+        self.mock_sess.info = {}
+        self.mock_sess.query.return_value.get.return_value = None
+        self.cls = PayPeriodDataCache()
+        self.data = {
+            'transactions': [Mock()],
+            'all_trans_list': [{'id': 1}],
+            'budget_sums': {2: {'spent': Decimal('1.23')}},
+            'overall_sums': {'spent': Decimal('1.23')}
+        }
+
+    def pp(self, d):
+        return BiweeklyPayPeriod(d, self.mock_sess)
+
+    @patch('%s.settings.PAY_PERIOD_CACHE_SIZE' % pbm, 0)
+    def test_disabled(self):
+        pp = self.pp(date(2017, 3, 17))
+        self.cls.set(pp, self.data)
+        assert self.cls.get(pp) is None
+        assert self.cls.stats == {
+            'enabled': False,
+            'size': 0,
+            'max_size': 0,
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'invalidations': 0
+        }
+        assert self.mock_sess.mock_calls == []
+
+    @patch('%s.settings.PAY_PERIOD_CACHE_SIZE' % pbm, 5)
+    def test_set_get(self):
+        pp = self.pp(date(2017, 3, 17))
+        assert self.cls.get(pp) is None
+        self.cls.set(pp, self.data)
+        res = self.cls.get(self.pp(date(2017, 3, 17)))
+        assert res == {
+            'all_trans_list': [{'id': 1}],
+            'budget_sums': {2: {'spent': Decimal('1.23')}},
+            'overall_sums': {'spent': Decimal('1.23')}
+        }
+        # returned data is a copy
+        res['budget_sums'][2]['spent'] = Decimal('0')
+        assert self.cls.get(pp)['budget_sums'][2]['spent'] == Decimal('1.23')
+        assert self.cls.hits == 2
+        assert self.cls.misses == 1
+        # generation only checked once per transaction
+        assert self.mock_sess.query.mock_calls == [
+            call(DBSetting),
+            call().get('payperiod_cache_generation')
+        ]
+
+    @patch('%s.settings.PAY_PERIOD_CACHE_SIZE' % pbm, 5)
+    def test_is_in_past_changed(self):
+        pp = self.pp(date(2017, 3, 17))
+        with patch('%s.is_in_past' % pb, new_callable=PropertyMock) as m_iip:
+            m_iip.return_value = False
+            self.cls.set(pp, self.data)
+            m_iip.return_value = True
+            assert self.cls.get(pp) is None
+        assert self.cls.stats['size'] == 0
+
+    @patch('%s.settings.PAY_PERIOD_CACHE_SIZE' % pbm, 2)
+    def test_eviction(self):
+        p1 = self.pp(date(2017, 3, 3))
+        p2 = self.pp(date(2017, 3, 17))
+        p3 = self.pp(date(2017, 3, 31))
+        self.cls.set(p1, self.data)
+        self.cls.set(p2, self.data)
+        # make p1 most recently used
+        assert self.cls.get(p1) is not None
+        self.cls.set(p3, self.data)
+        assert self.cls.evictions == 1
+        assert self.cls.get(p2) is None
+        assert self.cls.get(p1) is not None
+        assert self.cls.get(p3) is not None
+
+    @patch('%s.settings.PAY_PERIOD_CACHE_SIZE' % pbm, 5)
+    def test_invalidate(self):
+        p1 = self.pp(date(2017, 3, 3))
+        p2 = self.pp(date(2017, 3, 17))
+        self.cls.set(p1, self.data)
+        self.cls.set(p2, self.data)
+        self.cls.invalidate([date(2017, 3, 3), date(2017, 4, 14)])
+        assert self.cls.invalidations == 1
+        assert self.cls.get(p1) is None
+        assert self.cls.get(p2) is not None
+        self.cls.invalidate_all()
+        assert self.cls.invalidations == 2
+        assert self.cls.get(p2) is None
+
+    @patch('%s.settings.PAY_PERIOD_CACHE_SIZE' % pbm, 5)
+    def test_generation_changed(self):
+        p1 = self.pp(date(2017, 3, 3))
+        self.cls.set(p1, self.data)
+        assert self.cls.get(p1) is not None
+        # another process changed the generation; new DB transaction
+        self.mock_sess.info = {}
+        self.mock_sess.query.return_value.get.return_value = Mock(value='abc')
+        assert self.cls.get(p1) is None
+        assert self.cls._generation == 'abc'
+
+    def test_new_generation(self):
+        self.cls.new_generation(self.mock_sess)
+        assert len(self.mock_sess.add.mock_calls) == 1
+        added = self.mock_sess.add.mock_calls[0][1][0]
+        assert added.name == 'payperiod_cache_generation'
+        assert added.value == self.cls._generation
+        assert len(added.value) == 32
+        assert self.mock_sess.info == {
+            'payperiod_cache_generation_checked': True
+        }
@@ -0,0 +1,266 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/biweeklybudget>
+
+################################################################################
+Copyright 2016-2024 Jason Antman <http://www.jasonantman.com>
+
+    This file is part of biweeklybudget, also known as biweeklybudget.
+
+    biweeklybudget is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    biweeklybudget is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with biweeklybudget.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/biweeklybudget> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import pytest
+from unittest.mock import Mock, call
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm.query import Query
+from sqlalchemy.orm.session import Session
+from sqlalchemy.dialects import mysql, sqlite
+
+from biweeklybudget.fulltext import (
+    tokenize, search_terms, substring_terms, is_native, fulltext_index_ddl,
+    CHUNK_SIZE
+)
+from biweeklybudget.models.ofx_transaction import OFXTransaction
+from biweeklybudget.models.transaction import Transaction
+from biweeklybudget.models.search_token import (
+    transaction_search, ofx_transaction_search, TransactionSearchToken
+)
+
+
+def mock_session(dialect_name):
+    sess = Mock(spec_set=Session)
+    sess.get_bind.return_value.dialect.name = dialect_name
+    return sess
+
+
+def compiled(query, dialect):
+    return str(query.statement.compile(
+        dialect=dialect, compile_kwargs={'literal_binds': True}
+    ))
+
+
+def compiled_clause(clause):
+    return str(clause.compile(
+        dialect=sqlite.dialect(), compile_kwargs={'literal_binds': True}
+    ))
+
+
+class TestTokenize(object):
+
+    def test_tokenize(self):
+        assert tokenize(
+            'AMAZON.COM*AB12 Seattle', None, 'seattle, WA', ''
+        ) == {'amazon', 'com', 'ab12', 'seattle', 'wa'}
+
+    def test_tokenize_truncates(self):
+        assert tokenize('a' * 100) == {'a' * 64}
+
+    def test_search_terms(self):
+        assert search_terms('Shell Oil #12 to go') == ['oil', 'shell']
+
+    def test_substring_terms(self):
+        assert substring_terms('Shell Oil #12 to go') == ['oil']
+        assert substring_terms(' Shell Oil  oil') == ['oil', 'shell']
+        assert substring_terms('AMAZON.COM*AB12 Seattle') == ['seattle']
+        assert substring_terms('mazon') == []
+        assert substring_terms('zon mkt') == ['mkt']
+        assert substring_terms('foo bar_baz quux') == ['quux']
+
+    def test_is_native(self):
+        bind = Mock()
+        bind.dialect.name = 'mysql'
+        assert is_native(bind) is True
+        bind.dialect.name = 'sqlite'
+        assert is_native(bind) is False
+
+    def test_fulltext_index_ddl(self):
+        ddl = fulltext_index_ddl('foo', 'ix_foo_ft', ['a', 'b'])
+        assert ddl.statement == 'CREATE FULLTEXT INDEX ix_foo_ft ON foo (a, b)'
+        assert ddl.dialect == 'mysql'
+
+
+class TestSearchIndexFilter(object):
+
+    def test_no_terms(self):
+        sess = mock_session('sqlite')
+        q = Query(Transaction, session=sess)
+        assert transaction_search.filter(q, 'ab cd') is q
+
+    def test_local_single_key(self):
+        sess = mock_session('sqlite')
+        q = transaction_search.filter(
+            Query(Transaction, session=sess), ' Shell gas'
+        )
+        sql = compiled(q, sqlite.dialect())
+        assert sql.count('JOIN (SELECT DISTINCT') == 2
+        assert "transaction_search_tokens.token >= 'gas'" in sql
+        assert "transaction_search_tokens.token < 'gat'" in sql
+        assert "transaction_search_tokens.token >= 'shell'" in sql
+        assert "transaction_search_tokens.token < 'shelm'" in sql
+        assert 'anon_1.transaction_id = transactions.id' in sql
+
+    def test_local_composite_key(self):
+        sess = mock_session('sqlite')
+        q = ofx_transaction_search.filter(
+            Query(OFXTransaction, session=sess), 'mktplace amazon'
+        )
+        sql = compiled(q, sqlite.dialect())
+        assert sql.count('JOIN (SELECT DISTINCT') == 1
+        assert 'anon_1.account_id = ofx_trans.account_id AND ' \
+               'anon_1.fitid = ofx_trans.fitid' in sql
+
+    def test_local_no_word_start_terms(self):
+        sess = mock_session('sqlite')
+        q = Query(Transaction, session=sess)
+        assert transaction_search.filter(q, 'mazon') is q
+
+    def test_native(self):
+        sess = mock_session('mysql')
+        q = ofx_transaction_search.filter(
+            Query(OFXTransaction, session=sess), 'The Amazon.com ab store'
+        )
+        sql = compiled(q, mysql.dialect())
+        assert 'JOIN' not in sql
+        assert "MATCH (ofx_trans.name, ofx_trans.memo, " \
+               "ofx_trans.description, ofx_trans.notes) AGAINST " \
+               "('+amazon* +store*' IN BOOLEAN MODE)" in sql
+
+    def test_native_only_stopwords(self):
+        sess = mock_session('mysql')
+        q = Query(Transaction, session=sess)
+        assert transaction_search.filter(q, 'the www') is q
+
+
+class TestSearchIndexSubstringSearch(object):
+    """
+    Searches must return the same records as the ``LIKE '%s%'`` filter alone,
+    including for search strings that begin or end mid-word.
+    """
+
+    descriptions = [
+        'AMAZON MKTPLACE PMTS', 'Amazon.com*AB12CD', 'Shell Oil 1234',
+        'T1foo', 'foo bar baz', 'Interest Charge', 'joe_s pizza'
+    ]
+
+    @pytest.fixture
+    def sess(self):
+        engine = create_engine('sqlite://')
+        Transaction.__table__.create(engine)
+        TransactionSearchToken.__table__.create(engine)
+        sess = sessionmaker(bind=engine)()
+        rows = [
+            {'id': idx + 1, 'description': d}
+            for idx, d in enumerate(self.descriptions)
+        ]
+        sess.execute(Transaction.__table__.insert(), rows)
+        transaction_search.index_mappings(sess, rows)
+        yield sess
+        sess.close()
+
+    @pytest.mark.parametrize('s', [
+        'mazon', 'zon mkt', 'amazon', 'AMAZON MKT', 'com*ab', 'oil 12',
+        'foo', '1foo', 'inte', 'rest char', ' bar', 'r baz', 'e_s piz',
+        'oe_s pizza'
+    ])
+    def test_same_records_as_like(self, sess, s):
+        like = '%' + s + '%'
+        expected = [
+            r.id for r in sess.query(Transaction.id).filter(
+                Transaction.description.like(like)
+            ).order_by(Transaction.id)
+        ]
+        assert len(expected) > 0
+        res = [
+            r.id for r in transaction_search.filter(
+                sess.query(Transaction.id), s
+            ).filter(
+                Transaction.description.like(like)
+            ).order_by(Transaction.id)
+        ]
+        assert res == expected
+
+
+class TestSearchIndexMaintenance(object):
+
+    def test_record_key_and_tokens(self):
+        t = OFXTransaction(
+            account_id=2, fitid='F1', name='Foo Bar', memo='bar baz'
+        )
+        assert ofx_transaction_search.record_key(t) == (2, 'F1')
+        assert ofx_transaction_search.record_tokens(t) == {
+            'foo', 'bar', 'baz'
+        }
+        m = {'account_id': 3, 'fitid': 'F2', 'name': 'Quux'}
+        assert ofx_transaction_search.record_key(m) == (3, 'F2')
+        assert ofx_transaction_search.record_tokens(m) == {'quux'}
+
+    def test_index(self):
+        sess = mock_session('sqlite')
+        transaction_search.index(sess, [
+            Transaction(id=1, description='Foo bar'),
+            Transaction(id=2, description='')
+        ])
+        assert len(sess.execute.mock_calls) == 2
+        delete = sess.execute.mock_calls[0][1][0]
+        assert compiled_clause(delete) == 'DELETE FROM ' \
+            'transaction_search_tokens WHERE ' \
+            'transaction_search_tokens.transaction_id IN (1, 2)'
+        assert sess.execute.mock_calls[1][1][1] == [
+            {'transaction_id': 1, 'token': 'bar'},
+            {'transaction_id': 1, 'token': 'foo'}
+        ]
+
+    def test_index_empty(self):
+        sess = mock_session('sqlite')
+        transaction_search.index(sess, [])
+        assert sess.execute.mock_calls == []
+
+    def test_remove_chunked(self):
+        sess = mock_session('sqlite')
+        keys = [(1, 'F%d' % i) for i in range(CHUNK_SIZE + 1)]
+        ofx_transaction_search.remove(sess, keys)
+        assert len(sess.execute.mock_calls) == 2
+
+    def test_index_mappings(self):
+        sess = mock_session('sqlite')
+        ofx_transaction_search.index_mappings(
+            sess, [{'account_id': 1, 'fitid': 'F1', 'name': 'Foo'}]
+        )
+        assert len(sess.execute.mock_calls) == 2
+        assert sess.execute.mock_calls[1][1][1] == [
+            {'account_id': 1, 'fitid': 'F1', 'token': 'foo'}
+        ]
+
+    def test_index_mappings_native(self):
+        sess = mock_session('mysql')
+        ofx_transaction_search.index_mappings(
+            sess, [{'account_id': 1, 'fitid': 'F1', 'name': 'Foo'}]
+        )
+        assert sess.mock_calls == [call.get_bind()]
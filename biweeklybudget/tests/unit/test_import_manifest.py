@@ -0,0 +1,132 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/biweeklybudget>
+
+################################################################################
+Copyright 2016-2024 Jason Antman <http://www.jasonantman.com>
+
+    This file is part of biweeklybudget, also known as biweeklybudget.
+
+    biweeklybudget is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    biweeklybudget is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with biweeklybudget.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/biweeklybudget> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+import os
+import json
+import hashlib
+
+from biweeklybudget.import_manifest import ImportManifest
+
+
+class TestImportManifest(object):
+
+    def setup_method(self):
+        self.content = b'<OFX>foo</OFX>'
+
+    def write(self, tmpdir, content=None):
+        p = tmpdir.mkdir('Acct').join('a.ofx')
+        p.write_binary(self.content if content is None else content)
+        return str(p)
+
+    def test_new(self, tmpdir):
+        cls = ImportManifest(str(tmpdir))
+        assert len(cls) == 0
+        path = self.write(tmpdir)
+        assert cls.get(path) is None
+        assert cls.is_unchanged(path) is False
+        assert cls.is_unchanged(path, verify=True) is False
+
+    def test_record_and_save(self, tmpdir):
+        path = self.write(tmpdir)
+        cls = ImportManifest(str(tmpdir))
+        cls.record(path, 12)
+        st = os.stat(path)
+        expected = {
+            'sha256': hashlib.sha256(self.content).hexdigest(),
+            'size': len(self.content),
+            'mtime_ns': st.st_mtime_ns,
+            'statement_id': 12
+        }
+        assert cls.get(path) == expected
+        assert cls.is_unchanged(path) is True
+        assert cls.is_unchanged(path, verify=True) is True
+        cls.save()
+        with open(os.path.join(str(tmpdir), ImportManifest.FILENAME)) as fh:
+            assert json.load(fh) == {'Acct/a.ofx': expected}
+        assert not os.path.exists(
+            os.path.join(str(tmpdir), ImportManifest.FILENAME + '.tmp')
+        )
+        cls2 = ImportManifest(str(tmpdir))
+        assert len(cls2) == 1
+        assert cls2.is_unchanged(path) is True
+
+    def test_changed(self, tmpdir):
+        path = self.write(tmpdir)
+        cls = ImportManifest(str(tmpdir))
+        cls.record(path, 12)
+        with open(path, 'wb') as fh:
+            fh.write(b'<OFX>bar</OFX>')
+        os.utime(path, ns=(1, 1))
+        assert cls.is_unchanged(path) is False
+        assert cls.is_unchanged(path, verify=True) is False
+
+    def test_touched(self, tmpdir):
+        path = self.write(tmpdir)
+        cls = ImportManifest(str(tmpdir))
+        cls.record(path, 12)
+        cls.save()
+        os.utime(path, ns=(1, 1))
+        assert cls.is_unchanged(path) is False
+        assert cls.is_unchanged(path, verify=True) is True
+        assert cls.get(path)['mtime_ns'] == 1
+        assert cls.is_unchanged(path) is True
+        cls.save()
+        assert ImportManifest(str(tmpdir)).get(path)['mtime_ns'] == 1
+
+    def test_save_unchanged(self, tmpdir):
+        cls = ImportManifest(str(tmpdir))
+        cls.save()
+        assert not os.path.exists(
+            os.path.join(str(tmpdir), ImportManifest.FILENAME)
+        )
+
+    def test_prune(self, tmpdir):
+        path = self.write(tmpdir)
+        other = str(tmpdir.join('Acct', 'b.ofx'))
+        with open(other, 'wb') as fh:
+            fh.write(b'<OFX>bar</OFX>')
+        cls = ImportManifest(str(tmpdir))
+        cls.record(path, 12)
+        cls.record(other, 13)
+        cls.save()
+        assert cls.statement_ids() == {12, 13}
+        assert cls.prune({12, 13, 14}) == 0
+        assert cls.prune({12}) == 1
+        assert cls.statement_ids() == {12}
+        assert cls.is_unchanged(path) is True
+        assert cls.is_unchanged(other) is False
+        cls.save()
+        assert len(ImportManifest(str(tmpdir))) == 1
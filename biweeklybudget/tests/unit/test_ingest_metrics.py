@@ -0,0 +1,234 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/biweeklybudget>
+
+################################################################################
+Copyright 2016-2024 Jason Antman <http://www.jasonantman.com>
+
+    This file is part of biweeklybudget, also known as biweeklybudget.
+
+    biweeklybudget is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    biweeklybudget is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with biweeklybudget.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/biweeklybudget> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+from unittest.mock import Mock, patch
+import threading
+import pytest
+
+from biweeklybudget.ingest_metrics import (
+    IngestMetrics, IngestResult, IngestSummary, count_query, current, stage
+)
+
+pbm = 'biweeklybudget.ingest_metrics'
+
+
+class TestIngestMetrics(object):
+
+    def test_init(self):
+        m = IngestMetrics('ofx', account_id=3, filename='foo.ofx')
+        assert m.as_dict == {
+            'source': 'ofx',
+            'account_id': 3,
+            'filename': 'foo.ofx',
+            'stages': {},
+            'rows': 0,
+            'count_new': 0,
+            'count_updated': 0,
+            'queries': 0,
+            'total_secs': 0,
+            'rows_per_sec': None
+        }
+
+    def test_stages(self):
+        m = IngestMetrics('ofx')
+        with patch('%s.default_timer' % pbm) as m_timer:
+            m_timer.side_effect = [0.0, 1.0, 2.0, 5.0, 7.0, 10.0]
+            with m:
+                assert current() is m
+                with m.stage('a'):
+                    with stage('b'):
+                        pass
+        assert current() is None
+        assert m.stages == {'a': 3.0, 'b': 3.0, 'other': 4.0}
+        assert list(m.stages.keys()) == ['a', 'b', 'other']
+        assert m.total == 10.0
+
+    def test_stage_repeated(self):
+        m = IngestMetrics('ofx')
+        with patch('%s.default_timer' % pbm) as m_timer:
+            m_timer.side_effect = [0.0, 1.0, 2.0, 3.0, 5.0, 5.0]
+            with m:
+                with m.stage('a'):
+                    pass
+                with m.stage('a'):
+                    pass
+        assert m.stages == {'a': 3.0, 'other': 2.0}
+
+    def test_exception(self):
+        m = IngestMetrics('ofx')
+        with pytest.raises(RuntimeError):
+            with m:
+                with m.stage('a'):
+                    raise RuntimeError('foo')
+        assert current() is None
+        assert 'a' in m.stages
+
+    def test_nested_metrics(self):
+        outer = IngestMetrics('ofx')
+        inner = IngestMetrics('plaid')
+        with outer:
+            with inner:
+                assert current() is inner
+                with stage('a'):
+                    pass
+            assert current() is outer
+        assert 'a' in inner.stages
+        assert 'a' not in outer.stages
+
+    def test_rows_per_sec(self):
+        m = IngestMetrics('ofx')
+        m.rows = 10
+        assert m.rows_per_sec is None
+        m.add_stage('parse', 1.5)
+        m.add_stage('upsert', 0.5)
+        m.add_stage('parse', 2.0)
+        assert m.stages == {'parse': 3.5, 'upsert': 0.5}
+        assert m.rows_per_sec == 2.5
+
+    def test_from_dict(self):
+        m = IngestMetrics('ofx', account_id=3, filename='foo.ofx')
+        m.add_stage('parse', 1.5)
+        m.add_stage('commit', 0.5)
+        m.rows = 10
+        m.count_new = 4
+        m.count_updated = 6
+        m.queries = 20
+        res = IngestMetrics.from_dict(m.as_dict)
+        assert res.as_dict == m.as_dict
+        assert list(res.stages.keys()) == ['parse', 'commit']
+
+
+class TestStage(object):
+
+    def test_no_metrics(self):
+        with patch('%s.default_timer' % pbm) as m_timer:
+            with stage('foo'):
+                pass
+        assert m_timer.mock_calls == []
+
+
+class TestCountQuery(object):
+
+    def test_no_metrics(self):
+        count_query(Mock(), Mock(), 'SELECT 1', (), Mock(), False)
+
+    def test_count(self):
+        m = IngestMetrics('ofx')
+        with m:
+            count_query(Mock(), Mock(), 'SELECT 1', (), Mock(), False)
+            count_query(Mock(), Mock(), 'SELECT 2', (), Mock(), False)
+        count_query(Mock(), Mock(), 'SELECT 3', (), Mock(), False)
+        assert m.queries == 2
+
+    def test_per_thread(self):
+        m = IngestMetrics('ofx')
+        seen = []
+
+        def other_thread():
+            seen.append(current())
+            count_query(Mock(), Mock(), 'SELECT 1', (), Mock(), False)
+
+        with m:
+            t = threading.Thread(target=other_thread)
+            t.start()
+            t.join()
+        assert seen == [None]
+        assert m.queries == 0
+
+
+class TestIngestResult(object):
+
+    def test_tuple(self):
+        m = IngestMetrics('ofx')
+        res = IngestResult(1, 2, 3, metrics=m)
+        assert res == (1, 2, 3)
+        stmt_id, count_new, count_upd = res
+        assert (stmt_id, count_new, count_upd) == (1, 2, 3)
+        assert res.statement_id == 1
+        assert res.count_new == 2
+        assert res.count_updated == 3
+        assert res.metrics is m
+
+    def test_no_metrics(self):
+        assert IngestResult(1, 2, 3).metrics is None
+
+
+class TestIngestSummary(object):
+
+    def _metrics(self, stages, rows, queries):
+        m = IngestMetrics('ofx')
+        for k, v in stages:
+            m.add_stage(k, v)
+        m.rows = rows
+        m.count_new = rows - 1
+        m.count_updated = 1
+        m.queries = queries
+        return m
+
+    def test_add(self):
+        s = IngestSummary()
+        s.add(self._metrics([('parse', 1.0), ('upsert', 2.0)], 10, 5))
+        s.add(None)
+        s.add(self._metrics([('upsert', 1.0), ('commit', 1.0)], 5, 3))
+        assert s.as_dict == {
+            'statements': 2,
+            'stages': {'parse': 1.0, 'upsert': 3.0, 'commit': 1.0},
+            'rows': 15,
+            'count_new': 13,
+            'count_updated': 2,
+            'queries': 8,
+            'total_secs': 5.0,
+            'rows_per_sec': 3.0
+        }
+
+    def test_report(self):
+        s = IngestSummary()
+        s.add(self._metrics([('parse', 1.0), ('upsert', 3.0)], 10, 5))
+        assert s.report() == '\n'.join([
+            'Imported 1 statement(s): 10 row(s) (9 new, 1 updated), 5 '
+            'queries in 4.000s (2.5 rows/sec)',
+            'Stage               Seconds     Pct',
+            'upsert                3.000   75.0%',
+            'parse                 1.000   25.0%'
+        ])
+
+    def test_report_empty(self):
+        assert IngestSummary().report() == '\n'.join([
+            'Imported 0 statement(s): 0 row(s) (0 new, 0 updated), 0 '
+            'queries in 0.000s (- rows/sec)',
+            'Stage               Seconds     Pct'
+        ])
@@ -40,8 +40,10 @@ from datetime import date, timedelta
 from sqlalchemy.orm.session import Session
 import pytest
 from math import ceil
+from random import Random
 from decimal import Decimal
 from copy import deepcopy
+from concurrent.futures.process import BrokenProcessPool
 
 from biweeklybudget.interest import (
     InterestHelper,
@@ -53,7 +55,8 @@ from biweeklybudget.interest import (
     LowestInterestRateFirstMethod, HighestInterestRateFirstMethod,
     calculate_payoffs, CCStatement,
     INTEREST_CALCULATION_NAMES, MIN_PAYMENT_FORMULA_NAMES,
-    PAYOFF_METHOD_NAMES
+    PAYOFF_METHOD_NAMES, calculate_payoffs_vectorized,
+    calculate_payoffs_checked, PayoffResultCache
 )
 from biweeklybudget.utils import dtnow
 from biweeklybudget.models.account import Account, AcctType
@@ -175,9 +178,17 @@ class TestInterestHelper(object):
         self.mock_sess = Mock(spec_set=Session)
         self.mock_sess.query.return_value.filter.return_value.all.\
             return_value = self.accts.values()
+        self.latest_patcher = patch('%s.Account.latest_balances' % pbm)
+        self.m_latest = self.latest_patcher.start()
         self.cls = InterestHelper(self.mock_sess)
 
+    def teardown_method(self):
+        self.latest_patcher.stop()
+
     def test_init(self):
+        assert self.m_latest.mock_calls == [
+            call(self.mock_sess, self.accts.keys())
+        ]
         assert self.cls._increases == {}
         assert self.cls._onetimes == {}
         assert self.mock_sess.mock_calls[0] == call.query(Account)
@@ -233,6 +244,36 @@ class TestInterestHelper(object):
             4: Decimal('109.9730')
         }
 
+    def test_fingerprint(self):
+        bal3 = self.accts[3].balance
+        bal4 = self.accts[4].balance
+        assert self.cls.fingerprint == (
+            (
+                (
+                    3, bal3.id, bal3.ledger, bal3.ledger_date,
+                    Decimal('0.0100'), 'AdbCompoundedDaily', 'MinPaymentAmEx',
+                    Decimal('0.8089')
+                ),
+                (
+                    4, bal4.id, bal4.ledger, bal4.ledger_date,
+                    Decimal('0.1000'), 'AdbCompoundedDaily',
+                    'MinPaymentDiscover', Decimal('46.9061')
+                )
+            ),
+            (),
+            ()
+        )
+        cls = InterestHelper(
+            self.mock_sess,
+            increases={date(2017, 9, 1): Decimal('500')},
+            onetimes={date(2017, 8, 1): Decimal('100')}
+        )
+        assert cls.fingerprint[1:] == (
+            ((date(2017, 9, 1), Decimal('500')),),
+            ((date(2017, 8, 1), Decimal('100')),)
+        )
+        assert cls.fingerprint != self.cls.fingerprint
+
     def test_calculate_payoffs(self):
         pm1 = Mock()
         pm2 = Mock()
@@ -272,10 +313,62 @@ class TestInterestHelper(object):
             }
         }
         assert mock_cpm.mock_calls == [
-            call(pm1.return_value),
-            call(pm2.return_value)
+            call(pm1.return_value, engine='decimal'),
+            call(pm2.return_value, engine='decimal')
         ]
 
+    def test_calculate_payoffs_engine(self):
+        with patch('%s._calc_payoff_method' % pb) as mock_cpm:
+            mock_cpm.return_value = 'res'
+            res = self.cls.calculate_payoffs(engine='numpy')
+        assert res['MinPaymentMethod']['results'] == 'res'
+        assert mock_cpm.mock_calls[0][2] == {'engine': 'numpy'}
+
+    def test_calculate_payoffs_bad_engine(self):
+        with pytest.raises(ValueError):
+            self.cls.calculate_payoffs(engine='foo')
+
+    def test_calculate_payoffs_processes(self):
+        expected = self.cls.calculate_payoffs()
+        with patch('%s._calc_payoff_method' % pb) as mock_cpm:
+            res = self.cls.calculate_payoffs(processes=2)
+        assert mock_cpm.mock_calls == []
+        assert res == expected
+
+    def test_calculate_payoffs_processes_error(self):
+        with patch('%s._calc_payoff_methods_parallel' % pb) as mock_par:
+            mock_par.return_value = {
+                'MinPaymentMethod': RuntimeError('foo'),
+                'HighestBalanceFirstMethod': []
+            }
+            with patch(
+                '%s.PAYOFF_METHOD_NAMES' % pbm, {
+                    k: PAYOFF_METHOD_NAMES[k] for k in [
+                        'MinPaymentMethod', 'HighestBalanceFirstMethod'
+                    ]
+                }
+            ):
+                res = self.cls.calculate_payoffs(processes=4)
+        assert res['MinPaymentMethod']['error'] == 'foo'
+        assert 'results' not in res['MinPaymentMethod']
+        assert res['HighestBalanceFirstMethod']['results'] == {}
+        assert len(mock_par.mock_calls) == 1
+        assert sorted(mock_par.mock_calls[0][1][0].keys()) == [
+            'HighestBalanceFirstMethod', 'MinPaymentMethod'
+        ]
+        assert mock_par.mock_calls[0][1][1:] == ('decimal', 4)
+
+    def test_calculate_payoffs_processes_fallback(self):
+        with patch('%s._calc_payoff_methods_parallel' % pb) as mock_par:
+            mock_par.side_effect = BrokenProcessPool('foo')
+            with patch('%s._calc_payoff_method' % pb) as mock_cpm:
+                mock_cpm.return_value = 'res'
+                res = self.cls.calculate_payoffs(processes=2)
+        assert len(mock_par.mock_calls) == 1
+        assert len(mock_cpm.mock_calls) == len(res)
+        for v in res.values():
+            assert v['results'] == 'res'
+
     def test_calculate_payoff_method(self):
         mock_m = Mock()
         with patch('%s.calculate_payoffs' % pbm) as mock_calc:
@@ -300,6 +393,93 @@ class TestInterestHelper(object):
         }
 
 
+class TestPayoffResultCache(object):
+
+    def setup_method(self):
+        self.cls = PayoffResultCache()
+
+    def mock_ih(self, fingerprint):
+        ih = Mock(spec_set=InterestHelper)
+        type(ih).fingerprint = PropertyMock(return_value=fingerprint)
+        ih.calculate_payoffs.return_value = {
+            'PM1': {'results': {3: {'total_payments': Decimal('1.23')}}}
+        }
+        return ih
+
+    @patch('%s.settings.CREDIT_PAYOFF_CACHE_SIZE' % pbm, 0)
+    def test_disabled(self):
+        ih = self.mock_ih(('a',))
+        for _ in range(2):
+            res, hit = self.cls.calculate_payoffs(ih, engine='numpy')
+            assert hit is False
+            assert res == ih.calculate_payoffs.return_value
+        assert ih.calculate_payoffs.mock_calls == [
+            call(engine='numpy', processes=0),
+            call(engine='numpy', processes=0)
+        ]
+        assert self.cls.stats == {
+            'enabled': False,
+            'size': 0,
+            'max_size': 0,
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'invalidations': 0
+        }
+
+    @patch('%s.settings.CREDIT_PAYOFF_CACHE_SIZE' % pbm, 5)
+    def test_hit_miss(self):
+        ih = self.mock_ih(('a',))
+        res, hit = self.cls.calculate_payoffs(ih, processes=2)
+        assert hit is False
+        res, hit = self.cls.calculate_payoffs(self.mock_ih(('a',)))
+        assert hit is True
+        assert res == {
+            'PM1': {'results': {3: {'total_payments': Decimal('1.23')}}}
+        }
+        # returned results are a copy
+        res['PM1']['results'][3]['total_payments'] = Decimal('0')
+        res, hit = self.cls.calculate_payoffs(ih)
+        assert hit is True
+        assert res['PM1']['results'][3]['total_payments'] == Decimal('1.23')
+        assert ih.calculate_payoffs.mock_calls == [
+            call(engine='decimal', processes=2)
+        ]
+        # different fingerprint or engine is a miss
+        assert self.cls.calculate_payoffs(self.mock_ih(('b',)))[1] is False
+        assert self.cls.calculate_payoffs(ih, engine='numpy')[1] is False
+        assert self.cls.stats == {
+            'enabled': True,
+            'size': 3,
+            'max_size': 5,
+            'hits': 2,
+            'misses': 3,
+            'evictions': 0,
+            'invalidations': 0
+        }
+
+    @patch('%s.settings.CREDIT_PAYOFF_CACHE_SIZE' % pbm, 2)
+    def test_eviction(self):
+        a = self.mock_ih(('a',))
+        self.cls.calculate_payoffs(a)
+        self.cls.calculate_payoffs(self.mock_ih(('b',)))
+        assert self.cls.calculate_payoffs(a)[1] is True
+        self.cls.calculate_payoffs(self.mock_ih(('c',)))
+        assert self.cls.evictions == 1
+        assert self.cls.calculate_payoffs(a)[1] is True
+        assert self.cls.calculate_payoffs(self.mock_ih(('b',)))[1] is False
+
+    @patch('%s.settings.CREDIT_PAYOFF_CACHE_SIZE' % pbm, 5)
+    def test_invalidate_all(self):
+        a = self.mock_ih(('a',))
+        self.cls.calculate_payoffs(a)
+        self.cls.calculate_payoffs(self.mock_ih(('b',)))
+        self.cls.invalidate_all()
+        assert self.cls.stats['size'] == 0
+        assert self.cls.invalidations == 2
+        assert self.cls.calculate_payoffs(a)[1] is False
+
+
 class TestInterestCalculation(object):
 
     def test_init(self):
@@ -333,8 +513,8 @@ class TestAdbCompoundedDaily(object):
             (date(2017, 1, 1) + timedelta(days=365))
         )
         assert res == {
-            'end_balance': Decimal('110.5487464695276899243379188'),
-            'interest_paid': Decimal('10.54874567794529906536521621')
+            'end_balance': Decimal('110.5487464695276899243379176'),
+            'interest_paid': Decimal('10.54874567794529906536521613')
         }
 
     def test_calculate_transactions(self):
@@ -349,6 +529,35 @@ class TestAdbCompoundedDaily(object):
                 (end_d - timedelta(days=1)): Decimal('50.00')
             }
         )
+        assert res == {
+            'end_balance': Decimal('107.5420752170470026908058801'),
+            'interest_paid': Decimal('7.542074651086492634526111763')
+        }
+
+    def test_calculate_by_day(self):
+        cls = AdbCompoundedDaily(Decimal('0.1000'))
+        res = cls.calculate_by_day(
+            Decimal('100.00'),
+            date(2017, 1, 1),
+            (date(2017, 1, 1) + timedelta(days=365))
+        )
+        assert res == {
+            'end_balance': Decimal('110.5487464695276899243379188'),
+            'interest_paid': Decimal('10.54874567794529906536521621')
+        }
+
+    def test_calculate_by_day_transactions(self):
+        cls = AdbCompoundedDaily(Decimal('0.1000'))
+        end_d = date(2017, 1, 1) + timedelta(days=365)
+        res = cls.calculate_by_day(
+            Decimal('100.00'),
+            date(2017, 1, 1),
+            end_d,
+            transactions={
+                date(2017, 6, 1): Decimal('-50.00'),
+                (end_d - timedelta(days=1)): Decimal('50.00')
+            }
+        )
         assert res == {
             'end_balance': Decimal('107.5420752170470026908058809'),
             'interest_paid': Decimal('7.542074651086492634526111808')
@@ -394,6 +603,61 @@ class TestSimpleInterest(object):
         }
 
 
+class TestCalculateMatchesByDay(object):
+    """
+    Property-style check that the segment-based ``calculate()`` methods agree
+    with the day-by-day ``calculate_by_day()`` reference implementations
+    across randomly-generated (but seeded, so reproducible) inputs.
+    """
+
+    @staticmethod
+    def _random_args(seed):
+        rand = Random(seed)
+        first_d = date(2017, 1, 1) + timedelta(days=rand.randint(0, 730))
+        last_d = first_d + timedelta(days=rand.randint(0, 62))
+        transactions = {}
+        for _ in range(rand.randint(0, 8)):
+            d = first_d + timedelta(
+                days=rand.randint(-5, (last_d - first_d).days + 5)
+            )
+            transactions[d] = Decimal(rand.randint(-200000, 200000)) / 100
+        return (
+            Decimal(rand.randint(0, 3000)) / 10000,
+            Decimal(rand.randint(0, 2000000)) / 100,
+            first_d,
+            last_d,
+            transactions
+        )
+
+    @staticmethod
+    def _assert_close(actual, expected):
+        assert sorted(actual.keys()) == sorted(expected.keys())
+        for k in expected.keys():
+            diff = abs(actual[k] - expected[k])
+            assert diff <= (abs(expected[k]) + 1) * Decimal('1e-20'), k
+
+    @pytest.mark.parametrize('seed', range(50))
+    def test_adb_compounded_daily(self, seed):
+        apr, principal, first_d, last_d, trans = self._random_args(seed)
+        cls = AdbCompoundedDaily(apr)
+        self._assert_close(
+            cls.calculate(principal, first_d, last_d, transactions=trans),
+            cls.calculate_by_day(
+                principal, first_d, last_d, transactions=trans
+            )
+        )
+
+    @pytest.mark.parametrize('seed', range(50))
+    def test_simple_interest(self, seed):
+        apr, principal, first_d, last_d, trans = self._random_args(seed)
+        cls = SimpleInterest(apr)
+        assert cls.calculate(
+            principal, first_d, last_d, transactions=trans
+        ) == cls.calculate_by_day(
+            principal, first_d, last_d, transactions=trans
+        )
+
+
 class TestBillingPeriod(object):
 
     def test_init(self):
@@ -1027,6 +1291,54 @@ class TestCCStatement(object):
             call(cls, {date(2017, 1, 15): Decimal('98.76')})
         ]
 
+    def test_compact_round_trip(self):
+        cls = CCStatement(
+            AdbCompoundedDaily(Decimal('0.1999')),
+            Decimal('1234.56'),
+            MinPaymentDiscover(),
+            _BillingPeriod(date(2017, 2, 28), start_date=date(2017, 2, 1)),
+            transactions={
+                date(2017, 2, 14): Decimal('-100.00'),
+                date(2017, 2, 3): Decimal('25.00')
+            }
+        )
+        compact = cls.to_compact()
+        assert compact == (
+            'AdbCompoundedDaily',
+            Decimal('0.1999'),
+            Decimal('1234.56'),
+            'MinPaymentDiscover',
+            date(2017, 2, 28),
+            date(2017, 2, 1),
+            (
+                (date(2017, 2, 3), Decimal('25.00')),
+                (date(2017, 2, 14), Decimal('-100.00'))
+            ),
+            cls.principal,
+            cls.interest
+        )
+        res = CCStatement.from_compact(compact)
+        assert isinstance(res._interest_cls, AdbCompoundedDaily)
+        assert res.apr == Decimal('0.1999')
+        assert isinstance(res._min_pay_cls, MinPaymentDiscover)
+        assert res._orig_principal == Decimal('1234.56')
+        assert res.start_date == date(2017, 2, 1)
+        assert res.end_date == date(2017, 2, 28)
+        assert res._transactions == cls._transactions
+        assert res.principal == cls.principal
+        assert res.interest == cls.interest
+        assert res.minimum_payment == cls.minimum_payment
+
+    def test_to_compact_unknown_class(self):
+        i = Mock(spec_set=_InterestCalculation)
+        cls = CCStatement(
+            i, Decimal('1.23'), MinPaymentAmEx(),
+            _BillingPeriod(date(2017, 1, 31)),
+            end_balance=Decimal('1.50'), interest_amt=Decimal('0.27')
+        )
+        with pytest.raises(TypeError):
+            cls.to_compact()
+
 
 class TestCalculatePayoffs(object):
 
@@ -1071,6 +1383,139 @@ class TestCalculatePayoffs(object):
         ]
 
 
+class TestCalculatePayoffsVectorized(object):
+
+    def setup_method(self):
+        self.stmts = [
+            CCStatement(
+                AdbCompoundedDaily(Decimal('0.0100')),
+                Decimal('952.06'),
+                MinPaymentAmEx(),
+                _BillingPeriod(date(2017, 7, 31)),
+                end_balance=Decimal('952.06'),
+                interest_amt=Decimal('16.25')
+            ),
+            CCStatement(
+                AdbCompoundedDaily(Decimal('0.1000')),
+                Decimal('5498.65'),
+                MinPaymentDiscover(),
+                _BillingPeriod(date(2017, 7, 31)),
+                end_balance=Decimal('5498.65'),
+                interest_amt=Decimal('28.53')
+            ),
+            CCStatement(
+                SimpleInterest(Decimal('0.2499')),
+                Decimal('2345.67'),
+                MinPaymentCiti(),
+                _BillingPeriod(date(2017, 7, 12)),
+                end_balance=Decimal('2345.67'),
+                interest_amt=Decimal('48.12')
+            ),
+            CCStatement(
+                SimpleInterest(Decimal('0.0')),
+                Decimal('0'),
+                MinPaymentAmEx(),
+                _BillingPeriod(date(2017, 7, 31)),
+                end_balance=Decimal('0'),
+                interest_amt=Decimal('0')
+            )
+        ]
+
+    def test_pay_min(self):
+        res = calculate_payoffs_vectorized(
+            MinPaymentMethod(), self.stmts[:2]
+        )
+        assert res == [
+            (28, Decimal('963.00'), Decimal('35.00')),
+            (162, Decimal('8664.86'), Decimal('109.97'))
+        ]
+
+    def test_pay_highest_ir(self):
+        res = calculate_payoffs_vectorized(
+            HighestInterestRateFirstMethod(Decimal('144.9730')),
+            self.stmts[:2]
+        )
+        assert res == [
+            (28, Decimal('963.00'), Decimal('35.00')),
+            (55, Decimal('6956.35'), Decimal('109.97'))
+        ]
+
+    def test_pay_lowest_bal(self):
+        res = calculate_payoffs_vectorized(
+            LowestBalanceFirstMethod(Decimal('144.9730')),
+            self.stmts[:2]
+        )
+        assert res == [
+            (21, Decimal('960.92'), Decimal('35.00')),
+            (56, Decimal('6988.24'), Decimal('109.97'))
+        ]
+
+    def test_max_total_equals_min_sum(self):
+        # the float sum of these minimums is 289.16790000000003
+        stmts = [
+            CCStatement(
+                AdbCompoundedDaily(Decimal('0.0100')),
+                Decimal('4929.53'),
+                MinPaymentAmEx(),
+                _BillingPeriod(date(2017, 7, 31)),
+                end_balance=Decimal('4929.53'),
+                interest_amt=Decimal('79.48')
+            ),
+            CCStatement(
+                AdbCompoundedDaily(Decimal('0.0200')),
+                Decimal('8019.63'),
+                MinPaymentDiscover(),
+                _BillingPeriod(date(2017, 7, 31)),
+                end_balance=Decimal('8019.63'),
+                interest_amt=Decimal('20.00')
+            )
+        ]
+        assert sum(
+            [s.minimum_payment for s in stmts]
+        ) == Decimal('289.1679')
+        res = calculate_payoffs_checked(
+            HighestInterestRateFirstMethod(Decimal('289.1679')), stmts
+        )
+        assert [r[0] for r in res] == [47, 35]
+
+    @pytest.mark.parametrize('method', [
+        MinPaymentMethod, HighestBalanceFirstMethod,
+        HighestInterestRateFirstMethod, LowestBalanceFirstMethod,
+        LowestInterestRateFirstMethod, FixedPaymentMethod
+    ])
+    def test_checked(self, method):
+        res = calculate_payoffs_checked(
+            method(
+                Decimal('400'), onetimes={date(2018, 3, 15): Decimal('1000')}
+            ),
+            self.stmts
+        )
+        assert res[3] == (0, Decimal('0.00'), Decimal('0.0'))
+
+    def test_checked_mismatch(self):
+        with patch('%s.calculate_payoffs' % pbm) as mock_calc:
+            mock_calc.return_value = [
+                (28, Decimal('963.01'), Decimal('35.00')),
+                (162, Decimal('8664.86'), Decimal('109.97'))
+            ]
+            with pytest.raises(RuntimeError):
+                calculate_payoffs_checked(MinPaymentMethod(), self.stmts[:2])
+
+    def test_unsupported_method(self):
+        m = Mock(spec_set=_PayoffMethod)
+        with pytest.raises(NotImplementedError):
+            calculate_payoffs_vectorized(m, self.stmts)
+
+    def test_unsupported_interest(self):
+        s = CCStatement(
+            FixedInterest(Decimal('10.00')), Decimal('100.00'),
+            MinPaymentAmEx(), _BillingPeriod(date(2017, 7, 31)),
+            end_balance=Decimal('100.00'), interest_amt=Decimal('10.00')
+        )
+        with pytest.raises(NotImplementedError):
+            calculate_payoffs_vectorized(MinPaymentMethod(), [s])
+
+
 class TestModuleConstants(object):
 
     def test_interest(self):
@@ -1175,7 +1620,7 @@ class TestAcceptanceData(object):
             [self.stmt_cc_one]
         )
         assert res == [
-            (28, Decimal('962.9988625702411101133192793'), Decimal('35'))
+            (28, Decimal('962.9988625702411101133192802'), Decimal('35'))
         ]
 
     def test_cc_two_pay_min(self):
@@ -1186,7 +1631,7 @@ class TestAcceptanceData(object):
         assert res == [
             (
                 162,
-                Decimal('8664.861877369277471400473622'),
+                Decimal('8664.861877369277471400473654'),
                 Decimal('109.9730')
             )
         ]
@@ -1202,8 +1647,8 @@ class TestAcceptanceData(object):
             [self.stmt_cc_one, self.stmt_cc_two]
         )
         assert res == [
-            (28, Decimal('962.9988625702411101133192793'), Decimal('35')),
-            (162, Decimal('8664.861877369277471400473622'), Decimal('109.9730'))
+            (28, Decimal('962.9988625702411101133192802'), Decimal('35')),
+            (162, Decimal('8664.861877369277471400473654'), Decimal('109.9730'))
         ]
 
     def test_combined_pay_lowest_ir(self):
@@ -1212,8 +1657,8 @@ class TestAcceptanceData(object):
             [self.stmt_cc_one, self.stmt_cc_two]
         )
         assert res == [
-            (21, Decimal('960.9178327498502165965138131'), Decimal('35')),
-            (56, Decimal('6988.237124948955044765363412'), Decimal('109.9730'))
+            (21, Decimal('960.9178327498502165965138137'), Decimal('35')),
+            (56, Decimal('6988.237124948955044765363422'), Decimal('109.9730'))
         ]
 
     def test_combined_pay_lowest_bal(self):
@@ -1222,8 +1667,8 @@ class TestAcceptanceData(object):
             [self.stmt_cc_one, self.stmt_cc_two]
         )
         assert res == [
-            (21, Decimal('960.9178327498502165965138131'), Decimal('35')),
-            (56, Decimal('6988.237124948955044765363412'), Decimal('109.9730'))
+            (21, Decimal('960.9178327498502165965138137'), Decimal('35')),
+            (56, Decimal('6988.237124948955044765363422'), Decimal('109.9730'))
         ]
 
     def test_combined_pay_highest_ir(self):
@@ -1232,8 +1677,8 @@ class TestAcceptanceData(object):
             [self.stmt_cc_one, self.stmt_cc_two]
         )
         assert res == [
-            (28, Decimal('962.9988625702411101133192793'), Decimal('35')),
-            (55, Decimal('6956.345228060182432444990377'), Decimal('109.9730'))
+            (28, Decimal('962.9988625702411101133192802'), Decimal('35')),
+            (55, Decimal('6956.345228060182432444990373'), Decimal('109.9730'))
         ]
 
     def test_combined_pay_highest_bal(self):
@@ -1242,8 +1687,8 @@ class TestAcceptanceData(object):
             [self.stmt_cc_one, self.stmt_cc_two]
         )
         assert res == [
-            (28, Decimal('962.9988625702411101133192793'), Decimal('35')),
-            (55, Decimal('6956.345228060182432444990377'), Decimal('109.9730'))
+            (28, Decimal('962.9988625702411101133192802'), Decimal('35')),
+            (55, Decimal('6956.345228060182432444990373'), Decimal('109.9730'))
         ]
 
 
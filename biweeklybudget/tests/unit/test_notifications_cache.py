@@ -0,0 +1,151 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/biweeklybudget>
+
+################################################################################
+Copyright 2016-2024 Jason Antman <http://www.jasonantman.com>
+
+    This file is part of biweeklybudget, also known as biweeklybudget.
+
+    biweeklybudget is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    biweeklybudget is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with biweeklybudget.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/biweeklybudget> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+import sys
+
+from sqlalchemy.orm.session import Session
+
+from biweeklybudget.notifications_cache import NotificationsCache
+
+# https://code.google.com/p/mock/issues/detail?id=249
+# py>=3.4 should use unittest.mock not the mock package on pypi
+if (
+        sys.version_info[0] < 3 or
+        sys.version_info[0] == 3 and sys.version_info[1] < 4
+):
+    from mock import Mock, patch, call, DEFAULT  # noqa
+else:
+    from unittest.mock import Mock, patch, call, DEFAULT  # noqa
+
+pbm = 'biweeklybudget.notifications_cache'
+
+
+class TestNotificationsCache(object):
+
+    def setup_method(self):
+        self.mock_sess = Mock(spec_set=Session)
+        self.gen = self.mock_sess.query.return_value.filter.return_value\
+            .scalar
+        self.gen.return_value = 'g1'
+        self.func = Mock(return_value=[{'classes': 'a', 'content': 'b'}])
+        self.cls = NotificationsCache()
+
+    @patch('%s.settings.NOTIFICATIONS_CACHE_TTL' % pbm, 0)
+    def test_disabled(self):
+        assert self.cls.get(self.mock_sess, self.func) == [
+            {'classes': 'a', 'content': 'b'}
+        ]
+        assert self.cls.get(self.mock_sess, self.func) == [
+            {'classes': 'a', 'content': 'b'}
+        ]
+        assert len(self.func.mock_calls) == 2
+        assert self.mock_sess.mock_calls == []
+        assert self.cls.stats == {
+            'enabled': False,
+            'ttl': 0,
+            'cached': False,
+            'hits': 0,
+            'misses': 0,
+            'invalidations': 0
+        }
+
+    @patch('%s.settings.NOTIFICATIONS_CACHE_TTL' % pbm, 30)
+    def test_hit(self):
+        with patch('%s.time.monotonic' % pbm) as m_time:
+            m_time.side_effect = [100, 129]
+            res1 = self.cls.get(self.mock_sess, self.func)
+            res2 = self.cls.get(self.mock_sess, self.func)
+        assert res1 == res2 == [{'classes': 'a', 'content': 'b'}]
+        assert len(self.func.mock_calls) == 1
+        # returned data is a copy
+        res2[0]['content'] = 'x'
+        with patch('%s.time.monotonic' % pbm) as m_time:
+            m_time.return_value = 129
+            res3 = self.cls.get(self.mock_sess, self.func)
+        assert res3 == [{'classes': 'a', 'content': 'b'}]
+        assert self.cls.stats == {
+            'enabled': True,
+            'ttl': 30,
+            'cached': True,
+            'hits': 2,
+            'misses': 1,
+            'invalidations': 0
+        }
+
+    @patch('%s.settings.NOTIFICATIONS_CACHE_TTL' % pbm, 30)
+    def test_expired(self):
+        with patch('%s.time.monotonic' % pbm) as m_time:
+            m_time.side_effect = [100, 130]
+            self.cls.get(self.mock_sess, self.func)
+            self.cls.get(self.mock_sess, self.func)
+        assert len(self.func.mock_calls) == 2
+        assert self.cls.misses == 2
+
+    @patch('%s.settings.NOTIFICATIONS_CACHE_TTL' % pbm, 30)
+    def test_generation_changed(self):
+        self.cls.get(self.mock_sess, self.func)
+        self.gen.return_value = 'g2'
+        self.cls.get(self.mock_sess, self.func)
+        self.cls.get(self.mock_sess, self.func)
+        assert len(self.func.mock_calls) == 2
+        assert self.cls.hits == 1
+        assert self.cls.misses == 2
+
+    @patch('%s.settings.NOTIFICATIONS_CACHE_TTL' % pbm, 30)
+    def test_invalidate(self):
+        self.cls.get(self.mock_sess, self.func)
+        self.cls.invalidate()
+        self.cls.invalidate()
+        assert self.cls.invalidations == 1
+        self.cls.get(self.mock_sess, self.func)
+        assert len(self.func.mock_calls) == 2
+
+    def test_new_generation(self):
+        self.mock_sess.query.return_value.get.return_value = None
+        self.cls.new_generation(self.mock_sess)
+        assert len(self.mock_sess.add.mock_calls) == 1
+        added = self.mock_sess.add.mock_calls[0][1][0]
+        assert added.name == 'notifications_cache_generation'
+        assert added.is_json is False
+        assert len(added.value) == 32
+
+    def test_new_generation_existing(self):
+        s = Mock(value='old')
+        self.mock_sess.query.return_value.get.return_value = s
+        self.cls.new_generation(self.mock_sess)
+        assert self.mock_sess.add.mock_calls == [call(s)]
+        assert s.value != 'old'
+        assert len(s.value) == 32
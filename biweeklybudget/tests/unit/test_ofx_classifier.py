@@ -0,0 +1,244 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/biweeklybudget>
+
+################################################################################
+Copyright 2016-2024 Jason Antman <http://www.jasonantman.com>
+
+    This file is part of biweeklybudget, also known as biweeklybudget.
+
+    biweeklybudget is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    biweeklybudget is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with biweeklybudget.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/biweeklybudget> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import re
+from unittest.mock import Mock, patch
+
+from biweeklybudget.models.account import Account
+from biweeklybudget.ofx_classifier import (
+    OfxClassifier, FIELDS, classifier_for, classify_many, _classifier
+)
+
+pbm = 'biweeklybudget.ofx_classifier'
+
+
+def legacy_is_fields(patterns, name):
+    """
+    The original, uncompiled per-pattern classification algorithm, to check
+    equivalence against.
+    """
+    res = {}
+    for (_, field), r_str in zip(FIELDS, patterns):
+        if (
+            field == 'is_interest_charge' and
+            name == 'Interest Charged - MANUALLY ENTERED'
+        ):
+            continue
+        res[field] = False
+        if r_str is None:
+            continue
+        try:
+            if re.match(r_str, name, re.I):
+                res[field] = True
+        except Exception:
+            pass
+    return res
+
+
+class TestOfxClassifier(object):
+
+    patterns = (
+        '^INTEREST CHARGED',
+        None,
+        '^(payment|thank you)',
+        '^LATE FEE',
+        '.*fee$'
+    )
+
+    names = [
+        '',
+        'Online Payment, thank you',
+        'PAYMENT - THANK YOU',
+        'thank you',
+        'INTEREST CHARGED TO STANDARD PUR',
+        'Interest Charged - MANUALLY ENTERED',
+        'late fee',
+        'LATE FEE fee',
+        'annual fee',
+        'annual fee refund'
+    ]
+
+    def test_combined(self):
+        cls = OfxClassifier(self.patterns)
+        assert cls._combined is not None
+        assert len(cls._compiled) == 4
+        for name in self.names:
+            assert cls.classify(name) == legacy_is_fields(
+                self.patterns, name
+            )
+
+    def test_classify(self):
+        cls = OfxClassifier(self.patterns)
+        assert cls.classify('Late Fee') == {
+            'is_interest_charge': False,
+            'is_interest_payment': False,
+            'is_payment': False,
+            'is_late_fee': True,
+            'is_other_fee': True
+        }
+        assert cls.classify('Interest Charged - MANUALLY ENTERED') == {
+            'is_interest_payment': False,
+            'is_payment': False,
+            'is_late_fee': False,
+            'is_other_fee': False
+        }
+
+    def test_fallback_backreference(self):
+        patterns = ('^(a)\\1', None, '^(b)', None, None)
+        cls = OfxClassifier(patterns)
+        assert cls._combined is None
+        for name in ['aa', 'ab', 'b', 'AA']:
+            assert cls.classify(name) == legacy_is_fields(patterns, name)
+
+    def test_fallback_duplicate_group_names(self):
+        patterns = ('(?P<x>a)', '(?P<x>a)b', None, None, None)
+        cls = OfxClassifier(patterns)
+        assert cls._combined is None
+        for name in ['a', 'ab', 'b']:
+            assert cls.classify(name) == legacy_is_fields(patterns, name)
+
+    def test_invalid_pattern(self):
+        patterns = ('(', None, '.*payment.*', None, '^fee')
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            cls = OfxClassifier(patterns)
+            for name in ['payment', 'fee', '(']:
+                assert cls.classify(name) == legacy_is_fields(patterns, name)
+        assert mock_logger.error.call_count == 1
+        assert cls._combined is not None
+        assert [x[0] for x in cls._compiled] == ['is_payment', 'is_other_fee']
+
+    def test_no_patterns(self):
+        cls = OfxClassifier((None, None, None, None, None))
+        assert cls.classify('foo') == {
+            'is_interest_charge': False,
+            'is_interest_payment': False,
+            'is_payment': False,
+            'is_late_fee': False,
+            'is_other_fee': False
+        }
+
+    def test_non_string_name(self):
+        cls = OfxClassifier(self.patterns)
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            res = cls.classify(None)
+        assert res == legacy_is_fields(self.patterns, 'x')
+        assert mock_logger.error.call_count == 1
+
+    def test_classify_many(self):
+        cls = OfxClassifier(self.patterns)
+        names = self.names + self.names
+        res = cls.classify_many(names)
+        assert res == [legacy_is_fields(self.patterns, n) for n in names]
+        # results for duplicate names must be independent
+        res[0]['is_payment'] = True
+        assert res[len(self.names)]['is_payment'] is False
+
+    def test_equivalence(self):
+        pats = [
+            None, '', '^$', 'a*', 'b?', '^a', 'a$', '.*fee', 'x|y',
+            '^(a|b)', '(?=a)a', '(?i)a', '(?P<x>a)', '(a)\\1', '('
+        ]
+        names = ['', 'a', 'A', 'aa', 'ab', 'ba', 'x', 'yfee', 'FEE', 'b']
+        for i in range(len(pats)):
+            patterns = tuple(
+                pats[(i + j * 4) % len(pats)] for j in range(5)
+            )
+            cls = OfxClassifier(patterns)
+            for name in names:
+                assert cls.classify(name) == legacy_is_fields(
+                    patterns, name
+                ), '%s %s' % (patterns, name)
+
+
+class TestClassifierFor(object):
+
+    def setup_method(self):
+        _classifier.cache_clear()
+
+    def teardown_method(self):
+        _classifier.cache_clear()
+
+    def acct(self, **kwargs):
+        attrs = {
+            're_interest_charge': '^INTEREST CHARGED',
+            're_interest_paid': None,
+            're_payment': '.*payment.*',
+            're_late_fee': '^LATE FEE',
+            're_other_fee': None
+        }
+        attrs.update(kwargs)
+        return Mock(spec_set=Account, **attrs)
+
+    def test_cached(self):
+        a1 = self.acct()
+        a2 = self.acct()
+        cls = classifier_for(a1)
+        assert cls.patterns == (
+            '^INTEREST CHARGED', None, '.*payment.*', '^LATE FEE', None
+        )
+        assert classifier_for(a1) is cls
+        assert classifier_for(a2) is cls
+        assert _classifier.cache_info().misses == 1
+
+    def test_pattern_change(self):
+        acct = self.acct()
+        cls = classifier_for(acct)
+        assert cls.classify('late fee')['is_late_fee'] is True
+        acct.re_late_fee = '^foo'
+        cls2 = classifier_for(acct)
+        assert cls2 is not cls
+        assert cls2.classify('late fee')['is_late_fee'] is False
+        assert cls2.classify('foo')['is_late_fee'] is True
+
+    def test_classify_many(self):
+        acct = self.acct()
+        assert classify_many(acct, ['my payment', 'foo']) == [
+            {
+                'is_interest_charge': False,
+                'is_interest_payment': False,
+                'is_payment': True,
+                'is_late_fee': False,
+                'is_other_fee': False
+            },
+            {
+                'is_interest_charge': False,
+                'is_interest_payment': False,
+                'is_payment': False,
+                'is_late_fee': False,
+                'is_other_fee': False
+            }
+        ]
@@ -0,0 +1,154 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/biweeklybudget>
+
+################################################################################
+Copyright 2016-2024 Jason Antman <http://www.jasonantman.com>
+
+    This file is part of biweeklybudget, also known as biweeklybudget.
+
+    biweeklybudget is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    biweeklybudget is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with biweeklybudget.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/biweeklybudget> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+from unittest.mock import Mock, patch, call, DEFAULT
+from sqlalchemy.orm.session import Session
+
+from biweeklybudget.ofx_reclassify import OfxReclassifier, ReclassifyJob
+
+pbm = 'biweeklybudget.ofx_reclassify'
+
+
+class TestReclassifyJob(object):
+
+    def test_init(self):
+        job = ReclassifyJob(3, 100)
+        assert job.as_dict == {
+            'account_id': 3,
+            'status': 'pending',
+            'total': None,
+            'processed': 0,
+            'changed': 0,
+            'batches': 0,
+            'queued': job.queued,
+            'started': None,
+            'finished': None,
+            'elapsed': 0.0,
+            'error': None
+        }
+
+    def test_run(self):
+        sess = Mock(spec_set=Session)
+        job = ReclassifyJob(3, 100)
+        with patch('%s.ReclassifyJob._run' % pbm, autospec=True) as m_run:
+            job.run(sess)
+        assert m_run.mock_calls == [call(job, sess)]
+        assert sess.mock_calls == []
+        assert job.status == 'done'
+        assert job.started is not None
+        assert job.finished is not None
+        assert job.error is None
+
+    def test_run_exception(self):
+        sess = Mock(spec_set=Session)
+        job = ReclassifyJob(3, 100)
+        with patch('%s.ReclassifyJob._run' % pbm, autospec=True) as m_run:
+            m_run.side_effect = RuntimeError('foo')
+            job.run(sess)
+        assert sess.mock_calls == [call.rollback()]
+        assert job.status == 'failed'
+        assert job.error == 'foo'
+        assert job.finished is not None
+
+
+class TestOfxReclassifier(object):
+
+    def setup_method(self):
+        self.cls = OfxReclassifier()
+        self.sess = Mock(spec_set=Session)
+        self.factory = Mock(return_value=self.sess)
+
+    def test_submit_sync(self):
+        with patch.multiple(
+            '%s.settings' % pbm,
+            OFX_RECLASSIFY_BACKGROUND=0,
+            OFX_RECLASSIFY_BATCH_SIZE=50
+        ):
+            with patch(
+                '%s.ReclassifyJob.run' % pbm, autospec=True
+            ) as m_run:
+                job = self.cls.submit(3, session_factory=self.factory)
+        assert job.account_id == 3
+        assert job.batch_size == 50
+        assert m_run.mock_calls == [call(job, self.sess)]
+        assert self.sess.mock_calls == [call.close()]
+        assert self.cls.status == {3: job.as_dict}
+
+    def test_submit_background(self):
+        with patch.multiple(
+            '%s.settings' % pbm,
+            OFX_RECLASSIFY_BACKGROUND=1,
+            OFX_RECLASSIFY_BATCH_SIZE=0
+        ):
+            with patch.multiple(
+                pbm, autospec=True, ThreadPoolExecutor=DEFAULT
+            ) as mocks:
+                job = self.cls.submit(3, session_factory=self.factory)
+                # still pending, so not queued again
+                assert self.cls.submit(
+                    3, session_factory=self.factory
+                ) is job
+                job2 = self.cls.submit(4, session_factory=self.factory)
+        m_exec = mocks['ThreadPoolExecutor']
+        assert job.batch_size == 1000
+        assert m_exec.mock_calls == [
+            call(max_workers=1, thread_name_prefix='ofx-reclassify'),
+            call().submit(self.cls._run, job, self.factory),
+            call().submit(self.cls._run, job2, self.factory)
+        ]
+        assert self.factory.mock_calls == []
+        # once a job is no longer pending, a new one is queued
+        job.status = 'running'
+        with patch.multiple(
+            '%s.settings' % pbm, OFX_RECLASSIFY_BACKGROUND=1
+        ):
+            job3 = self.cls.submit(3, session_factory=self.factory)
+        assert job3 is not job
+        assert self.cls.status[3] == job3.as_dict
+
+    def test_wait_no_executor(self):
+        self.cls.wait()
+
+    def test_run_exception_closes_session(self):
+        job = Mock(spec_set=ReclassifyJob)
+        job.run.side_effect = RuntimeError('foo')
+        try:
+            self.cls._run(job, self.factory)
+        except RuntimeError:
+            pass
+        assert job.mock_calls == [call.run(self.sess)]
+        assert self.sess.mock_calls == [call.close()]
@@ -0,0 +1,159 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/biweeklybudget>
+
+################################################################################
+Copyright 2016-2024 Jason Antman <http://www.jasonantman.com>
+
+    This file is part of biweeklybudget, also known as biweeklybudget.
+
+    biweeklybudget is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    biweeklybudget is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with biweeklybudget.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/biweeklybudget> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+import json
+import pytest
+from datetime import datetime
+from decimal import Decimal
+
+from pytz import UTC
+from ofxparse.ofxparse import (
+    Ofx, Account, InvestmentAccount, AccountType, Institution, Signon,
+    Statement, Transaction, Position
+)
+
+from biweeklybudget.ofxapi.serialization import (
+    statement_to_dict, statement_from_dict
+)
+
+
+def make_ofx(acct_type=AccountType.CreditCard):
+    ofx = Ofx()
+    ofx.signon = Signon({
+        'code': 0, 'severity': 'INFO', 'message': '',
+        'dtserver': '20170728053000.0000[-0:UTC]', 'language': 'ENG',
+        'dtprofup': None, 'org': 'CreditOne', 'fid': '4321', 'intu.bid': None
+    })
+    ofx.status = {'code': 0, 'severity': 'INFO'}
+    if acct_type == AccountType.Investment:
+        acct = InvestmentAccount()
+        acct.brokerid = 'broker.example.com'
+    else:
+        acct = Account()
+    acct.type = acct_type
+    acct.curdef = 'USD'
+    acct.account_id = 'AcctId'
+    acct.institution = Institution()
+    acct.institution.organization = 'CreditOne'
+    acct.institution.fid = '4321'
+    stmt = Statement()
+    stmt.balance = Decimal('-1234.56')
+    stmt.balance_date = datetime(2017, 7, 28, 5, 29, 32)
+    for idx in range(2):
+        t = Transaction()
+        t.id = 'FITID%d' % idx
+        t.type = 'debit'
+        t.date = datetime(2017, 7, 20 + idx, 16)
+        t.amount = Decimal('-12.3%d' % idx)
+        t.payee = 'Payee %d' % idx
+        t.memo = 'Memo'
+        t.checknum = str(idx)
+        stmt.transactions.append(t)
+    if acct_type == AccountType.Investment:
+        pos = Position()
+        pos.date = datetime(2017, 7, 27)
+        pos.units = Decimal('10.5')
+        pos.unit_price = Decimal('2')
+        pos.market_value = Decimal('21')
+        stmt.positions = [pos]
+    acct.statement = stmt
+    ofx.account = acct
+    return ofx
+
+
+class TestSerialization(object):
+
+    def round_trip(self, *args):
+        return statement_from_dict(json.loads(json.dumps(
+            statement_to_dict(*args)
+        )))
+
+    def test_credit(self):
+        ofx = make_ofx()
+        mtime = datetime(2017, 7, 28, 6, 1, 2, tzinfo=UTC)
+        acct_id, res, res_mtime, filename = self.round_trip(
+            3, ofx, mtime, 'foo.ofx'
+        )
+        assert acct_id == 3
+        assert res_mtime == mtime
+        assert filename == 'foo.ofx'
+        assert res.status == {'code': 0, 'severity': 'INFO'}
+        assert vars(res.signon) == {
+            k: v for k, v in vars(ofx.signon).items() if k != 'success'
+        }
+        assert type(res.account) is Account
+        assert res.account.type == AccountType.CreditCard
+        assert vars(res.account.institution) == vars(ofx.account.institution)
+        assert res.account.statement.balance == Decimal('-1234.56')
+        assert res.account.statement.balance_date == datetime(
+            2017, 7, 28, 5, 29, 32
+        )
+        assert not hasattr(res.account.statement, 'available_balance')
+        assert not hasattr(res.account.statement, 'positions')
+        assert not hasattr(res.account, 'brokerid')
+        assert [vars(t) for t in res.account.statement.transactions] == [
+            vars(t) for t in ofx.account.statement.transactions
+        ]
+
+    def test_investment_no_mtime(self):
+        ofx = make_ofx(AccountType.Investment)
+        ofx.account.institution = None
+        del ofx.status
+        acct_id, res, res_mtime, filename = self.round_trip(5, ofx)
+        assert acct_id == 5
+        assert res_mtime is None
+        assert filename is None
+        assert not hasattr(res, 'status')
+        assert type(res.account) is InvestmentAccount
+        assert res.account.brokerid == 'broker.example.com'
+        assert res.account.institution is None
+        assert [vars(p) for p in res.account.statement.positions] == [
+            vars(p) for p in ofx.account.statement.positions
+        ]
+
+    def test_invalid(self):
+        data = statement_to_dict(3, make_ofx())
+        data['transactions'][0]['foo'] = 'bar'
+        with pytest.raises(ValueError, match='Unknown Transaction attr'):
+            statement_from_dict(data)
+        data = statement_to_dict(3, make_ofx())
+        data['transactions'][1]['amount'] = 'one'
+        with pytest.raises(ValueError, match='Invalid Transaction amount'):
+            statement_from_dict(data)
+        data = statement_to_dict(3, make_ofx())
+        del data['signon']
+        with pytest.raises(ValueError, match='Invalid statement data'):
+            statement_from_dict(data)
@@ -0,0 +1,312 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/biweeklybudget>
+
+################################################################################
+Copyright 2016-2024 Jason Antman <http://www.jasonantman.com>
+
+    This file is part of biweeklybudget, also known as biweeklybudget.
+
+    biweeklybudget is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    biweeklybudget is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with biweeklybudget.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/biweeklybudget> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+import threading
+import time
+from collections import OrderedDict
+from unittest.mock import Mock, patch, call, DEFAULT
+
+import pytest
+
+from biweeklybudget.ofxgetter import OfxGetter, main, parse_args
+
+pbm = 'biweeklybudget.ofxgetter'
+pb = f'{pbm}.OfxGetter'
+
+
+def scraper_acct(acct_id, module_name):
+    return {
+        'id': acct_id,
+        'vault_path': f'secret/acct{acct_id}',
+        'config': {
+            'class_name': 'Scraper',
+            'module_name': module_name,
+            'institution': {}
+        }
+    }
+
+
+class OfxGetterTester:
+
+    def setup_method(self):
+        self.mock_client = Mock()
+        self.mock_client.get_accounts.return_value = OrderedDict([
+            ('A1', scraper_acct(1, 'inst.a')),
+            ('A2', scraper_acct(2, 'inst.a')),
+            ('A3', scraper_acct(3, 'inst.a')),
+            ('B1', scraper_acct(4, 'inst.b')),
+            ('B2', scraper_acct(5, 'inst.b')),
+            ('C1', scraper_acct(6, 'inst.c'))
+        ])
+        with patch(f'{pbm}.Vault') as m_vault:
+            m_vault.return_value.read.return_value = {
+                'username': 'user', 'password': 'pass'
+            }
+            self.cls = OfxGetter(self.mock_client, savedir='/tmp/stmts')
+        self.mock_vault = m_vault.return_value
+
+
+class TestInit(OfxGetterTester):
+
+    def test_scraper_secrets(self):
+        assert self.mock_vault.read.mock_calls == [
+            call(f'secret/acct{x}') for x in range(1, 7)
+        ]
+        assert self.cls._account_data['A1']['config']['institution'] == {
+            'username': 'user', 'password': 'pass'
+        }
+        assert self.cls._accounts == {}
+
+
+class TestGetOfxScraper(OfxGetterTester):
+
+    def test_no_vault_reads(self):
+        self.mock_vault.reset_mock()
+        self.cls._account_data['B1']['config']['kwargs'] = {'foo': 'bar'}
+        with patch(f'{pbm}.importlib.import_module') as m_import:
+            m_cls = m_import.return_value.Scraper
+            m_cls.return_value.run.return_value = '<OFX/>'
+            res = self.cls._get_ofx_scraper('B1', days=10)
+        assert res == '<OFX/>'
+        assert m_import.mock_calls[0] == call('inst.b')
+        assert m_cls.mock_calls == [
+            call(
+                foo='bar', username='user', password='pass',
+                savedir='/tmp/stmts/B1'
+            ),
+            call().run()
+        ]
+        assert self.mock_vault.mock_calls == []
+
+
+class TestInstitutionKey(OfxGetterTester):
+
+    def test_scraper(self):
+        assert self.cls._institution_key('A2') == 'inst.a.Scraper'
+
+    @pytest.mark.parametrize('inst, expected', [
+        ({'url': 'https://ofx.example', 'org': 'Ex'}, 'https://ofx.example'),
+        ({'org': 'Ex'}, 'Ex'),
+        ({}, 'D1')
+    ])
+    def test_ofxclient(self, inst, expected):
+        self.cls._account_data['D1'] = {'config': {'institution': inst}}
+        assert self.cls._institution_key('D1') == expected
+
+
+class TestGetOfxConcurrent(OfxGetterTester):
+
+    def setup_method(self):
+        super().setup_method()
+        self.lock = threading.Lock()
+        self.active = {}
+        self.max_active = {}
+        self.max_total = 0
+        self.db_active = 0
+        self.max_db_active = 0
+        self.db_calls = []
+        self.fail_download = []
+        self.fail_update = []
+
+    def se_download(self, name, write_to_file=True, days=30, quiet=True):
+        inst = self.cls._institution_key(name)
+        with self.lock:
+            self.active[inst] = self.active.get(inst, 0) + 1
+            self.max_active[inst] = max(
+                self.max_active.get(inst, 0), self.active[inst]
+            )
+            self.max_total = max(self.max_total, sum(self.active.values()))
+        time.sleep(0.02)
+        with self.lock:
+            self.active[inst] -= 1
+        assert quiet is False
+        if name in self.fail_download:
+            raise RuntimeError(f'download {name}')
+        return f'<OFX>{name}</OFX>', f'{name}.ofx'
+
+    def se_ofx_to_db(self, name, fname, ofxdata):
+        with self.lock:
+            self.db_active += 1
+            self.max_db_active = max(self.max_db_active, self.db_active)
+        self.db_calls.append((name, fname, ofxdata, threading.get_ident()))
+        time.sleep(0.005)
+        with self.lock:
+            self.db_active -= 1
+        if name in self.fail_update:
+            raise RuntimeError(f'update {name}')
+        return 2, 1
+
+    def run(self, jobs, per_institution):
+        with patch.multiple(
+            pb, _download_ofx=DEFAULT, _ofx_to_db=DEFAULT
+        ) as mocks:
+            mocks['_download_ofx'].side_effect = self.se_download
+            mocks['_ofx_to_db'].side_effect = self.se_ofx_to_db
+            return self.cls.get_ofx_concurrent(
+                ['A1', 'A2', 'A3', 'B1', 'B2', 'C1'], days=10, jobs=jobs,
+                per_institution=per_institution
+            )
+
+    @pytest.mark.parametrize('per_institution', [1, 2])
+    def test_limits(self, per_institution):
+        res = self.run(6, per_institution)
+        assert list(res.keys()) == ['A1', 'A2', 'A3', 'B1', 'B2', 'C1']
+        assert [r['status'] for r in res.values()] == ['ok'] * 6
+        assert self.max_active == {
+            'inst.a.Scraper': per_institution,
+            'inst.b.Scraper': per_institution,
+            'inst.c.Scraper': 1
+        }
+        # downloads from different institutions overlap
+        assert self.max_total > per_institution
+        assert sorted(x[:3] for x in self.db_calls) == [
+            (n, f'{n}.ofx', f'<OFX>{n}</OFX>')
+            for n in ['A1', 'A2', 'A3', 'B1', 'B2', 'C1']
+        ]
+        # all DB writes happen one at a time, in the calling thread
+        assert self.max_db_active == 1
+        assert set(x[3] for x in self.db_calls) == {threading.get_ident()}
+
+    def test_jobs_limit(self):
+        self.run(2, 2)
+        assert self.max_total == 2
+
+    def test_failures(self):
+        self.fail_download = ['A2']
+        self.fail_update = ['B1']
+        res = self.run(3, 1)
+        assert res['A2']['status'] == 'download failed'
+        assert res['A2']['download_secs'] is None
+        assert res['A2']['update_secs'] is None
+        assert res['A2']['count_new'] is None
+        assert res['B1']['status'] == 'update failed'
+        assert res['B1']['download_secs'] > 0
+        assert res['B1']['update_secs'] > 0
+        assert res['B1']['count_new'] is None
+        assert res['C1']['status'] == 'ok'
+        assert res['C1']['download_secs'] > 0
+        assert res['C1']['update_secs'] > 0
+        assert (res['C1']['count_new'], res['C1']['count_upd']) == (2, 1)
+        assert 'A2' not in [x[0] for x in self.db_calls]
+
+
+class TestTimingReport:
+
+    def test_report(self):
+        res = OrderedDict([
+            ('LongAccountName', {
+                'status': 'ok', 'download_secs': 1.234, 'update_secs': 0.5,
+                'count_new': 3, 'count_upd': 12
+            }),
+            ('A2', {
+                'status': 'download failed', 'download_secs': None,
+                'update_secs': None, 'count_new': None, 'count_upd': None
+            })
+        ])
+        assert OfxGetter.timing_report(res) == "\n".join([
+            'Account          Status           Download    Update    New  '
+            'Updated',
+            'LongAccountName  ok                  1.23s     0.50s      3  '
+            '     12',
+            'A2               download failed         -         -      -  '
+            '      -'
+        ])
+
+
+class TestMainConcurrent:
+
+    def run_main(self, statuses):
+        results = OrderedDict(
+            (f'A{idx}', {
+                'status': s, 'download_secs': 1.0, 'update_secs': 1.0,
+                'count_new': 0, 'count_upd': 0
+            }) for idx, s in enumerate(statuses)
+        )
+        args = Mock(
+            verbose=0, list=False, remote='https://bwb', save_path='/stmts',
+            institution=False,
+            ACCOUNT_NAME=None, days=10, jobs=3, per_institution=2,
+            metrics=False
+        )
+        with patch.multiple(
+            pbm, parse_args=DEFAULT, apiclient=DEFAULT, OfxGetter=DEFAULT,
+            ImportManifest=DEFAULT, logger=DEFAULT
+        ) as mocks:
+            mocks['parse_args'].return_value = args
+            m_og = mocks['OfxGetter']
+            m_og.accounts.return_value = {'A1': {}, 'A0': {}}
+            m_og.timing_report.return_value = 'REPORT'
+            m_og.return_value.get_ofx_concurrent.return_value = results
+            with pytest.raises(SystemExit) as exc:
+                main()
+        assert m_og.mock_calls[0] == call(
+            mocks['apiclient'].return_value, '/stmts',
+            manifest=mocks['ImportManifest'].return_value
+        )
+        assert m_og.return_value.get_ofx_concurrent.mock_calls == [
+            call(['A0', 'A1'], days=10, jobs=3, per_institution=2)
+        ]
+        assert m_og.timing_report.mock_calls == [call(results)]
+        assert m_og.return_value.get_ofx.mock_calls == []
+        return exc.value.code
+
+    def test_success(self, capsys):
+        assert self.run_main(['ok', 'ok']) == 0
+        assert capsys.readouterr().out == 'REPORT\n'
+
+    @pytest.mark.parametrize('failed', ['download failed', 'update failed'])
+    def test_failure(self, capsys, failed):
+        assert self.run_main(['ok', failed]) == 1
+        assert capsys.readouterr().out == 'REPORT\n'
+
+
+class TestParseArgs:
+
+    def test_jobs(self):
+        with patch('sys.argv', ['ofxgetter', '-j', '3']):
+            args = parse_args()
+        assert args.jobs == 3
+        assert args.per_institution == 1
+
+    @pytest.mark.parametrize('argv', [
+        ['-j', '0'], ['-j', '-2'], ['-j', 'x'], ['--per-institution', '0']
+    ])
+    def test_invalid(self, argv, capsys):
+        with patch('sys.argv', ['ofxgetter'] + argv):
+            with pytest.raises(SystemExit) as exc:
+                parse_args()
+        assert exc.value.code == 2
+        assert 'usage: ofxgetter' in capsys.readouterr().err
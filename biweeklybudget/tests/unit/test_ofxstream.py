@@ -0,0 +1,195 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/biweeklybudget>
+
+################################################################################
+Copyright 2016-2024 Jason Antman <http://www.jasonantman.com>
+
+    This file is part of biweeklybudget, also known as biweeklybudget.
+
+    biweeklybudget is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    biweeklybudget is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with biweeklybudget.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/biweeklybudget> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+import os
+from io import BytesIO
+
+import pytest
+from ofxparse import OfxParser, AccountType
+from ofxparse.ofxparse import OfxParserException
+
+from biweeklybudget.ofxstream import OfxStreamReader
+from biweeklybudget.models.ofx_transaction import OFXTransaction
+
+fixturedir = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..', 'fixtures')
+)
+
+SGML = '''OFXHEADER:100
+DATA:OFXSGML
+VERSION:102
+SECURITY:NONE
+ENCODING:USASCII
+CHARSET:1252
+COMPRESSION:NONE
+OLDFILEUID:NONE
+NEWFILEUID:NONE
+
+<OFX>
+<SIGNONMSGSRSV1><SONRS><STATUS><CODE>0<SEVERITY>INFO<MESSAGE>OK</STATUS>
+<DTSERVER>20200102030405.123[-5:EST]<LANGUAGE>ENG
+<FI><ORG>B&amp;T Bank<FID>1234</FI><INTU.BID>999</SONRS></SIGNONMSGSRSV1>
+<BANKMSGSRSV1><STMTTRNRS><TRNUID>1<STATUS><CODE>0<SEVERITY>INFO</STATUS>
+<STMTRS><CURDEF>USD<BANKACCTFROM><BANKID>011000015<BRANCHID>22
+<ACCTID>12345<ACCTTYPE>CHECKING</BANKACCTFROM>
+<BANKTRANLIST><DTSTART>20191201<DTEND>20200101120000
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20191202120000[-5:EST]<TRNAMT>-1,234.56
+<FITID>A1<NAME>Caf\xe9 AT&T &lt;x&gt;<MEMO>memo 1</STMTTRN>
+<STMTTRN><TRNTYPE>CHECK<DTPOSTED>20191203<TRNAMT>-10.00<FITID>A2
+<CHECKNUM>1001<SIC>5411<NAME>Grocer<MEMO></STMTTRN>
+<STMTTRN>
+  <TRNTYPE>  CREDIT
+  <DTPOSTED>20191204
+  <TRNAMT>null
+  <FITID> A3
+  <PAYEE><NAME>Payee Name<ADDR1>1 Main</PAYEE>
+  <MEMO>
+</STMTTRN>
+<STMTTRN><TRNTYPE>INT<DTPOSTED>20191205.5<TRNAMT>10000,50<FITID>A4
+<NAME>Interest<SIC>9999</STMTTRN>
+</BANKTRANLIST>
+<LEDGERBAL><BALAMT>1.000,25<DTASOF>20200101</LEDGERBAL>
+<AVAILBAL><BALAMT>900<DTASOF>20200101120000</AVAILBAL>
+</STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+'''.encode('cp1252')
+
+XML = b'''<?xml version="1.0" encoding="UTF-8" standalone="no"?>
+<?OFX OFXHEADER="200" VERSION="220" SECURITY="NONE"?>
+<OFX><SIGNONMSGSRSV1><SONRS><STATUS><CODE>0</CODE><SEVERITY>INFO</SEVERITY>
+</STATUS><DTSERVER>20200102</DTSERVER><LANGUAGE>ENG</LANGUAGE></SONRS>
+</SIGNONMSGSRSV1><CREDITCARDMSGSRSV1><CCSTMTTRNRS><TRNUID>0</TRNUID>
+<STATUS><CODE>2000</CODE><SEVERITY>ERROR</SEVERITY><MESSAGE>Bad</MESSAGE>
+</STATUS><CCSTMTRS><CURDEF>CAD</CURDEF><CCACCTFROM><ACCTID>9999</ACCTID>
+</CCACCTFROM><BANKTRANLIST><DTSTART>20191201</DTSTART><DTEND>20200101</DTEND>
+<STMTTRN><TRNTYPE>PAYMENT</TRNTYPE><DTPOSTED>20191202</DTPOSTED>
+<TRNAMT>50</TRNAMT><FITID>X1</FITID><NAME>Pay</NAME><MEMO>m</MEMO></STMTTRN>
+</BANKTRANLIST><LEDGERBAL><BALAMT>-5</BALAMT><DTASOF>20200101</DTASOF>
+</LEDGERBAL></CCSTMTRS></CCSTMTTRNRS></CREDITCARDMSGSRSV1></OFX>'''
+
+
+def fixture_bytes(fname='CreditOne_2017-07-28_05-30-00.ofx'):
+    ofxpath = os.path.join(fixturedir, fname)
+    with open(ofxpath, 'rb') as fh:
+        return fh.read()
+
+
+def statement_vars(stmt):
+    res = dict(vars(stmt))
+    del res['transactions']
+    return res
+
+
+class TestOfxStreamReader(object):
+
+    @pytest.mark.parametrize('read_size', [7, 65536])
+    @pytest.mark.parametrize(
+        'data_name', ['fixture', 'suncorp.ofx', 'sgml', 'xml']
+    )
+    def test_matches_ofxparser(self, data_name, read_size):
+        data = {'sgml': SGML, 'xml': XML}.get(data_name)
+        if data is None:
+            data = fixture_bytes() if data_name == 'fixture' else \
+                fixture_bytes(data_name)
+        ofx = OfxParser.parse(BytesIO(data))
+        cls = OfxStreamReader(BytesIO(data), read_size=read_size)
+        assert cls.headers == ofx.headers
+        assert vars(cls.signon) == vars(ofx.signon)
+        assert cls.status == ofx.status
+        for attr in [
+            'curdef', 'account_id', 'routing_number', 'branch_id',
+            'account_type', 'type'
+        ]:
+            assert getattr(cls.account, attr) == getattr(ofx.account, attr)
+        if ofx.account.institution is None:
+            assert cls.account.institution is None
+        else:
+            assert vars(cls.account.institution) == vars(
+                ofx.account.institution)
+        expected = [
+            OFXTransaction.params_from_ofxparser_transaction(t, 3, None)
+            for t in ofx.account.statement.transactions
+        ]
+        assert len(expected) > 0
+        assert [
+            OFXTransaction.params_from_ofxparser_transaction(t, 3, None)
+            for t in cls.transactions()
+        ] == expected
+        assert statement_vars(cls.account.statement) == statement_vars(
+            ofx.account.statement
+        )
+
+    def test_header_before_transactions(self):
+        cls = OfxStreamReader(BytesIO(SGML), read_size=16)
+        assert cls.account.type == AccountType.Bank
+        assert cls.account.account_id == '12345'
+        assert cls.account.institution.organization == 'B&T Bank'
+        assert not hasattr(cls.account.statement, 'balance')
+        assert len(list(cls.transactions())) == 4
+        assert str(cls.account.statement.balance) == '1000.25'
+
+    def test_chunks(self):
+        cls = OfxStreamReader(BytesIO(SGML))
+        res = [[t.id for t in c] for c in cls.chunks(3)]
+        assert res == [['A1', 'A2', 'A3'], ['A4']]
+
+    def test_transactions_twice(self):
+        cls = OfxStreamReader(BytesIO(SGML))
+        list(cls.transactions())
+        with pytest.raises(RuntimeError):
+            list(cls.transactions())
+
+    def test_no_transactions(self):
+        data = SGML.split(b'<STMTTRN>')[0] + b'</BANKTRANLIST>' + \
+            SGML.split(b'</BANKTRANLIST>')[1]
+        cls = OfxStreamReader(BytesIO(data))
+        assert list(cls.transactions()) == []
+        assert str(cls.account.statement.balance) == '1000.25'
+
+    def test_bad_transaction(self):
+        data = SGML.replace(b'<FITID>A2\n', b'')
+        cls = OfxStreamReader(BytesIO(data))
+        with pytest.raises(OfxParserException):
+            list(cls.transactions())
+
+    def test_empty(self):
+        with pytest.raises(OfxParserException):
+            OfxStreamReader(BytesIO(b'FOO:BAR\n\n'))
+
+    def test_investment(self):
+        data = b'<OFX><INVSTMTMSGSRSV1><INVSTMTTRNRS><INVSTMTRS>' \
+               b'</INVSTMTRS></INVSTMTTRNRS></INVSTMTMSGSRSV1></OFX>'
+        with pytest.raises(OfxParserException):
+            OfxStreamReader(BytesIO(data))
@@ -36,17 +36,21 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 """
 
 from biweeklybudget.plaid_updater import PlaidUpdateResult, PlaidUpdater
+from biweeklybudget.ingest_metrics import IngestMetrics, IngestResult
 from biweeklybudget.models.account import Account
 from biweeklybudget.models.ofx_transaction import OFXTransaction
 from biweeklybudget.models.plaid_items import PlaidItem
 from biweeklybudget.models.plaid_accounts import PlaidAccount
 from plaid.api.plaid_api import PlaidApi
+from plaid import ApiException
 from datetime import datetime, date
 from decimal import Decimal
 from pytz import UTC
 
 from unittest.mock import Mock, patch, call, MagicMock, DEFAULT
 import pytest
+import threading
+import time
 
 pbm = 'biweeklybudget.plaid_updater'
 pb = f'{pbm}.PlaidUpdater'
@@ -72,9 +76,35 @@ class TestPlaidUpdateResult:
             'exception': 'foo',
             'statement_ids': [123],
             'added': 2,
-            'updated': 1
+            'updated': 1,
+            'removed': 0,
+            'fetch_secs': None,
+            'apply_secs': None,
+            'metrics': None
         }
 
+    def test_timings(self):
+        item = Mock(spec_set=PlaidItem)
+        type(item).item_id = 4
+        r = PlaidUpdateResult(
+            item, True, 1, 2, None, [123], fetch_secs=1.5, apply_secs=0.25
+        )
+        assert r.as_dict['fetch_secs'] == 1.5
+        assert r.as_dict['apply_secs'] == 0.25
+
+    def test_metrics(self):
+        item = Mock(spec_set=PlaidItem)
+        type(item).item_id = 4
+        m = IngestMetrics('plaid', account_id=2, filename='foo.ofx')
+        m.add_stage('upsert', 0.5)
+        m.rows = 3
+        r = PlaidUpdateResult(
+            item, True, 1, 2, None, [123], metrics=[m]
+        )
+        assert r.metrics == [m]
+        assert r.as_dict['metrics'] == [m.as_dict]
+        assert r.as_dict['metrics'][0]['rows'] == 3
+
 
 class TestInit:
 
@@ -109,6 +139,54 @@ class TestAvailableItems:
         ]
 
 
+class FakePlaidClient:
+    """
+    Local stand-in for the parts of the Plaid API client that PlaidUpdater
+    uses. Each access token has ``txns[token]`` transactions, returned in
+    pages of ``page_size``. Each request sleeps for ``delay`` seconds, and the
+    maximum number of concurrent requests is tracked in ``max_active``.
+    """
+
+    def __init__(self, txns, page_size=3, delay=0, fail_tokens=()):
+        self.txns = txns
+        self.page_size = page_size
+        self.delay = delay
+        self.fail_tokens = fail_tokens
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def _request(self, *args):
+        with self._lock:
+            self.requests.append(args)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+
+    def item_get(self, req):
+        self._request('item_get', req.access_token)
+        if req.access_token in self.fail_tokens:
+            raise RuntimeError(f'item_get failed for {req.access_token}')
+        return {'item': {}, 'status': {'transactions': {}}}
+
+    def transactions_get(self, req):
+        offset = req.options.get('offset', 0)
+        self._request('transactions_get', req.access_token, offset)
+        total = self.txns[req.access_token]
+        acct_id = f'{req.access_token}-acct'
+        return {
+            'transactions': [
+                {'account_id': acct_id, 'transaction_id': i}
+                for i in range(offset, min(offset + self.page_size, total))
+            ],
+            'accounts': [{'account_id': acct_id}],
+            'total_transactions': total
+        }
+
+
 class PlaidUpdaterTester:
 
     def setup_method(self):
@@ -137,9 +215,9 @@ class TestUpdate(PlaidUpdaterTester):
         assert res == results
         assert m_avail.mock_calls == [call()]
         assert m_do_item.mock_calls == [
-            call(item1, days=30),
-            call(item2, days=30),
-            call(item3, days=30)
+            call(item1, days=30, sync=False),
+            call(item2, days=30, sync=False),
+            call(item3, days=30, sync=False)
         ]
 
     def test_accounts_specified(self):
@@ -158,10 +236,94 @@ class TestUpdate(PlaidUpdaterTester):
         assert res == results
         assert m_avail.mock_calls == []
         assert m_do_item.mock_calls == [
-            call(item1, days=10),
-            call(item3, days=10)
+            call(item1, days=10, sync=False),
+            call(item3, days=10, sync=False)
         ]
 
+    def test_workers(self):
+        items = [Mock(), Mock()]
+        results = [Mock(), Mock()]
+        with patch(f'{pb}._do_item') as m_do_item:
+            with patch(f'{pb}._update_concurrent') as m_uc:
+                m_uc.return_value = results
+                res = self.cls.update(
+                    items=items, days=10, workers=4, sync=True
+                )
+        assert res == results
+        assert m_do_item.mock_calls == []
+        assert m_uc.mock_calls == [call(items, 10, 4, sync=True)]
+
+
+class TestUpdateConcurrent(PlaidUpdaterTester):
+
+    def setup_method(self):
+        super().setup_method()
+        self.items = [
+            Mock(
+                item_id=f'Item{x}', access_token=f'Token{x}',
+                institution_name=f'Inst{x}', sync_cursor=None
+            ) for x in range(4)
+        ]
+        self.cls.client = FakePlaidClient(
+            {'Token0': 7, 'Token1': 0, 'Token2': 3, 'Token3': 10}, delay=0.02
+        )
+        self.applied = []
+
+    def se_apply(
+        self, item, end_date, txns, accts, fetch_secs, removed, cursor
+    ):
+        self.applied.append((item, threading.get_ident()))
+        return PlaidUpdateResult(
+            item, True, 0, len(txns), None, [item.item_id],
+            fetch_secs=fetch_secs, apply_secs=0
+        )
+
+    def test_happy_path(self):
+        with patch(f'{pb}._apply_item') as m_apply:
+            m_apply.side_effect = self.se_apply
+            res = self.cls._update_concurrent(self.items, 30, 3)
+        assert [r.item for r in res] == self.items
+        assert [r.success for r in res] == [True, True, True, True]
+        assert [r.added for r in res] == [7, 0, 3, 10]
+        assert all(r.as_dict['fetch_secs'] > 0 for r in res)
+        assert sorted(
+            [x[0] for x in self.applied], key=lambda x: x.item_id
+        ) == self.items
+        assert set(x[1] for x in self.applied) == {threading.get_ident()}
+        assert 1 < self.cls.client.max_active <= 3
+        assert self.cls._request_slots is None
+        assert sorted(
+            x[2] for x in self.cls.client.requests
+            if x[0] == 'transactions_get' and x[1] == 'Token3'
+        ) == [0, 3, 6, 9]
+
+    @pytest.mark.parametrize('workers', [1, 2, 4])
+    def test_request_limit(self, workers):
+        """
+        Item and page threads together never have more than ``workers``
+        requests to Plaid in flight.
+        """
+        self.cls.client = FakePlaidClient(
+            {'Token0': 30, 'Token1': 30, 'Token2': 30, 'Token3': 30},
+            delay=0.01
+        )
+        with patch(f'{pb}._apply_item') as m_apply:
+            m_apply.side_effect = self.se_apply
+            res = self.cls._update_concurrent(self.items, 30, workers)
+        assert [r.added for r in res] == [30, 30, 30, 30]
+        assert len(self.cls.client.requests) == 44
+        assert self.cls.client.max_active == workers
+
+    def test_fetch_failure(self):
+        self.cls.client.fail_tokens = ['Token2']
+        with patch(f'{pb}._apply_item') as m_apply:
+            m_apply.side_effect = self.se_apply
+            res = self.cls._update_concurrent(self.items, 30, 2)
+        assert [r.success for r in res] == [True, True, False, True]
+        assert str(res[2].exc) == 'item_get failed for Token2'
+        assert res[2].stmt_ids is None
+        assert self.items[2] not in [x[0] for x in self.applied]
+
 
 class TestDoItem(PlaidUpdaterTester):
 
@@ -200,10 +362,13 @@ class TestDoItem(PlaidUpdaterTester):
 
         mock_igr = Mock()
 
+        m1 = IngestMetrics('plaid')
+        m2 = IngestMetrics('plaid')
+
         def se_sfa(_, acct, *args):
             if acct['account_id'] == 1:
-                return 'sid1', 1, 4
-            return 'sid2', 2, 3
+                return IngestResult('sid1', 1, 4, metrics=m1)
+            return IngestResult('sid2', 2, 3, metrics=m2)
 
         with patch.multiple(
             pbm,
@@ -228,6 +393,7 @@ class TestDoItem(PlaidUpdaterTester):
         assert res.success is True
         assert res.exc is None
         assert res.stmt_ids == ['sid1', 'sid2']
+        assert res.metrics == [m1, m2]
         assert m_sfa.mock_calls == [
             call(
                 acctA,
@@ -300,10 +466,13 @@ class TestDoItem(PlaidUpdaterTester):
 
         mock_igr = Mock()
 
+        m1 = IngestMetrics('plaid')
+        m2 = IngestMetrics('plaid')
+
         def se_sfa(_, acct, *args):
             if acct['account_id'] == 1:
-                return 'sid1', 1, 4
-            return 'sid2', 2, 3
+                return IngestResult('sid1', 1, 4, metrics=m1)
+            return IngestResult('sid2', 2, 3, metrics=m2)
 
         with patch.multiple(
             pbm,
@@ -328,6 +497,7 @@ class TestDoItem(PlaidUpdaterTester):
         assert res.success is True
         assert res.exc is None
         assert res.stmt_ids == ['sid1']
+        assert res.metrics == [m1]
         assert m_sfa.mock_calls == [
             call(
                 acctA,
@@ -393,10 +563,13 @@ class TestDoItem(PlaidUpdaterTester):
 
         mock_igr = Mock()
 
+        m1 = IngestMetrics('plaid')
+        m2 = IngestMetrics('plaid')
+
         def se_sfa(_, acct, *args):
             if acct['account_id'] == 1:
-                return 'sid1', 1, 4
-            return 'sid2', 2, 3
+                return IngestResult('sid1', 1, 4, metrics=m1)
+            return IngestResult('sid2', 2, 3, metrics=m2)
 
         ex = RuntimeError('foo')
         with patch.multiple(
@@ -571,6 +744,288 @@ class TestGetTransactions(PlaidUpdaterTester):
             call(), call(offset=2), call(offset=4)
         ]
 
+    @pytest.mark.parametrize('total', [0, 2, 3, 10, 12])
+    def test_paginate_concurrent(self, total):
+        self.cls.client = FakePlaidClient({'aToken': total})
+        res = self.cls._get_transactions(
+            'aToken', datetime(2020, 5, 10, 0, 0, 0),
+            datetime(2020, 5, 25, 0, 0, 0), page_workers=3
+        )
+        assert [t['transaction_id'] for t in res[0]] == list(range(total))
+        assert res[1] == {'aToken-acct': {'account_id': 'aToken-acct'}}
+        assert [x[2] for x in self.cls.client.requests][0] == 0
+        assert sorted(x[2] for x in self.cls.client.requests) == list(
+            range(0, max(total, 1), 3)
+        )
+
+    def test_paginate_concurrent_short_page(self):
+        """missing transactions are then requested serially, by offset"""
+        self.cls.client = FakePlaidClient({'aToken': 5}, page_size=2)
+        orig = self.cls.client.transactions_get
+
+        def se_tg(req):
+            resp = orig(req)
+            if req.options.get('offset', 0) == 2:
+                resp['transactions'] = resp['transactions'][:1]
+            return resp
+
+        self.cls.client.transactions_get = se_tg
+        res = self.cls._get_transactions(
+            'aToken', datetime(2020, 5, 10, 0, 0, 0),
+            datetime(2020, 5, 25, 0, 0, 0), page_workers=3
+        )
+        assert len(res[0]) == 5
+        assert sorted(x[2] for x in self.cls.client.requests) == [0, 2, 4, 4]
+
+
+def sync_page(cursor, has_more=False, added=(), modified=(), removed=()):
+    return {
+        'added': [{'transaction_id': x} for x in added],
+        'modified': [
+            {'transaction_id': x, 'modified': True} for x in modified
+        ],
+        'removed': [{'transaction_id': x} for x in removed],
+        'next_cursor': cursor,
+        'has_more': has_more
+    }
+
+
+class TestSyncTransactions(PlaidUpdaterTester):
+
+    def test_paginate(self):
+        self.mock_client.transactions_sync.side_effect = [
+            sync_page('c1', True, added=['t1', 't2', 't3']),
+            sync_page('c2', True, modified=['t1'], removed=['t2', 'old1']),
+            sync_page('c3', added=['t4'])
+        ]
+        with patch(f'{pbm}.TransactionsSyncRequest') as m_tsr:
+            res = self.cls._sync_transactions('aToken', 'c0')
+        assert res == (
+            [
+                {'transaction_id': 't3'},
+                {'transaction_id': 't1', 'modified': True},
+                {'transaction_id': 't4'}
+            ],
+            ['t2', 'old1'],
+            'c3'
+        )
+        assert m_tsr.mock_calls == [
+            call(access_token='aToken', count=500, cursor='c0'),
+            call(access_token='aToken', count=500, cursor='c1'),
+            call(access_token='aToken', count=500, cursor='c2')
+        ]
+
+    def test_no_cursor(self):
+        self.mock_client.transactions_sync.side_effect = [
+            sync_page('c1', added=['t1'])
+        ]
+        with patch(f'{pbm}.TransactionsSyncRequest') as m_tsr:
+            res = self.cls._sync_transactions('aToken', None)
+        assert res == ([{'transaction_id': 't1'}], [], 'c1')
+        assert m_tsr.mock_calls == [call(access_token='aToken', count=500)]
+
+    def test_mutation_restart(self):
+        ex = ApiException(status=400)
+        ex.body = '{"error_code": "TRANSACTIONS_SYNC_MUTATION_DURING_' \
+                  'PAGINATION"}'
+        self.mock_client.transactions_sync.side_effect = [
+            sync_page('c1', True, added=['t1']),
+            ex,
+            sync_page('c1', True, added=['t1']),
+            sync_page('c2', added=['t2'])
+        ]
+        with patch(f'{pbm}.TransactionsSyncRequest') as m_tsr:
+            res = self.cls._sync_transactions('aToken', 'c0')
+        assert res == (
+            [{'transaction_id': 't1'}, {'transaction_id': 't2'}], [], 'c2'
+        )
+        assert [x.kwargs['cursor'] for x in m_tsr.mock_calls] == [
+            'c0', 'c1', 'c0', 'c1'
+        ]
+
+    def test_mutation_too_many_restarts(self):
+        ex = ApiException(status=400)
+        ex.body = 'TRANSACTIONS_SYNC_MUTATION_DURING_PAGINATION'
+        self.mock_client.transactions_sync.side_effect = ex
+        with patch(f'{pbm}.TransactionsSyncRequest'):
+            with pytest.raises(ApiException):
+                self.cls._sync_transactions('aToken', 'c0')
+        assert len(self.mock_client.transactions_sync.mock_calls) == 4
+
+    def test_other_exception(self):
+        ex = ApiException(status=400)
+        ex.body = '{"error_code": "ITEM_LOGIN_REQUIRED"}'
+        self.mock_client.transactions_sync.side_effect = ex
+        with patch(f'{pbm}.TransactionsSyncRequest'):
+            with pytest.raises(ApiException):
+                self.cls._sync_transactions('aToken', 'c0')
+        assert len(self.mock_client.transactions_sync.mock_calls) == 1
+
+
+class TestFetchItemSync(PlaidUpdaterTester):
+
+    def test_cursor(self):
+        self.mock_client.item_get.return_value = {'status': {}}
+        self.mock_client.accounts_get.return_value = {
+            'accounts': [{'account_id': 'A1', 'foo': 'bar'}]
+        }
+        with patch(f'{pb}._sync_transactions') as m_st:
+            m_st.return_value = [{'transaction_id': 't1'}], ['t2'], 'c2'
+            with patch(f'{pb}._get_transactions') as m_gt:
+                with patch(f'{pbm}.dtnow') as m_dtnow:
+                    m_dtnow.return_value = datetime(2020, 5, 25)
+                    res = self.cls._fetch_item(
+                        'Item1', 'aToken', 30, sync=True, cursor='c1'
+                    )
+        assert res[:3] == (
+            datetime(2020, 5, 25), [{'transaction_id': 't1'}],
+            {'A1': {'account_id': 'A1', 'foo': 'bar'}}
+        )
+        assert res[4:] == (['t2'], 'c2')
+        assert m_st.mock_calls == [call('aToken', 'c1')]
+        assert m_gt.mock_calls == []
+
+    def test_no_cursor(self):
+        """the initial sync's transactions are applied, not re-downloaded"""
+        self.mock_client.item_get.return_value = {'status': {}}
+        self.mock_client.accounts_get.return_value = {
+            'accounts': [{'account_id': 'A1'}]
+        }
+        with patch(f'{pb}._sync_transactions') as m_st:
+            m_st.return_value = (
+                [{'transaction_id': 't1'}, {'transaction_id': 't2'}], [], 'c9'
+            )
+            with patch(f'{pb}._get_transactions') as m_gt:
+                with patch(f'{pbm}.dtnow') as m_dtnow:
+                    m_dtnow.return_value = datetime(2020, 5, 25)
+                    res = self.cls._fetch_item(
+                        'Item1', 'aToken', 15, sync=True, cursor=None
+                    )
+        assert res[:3] == (
+            datetime(2020, 5, 25),
+            [{'transaction_id': 't1'}, {'transaction_id': 't2'}],
+            {'A1': {'account_id': 'A1'}}
+        )
+        assert res[4:] == ([], 'c9')
+        assert m_st.mock_calls == [call('aToken', None)]
+        assert m_gt.mock_calls == []
+        assert len(self.mock_client.transactions_get.mock_calls) == 0
+
+    def test_no_sync(self):
+        self.mock_client.item_get.return_value = {'status': {}}
+        with patch(f'{pb}._sync_transactions') as m_st:
+            with patch(f'{pb}._get_transactions') as m_gt:
+                m_gt.return_value = [{'transaction_id': 'w1'}], {'A1': {}}
+                with patch(f'{pbm}.dtnow') as m_dtnow:
+                    m_dtnow.return_value = datetime(2020, 5, 25)
+                    res = self.cls._fetch_item(
+                        'Item1', 'aToken', 15, cursor='c1'
+                    )
+        assert res[:3] == (
+            datetime(2020, 5, 25), [{'transaction_id': 'w1'}], {'A1': {}}
+        )
+        assert res[4:] == (None, None)
+        assert m_st.mock_calls == []
+        assert m_gt.mock_calls == [
+            call('aToken', datetime(2020, 5, 10), datetime(2020, 5, 25))
+        ]
+        assert self.mock_client.accounts_get.mock_calls == []
+
+
+class TestApplyItemSync(PlaidUpdaterTester):
+
+    def test_removed_and_cursor(self):
+        acctA = Mock(spec_set=Account)
+        pa = Mock(
+            spec_set=PlaidAccount, item_id='Item1', account_id='A1',
+            account=acctA
+        )
+        mock_item = Mock(item_id='Item1', sync_cursor='c1')
+        with patch.multiple(
+            pbm, db_session=DEFAULT, PlaidAccount=DEFAULT, dtnow=DEFAULT
+        ) as mocks:
+            mocks['db_session'].query.return_value.filter. \
+                return_value.all.return_value = [pa]
+            with patch(f'{pb}._stmt_for_acct') as m_sfa:
+                m_sfa.return_value = IngestResult('sid1', 1, 2)
+                with patch(f'{pb}._remove_transactions') as m_rt:
+                    m_rt.return_value = 1
+                    res = self.cls._apply_item(
+                        mock_item, datetime(2020, 5, 25), [], {'A1': {}}, 1.0,
+                        removed=['t2', 't3'], cursor='c2'
+                    )
+        assert res.success is True
+        assert res.added == 1
+        assert res.updated == 2
+        assert res.removed == 1
+        assert m_rt.mock_calls == [call({'A1': pa}, ['t2', 't3'])]
+        assert mock_item.sync_cursor == 'c2'
+        assert mocks['db_session'].mock_calls[-2:] == [
+            call.add(mock_item), call.commit()
+        ]
+
+    def test_failure_keeps_cursor(self):
+        mock_item = Mock(item_id='Item1', sync_cursor='c1')
+        with patch.multiple(
+            pbm, db_session=DEFAULT, PlaidAccount=DEFAULT, dtnow=DEFAULT
+        ) as mocks:
+            mocks['db_session'].query.return_value.filter. \
+                return_value.all.return_value = []
+            res = self.cls._apply_item(
+                mock_item, datetime(2020, 5, 25), [], {'A1': {}}, 1.0,
+                removed=['t2'], cursor='c2'
+            )
+        assert res.success is False
+        assert isinstance(res.exc, KeyError)
+        assert mock_item.sync_cursor == 'c1'
+        assert call.commit() not in mocks['db_session'].mock_calls
+
+
+class TestRemoveTransactions(PlaidUpdaterTester):
+
+    def test_remove(self):
+        pas = {
+            'A1': Mock(spec_set=PlaidAccount, account=Mock(id=1)),
+            'A2': Mock(spec_set=PlaidAccount, account=None),
+            'A3': Mock(spec_set=PlaidAccount, account=Mock(id=3))
+        }
+        # t1 has a reference number FITID; t2 was saved before
+        # plaid_transaction_id was
+        t1 = Mock(
+            spec_set=OFXTransaction, reconcile=None, fitid='ref1',
+            plaid_transaction_id='t1'
+        )
+        t2 = Mock(
+            spec_set=OFXTransaction, reconcile=Mock(), fitid='t2',
+            plaid_transaction_id=None
+        )
+        with patch(f'{pbm}.db_session') as mock_db:
+            mock_db.query.return_value.filter.return_value.all.return_value = [
+                t1, t2
+            ]
+            with patch(f'{pbm}.logger') as mock_logger:
+                res = self.cls._remove_transactions(pas, ['t1', 't2', 't3'])
+        assert res == 1
+        assert mock_db.mock_calls[0] == call.query(OFXTransaction)
+        assert call.delete(t1) in mock_db.mock_calls
+        assert call.delete(t2) not in mock_db.mock_calls
+        sql = str(mock_db.query.return_value.filter.mock_calls[0][1][1])
+        assert 'ofx_trans.plaid_transaction_id IN' in sql
+        assert 'ofx_trans.plaid_transaction_id IS NULL AND ' \
+               'ofx_trans.fitid IN' in sql
+        assert mock_logger.mock_calls[-1] == call.info(
+            'Plaid reported transaction %s as removed, but it does not match '
+            'any OFXTransaction; it may have been pending', 't3'
+        )
+        assert len(mock_logger.info.mock_calls) == 2
+
+    def test_no_accounts(self):
+        pas = {'A2': Mock(spec_set=PlaidAccount, account=None)}
+        with patch(f'{pbm}.db_session') as mock_db:
+            res = self.cls._remove_transactions(pas, ['t1'])
+        assert res == 0
+        assert mock_db.mock_calls == []
+
 
 class TestStmtForAcct(PlaidUpdaterTester):
 
@@ -615,6 +1070,15 @@ class TestStmtForAcct(PlaidUpdaterTester):
                     m_ofxstmt.return_value = mock_stmt
                     res = self.cls._stmt_for_acct(mock_acct, pai, txns, end_dt)
         assert res == (123, 1, 2)
+        assert res.metrics.source == 'plaid'
+        assert res.metrics.account_id == 5
+        assert res.metrics.filename == 'Plaid_acct5_1590364800.ofx'
+        assert res.metrics.rows == 2
+        assert res.metrics.count_new == 1
+        assert res.metrics.count_updated == 2
+        assert list(res.metrics.stages.keys()) == [
+            'create_statement', 'upsert', 'flush', 'commit', 'other'
+        ]
         assert mocks['_update_bank_or_credit'].mock_calls == [
             call(end_dt, mock_acct, pai, txns, mock_stmt)
         ]
@@ -632,7 +1096,7 @@ class TestStmtForAcct(PlaidUpdaterTester):
         ]
         assert mock_stmt.bankid == 'abc123'
         assert mock_stmt.type == 'CreditCard'
-        assert m_dbsess.mock_calls == [call.commit()]
+        assert m_dbsess.mock_calls == [call.flush(), call.commit()]
 
     def test_depository(self):
         mock_item = Mock(institution_id='abc123')
@@ -693,7 +1157,7 @@ class TestStmtForAcct(PlaidUpdaterTester):
         ]
         assert mock_stmt.bankid == 'abc123'
         assert mock_stmt.type == 'Bank'
-        assert m_dbsess.mock_calls == [call.commit()]
+        assert m_dbsess.mock_calls == [call.flush(), call.commit()]
 
     def test_investment(self):
         mock_item = Mock(institution_id='abc123')
@@ -752,7 +1216,7 @@ class TestStmtForAcct(PlaidUpdaterTester):
             )
         ]
         assert mock_stmt.type == 'Investment'
-        assert m_dbsess.mock_calls == [call.commit()]
+        assert m_dbsess.mock_calls == [call.flush(), call.commit()]
 
     def test_loan(self):
         mock_item = Mock(institution_id='abc123')
@@ -811,7 +1275,7 @@ class TestStmtForAcct(PlaidUpdaterTester):
             )
         ]
         assert mock_stmt.type == 'Investment'
-        assert m_dbsess.mock_calls == [call.commit()]
+        assert m_dbsess.mock_calls == [call.flush(), call.commit()]
 
     def test_unknown_type(self):
         mock_item = Mock(institution_id='abc123')
@@ -955,6 +1419,7 @@ class TestUpdateBankOrCredit(PlaidUpdaterTester):
                 amount=Decimal('123.46'),
                 date_posted=datetime(2020, 2, 23, 0, 0, 0, tzinfo=UTC),
                 fitid='TXN001',
+                plaid_transaction_id='TXN001',
                 name='Some Txn',
                 account_id=4,
                 statement=mock_stmt
@@ -965,6 +1430,7 @@ class TestUpdateBankOrCredit(PlaidUpdaterTester):
                 amount=Decimal('482.86'),
                 date_posted=datetime(2020, 3, 15, 0, 0, 0, tzinfo=UTC),
                 fitid='456def',
+                plaid_transaction_id='TXN002',
                 name='Other Txn',
                 account_id=4,
                 statement=mock_stmt
@@ -1035,6 +1501,7 @@ class TestUpdateBankOrCredit(PlaidUpdaterTester):
                 amount=Decimal('-123.46'),
                 date_posted=datetime(2020, 2, 23, 0, 0, 0, tzinfo=UTC),
                 fitid='TXN001',
+                plaid_transaction_id='TXN001',
                 name='Some Txn',
                 account_id=4,
                 statement=mock_stmt
@@ -1045,6 +1512,7 @@ class TestUpdateBankOrCredit(PlaidUpdaterTester):
                 amount=Decimal('-482.86'),
                 date_posted=datetime(2020, 3, 15, 0, 0, 0, tzinfo=UTC),
                 fitid='456def',
+                plaid_transaction_id='TXN002',
                 name='Other Txn',
                 account_id=4,
                 statement=mock_stmt
@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+"""
+Development script to benchmark the Decimal and vectorized (NumPy) credit card
+payoff engines in :py:mod:`biweeklybudget.interest` against each other.
+
+The latest version of this package is available at:
+<http://github.com/jantman/biweeklybudget>
+
+################################################################################
+Copyright 2016-2024 Jason Antman <http://www.jasonantman.com>
+
+    This file is part of biweeklybudget, also known as biweeklybudget.
+
+    biweeklybudget is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    biweeklybudget is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with biweeklybudget.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/biweeklybudget> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import sys
+import re
+import argparse
+import logging
+import random
+from timeit import default_timer
+from datetime import datetime
+from decimal import Decimal
+
+from pytz import UTC
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from biweeklybudget.models.base import Base
+from biweeklybudget.models.account import Account, AcctType
+from biweeklybudget.models.ofx_statement import OFXStatement
+from biweeklybudget.models.ofx_transaction import OFXTransaction
+from biweeklybudget.db_event_handlers import (
+    handle_ofx_transaction_new_or_change
+)
+from biweeklybudget.ofx_classifier import FIELDS, classify_many, _classifier
+
+FORMAT = "[%(levelname)s %(filename)s:%(lineno)s - %(name)s.%(funcName)s() ] " \
+         "%(message)s"
+logging.basicConfig(level=logging.WARNING, format=FORMAT)
+logger = logging.getLogger()
+
+#: Account patterns to classify with
+PATTERNS = {
+    're_interest_charge': '^(interest charge|interest charged)',
+    're_interest_paid': '^interest (paid|earned)',
+    're_payment': '^(payment|thank you|online payment)',
+    're_late_fee': '^late fee',
+    're_other_fee': '.*(annual|foreign transaction|overlimit) fee'
+}
+
+#: Transaction name templates
+NAMES = [
+    'PAYMENT - THANK YOU', 'Online Payment %d, Thank You',
+    'INTEREST CHARGED TO STANDARD PUR', 'Interest Paid', 'LATE FEE',
+    'ANNUAL FEE', 'FOREIGN TRANSACTION FEE %d', 'AMAZON MKTPLACE PMTS %d',
+    'SQ *COFFEE SHOP %d', 'SHELL OIL %d', 'GROCERY STORE #%d',
+    'NETFLIX.COM', 'UBER TRIP %d HELP.UBER.COM', 'CHECK #%d'
+]
+
+
+def legacy_is_fields(acct, name):
+    """
+    The original classification algorithm: ``re.match`` on each of the
+    Account's uncompiled pattern strings.
+    """
+    res = {}
+    for acct_attr, self_attr in FIELDS:
+        if (
+            self_attr == 'is_interest_charge' and
+            name == 'Interest Charged - MANUALLY ENTERED'
+        ):
+            continue
+        res[self_attr] = False
+        r_str = getattr(acct, acct_attr)
+        if r_str is None:
+            continue
+        try:
+            if re.match(r_str, name, re.I):
+                res[self_attr] = True
+        except Exception:
+            pass
+    return res
+
+
+def legacy_handle_new_or_change(session):
+    """
+    The original ``before_flush`` handler: reclassify every new and dirty
+    OFXTransaction.
+    """
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, OFXTransaction):
+            for k, v in legacy_is_fields(obj.account, obj.name).items():
+                setattr(obj, k, v)
+
+
+class TimedHandler(object):
+    """``before_flush`` listener that accumulates the run time of ``func``."""
+
+    def __init__(self, func):
+        self.func = func
+        self.elapsed = 0.0
+
+    def __call__(self, session, flush_context, instances):
+        start = default_timer()
+        self.func(session)
+        self.elapsed += default_timer() - start
+
+
+def make_names(count, seed):
+    rand = random.Random(seed)
+    res = []
+    for _ in range(count):
+        tmpl = rand.choice(NAMES)
+        if '%d' in tmpl:
+            tmpl = tmpl % rand.randint(1, 5000)
+        res.append(tmpl)
+    return res
+
+
+def timed(func, *args):
+    """Return a 2-tuple of (``func(*args)``, run time in seconds)."""
+    start = default_timer()
+    res = func(*args)
+    return res, default_timer() - start
+
+
+def new_session(handler=None):
+    """
+    Return a 3-tuple of a session on a new in-memory SQLite database, with
+    ``handler`` as a ``before_flush`` listener, and the Account and
+    OFXStatement created in it.
+    """
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    sess = sessionmaker(bind=engine)()
+    if handler is not None:
+        event.listen(sess, 'before_flush', handler)
+    acct = Account(name='Bench', acct_type=AcctType.Credit, **PATTERNS)
+    stmt = OFXStatement(
+        account=acct, filename='bench.ofx', file_mtime=datetime.now(UTC)
+    )
+    sess.add_all([acct, stmt])
+    sess.flush()
+    return sess, acct, stmt
+
+
+def bulk_ingest(legacy, names, chunk_size):
+    """
+    Ingest transactions with ``names`` into a new in-memory SQLite database
+    the way :py:class:`~.OfxApiLocal` does, with one ``bulk_insert_mappings``
+    per ``chunk_size`` transactions, classifying them with either the legacy
+    algorithm or :py:func:`~.ofx_classifier.classify_many`. Return a 2-tuple
+    of run time and list of resulting ``is_*`` field tuples.
+    """
+    sess, acct, stmt = new_session()
+    start = default_timer()
+    for offset in range(0, len(names), chunk_size):
+        chunk = names[offset:offset + chunk_size]
+        new = [
+            {
+                'account_id': acct.id, 'statement_id': stmt.id,
+                'fitid': 'T%d' % (offset + idx), 'trans_type': 'Debit',
+                'date_posted': datetime(2017, 7, 1, tzinfo=UTC),
+                'amount': Decimal('-1.23'), 'name': name
+            } for idx, name in enumerate(chunk)
+        ]
+        if legacy:
+            for mapping in new:
+                mapping.update(legacy_is_fields(acct, mapping['name']))
+        else:
+            for mapping, fields in zip(
+                new, classify_many(acct, [m['name'] for m in new])
+            ):
+                mapping.update(fields)
+        sess.bulk_insert_mappings(OFXTransaction, new)
+    sess.flush()
+    duration = default_timer() - start
+    res = [
+        tuple(getattr(t, f) for _, f in FIELDS)
+        for t in sess.query(OFXTransaction).order_by(OFXTransaction.fitid)
+    ]
+    sess.close()
+    return duration, res
+
+
+def ingest(func, names, chunk_size):
+    """
+    Ingest transactions with ``names`` into a new in-memory SQLite database
+    through the ORM with ``func`` as the ``before_flush`` handler, flushing
+    every ``chunk_size`` transactions, then change the memo of every
+    transaction (without changing names) and flush again. Return a 3-tuple
+    of the time spent in the handler during ingest, the time spent in the
+    handler during the update, and list of resulting ``is_*`` field tuples.
+    """
+    handler = TimedHandler(func)
+    sess, acct, stmt = new_session(handler)
+    handler.elapsed = 0.0
+    txns = []
+    for idx, name in enumerate(names):
+        txn = OFXTransaction(
+            account=acct, statement=stmt, fitid='T%d' % idx,
+            trans_type='Debit', date_posted=datetime(2017, 7, 1, tzinfo=UTC),
+            amount=Decimal('-1.23'), name=name
+        )
+        sess.add(txn)
+        txns.append(txn)
+        if len(txns) % chunk_size == 0:
+            sess.flush()
+    sess.flush()
+    ingest_time = handler.elapsed
+    handler.elapsed = 0.0
+    for txn in txns:
+        txn.memo = 'updated'
+    sess.flush()
+    update_time = handler.elapsed
+    res = [
+        tuple(getattr(t, f) for _, f in FIELDS) for t in txns
+    ]
+    sess.close()
+    return ingest_time, update_time, res
+
+
+def main(argv):
+    p = argparse.ArgumentParser(
+        description='Benchmark legacy vs compiled OFXTransaction '
+                    'classification, alone and when ingesting transactions '
+                    'into an in-memory SQLite database',
+        epilog='The usual settings environment variables must be set so '
+               'that the models can be imported; the configured database '
+               'is not used.'
+    )
+    p.add_argument('-n', '--num-transactions', dest='num', type=int,
+                   default=50000,
+                   help='number of synthetic transactions (default: 50000)')
+    p.add_argument('-c', '--chunk-size', dest='chunk_size', type=int,
+                   default=500,
+                   help='transactions per flush when ingesting '
+                        '(default: 500)')
+    p.add_argument('-s', '--seed', dest='seed', type=int, default=1,
+                   help='random seed (default: 1)')
+    args = p.parse_args(argv)
+    names = make_names(args.num, args.seed)
+    acct = Account(**PATTERNS)
+    print('%d transactions, %d distinct names' % (len(names), len(set(names))))
+    legacy, leg_time = timed(
+        lambda: [legacy_is_fields(acct, n) for n in names]
+    )
+    _classifier.cache_clear()
+    new, new_time = timed(classify_many, acct, names)
+    if legacy != new:
+        raise RuntimeError('classification results differ')
+    print('%-24s %10s %10s %8s' % ('Phase', 'Legacy', 'New', 'Speedup'))
+    print('%-24s %9.3fs %9.3fs %7.1fx' % (
+        'classify', leg_time, new_time, leg_time / new_time
+    ))
+    leg_bulk, leg_res = bulk_ingest(True, names, args.chunk_size)
+    _classifier.cache_clear()
+    new_bulk, new_res = bulk_ingest(False, names, args.chunk_size)
+    if leg_res != new_res:
+        raise RuntimeError('bulk ingested is_* fields differ')
+    print('%-24s %9.3fs %9.3fs %7.1fx' % (
+        'bulk ingest', leg_bulk, new_bulk, leg_bulk / new_bulk
+    ))
+    _classifier.cache_clear()
+    leg_ingest, leg_update, leg_res = ingest(
+        legacy_handle_new_or_change, names, args.chunk_size
+    )
+    _classifier.cache_clear()
+    new_ingest, new_update, new_res = ingest(
+        handle_ofx_transaction_new_or_change, names, args.chunk_size
+    )
+    if leg_res != new_res:
+        raise RuntimeError('ingested is_* fields differ')
+    print('%-24s %9.3fs %9.3fs %7.1fx' % (
+        'ORM ingest (handler)', leg_ingest, new_ingest, leg_ingest / new_ingest
+    ))
+    print('%-24s %9.3fs %9.3fs %7.1fx' % (
+        'ORM update (handler)', leg_update, new_update,
+        leg_update / new_update
+    ))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+"""
+Development script to benchmark the Decimal and vectorized (NumPy) credit card
+payoff engines in :py:mod:`biweeklybudget.interest` against each other.
+
+The latest version of this package is available at:
+<http://github.com/jantman/biweeklybudget>
+
+################################################################################
+Copyright 2016-2024 Jason Antman <http://www.jasonantman.com>
+
+    This file is part of biweeklybudget, also known as biweeklybudget.
+
+    biweeklybudget is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    biweeklybudget is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with biweeklybudget.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/biweeklybudget> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+
+import sys
+import argparse
+import logging
+import random
+from timeit import default_timer
+from datetime import date
+from decimal import Decimal
+
+from biweeklybudget.interest import (
+    CCStatement, _BillingPeriod, INTEREST_CALCULATION_NAMES,
+    MIN_PAYMENT_FORMULA_NAMES, PAYOFF_METHOD_NAMES, calculate_payoffs,
+    calculate_payoffs_vectorized, calculate_payoffs_checked
+)
+
+FORMAT = "[%(levelname)s %(filename)s:%(lineno)s - %(name)s.%(funcName)s() ] " \
+         "%(message)s"
+logging.basicConfig(level=logging.WARNING, format=FORMAT)
+logger = logging.getLogger()
+
+
+def make_statements(num_cards, seed):
+    """
+    Generate ``num_cards`` synthetic credit card statements with random
+    balances, APRs, interest calculations and minimum payment formulas.
+    """
+    rand = random.Random(seed)
+    res = []
+    for _ in range(num_cards):
+        icls = rand.choice(sorted(INTEREST_CALCULATION_NAMES.keys()))
+        mcls = rand.choice(sorted(MIN_PAYMENT_FORMULA_NAMES.keys()))
+        principal = Decimal(rand.randint(50000, 2000000)) / 100
+        res.append(CCStatement(
+            INTEREST_CALCULATION_NAMES[icls]['cls'](
+                Decimal(rand.randint(900, 2999)) / 10000
+            ),
+            principal,
+            MIN_PAYMENT_FORMULA_NAMES[mcls]['cls'](),
+            _BillingPeriod(date(2017, 7, rand.randint(1, 28))),
+            end_balance=principal,
+            interest_amt=(principal * Decimal('0.015')).quantize(
+                Decimal('.01')
+            )
+        ))
+    return res
+
+
+def timed(repeat, func, *args):
+    """Return the best run time of ``func(*args)`` out of ``repeat`` runs."""
+    times = []
+    for _ in range(repeat):
+        start = default_timer()
+        func(*args)
+        times.append(default_timer() - start)
+    return min(times)
+
+
+def main(argv):
+    p = argparse.ArgumentParser(
+        description='Benchmark Decimal vs vectorized credit card payoff engines'
+    )
+    p.add_argument('-c', '--cards', dest='cards', type=int, default=12,
+                   help='number of synthetic cards (default: 12)')
+    p.add_argument('-r', '--repeat', dest='repeat', type=int, default=3,
+                   help='number of times to run each engine (default: 3)')
+    p.add_argument('-s', '--seed', dest='seed', type=int, default=1,
+                   help='random seed (default: 1)')
+    args = p.parse_args(argv)
+    stmts = make_statements(args.cards, args.seed)
+    min_total = sum(s.minimum_payment for s in stmts)
+    print('%d cards, total balance %s, total minimum payment %s' % (
+        len(stmts), sum(s.principal for s in stmts), min_total
+    ))
+    print('%-32s %10s %10s %8s' % ('Method', 'Decimal', 'NumPy', 'Speedup'))
+    for name in sorted(PAYOFF_METHOD_NAMES.keys()):
+        cls = PAYOFF_METHOD_NAMES[name]['cls']
+        if not cls.show_in_ui:
+            continue
+        method = cls(min_total * Decimal('1.2'))
+        # raises if the engines don't agree to the cent
+        calculate_payoffs_checked(method, stmts)
+        dec_time = timed(args.repeat, calculate_payoffs, method, stmts)
+        vec_time = timed(
+            args.repeat, calculate_payoffs_vectorized, method, stmts
+        )
+        print('%-32s %9.3fs %9.3fs %7.1fx' % (
+            name, dec_time, vec_time, dec_time / vec_time
+        ))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])